@@ -0,0 +1,214 @@
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.query_accounting import query_stats
+from app.core.rate_limiting import rate_limit_stats
+from app.core.spans import recent_slow_queries
+from app.models.user import User
+from app.services import parquet_store
+from app.services.collected_data import build_filter, delete_collected_data, rebuild_search_index, rebuild_vector_index
+from app.services.auth import get_current_active_superuser
+from app.services.live_events import get_event_hub
+from app.services.mention_tagger import get_mention_tagger
+from app.services.request_profiles import delete_profiles, get_profile, list_profiles, serialize_profile
+from app.services.vector_index import get_vector_index
+
+router = APIRouter()
+
+@router.get("/profiles")
+async def get_request_profiles(
+    path: Optional[str] = Query(None, description="Only profiles of this request path"),
+    limit: int = Query(20, ge=1, le=200, description="Maximum number of profiles to return"),
+    skip: int = Query(0, ge=0, description="Number of profiles to skip"),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    List request profiles, newest first
+
+    Requests are profiled when a superuser sends the profiling header or when
+    sampled, and only if profiling is enabled.
+    """
+    page = list_profiles(path, limit, skip)
+    return {
+        "enabled": settings.PROFILING_ENABLED,
+        "header": settings.PROFILING_HEADER,
+        "sample_rate": settings.PROFILING_SAMPLE_RATE,
+        "total": page["total"],
+        "profiles": [serialize_profile(profile) for profile in page["profiles"]],
+    }
+
+@router.get("/profiles/{profile_id}")
+async def get_request_profile(
+    profile_id: str,
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Get a request profile with its hottest functions and datastore spans
+    """
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return serialize_profile(profile, detailed=True)
+
+@router.get("/profiles/{profile_id}/folded")
+async def download_request_profile(
+    profile_id: str,
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Download a profile's sampled stacks in folded format, for flamegraph.pl or speedscope
+    """
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        profile["folded"] + "\n",
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.folded"},
+    )
+
+@router.delete("/profiles")
+async def delete_request_profiles(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Delete all stored request profiles
+    """
+    return {"status": "success", "deleted": delete_profiles()}
+
+@router.get("/queries")
+async def get_query_accounting(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Datastore calls per endpoint, repeated (N+1) queries and recent slow queries of this worker process
+    """
+    return {
+        "enabled": settings.QUERY_ACCOUNTING_ENABLED,
+        "repeat_threshold": settings.QUERY_REPEAT_THRESHOLD,
+        "slow_query_ms": {
+            "sql": settings.SLOW_QUERY_SQL_MS,
+            "mongo": settings.SLOW_QUERY_MONGO_MS,
+            "redis": settings.SLOW_QUERY_REDIS_MS,
+        },
+        "endpoints": query_stats.snapshot(),
+        "slow_queries": list(reversed(recent_slow_queries)),
+    }
+
+@router.delete("/queries")
+async def reset_query_accounting(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Reset this worker's query accounting and slow-query list
+    """
+    query_stats.reset()
+    return {"status": "success"}
+
+@router.get("/rate-limits")
+async def get_rate_limits(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Rate limit buckets and route class admission of this worker process
+    """
+    return {
+        "enabled": settings.RATE_LIMIT_ENABLED,
+        "tokens_per_minute": settings.RATE_LIMIT_TOKENS_PER_MINUTE,
+        "burst": settings.RATE_LIMIT_BURST,
+        **rate_limit_stats(),
+    }
+
+@router.get("/parquet")
+async def get_parquet_store(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Partitions, size and last export of the Parquet analytics store
+    """
+    return {"enabled": settings.PARQUET_STORE_ENABLED, "directory": settings.PARQUET_STORE_DIR, **parquet_store.store_stats()}
+
+@router.post("/parquet/export")
+async def export_parquet_store(
+    days: Optional[int] = Query(None, ge=1, le=3650, description="Rewrite every partition of the last days instead of only those with new documents"),
+    sources: Optional[List[str]] = Query(None, description="Only these sources, with days"),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Export collected data to the Parquet analytics store now
+    """
+    if days is None:
+        return await run_in_threadpool(parquet_store.export_new_documents)
+    end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return await run_in_threadpool(parquet_store.export_range, end - timedelta(days=days), end, sources)
+
+@router.get("/live-events")
+async def get_live_events(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Open event streams and events delivered or dropped by this worker process
+    """
+    return {"enabled": settings.LIVE_EVENTS_ENABLED, **get_event_hub().stats()}
+
+@router.get("/mention-tagger")
+async def get_mention_tagger_stats(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Competitor patterns and automaton size of this worker process's mention tagger
+    """
+    return {"enabled": settings.MENTION_TAGGING_ENABLED, **get_mention_tagger().stats()}
+
+@router.post("/search-index/rebuild")
+async def rebuild_keyword_search_index(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Reindex every collected document, e.g. after enabling the search index, dropping entries of deleted documents
+    """
+    if not settings.SEARCH_INDEX_ENABLED:
+        raise HTTPException(status_code=400, detail="The search index is disabled")
+    return await run_in_threadpool(rebuild_search_index)
+
+@router.get("/vector-index")
+async def get_vector_index_stats(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Documents, segments and training state of the semantic search vector index
+    """
+    if not settings.VECTOR_INDEX_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_vector_index().stats()}
+
+@router.post("/vector-index/rebuild")
+async def rebuild_semantic_search_index(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Re-embed every collected document, e.g. after enabling semantic search or changing the model, dropping entries of deleted documents
+    """
+    if not settings.VECTOR_INDEX_ENABLED or not settings.NLP_EMBEDDING_MODEL:
+        raise HTTPException(status_code=400, detail="Semantic search is not enabled")
+    return await run_in_threadpool(rebuild_vector_index)
+
+@router.delete("/collected-data")
+async def delete_collected_documents(
+    source: Optional[str] = Query(None, description="Only documents from this source"),
+    query: Optional[str] = Query(None, description="Only documents matching these keywords"),
+    date_from: Optional[str] = Query(None, description="Only documents collected on or after this day (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Only documents collected on or before this day (YYYY-MM-DD)"),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Delete collected documents matching every given filter, with their search and vector index entries
+    """
+    mongo_filter = build_filter(source, query, date_from, date_to)
+    if not mongo_filter:
+        raise HTTPException(status_code=400, detail="At least one filter is required")
+    return {"status": "success", "deleted": await run_in_threadpool(delete_collected_data, mongo_filter)}
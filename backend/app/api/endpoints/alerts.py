@@ -0,0 +1,140 @@
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+
+from app.core.config import settings
+from app.models.user import User
+from app.services.alert_engine import (
+    METRICS,
+    OPERATORS,
+    create_rule,
+    delete_rule,
+    get_alert_engine,
+    list_notifications,
+    list_rules,
+    mark_notifications_read,
+    serialize_notification,
+    serialize_rule,
+    set_rule_active,
+)
+from app.services.auth import get_current_active_superuser, get_current_user
+from app.services.competitor_store import get_competitor
+
+router = APIRouter()
+
+@router.post("/rules")
+async def create_alert_rule(
+    name: str = Body(..., description="Rule name shown in notifications"),
+    metric: str = Body(..., description=f"Event metric to watch ({', '.join(METRICS)})"),
+    competitor_id: Optional[str] = Body(None, description="Only events of this competitor"),
+    entity: Optional[str] = Body(None, description="Only events about this entity or product key"),
+    source: Optional[str] = Body(None, description="Only events from this data source"),
+    condition: Optional[dict] = Body(None, description="Condition on the event value, e.g. {op: 'lt', threshold: 0.3}"),
+    keywords: Optional[List[str]] = Body(None, description="Only events whose text contains any of these keywords"),
+    debounce_minutes: int = Body(settings.ALERT_DEFAULT_DEBOUNCE_MINUTES, ge=0, le=7 * 24 * 60, description="Minimum time between two notifications of the rule"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Create an alert rule, effective immediately
+    """
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of: {', '.join(METRICS)}")
+    if condition is not None:
+        if condition.get("op") not in OPERATORS or not isinstance(condition.get("threshold"), (int, float)):
+            raise HTTPException(
+                status_code=400,
+                detail=f"condition needs an op ({', '.join(OPERATORS)}) and a numeric threshold",
+            )
+        condition = {"op": condition["op"], "threshold": condition["threshold"]}
+    if competitor_id is not None and get_competitor(competitor_id, current_user.id) is None:
+        raise HTTPException(status_code=404, detail="Competitor not found")
+    keywords = [keyword for keyword in keywords or [] if keyword.strip()] or None
+
+    rule = create_rule(
+        current_user.id,
+        {
+            "name": name,
+            "metric": metric,
+            "competitor_id": competitor_id,
+            "entity": entity,
+            "source": source,
+            "condition": condition,
+            "keywords": keywords,
+            "debounce_minutes": debounce_minutes,
+        },
+    )
+    return serialize_rule(rule)
+
+@router.get("/rules")
+async def get_alert_rules(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    List alert rules with how often they triggered
+    """
+    return {"rules": [serialize_rule(rule) for rule in list_rules(current_user.id)]}
+
+@router.put("/rules/{rule_id}/active")
+async def set_alert_rule_active(
+    rule_id: str,
+    active: bool = Body(..., embed=True, description="Whether the rule is evaluated"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Pause or resume an alert rule
+    """
+    rule = set_rule_active(rule_id, current_user.id, active)
+    if rule is None:
+        raise HTTPException(status_code=404, detail="Alert rule not found")
+    return serialize_rule(rule)
+
+@router.delete("/rules/{rule_id}")
+async def delete_alert_rule(
+    rule_id: str,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Delete an alert rule
+    """
+    if not delete_rule(rule_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Alert rule not found")
+    return {"status": "success", "message": f"Alert rule {rule_id} deleted successfully"}
+
+@router.get("/notifications")
+async def get_alert_notifications(
+    unread_only: bool = Query(False, description="Only notifications not marked as read"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of notifications to return"),
+    skip: int = Query(0, ge=0, description="Number of notifications to skip"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    List alert notifications; each batches the alerts triggered together
+    """
+    page = list_notifications(current_user.id, unread_only, limit, skip)
+    return {"total": page["total"], "notifications": [serialize_notification(notification) for notification in page["notifications"]]}
+
+@router.post("/notifications/read")
+async def read_alert_notifications(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Mark all alert notifications as read
+    """
+    return {"status": "success", "updated": mark_notifications_read(current_user.id)}
+
+@router.get("/stats")
+async def get_alert_stats(
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Rule index size and evaluation counters of this worker
+    """
+    engine = get_alert_engine()
+    engine.ensure_fresh()
+    return {
+        "rules": len(engine.index.rules),
+        "index_keys": len(engine.index.buckets),
+        "rules_by_metric": {metric: count for metric, count in engine.index.metric_counts.items() if count},
+        "pending": len(engine.pending),
+        **engine.stats,
+    }
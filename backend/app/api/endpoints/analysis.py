@@ -1,11 +1,16 @@
+from datetime import datetime, timedelta
 from typing import Any, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db, get_mongo_collection
 from app.models.user import User
+from app.services import analysis_queries, nlp_models
+from app.services.activity_timeline import TIME_PERIOD_DAYS
 from app.services.auth import get_current_user
+from app.services.collected_data import build_filter, count_collected_data
 
 router = APIRouter()
 
@@ -17,8 +22,10 @@ async def analyze_sentiment(
     """
     Analyze the sentiment of provided text
     """
-    # TODO: Implement sentiment analysis
-    # This would typically use a pre-trained NLP model
+    result = await run_in_threadpool(nlp_models.analyze_sentiment, text)
+    if result is not None:
+        return {"text": text, **result}
+    # TODO: Sample result until NLP_SENTIMENT_MODEL is configured
     return {
         "text": text,
         "sentiment": "positive",  # Sample result
@@ -42,11 +49,13 @@ async def analyze_batch_sentiment(
     Run sentiment analysis on a batch of collected data
     """
     # TODO: Implement batch sentiment analysis
+    matched_documents = count_collected_data(build_filter(data_source, query, date_from, date_to))
     return {
         "status": "success",
         "message": "Batch sentiment analysis job initiated",
         "job_id": "sample-job-123",
         "data_source": data_source,
+        "matched_documents": matched_documents,
         "filters": {
             "query": query,
             "date_range": f"{date_from or 'any'} to {date_to or 'present'}",
@@ -61,29 +70,21 @@ async def detect_trends(
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
-    Detect trends in collected data over time
+    Detect trends in collected data over time: entities rising or falling in
+    mentions with their sentiment shift, and sentiment per day
     """
-    # TODO: Implement trend detection
+    if timeframe not in TIME_PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"timeframe must be one of: {', '.join(TIME_PERIOD_DAYS)}")
+    window_end = datetime.utcnow()
+    window_start = window_end - timedelta(days=TIME_PERIOD_DAYS[timeframe])
+    result = await run_in_threadpool(analysis_queries.detect_trends, data_source, window_start, window_end, topic)
     return {
         "timeframe": timeframe,
         "data_source": data_source,
         "topic": topic,
-        "trends": [
-            {
-                "topic": "Product Feature X",
-                "trend": "rising",
-                "change_percent": 15.5,
-                "sentiment_shift": 0.2,  # Positive shift in sentiment
-                "related_terms": ["innovation", "improvement", "design"],
-            },
-            {
-                "topic": "Competitor Y",
-                "trend": "falling",
-                "change_percent": -8.3,
-                "sentiment_shift": -0.15,  # Negative shift in sentiment
-                "related_terms": ["issue", "problem", "alternative"],
-            }
-        ]
+        "window_start": window_start.isoformat() + "Z",
+        "window_end": window_end.isoformat() + "Z",
+        **result,
     }
 
 @router.get("/entities")
@@ -163,23 +164,20 @@ async def compare_entities(
     """
     Compare multiple entities across different metrics
     """
-    # TODO: Implement entity comparison
+    unknown_metrics = [metric for metric in metrics if metric not in analysis_queries.COMPARISON_METRICS]
+    if unknown_metrics:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown metrics: {', '.join(unknown_metrics)}; expected any of: {', '.join(analysis_queries.COMPARISON_METRICS)}",
+        )
+    if timeframe not in TIME_PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"timeframe must be one of: {', '.join(TIME_PERIOD_DAYS)}")
+    window_end = datetime.utcnow()
+    window_start = window_end - timedelta(days=TIME_PERIOD_DAYS[timeframe])
+    comparison = await run_in_threadpool(analysis_queries.compare, entities, metrics, window_start, window_end)
     return {
         "entities": entities,
         "metrics": metrics,
         "timeframe": timeframe,
-        "comparison": {
-            "sentiment": {
-                "Entity A": 0.65,  # Positive sentiment score
-                "Entity B": 0.42,  # Somewhat positive sentiment score
-            },
-            "volume": {
-                "Entity A": 1250,  # Number of mentions
-                "Entity B": 980,
-            },
-            "trend": {
-                "Entity A": 0.05,  # 5% increase in mentions
-                "Entity B": -0.03,  # 3% decrease in mentions
-            }
-        }
-    } 
\ No newline at end of file
+        "comparison": comparison,
+    }
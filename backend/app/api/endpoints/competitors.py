@@ -1,11 +1,15 @@
+from datetime import datetime, timezone
 from typing import Any, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Body
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db, get_mongo_collection
+from app.core.responses import json_list_response
 from app.models.user import User
 from app.services.auth import get_current_user
+from app.services import comparison_matrix, competitor_store, product_snapshots
+from app.services.activity_timeline import TIME_PERIOD_DAYS, get_timeline
 
 router = APIRouter()
 
@@ -16,61 +20,80 @@ async def add_competitor(
     description: Optional[str] = Body(None, description="Brief description of the competitor"),
     industry: str = Body(..., description="Industry or market segment"),
     social_profiles: Optional[dict] = Body(None, description="Social media profiles (e.g., {twitter: 'handle', linkedin: 'url'})"),
+    aliases: Optional[List[str]] = Body(None, description="Other names the competitor and its products are mentioned by"),
     tags: Optional[List[str]] = Body(None, description="Tags for categorizing the competitor"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Add a new competitor to track
     """
-    # TODO: Implement competitor addition to database
-    return {
-        "id": "comp-123",
-        "name": name,
-        "website": website,
-        "description": description,
-        "industry": industry,
-        "social_profiles": social_profiles or {},
-        "tags": tags or [],
-        "created_at": "2023-10-15T16:30:00Z",
-    }
+    competitor = competitor_store.create_competitor(
+        current_user.id,
+        {
+            "name": name,
+            "website": website,
+            "description": description,
+            "industry": industry,
+            "social_profiles": social_profiles,
+            "aliases": aliases,
+            "tags": tags,
+        },
+    )
+    return competitor_store.serialize_competitor(competitor)
 
 @router.get("/")
 async def list_competitors(
     industry: Optional[str] = Query(None, description="Filter by industry"),
-    tags: Optional[List[str]] = Query(None, description="Filter by tags"),
-    limit: int = Query(10, description="Maximum number of competitors to return"),
-    skip: int = Query(0, description="Number of competitors to skip"),
+    tags: Optional[List[str]] = Query(None, description="Filter by tags (competitors with any of the tags)"),
+    limit: int = Query(10, ge=1, le=500, description="Maximum number of competitors to return"),
+    skip: int = Query(0, ge=0, description="Number of competitors to skip (prefer cursor for deep pagination)"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    include_total: Optional[bool] = Query(None, description="Count all matching competitors (defaults to the first page only)"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     List all tracked competitors
     """
-    # TODO: Implement competitor listing from database
+    try:
+        page = competitor_store.list_competitors(
+            current_user.id, industry=industry, tags=tags, limit=limit, cursor=cursor, skip=skip, include_total=include_total
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return json_list_response(
+        page["competitors"],
+        key="competitors",
+        head={"total": page["total"], "next_cursor": page["next_cursor"]},
+    )
+
+@router.get("/comparison")
+async def compare_competitors(
+    competitor_ids: List[str] = Query(..., description="IDs of competitors to compare"),
+    metrics: List[str] = Query(["sentiment", "activity", "features"], description="Metrics to compare"),
+    time_period: str = Query("quarter", description="Time period for comparison"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Compare multiple competitors across different metrics
+    """
+    unknown_metrics = [metric for metric in metrics if metric not in comparison_matrix.METRICS]
+    if unknown_metrics:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown metrics: {', '.join(unknown_metrics)}; expected any of: {', '.join(comparison_matrix.METRICS)}"
+        )
+    if time_period not in TIME_PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"time_period must be one of: {', '.join(TIME_PERIOD_DAYS)}")
+    try:
+        result = comparison_matrix.compare_competitors(current_user.id, competitor_ids, metrics, time_period)
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=f"Competitors not found: {exc}")
     return {
-        "total": 3,
-        "competitors": [
-            {
-                "id": "comp-123",
-                "name": "Competitor A",
-                "website": "https://competitora.com",
-                "industry": "SaaS",
-                "tags": ["market research", "analytics"],
-            },
-            {
-                "id": "comp-124",
-                "name": "Competitor B",
-                "website": "https://competitorb.com",
-                "industry": "SaaS",
-                "tags": ["market research", "social media"],
-            },
-            {
-                "id": "comp-125",
-                "name": "Competitor C",
-                "website": "https://competitorc.com",
-                "industry": "Market Research",
-                "tags": ["enterprise", "consulting"],
-            }
-        ]
+        "competitors": result["competitors"],
+        "time_period": time_period,
+        "metrics": metrics,
+        "comparison": result["comparison"],
+        "similarity": result["similarity"],
+        "freshness": result["freshness"],
     }
 
 @router.get("/{competitor_id}")
@@ -81,22 +104,10 @@ async def get_competitor_details(
     """
     Get detailed information about a specific competitor
     """
-    # TODO: Implement competitor detail retrieval
-    return {
-        "id": competitor_id,
-        "name": "Competitor A",
-        "website": "https://competitora.com",
-        "description": "A leading provider of market research solutions",
-        "industry": "SaaS",
-        "social_profiles": {
-            "twitter": "CompetitorA",
-            "linkedin": "https://linkedin.com/company/competitora",
-            "facebook": "CompetitorA",
-        },
-        "tags": ["market research", "analytics"],
-        "created_at": "2023-10-15T16:30:00Z",
-        "updated_at": "2023-10-15T16:30:00Z",
-    }
+    competitor = competitor_store.get_competitor(competitor_id, current_user.id)
+    if competitor is None:
+        raise HTTPException(status_code=404, detail="Competitor not found")
+    return competitor
 
 @router.put("/{competitor_id}")
 async def update_competitor(
@@ -106,26 +117,29 @@ async def update_competitor(
     description: Optional[str] = Body(None, description="Brief description of the competitor"),
     industry: Optional[str] = Body(None, description="Industry or market segment"),
     social_profiles: Optional[dict] = Body(None, description="Social media profiles"),
+    aliases: Optional[List[str]] = Body(None, description="Other names the competitor and its products are mentioned by"),
     tags: Optional[List[str]] = Body(None, description="Tags for categorizing the competitor"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Update competitor information
     """
-    # TODO: Implement competitor update
-    return {
-        "id": competitor_id,
-        "name": name or "Competitor A",
-        "website": website or "https://competitora.com",
-        "description": description or "A leading provider of market research solutions",
-        "industry": industry or "SaaS",
-        "social_profiles": social_profiles or {
-            "twitter": "CompetitorA",
-            "linkedin": "https://linkedin.com/company/competitora",
+    competitor = competitor_store.update_competitor(
+        competitor_id,
+        current_user.id,
+        {
+            "name": name,
+            "website": website,
+            "description": description,
+            "industry": industry,
+            "social_profiles": social_profiles,
+            "aliases": aliases,
+            "tags": tags,
         },
-        "tags": tags or ["market research", "analytics"],
-        "updated_at": "2023-10-15T17:45:00Z",
-    }
+    )
+    if competitor is None:
+        raise HTTPException(status_code=404, detail="Competitor not found")
+    return competitor_store.serialize_competitor(competitor)
 
 @router.delete("/{competitor_id}")
 async def delete_competitor(
@@ -135,7 +149,8 @@ async def delete_competitor(
     """
     Delete a competitor from tracking
     """
-    # TODO: Implement competitor deletion
+    if not competitor_store.delete_competitor(competitor_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Competitor not found")
     return {
         "status": "success",
         "message": f"Competitor {competitor_id} deleted successfully",
@@ -146,148 +161,107 @@ async def get_competitor_activity(
     competitor_id: str,
     activity_type: Optional[str] = Query(None, description="Type of activity (social, news, web, product)"),
     time_period: str = Query("month", description="Time period (day, week, month, quarter, year)"),
-    limit: int = Query(20, description="Maximum number of activities to return"),
+    limit: int = Query(20, ge=1, le=200, description="Maximum number of activities to return"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Get recent activities of a competitor
     """
-    # TODO: Implement competitor activity tracking
+    if time_period not in TIME_PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"time_period must be one of: {', '.join(TIME_PERIOD_DAYS)}")
+    competitor = competitor_store.get_competitor(competitor_id, current_user.id)
+    if competitor is None:
+        raise HTTPException(status_code=404, detail="Competitor not found")
+    timeline = get_timeline(competitor_id, activity_type=activity_type, time_period=time_period, limit=limit)
     return {
         "competitor_id": competitor_id,
-        "competitor_name": "Competitor A",
+        "competitor_name": competitor["name"],
         "time_period": time_period,
         "activity_type": activity_type or "all",
-        "activities": [
-            {
-                "id": "act-123",
-                "type": "product",
-                "title": "New Feature Launch",
-                "description": "Launched AI-powered sentiment analysis",
-                "source": "website",
-                "url": "https://competitora.com/blog/new-feature",
-                "date": "2023-10-10T09:00:00Z",
-                "sentiment": "neutral",
-            },
-            {
-                "id": "act-124",
-                "type": "social",
-                "title": "Twitter Announcement",
-                "description": "Excited to announce our new partnership with...",
-                "source": "twitter",
-                "url": "https://twitter.com/CompetitorA/status/123456789",
-                "date": "2023-10-08T14:30:00Z",
-                "sentiment": "positive",
-            },
-            {
-                "id": "act-125",
-                "type": "news",
-                "title": "Industry Recognition",
-                "description": "Competitor A named in Gartner Magic Quadrant",
-                "source": "TechNews",
-                "url": "https://technews.com/article/12345",
-                "date": "2023-10-05T11:15:00Z",
-                "sentiment": "positive",
-            }
-        ]
+        "counts": timeline["counts"],
+        "activities": timeline["activities"],
     }
 
 @router.get("/{competitor_id}/products")
 async def get_competitor_products(
     competitor_id: str,
+    include_removed: bool = Query(False, description="Include products no longer listed by the competitor"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Get products or services offered by a competitor
     """
-    # TODO: Implement competitor product tracking
+    competitor = competitor_store.get_competitor(competitor_id, current_user.id)
+    if competitor is None:
+        raise HTTPException(status_code=404, detail="Competitor not found")
+    products = product_snapshots.list_products(competitor_id, include_removed=include_removed)
     return {
         "competitor_id": competitor_id,
-        "competitor_name": "Competitor A",
-        "products": [
-            {
-                "id": "prod-123",
-                "name": "Market Analyzer Pro",
-                "description": "Advanced market analysis platform",
-                "url": "https://competitora.com/products/analyzer",
-                "pricing_model": "subscription",
-                "price_range": "$499-$1999/month",
-                "features": [
-                    "Social media monitoring",
-                    "Sentiment analysis",
-                    "Competitor tracking",
-                    "Report generation"
-                ],
-                "last_updated": "2023-09-15T00:00:00Z",
-            },
-            {
-                "id": "prod-124",
-                "name": "Insights API",
-                "description": "API access to market data",
-                "url": "https://competitora.com/products/api",
-                "pricing_model": "usage-based",
-                "price_range": "$0.01 per request",
-                "features": [
-                    "Real-time data access",
-                    "Flexible integration",
-                    "Scalable pricing"
-                ],
-                "last_updated": "2023-08-20T00:00:00Z",
-            }
-        ]
+        "competitor_name": competitor["name"],
+        "products": [product_snapshots.serialize_product(product) for product in products],
     }
 
-@router.get("/comparison")
-async def compare_competitors(
-    competitor_ids: List[str] = Query(..., description="IDs of competitors to compare"),
-    metrics: List[str] = Query(["sentiment", "activity", "features"], description="Metrics to compare"),
-    time_period: str = Query("quarter", description="Time period for comparison"),
+@router.post("/{competitor_id}/products/snapshots")
+async def record_competitor_products(
+    competitor_id: str,
+    products: List[dict] = Body(..., description="Products found by a crawl, each with an id, url or name"),
+    observed_at: Optional[datetime] = Body(None, description="When the crawl ran (defaults to now)"),
+    complete: bool = Body(True, description="Whether the crawl lists every product; missing ones are marked removed"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
-    Compare multiple competitors across different metrics
+    Record a crawl of a competitor's products, storing only what changed
+    """
+    competitor = competitor_store.get_competitor(competitor_id, current_user.id)
+    if competitor is None:
+        raise HTTPException(status_code=404, detail="Competitor not found")
+    if observed_at is not None and observed_at.tzinfo is not None:
+        observed_at = observed_at.astimezone(timezone.utc).replace(tzinfo=None)
+    try:
+        return product_snapshots.record_snapshot(competitor_id, products, observed_at=observed_at, complete=complete)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+@router.get("/{competitor_id}/products/changes")
+async def get_competitor_product_changes(
+    competitor_id: str,
+    days: int = Query(30, ge=1, le=365, description="Only changes from the last N days"),
+    change_type: Optional[str] = Query(None, description="Type of change (created, removed, price, features, content)"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of changes to return"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
     """
-    # TODO: Implement competitor comparison
+    Get recent changes to a competitor's products, newest first
+    """
+    if change_type and change_type not in product_snapshots.CHANGE_TYPES:
+        raise HTTPException(
+            status_code=400, detail=f"change_type must be one of: {', '.join(product_snapshots.CHANGE_TYPES)}"
+        )
+    competitor = competitor_store.get_competitor(competitor_id, current_user.id)
+    if competitor is None:
+        raise HTTPException(status_code=404, detail="Competitor not found")
+    changes = product_snapshots.list_changes(competitor_id, days=days, change_type=change_type, limit=limit)
     return {
-        "competitors": [
-            {"id": "comp-123", "name": "Competitor A"},
-            {"id": "comp-124", "name": "Competitor B"},
-        ],
-        "time_period": time_period,
-        "metrics": metrics,
-        "comparison": {
-            "sentiment": {
-                "Competitor A": 0.72,  # Positive sentiment score
-                "Competitor B": 0.58,  # Somewhat positive sentiment score
-            },
-            "activity": {
-                "Competitor A": {
-                    "social": 45,
-                    "news": 12,
-                    "product": 3,
-                    "total": 60
-                },
-                "Competitor B": {
-                    "social": 32,
-                    "news": 8,
-                    "product": 5,
-                    "total": 45
-                }
-            },
-            "features": {
-                "common": [
-                    "Social media monitoring",
-                    "Sentiment analysis",
-                    "Report generation"
-                ],
-                "unique_to_A": [
-                    "Competitor tracking",
-                    "AI recommendations"
-                ],
-                "unique_to_B": [
-                    "Custom dashboards",
-                    "Integration with CRM"
-                ]
-            }
-        }
-    } 
\ No newline at end of file
+        "competitor_id": competitor_id,
+        "days": days,
+        "change_type": change_type or "all",
+        "changes": [product_snapshots.serialize_change(change) for change in changes],
+    }
+
+@router.get("/{competitor_id}/products/{product_id:path}/history")
+async def get_competitor_product_history(
+    competitor_id: str,
+    product_id: str,
+    limit: int = Query(20, ge=1, le=200, description="Maximum number of versions to return"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Get earlier versions of a product, rebuilt from its stored changes
+    """
+    competitor = competitor_store.get_competitor(competitor_id, current_user.id)
+    if competitor is None:
+        raise HTTPException(status_code=404, detail="Competitor not found")
+    history = product_snapshots.get_product_history(competitor_id, product_id, limit=limit)
+    if not history:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"competitor_id": competitor_id, "product_id": product_id, "versions": history}
@@ -1,11 +1,35 @@
+import json
+import os
+import tempfile
 from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, Query, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.database import get_db, get_mongo_collection
+from app.core.responses import json_list_response
 from app.models.user import User
 from app.services.auth import get_current_user
+from app.services.collected_data import (
+    COLLECTED_DATA_FIELDS,
+    apply_cursor,
+    build_filter,
+    build_projection,
+    count_collected_data,
+    find_collected_data,
+    get_collected_data_page,
+    iter_csv,
+    iter_ndjson,
+    search_collected_documents,
+    semantic_search_documents,
+)
+from app.services.collection_scheduler import create_schedule, delete_schedule, list_schedules, serialize_schedule
+from app.services.collection_jobs import cancel_job, create_job, list_jobs, serialize_job
+from app.services.file_import import detect_format, run_file_import, spool_upload
+from app.services.stream_ingestion import get_stream_stats
 
 router = APIRouter()
 
@@ -64,6 +88,42 @@ async def collect_news_data(
         "date_range": f"{date_from or 'any'} to {date_to or 'present'}",
     }
 
+@router.post("/schedules")
+async def create_collection_schedule(
+    platform: str = Query(..., description="Platform to collect from (twitter, linkedin, reddit, news, etc.)"),
+    query: str = Query(..., description="Search query or hashtag"),
+    interval_minutes: int = Query(60, ge=5, description="How often to collect"),
+    sources: Optional[List[str]] = Query(None, description="Specific news sources to include"),
+    lookback_hours: int = Query(24, ge=1, le=24 * 30, description="How far back the first run collects"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Schedule a recurring collection; identical queries from different users share one fetch
+    """
+    schedule = create_schedule(current_user.id, platform, query, interval_minutes, sources, lookback_hours)
+    return serialize_schedule(schedule)
+
+@router.get("/schedules")
+async def get_collection_schedules(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    List recurring collections and how many upstream fetches coalescing saved
+    """
+    return {"schedules": [serialize_schedule(schedule) for schedule in list_schedules(current_user.id)]}
+
+@router.delete("/schedules/{schedule_id}")
+async def delete_collection_schedule(
+    schedule_id: str,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Stop a recurring collection
+    """
+    if not delete_schedule(schedule_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return {"status": "success", "message": f"Schedule {schedule_id} deleted successfully"}
+
 @router.get("/sources")
 async def list_data_sources(
     current_user: User = Depends(get_current_user),
@@ -80,28 +140,73 @@ async def list_data_sources(
     }
     return sources
 
+@router.post("/import")
+async def import_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(..., description="CSV, JSON Lines or Excel (.xlsx) file to import"),
+    source: str = Form("import", description="Source recorded on the imported documents"),
+    query: Optional[str] = Form(None, description="Search query or campaign recorded on the imported documents"),
+    column_mapping: Optional[str] = Form(None, description='JSON object mapping fields to file columns (e.g. {"content": "text"})'),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Import a dataset file into collected data as a background collection job
+    """
+    try:
+        file_format = detect_format(file.filename or "")
+        mapping = json.loads(column_mapping) if column_mapping else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if mapping is not None and not isinstance(mapping, dict):
+        raise HTTPException(status_code=400, detail="column_mapping must be a JSON object")
+
+    path, size_bytes = await run_in_threadpool(
+        spool_upload,
+        file.file,
+        settings.IMPORT_UPLOAD_DIR or tempfile.gettempdir(),
+        os.path.splitext(file.filename or "")[1],
+    )
+    job = create_job(
+        current_user.id,
+        "file-import",
+        {"filename": file.filename, "format": file_format, "source": source, "size_bytes": size_bytes},
+    )
+    background_tasks.add_task(
+        run_file_import,
+        job["_id"],
+        path,
+        file_format,
+        source,
+        query=query,
+        column_mapping=mapping,
+        chunk_rows=settings.IMPORT_CHUNK_ROWS,
+    )
+    return {
+        "status": "success",
+        "message": "File import initiated",
+        "job_id": str(job["_id"]),
+        "filename": file.filename,
+        "size_bytes": size_bytes,
+    }
+
+@router.get("/stream/status")
+async def get_stream_ingestion_status(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Get throughput and consumer lag of the social media stream consumers
+    """
+    return get_stream_stats()
+
 @router.get("/jobs")
 async def get_collection_jobs(
-    status: Optional[str] = Query(None, description="Filter by job status (pending, running, completed, failed)"),
+    status: Optional[str] = Query(None, description="Filter by job status (pending, running, completed, failed, cancelled)"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Get status of data collection jobs
     """
-    # TODO: Implement job tracking
-    return {
-        "jobs": [
-            {
-                "id": "sample-job-1",
-                "type": "web-scrape",
-                "status": "completed",
-                "created_at": "2023-10-15T10:30:00Z",
-                "completed_at": "2023-10-15T10:35:00Z",
-                "params": {"url": "https://example.com"},
-                "results_count": 150,
-            }
-        ]
-    }
+    return {"jobs": [serialize_job(job) for job in list_jobs(current_user.id, status)]}
 
 @router.delete("/jobs/{job_id}")
 async def cancel_collection_job(
@@ -111,7 +216,8 @@ async def cancel_collection_job(
     """
     Cancel a running data collection job
     """
-    # TODO: Implement job cancellation
+    if not cancel_job(job_id, current_user.id):
+        raise HTTPException(status_code=404, detail="No pending or running job with this id")
     return {"status": "success", "message": f"Job {job_id} cancelled successfully"}
 
 @router.get("/data")
@@ -120,31 +226,88 @@ async def get_collected_data(
     query: Optional[str] = Query(None, description="Filter by search query"),
     date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
-    limit: int = Query(100, description="Maximum number of results to return"),
-    skip: int = Query(0, description="Number of results to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of results to return"),
+    skip: int = Query(0, ge=0, description="Number of results to skip (prefer cursor for deep pagination)"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return (e.g. 'id,source,content')"),
+    format: str = Query("json", description="Response format (json, ndjson, csv); ndjson and csv stream every matching document"),
+    include_total: bool = Query(False, description="Count all matching documents (slow on large result sets)"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Retrieve collected data with filtering options
     """
-    # TODO: Implement data retrieval from MongoDB
-    return {
-        "total": 1000,
-        "limit": limit,
-        "skip": skip,
-        "data": [
-            {
-                "id": "sample-data-1",
-                "source": "twitter",
-                "content": "Sample tweet content about a product",
-                "metadata": {
-                    "author": "user123",
-                    "timestamp": "2023-10-14T15:30:00Z",
-                    "likes": 45,
-                    "retweets": 12,
-                },
-                "sentiment": "positive",
-                "entities": ["product", "feature", "brand"],
-            }
-        ]
-    } 
\ No newline at end of file
+    mongo_filter = build_filter(source, query, date_from, date_to)
+    projection = build_projection(fields)
+
+    if format in ("ndjson", "csv"):
+        documents = find_collected_data(apply_cursor(mongo_filter, cursor), projection)
+        if format == "ndjson":
+            return StreamingResponse(iter_ndjson(documents), media_type="application/x-ndjson")
+        columns = [field for field in COLLECTED_DATA_FIELDS if projection is None or field == "id" or field in projection]
+        return StreamingResponse(
+            iter_csv(documents, columns),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=collected_data.csv"},
+        )
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Unsupported format, expected json, ndjson or csv")
+
+    page = get_collected_data_page(mongo_filter, projection, limit, cursor=cursor, skip=skip)
+    return json_list_response(
+        page["data"],
+        key="data",
+        head={
+            "total": count_collected_data(mongo_filter) if include_total else None,
+            "limit": limit,
+            "skip": skip,
+            "next_cursor": page["next_cursor"],
+        },
+    )
+
+@router.get("/search")
+async def search_collected_data(
+    q: str = Query(..., description='Keyword query; supports OR, -term / NOT term and "quoted phrases"'),
+    source: Optional[str] = Query(None, description="Filter by data source"),
+    date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
+    limit: int = Query(20, ge=1, le=200, description="Maximum number of results to return"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return (e.g. 'id,source,content')"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Search collected data by keywords, ranked by relevance
+    """
+    results = search_collected_documents(
+        q,
+        source=source,
+        date_from=date_from,
+        date_to=date_to,
+        limit=limit,
+        projection=build_projection(fields),
+    )
+    return {"query": q, "limit": limit, "data": results}
+
+@router.get("/semantic-search")
+async def semantic_search_collected_data(
+    q: str = Query(..., min_length=1, description="Text to find documents similar in meaning to"),
+    source: Optional[str] = Query(None, description="Filter by data source"),
+    date_from: Optional[str] = Query(None, description="Filter by date from (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Filter by date to (YYYY-MM-DD)"),
+    limit: int = Query(20, ge=1, le=200, description="Maximum number of results to return"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return (e.g. 'id,source,content')"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Search collected data by meaning, including paraphrases keyword search misses, ranked by similarity
+    """
+    results = await run_in_threadpool(
+        semantic_search_documents,
+        q,
+        source=source,
+        date_from=date_from,
+        date_to=date_to,
+        limit=limit,
+        projection=build_projection(fields),
+    )
+    return {"query": q, "limit": limit, "data": results}
@@ -0,0 +1,40 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.models.user import User
+from app.services.auth import get_current_user
+from app.services.live_events import event_stream, get_event_hub
+
+router = APIRouter()
+
+@router.get("/stream")
+async def stream_events(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Stream the current user's job progress, report progress and alert notifications as server-sent events
+
+    Events are ``job`` (a collection job as listed by /data/jobs), ``report``
+    (a report as returned by /reports/{id}) and ``alert`` (an alert
+    notification). Nothing is replayed, so clients load the current state
+    when they connect and apply events on top of it.
+    """
+    if not settings.LIVE_EVENTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Live events are disabled")
+    hub = get_event_hub()
+    if hub.open_streams >= settings.LIVE_EVENTS_MAX_STREAMS:
+        raise HTTPException(status_code=503, detail="Too many open event streams, try again later")
+    # The session would otherwise hold a pooled connection for as long as the stream stays open
+    user_id = current_user.id
+    db.close()
+    return StreamingResponse(
+        event_stream(hub, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,204 +1,322 @@
+import os
 from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Body
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status, Body
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db, get_mongo_collection
+from app.core.responses import ArtifactResponse, accepts_encoding, json_list_response
 from app.models.user import User
 from app.services.auth import get_current_user
+from app.services import report_store
+from app.services.report_pipeline import TIME_PERIOD_DAYS, report_window, start_report
+from app.services.report_scheduler import (
+    create_report_schedule,
+    delete_report_schedule,
+    list_report_schedules,
+    serialize_report_schedule,
+)
+from app.services.report_sections import REPORT_TYPE_SECTIONS, SECTIONS
 
 router = APIRouter()
 
 @router.post("/generate")
 async def generate_report(
+    background_tasks: BackgroundTasks,
     title: str = Body(..., description="Report title"),
     description: Optional[str] = Body(None, description="Report description"),
-    data_sources: List[str] = Body(..., description="Data sources to include in the report"),
+    data_sources: Optional[List[str]] = Body(None, description="Data sources to include in the report (defaults to the template's)"),
     report_type: str = Body(..., description="Type of report (market_overview, competitor_analysis, sentiment_analysis, trend_report)"),
     time_period: str = Body(..., description="Time period for the report (last_day, last_week, last_month, last_quarter, last_year, custom)"),
     custom_start_date: Optional[str] = Body(None, description="Custom start date (YYYY-MM-DD) if time_period is 'custom'"),
     custom_end_date: Optional[str] = Body(None, description="Custom end date (YYYY-MM-DD) if time_period is 'custom'"),
     entities: Optional[List[str]] = Body(None, description="Specific entities to include in the report (e.g., competitors, products)"),
     format: str = Body("pdf", description="Report format (pdf, docx, pptx, html)"),
+    template_id: Optional[str] = Body(None, description="Template providing the sections and default data sources"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Generate a market research report based on collected and analyzed data
     """
-    # TODO: Implement report generation
-    return {
-        "status": "success",
-        "message": "Report generation initiated",
-        "report_id": "report-123",
-        "estimated_completion_time": "2 minutes",
-        "details": {
+    if report_type not in REPORT_TYPE_SECTIONS:
+        raise HTTPException(status_code=400, detail=f"report_type must be one of: {', '.join(REPORT_TYPE_SECTIONS)}")
+    if format not in report_store.REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(report_store.REPORT_FORMATS)}")
+    section_names = REPORT_TYPE_SECTIONS[report_type]
+    if template_id:
+        template = report_store.get_template(template_id, current_user.id)
+        if template is None:
+            raise HTTPException(status_code=404, detail="Template not found")
+        section_names = template["sections"]
+        data_sources = data_sources or template["data_sources"]
+    if not data_sources:
+        raise HTTPException(status_code=400, detail="At least one data source is required")
+    try:
+        window_start, window_end = report_window(time_period, custom_start_date, custom_end_date)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return start_report(
+        background_tasks,
+        current_user.id,
+        {
             "title": title,
+            "description": description,
             "report_type": report_type,
             "data_sources": data_sources,
             "time_period": time_period,
+            "custom_start_date": custom_start_date,
+            "custom_end_date": custom_end_date,
+            "window_start": window_start,
+            "window_end": window_end,
+            "entities": entities,
             "format": format,
-        }
-    }
+            "template_id": template_id,
+        },
+        section_names,
+    )
 
 @router.get("/")
 async def list_reports(
     report_type: Optional[str] = Query(None, description="Filter by report type"),
     status: Optional[str] = Query(None, description="Filter by status (generating, completed, failed)"),
-    limit: int = Query(10, description="Maximum number of reports to return"),
-    skip: int = Query(0, description="Number of reports to skip"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of reports to return"),
+    skip: int = Query(0, ge=0, description="Number of reports to skip"),
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     List all reports generated by the user
     """
-    # TODO: Implement report listing from database
+    if status and status not in report_store.REPORT_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of: {', '.join(report_store.REPORT_STATUSES)}")
+    page = report_store.list_reports(current_user.id, report_type=report_type, status=status, limit=limit, skip=skip)
+    return json_list_response(
+        [report_store.serialize_report(report) for report in page["reports"]],
+        key="reports",
+        head={"total": page["total"]},
+    )
+
+@router.post("/templates")
+async def create_report_template(
+    name: str = Body(..., description="Template name"),
+    description: Optional[str] = Body(None, description="Template description"),
+    report_type: str = Body(..., description="Type of report"),
+    sections: List[str] = Body(..., description="Sections to include in the report"),
+    data_sources: List[str] = Body(..., description="Default data sources"),
+    is_default: bool = Body(False, description="Whether this is a default template for the report type"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Create a custom report template
+    """
+    if report_type not in REPORT_TYPE_SECTIONS:
+        raise HTTPException(status_code=400, detail=f"report_type must be one of: {', '.join(REPORT_TYPE_SECTIONS)}")
+    # Sections may be given by name or by title
+    names_by_label = {}
+    for section in SECTIONS.values():
+        names_by_label[section.name] = section.name
+        names_by_label[section.title.lower()] = section.name
+    unknown = [section for section in sections if section.lower() not in names_by_label]
+    if unknown or not sections:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sections: {', '.join(unknown)}; expected any of: {', '.join(SECTIONS)}",
+        )
+    template = report_store.create_template(
+        current_user.id,
+        {
+            "name": name,
+            "description": description,
+            "report_type": report_type,
+            "sections": list(dict.fromkeys(names_by_label[section.lower()] for section in sections)),
+            "data_sources": data_sources,
+            "is_default": is_default,
+        },
+    )
     return {
-        "total": 5,
-        "reports": [
-            {
-                "id": "report-123",
-                "title": "Q3 Market Analysis",
-                "report_type": "market_overview",
-                "created_at": "2023-10-15T14:30:00Z",
-                "status": "completed",
-                "download_url": "/api/v1/reports/report-123/download",
-            },
-            {
-                "id": "report-124",
-                "title": "Competitor Sentiment Analysis",
-                "report_type": "sentiment_analysis",
-                "created_at": "2023-10-14T09:15:00Z",
-                "status": "completed",
-                "download_url": "/api/v1/reports/report-124/download",
-            }
-        ]
+        "status": "success",
+        "message": "Report template created successfully",
+        "template_id": str(template["_id"]),
+        "name": name,
+        "report_type": report_type,
     }
 
+@router.get("/templates")
+async def list_report_templates(
+    report_type: Optional[str] = Query(None, description="Filter by report type"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    List available report templates
+    """
+    templates = report_store.list_templates(current_user.id, report_type=report_type)
+    return {"templates": [report_store.serialize_template(template) for template in templates]}
+
+@router.post("/schedules")
+async def create_scheduled_report(
+    title: str = Body(..., description="Title of the generated reports"),
+    description: Optional[str] = Body(None, description="Report description"),
+    data_sources: Optional[List[str]] = Body(None, description="Data sources to include (defaults to the template's)"),
+    report_type: str = Body(..., description="Type of report (market_overview, competitor_analysis, sentiment_analysis, trend_report)"),
+    time_period: str = Body(..., description="Period each report covers up to its run (last_day, last_week, last_month, last_quarter, last_year)"),
+    entities: Optional[List[str]] = Body(None, description="Specific entities to include in the reports"),
+    format: str = Body("pdf", description="Report format (pdf, docx, pptx, html)"),
+    template_id: Optional[str] = Body(None, description="Template providing the sections and default data sources"),
+    interval_hours: int = Body(24, ge=1, le=24 * 31, description="How often to generate the report"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Schedule a recurring report; reports due together are generated as one batch sharing their aggregates
+    """
+    if report_type not in REPORT_TYPE_SECTIONS:
+        raise HTTPException(status_code=400, detail=f"report_type must be one of: {', '.join(REPORT_TYPE_SECTIONS)}")
+    if time_period not in TIME_PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"time_period must be one of: {', '.join(TIME_PERIOD_DAYS)}")
+    if format not in report_store.REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(report_store.REPORT_FORMATS)}")
+    section_names = REPORT_TYPE_SECTIONS[report_type]
+    if template_id:
+        template = report_store.get_template(template_id, current_user.id)
+        if template is None:
+            raise HTTPException(status_code=404, detail="Template not found")
+        section_names = template["sections"]
+        data_sources = data_sources or template["data_sources"]
+    if not data_sources:
+        raise HTTPException(status_code=400, detail="At least one data source is required")
+    schedule = create_report_schedule(
+        current_user.id,
+        {
+            "title": title,
+            "description": description,
+            "report_type": report_type,
+            "data_sources": data_sources,
+            "time_period": time_period,
+            "entities": entities,
+            "format": format,
+            "template_id": template_id,
+        },
+        section_names,
+        interval_hours,
+    )
+    return serialize_report_schedule(schedule)
+
+@router.get("/schedules")
+async def get_scheduled_reports(
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    List scheduled reports with the size and shared work of their last batch
+    """
+    return {"schedules": [serialize_report_schedule(schedule) for schedule in list_report_schedules(current_user.id)]}
+
+@router.delete("/schedules/{schedule_id}")
+async def delete_scheduled_report(
+    schedule_id: str,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Stop a scheduled report
+    """
+    if not delete_report_schedule(schedule_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return {"status": "success", "message": f"Schedule {schedule_id} deleted successfully"}
+
 @router.get("/{report_id}")
 async def get_report_details(
     report_id: str,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
-    Get details of a specific report
+    Get details of a specific report, including per-section progress and timing
     """
-    # TODO: Implement report detail retrieval
-    return {
-        "id": report_id,
-        "title": "Q3 Market Analysis",
-        "description": "Comprehensive analysis of market trends in Q3 2023",
-        "report_type": "market_overview",
-        "created_at": "2023-10-15T14:30:00Z",
-        "completed_at": "2023-10-15T14:35:00Z",
-        "status": "completed",
-        "data_sources": ["twitter", "news", "web"],
-        "time_period": "last_quarter",
-        "format": "pdf",
-        "size_bytes": 2457600,
-        "page_count": 15,
-        "download_url": f"/api/v1/reports/{report_id}/download",
-        "sections": [
-            "Executive Summary",
-            "Market Overview",
-            "Competitor Analysis",
-            "Consumer Sentiment",
-            "Emerging Trends",
-            "Recommendations"
-        ]
-    }
+    report = report_store.get_report(report_id, current_user.id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report_store.serialize_report(report, detailed=True)
 
-@router.get("/{report_id}/download")
+@router.api_route("/{report_id}/download", methods=["GET", "HEAD"])
 async def download_report(
     report_id: str,
+    request: Request,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Download a generated report
+
+    Supports single byte ranges for resumable downloads and conditional
+    requests on the report's strong ETag.
     """
-    # TODO: Implement report download
-    # This would typically return a FileResponse with the report file
-    return {
-        "status": "success",
-        "message": "Report download endpoint (to be implemented)",
-        "report_id": report_id
-    }
+    report = report_store.get_report(report_id, current_user.id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if report["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Report is {report['status']}")
+    artifact = report["artifact"]
+    variant = artifact
+    content_encoding = None
+    if artifact.get("gzip") and accepts_encoding(request.headers.get("accept-encoding"), "gzip"):
+        variant = artifact["gzip"]
+        content_encoding = "gzip"
+    if not os.path.isfile(variant["path"]):
+        raise HTTPException(status_code=404, detail="Report file not found")
+    extension = report_store.REPORT_FORMATS[report["format"]][1]
+    return ArtifactResponse(
+        variant["path"],
+        request.headers,
+        etag=variant["sha256"],
+        media_type=artifact["content_type"],
+        filename=f"{report['title']}.{extension}",
+        content_encoding=content_encoding,
+        vary="Accept-Encoding" if artifact.get("gzip") else None,
+        method=request.method,
+    )
 
-@router.delete("/{report_id}")
-async def delete_report(
+@router.post("/{report_id}/regenerate")
+async def regenerate_report(
     report_id: str,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
-    Delete a report
+    Generate a new report with the settings of an earlier one over its current time period
+
+    Days already computed for earlier reports are reused from the section cache.
     """
-    # TODO: Implement report deletion
-    return {
-        "status": "success",
-        "message": f"Report {report_id} deleted successfully"
+    report = report_store.get_report(report_id, current_user.id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    window_start, window_end = report_window(
+        report["time_period"], report.get("custom_start_date"), report.get("custom_end_date")
+    )
+    fields = {
+        field: report.get(field)
+        for field in (
+            "title",
+            "description",
+            "report_type",
+            "data_sources",
+            "time_period",
+            "custom_start_date",
+            "custom_end_date",
+            "entities",
+            "format",
+            "template_id",
+        )
     }
+    fields.update({"window_start": window_start, "window_end": window_end, "regenerated_from": report["_id"]})
+    return start_report(background_tasks, current_user.id, fields, [section["name"] for section in report["sections"]])
 
-@router.post("/templates")
-async def create_report_template(
-    name: str = Body(..., description="Template name"),
-    description: Optional[str] = Body(None, description="Template description"),
-    report_type: str = Body(..., description="Type of report"),
-    sections: List[str] = Body(..., description="Sections to include in the report"),
-    data_sources: List[str] = Body(..., description="Default data sources"),
-    is_default: bool = Body(False, description="Whether this is a default template for the report type"),
+@router.delete("/{report_id}")
+async def delete_report(
+    report_id: str,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
-    Create a custom report template
+    Delete a report
     """
-    # TODO: Implement template creation
+    if not report_store.delete_report(report_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Report not found")
     return {
         "status": "success",
-        "message": "Report template created successfully",
-        "template_id": "template-123",
-        "name": name,
-        "report_type": report_type,
+        "message": f"Report {report_id} deleted successfully"
     }
-
-@router.get("/templates")
-async def list_report_templates(
-    report_type: Optional[str] = Query(None, description="Filter by report type"),
-    current_user: User = Depends(get_current_user),
-) -> Any:
-    """
-    List available report templates
-    """
-    # TODO: Implement template listing
-    return {
-        "templates": [
-            {
-                "id": "template-123",
-                "name": "Comprehensive Market Analysis",
-                "description": "Complete market overview with competitor analysis",
-                "report_type": "market_overview",
-                "is_default": True,
-                "created_by": "system",
-                "sections": [
-                    "Executive Summary",
-                    "Market Overview",
-                    "Competitor Analysis",
-                    "Consumer Sentiment",
-                    "Emerging Trends",
-                    "Recommendations"
-                ]
-            },
-            {
-                "id": "template-124",
-                "name": "Quick Competitor Update",
-                "description": "Brief update on competitor activities",
-                "report_type": "competitor_analysis",
-                "is_default": False,
-                "created_by": "user@example.com",
-                "sections": [
-                    "Recent Activities",
-                    "Sentiment Shifts",
-                    "Product Updates",
-                    "Strategic Recommendations"
-                ]
-            }
-        ]
-    } 
\ No newline at end of file
@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
+from app.core.responses import json_list_response
 from app.core.security import get_password_hash
 from app.models.user import User
 from app.schemas.user import User as UserSchema, UserCreate, UserUpdate
@@ -21,8 +22,11 @@ async def read_users(
     """
     Retrieve users. Only superusers can access this endpoint.
     """
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    # Only the schema's columns are selected; the rows are encoded as they are
+    # instead of being loaded as ORM objects and validated against the schema
+    columns = [getattr(User, field) for field in UserSchema.model_fields]
+    users = db.query(*columns).offset(skip).limit(limit).all()
+    return json_list_response([user._asdict() for user in users])
 
 @router.post("/", response_model=UserSchema)
 async def create_user(
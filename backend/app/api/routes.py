@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import auth, users, data_collection, analysis, reports, competitors
+from app.api.endpoints import auth, users, data_collection, analysis, reports, competitors, alerts, admin, events
 
 api_router = APIRouter()
 
@@ -10,4 +10,7 @@ api_router.include_router(users.router, prefix="/users", tags=["Users"])
 api_router.include_router(data_collection.router, prefix="/data", tags=["Data Collection"])
 api_router.include_router(analysis.router, prefix="/analysis", tags=["Analysis"])
 api_router.include_router(reports.router, prefix="/reports", tags=["Reports"])
-api_router.include_router(competitors.router, prefix="/competitors", tags=["Competitors"]) 
\ No newline at end of file
+api_router.include_router(competitors.router, prefix="/competitors", tags=["Competitors"]) 
+api_router.include_router(alerts.router, prefix="/alerts", tags=["Alerts"])
+api_router.include_router(admin.router, prefix="/admin", tags=["Admin"])
+api_router.include_router(events.router, prefix="/events", tags=["Events"])
\ No newline at end of file
@@ -2,19 +2,60 @@ import os
 import secrets
 from typing import List, Dict, Any, Optional, Union
 
-from pydantic import AnyHttpUrl, PostgresDsn, field_validator
+from pydantic import AnyHttpUrl, Field, PostgresDsn, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# Relative file settings are resolved against the backend directory, not the working directory
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def load_secret_key(path: str) -> str:
+    """
+    Read the token signing key from a file, creating it on first start so every worker signs with the same key
+    """
+    path = os.path.join(BASE_DIR, path)
+    try:
+        with open(path) as key_file:
+            return key_file.read().strip()
+    except FileNotFoundError:
+        pass
+    # Written whole to a temporary file and linked into place, so workers
+    # starting together never read a partial key and all end up with one
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as key_file:
+            key_file.write(secrets.token_urlsafe(32))
+        try:
+            os.link(temporary, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(temporary)
+    except OSError as exc:
+        raise RuntimeError(
+            f"SECRET_KEY is not set and the key file {path} could not be created ({exc.strerror});"
+            " set SECRET_KEY, or SECRET_KEY_FILE to a writable path"
+        ) from exc
+    with open(path) as key_file:
+        return key_file.read().strip()
+
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
-    SECRET_KEY: str = secrets.token_urlsafe(32)
+    SECRET_KEY_FILE: str = ".secret_key"  # Used when SECRET_KEY isn't set; relative to the backend directory
+    SECRET_KEY: Optional[str] = Field(None, validate_default=True)
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
     
+    @field_validator("SECRET_KEY", mode="before")
+    def assemble_secret_key(cls, v: Optional[str], values: Dict[str, Any]) -> str:
+        if v:
+            return v
+        return load_secret_key(values.data["SECRET_KEY_FILE"])
+    
     # CORS
     CORS_ORIGINS: List[AnyHttpUrl] = ["http://localhost:3000"]
     
     # Project info
     PROJECT_NAME: str = "InsightfulAI"
+    DEBUG: bool = False  # Adds diagnostic headers, such as query accounting, to responses
     
     # Database
     POSTGRES_SERVER: str = "localhost"
@@ -40,12 +81,121 @@ class Settings(BaseSettings):
     # MongoDB
     MONGODB_URL: str = "mongodb://localhost:27017"
     MONGODB_DB: str = "insightfulai"
+    MONGODB_ENSURE_INDEXES: bool = False  # Create managed indexes on startup
     
     # Redis
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     
+    # Keyword search index over collected data
+    SEARCH_INDEX_ENABLED: bool = False
+    SEARCH_INDEX_DIR: str = "data/search_index"
+    SEARCH_INDEX_FLUSH_DOCUMENTS: int = 10000
+    SEARCH_FILTER_MAX_IDS: int = 50000  # Larger keyword matches filter through the MongoDB text index
+    
+    # Semantic search: IVF-PQ nearest-neighbour index over document embeddings
+    VECTOR_INDEX_ENABLED: bool = False  # Needs NLP_EMBEDDING_MODEL
+    VECTOR_INDEX_DIR: str = "data/vector_index"
+    VECTOR_INDEX_FLUSH_DOCUMENTS: int = 10000
+    VECTOR_INDEX_TRAIN_SIZE: int = 50000  # Vectors stored before the quantizer is trained; searches are exact until then
+    VECTOR_INDEX_LISTS: int = 1024  # Coarse clusters, about the square root of the expected vector count
+    VECTOR_INDEX_SUBVECTORS: int = 48  # Bytes per vector code; must divide the embedding dimension
+    VECTOR_INDEX_PROBES: int = 16  # Clusters searched per query
+    VECTOR_INDEX_RERANK: int = 40  # Candidates per result re-scored against the stored vectors
+    
+    # File imports
+    IMPORT_UPLOAD_DIR: Optional[str] = None  # Defaults to the system temp dir
+    IMPORT_CHUNK_ROWS: int = 50000
+    
+    # Stream ingestion
+    KAFKA_BOOTSTRAP_SERVERS: str = "localhost:9092"
+    KAFKA_SOCIAL_TOPIC: str = "social-media"
+    KAFKA_CONSUMER_GROUP: str = "insightfulai-ingestion"
+    STREAM_BATCH_SIZE: int = 500
+    STREAM_POLL_TIMEOUT_MS: int = 1000
+    STREAM_WORKERS: int = 1
+    
+    # Recurring collection scheduler
+    COLLECTION_SCHEDULER_ENABLED: bool = False
+    COLLECTION_SCHEDULER_TICK_SECONDS: float = 30.0
+    COLLECTION_COALESCE_WINDOW_SECONDS: int = 120
+    COLLECTION_SCHEDULE_JITTER_RATIO: float = 0.1
+    
+    # Competitor profiles
+    COMPETITOR_CACHE_TTL_SECONDS: int = 300
+    ACTIVITY_HOUR_BUCKET_RETENTION_DAYS: int = 7  # Then compacted into day buckets
+    ACTIVITY_DAY_BUCKET_RETENTION_DAYS: int = 180  # Then compacted into month buckets
+    ACTIVITY_BUCKET_MAX_EVENTS: int = 200
+    ACTIVITY_COMPACTION_ENABLED: bool = False  # Compact buckets in a background thread of one API worker
+    ACTIVITY_COMPACTION_INTERVAL_SECONDS: float = 3600.0
+    COMPARISON_MATRIX_REFRESH_SECONDS: int = 30  # Staleness allowed before a comparison re-reads changes
+    COMPARISON_MATRIX_CACHE_SIZE: int = 256  # Matrices (one per user and industry) kept in each process
+    MENTION_TAGGING_ENABLED: bool = False  # Tag collected documents with the competitors they mention
+    MENTION_TAGGER_REFRESH_SECONDS: int = 30  # Staleness allowed before the tagger re-reads competitor changes
+    MENTION_TAGGER_MIN_PATTERN_LENGTH: int = 2  # Shorter names, aliases and handles are not matched
+    MENTION_TAGGER_DELTA_PATTERNS: int = 5000  # Patterns added before the full automaton is rebuilt
+    
+    # Reports
+    REPORT_SECTION_WORKERS: int = 4  # Threads computing report sections, shared by all reports
+    REPORT_ARTIFACT_DIR: str = "data/reports"
+    REPORT_GZIP_HTML: bool = True  # Store a pre-compressed variant of HTML reports
+    REPORT_CHART_WORKERS: int = 2  # Processes laying out report charts; 0 lays them out in the section threads
+    REPORT_SECTION_CACHE_TTL_DAYS: int = 400  # Long enough for year-over-year regenerations
+    REPORT_SCHEDULER_ENABLED: bool = False
+    REPORT_SCHEDULER_TICK_SECONDS: float = 60.0
+    REPORT_SCHEDULE_BATCH_WINDOW_SECONDS: int = 900  # Due reports pulled forward to share a batch
+    
+    # Alerts
+    ALERTS_ENABLED: bool = True
+    ALERT_RULES_REFRESH_SECONDS: float = 5.0  # How often workers check for rule changes made elsewhere
+    ALERT_BATCH_SIZE: int = 500  # Pending alerts that force a flush
+    ALERT_BATCH_SECONDS: float = 10.0  # Longest an alert waits to be batched
+    ALERT_DEFAULT_DEBOUNCE_MINUTES: int = 60
+    ALERT_SENTIMENT_BUCKET_MINUTES: int = 15
+    ALERT_SENTIMENT_WINDOW_MINUTES: int = 60
+    ALERT_SENTIMENT_BASELINE_HOURS: int = 24
+    ALERT_SENTIMENT_MIN_MENTIONS: int = 20
+    
+    # Request profiling
+    PROFILING_ENABLED: bool = False  # Installs the middleware and datastore spans; off means no per-request cost
+    PROFILING_SAMPLE_RATE: float = 0.0  # Fraction of requests profiled without being asked to
+    PROFILING_HEADER: str = "X-Profile"  # Profiles the request when sent by a superuser
+    PROFILING_INTERVAL_MS: float = 2.0
+    PROFILING_MAX_SPANS: int = 5000
+    PROFILING_RETENTION_HOURS: int = 72
+    
+    # Query accounting and slow-query log
+    QUERY_ACCOUNTING_ENABLED: bool = False  # Counts datastore calls per request and logs slow ones
+    QUERY_REPEAT_THRESHOLD: int = 5  # Identical queries in one request reported as N+1
+    SLOW_QUERY_SQL_MS: float = 100.0
+    SLOW_QUERY_MONGO_MS: float = 100.0
+    SLOW_QUERY_REDIS_MS: float = 20.0
+    SLOW_QUERY_LOG_FILE: Optional[str] = None  # Otherwise the app.slow_queries logger's own handlers
+    
+    # JSON responses
+    JSON_STREAM_MIN_ROWS: int = 500  # Lists at least this long are encoded and sent in batches
+    JSON_STREAM_BATCH_ROWS: int = 200
+    
+    # Rate limiting and admission control
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_TOKENS_PER_MINUTE: float = 120.0  # Per user and route class; routes cost 1 to 20 tokens
+    RATE_LIMIT_BURST: float = 60.0
+    RATE_LIMIT_SYNC_SECONDS: float = 1.0  # How often spent tokens are exchanged through Redis
+    RATE_LIMIT_QUEUE_TIMEOUT_SECONDS: float = 10.0  # Longest wait for a route class slot before shedding
+    
+    # Parquet analytics store
+    PARQUET_STORE_ENABLED: bool = False  # Analysis reads the store instead of MongoDB; exported by a background job
+    PARQUET_STORE_DIR: str = "data/parquet"
+    PARQUET_EXPORT_INTERVAL_SECONDS: float = 300.0
+    PARQUET_ROW_GROUP_SIZE: int = 100000
+    
+    # Live events (server-sent events)
+    LIVE_EVENTS_ENABLED: bool = True  # Job, report and alert updates are published to Redis
+    LIVE_EVENTS_HEARTBEAT_SECONDS: float = 15.0  # Keeps idle streams open through proxies
+    LIVE_EVENTS_QUEUE_SIZE: int = 100  # Events buffered per stream; a slower client misses the rest
+    LIVE_EVENTS_MAX_STREAMS: int = 10000  # Open streams per worker process
+    
     # Celery
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
@@ -58,6 +208,15 @@ class Settings(BaseSettings):
     
     # Model paths
     NLP_MODELS_DIR: str = "app/models/nlp"
+    NLP_SENTIMENT_MODEL: Optional[str] = None  # Hugging Face model name, or a directory under NLP_MODELS_DIR
+    NLP_SPACY_MODEL: Optional[str] = None  # spaCy package name, or a directory under NLP_MODELS_DIR
+    NLP_EMBEDDING_MODEL: Optional[str] = None  # Hugging Face encoder, e.g. sentence-transformers/all-MiniLM-L6-v2
+    NLP_EMBEDDING_BATCH_SIZE: int = 64
+    NLP_EMBEDDING_MAX_TOKENS: int = 256
+    
+    # Preforking server (app.server)
+    SERVER_WORKERS: int = 4
+    SERVER_PRELOAD: bool = True  # Load the app and models once before forking, shared copy-on-write
     
     # Logging
     LOG_LEVEL: str = "INFO"
@@ -6,18 +6,27 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
 from app.core.config import settings
+from app.core.spans import MongoSpanListener, TracedRedis, instrument_engine
+
+# Datastore calls are only timed when profiling or query accounting consumes the spans
+TRACE_SPANS = settings.PROFILING_ENABLED or settings.QUERY_ACCOUNTING_ENABLED
 
 # PostgreSQL setup
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+if TRACE_SPANS:
+    instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 # MongoDB setup
-mongo_client = pymongo.MongoClient(settings.MONGODB_URL)
+mongo_client = pymongo.MongoClient(
+    settings.MONGODB_URL,
+    event_listeners=[MongoSpanListener()] if TRACE_SPANS else [],
+)
 mongo_db = mongo_client[settings.MONGODB_DB]
 
 # Redis setup
-redis_client = redis.Redis(
+redis_client = (TracedRedis if TRACE_SPANS else redis.Redis)(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
     db=settings.REDIS_DB,
@@ -51,4 +60,12 @@ def init_db() -> None:
     Initialize database with default data
     """
     # Add any initial data seeding here
-    pass 
\ No newline at end of file
+    pass 
+
+def close_connections() -> None:
+    """
+    Close pooled datastore connections, which reopen on next use; called before forking workers
+    """
+    engine.dispose()
+    mongo_client.close()
+    redis_client.connection_pool.disconnect()
@@ -0,0 +1,182 @@
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import anyio
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.spans import SpanRecorder, current_recorder
+
+# Functions listed in a profile's summary
+SUMMARY_FUNCTIONS = 40
+
+Stack = Tuple[str, ...]
+
+class StackSampler:
+    """
+    Samples the call stack of one thread from a background thread
+
+    Requests are handled on the event loop thread, so concurrent requests
+    running on it while a profiled one awaits show up in its samples too.
+    """
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Dict[Stack, int] = {}
+        self.labels: Dict[Any, str] = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _label(self, code: Any) -> str:
+        label = self.labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            # Paths relative to site-packages or the app keep flame graphs readable
+            if "site-packages/" in filename:
+                filename = filename.rsplit("site-packages/", 1)[1]
+            elif "/app/" in filename:
+                filename = "app/" + filename.rsplit("/app/", 1)[1]
+            label = self.labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+        return label
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            key = tuple(stack)
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> Dict[Stack, int]:
+        self.stopped.set()
+        self.thread.join()
+        return self.counts
+
+def folded_stacks(counts: Dict[Stack, int]) -> str:
+    """
+    Stacks in the folded format read by flamegraph.pl, speedscope and similar tools
+    """
+    return "\n".join(f"{';'.join(stack)} {count}" for stack, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+def summarize_stacks(counts: Dict[Stack, int], interval_ms: float, limit: int = SUMMARY_FUNCTIONS) -> List[Dict[str, Any]]:
+    """
+    Functions by samples spent in them (self) and under them (total), like a pstats listing
+    """
+    own: Dict[str, int] = {}
+    total: Dict[str, int] = {}
+    for stack, count in counts.items():
+        if not stack:
+            continue
+        own[stack[-1]] = own.get(stack[-1], 0) + count
+        # Recursive functions are counted once per sample
+        for function in set(stack):
+            total[function] = total.get(function, 0) + count
+    ranked = sorted(total, key=lambda function: (-own.get(function, 0), -total[function]))[:limit]
+    return [
+        {
+            "function": function,
+            "self_samples": own.get(function, 0),
+            "total_samples": total[function],
+            "self_ms": round(own.get(function, 0) * interval_ms, 1),
+            "total_ms": round(total[function] * interval_ms, 1),
+        }
+        for function in ranked
+    ]
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+class ProfilingMiddleware:
+    """
+    Profiles requests a superuser asks for with the profiling header, plus a sampled fraction of all requests
+
+    Only installed when PROFILING_ENABLED is set. A profiled request gets
+    an X-Profile-Id response header naming the stored profile.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: Callable[[Dict[str, Any]], None],
+        authorize: Callable[[str], bool],
+    ) -> None:
+        self.app = app
+        self.store = store
+        self.authorize = authorize
+        self.header = settings.PROFILING_HEADER.lower().encode("latin-1")
+
+    async def _trigger(self, scope: Scope) -> Optional[str]:
+        requested = _header(scope, self.header)
+        if requested and requested.lower() not in ("0", "false"):
+            scheme, _, token = (_header(scope, b"authorization") or "").partition(" ")
+            if scheme.lower() == "bearer" and token and await anyio.to_thread.run_sync(self.authorize, token):
+                return "header"
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return "sample"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = await self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        status_code = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        created_at = datetime.utcnow()
+        recorder = SpanRecorder(settings.PROFILING_MAX_SPANS, scope["path"])
+        context_token = current_recorder.set(recorder)
+        sampler = StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL_MS / 1000)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            counts = sampler.stop()
+            duration_ms = (time.perf_counter() - recorder.started) * 1000
+            current_recorder.reset(context_token)
+            profile = {
+                "profile_id": profile_id,
+                "trigger": trigger,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query_string": scope.get("query_string", b"").decode("latin-1"),
+                "status_code": status_code,
+                "duration_ms": round(duration_ms, 2),
+                "interval_ms": settings.PROFILING_INTERVAL_MS,
+                "samples": sum(counts.values()),
+                "summary": summarize_stacks(counts, settings.PROFILING_INTERVAL_MS),
+                "folded": folded_stacks(counts),
+                "span_totals": recorder.totals(),
+                "repeated_queries": recorder.repeated(settings.QUERY_REPEAT_THRESHOLD),
+                "spans": recorder.spans,
+                "dropped_spans": recorder.dropped,
+                "created_at": created_at,
+            }
+            # The response is already sent; storing only delays freeing the connection slot
+            await anyio.to_thread.run_sync(self.store, profile)
@@ -0,0 +1,129 @@
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.spans import SpanRecorder, current_recorder, recent_slow_queries
+
+# Repeated queries kept per endpoint
+ENDPOINT_REPEATS = 5
+
+queries_logger = logging.getLogger("app.queries")
+
+def endpoint_name(scope: Scope) -> str:
+    """
+    Method and handler of a routed request; the router records the handler in the scope
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return f"{scope['method']} unmatched"
+    return f"{scope['method']} {endpoint.__module__.rsplit('.', 1)[-1]}.{endpoint.__name__}"
+
+class QueryStats:
+    """
+    Datastore calls per endpoint, accumulated by this process
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, endpoint: str, recorder: SpanRecorder, repeated: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            stats = self.endpoints.setdefault(
+                endpoint,
+                {"requests": 0, "queries": {}, "duration_ms": {}, "max_queries": 0, "repeated_requests": 0, "repeated": []},
+            )
+            stats["requests"] += 1
+            total = 0
+            for kind, (count, duration_ms) in recorder.counts.items():
+                stats["queries"][kind] = stats["queries"].get(kind, 0) + count
+                stats["duration_ms"][kind] = round(stats["duration_ms"].get(kind, 0.0) + duration_ms, 3)
+                total += count
+            stats["max_queries"] = max(stats["max_queries"], total)
+            if repeated:
+                stats["repeated_requests"] += 1
+                stats["repeated"] = (repeated + stats["repeated"])[:ENDPOINT_REPEATS]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """
+        Endpoints by queries per request, with their averages
+        """
+        with self.lock:
+            endpoints = []
+            for endpoint, stats in self.endpoints.items():
+                queries = sum(stats["queries"].values())
+                endpoints.append({
+                    "endpoint": endpoint,
+                    **stats,
+                    "queries_per_request": round(queries / stats["requests"], 2),
+                    "ms_per_request": round(sum(stats["duration_ms"].values()) / stats["requests"], 3),
+                })
+        return sorted(endpoints, key=lambda endpoint: -endpoint["queries_per_request"])
+
+    def reset(self) -> None:
+        with self.lock:
+            self.endpoints.clear()
+        recent_slow_queries.clear()
+
+query_stats = QueryStats()
+
+def query_headers(recorder: SpanRecorder) -> List[Tuple[bytes, bytes]]:
+    """
+    Debug headers with the datastore calls made before the response started
+    """
+    counts = ", ".join(f"{kind}={count}" for kind, (count, _) in sorted(recorder.counts.items()))
+    durations = ", ".join(f"{kind}={duration_ms:.1f}" for kind, (_, duration_ms) in sorted(recorder.counts.items()))
+    headers = [(b"x-query-count", counts.encode("latin-1")), (b"x-query-time-ms", durations.encode("latin-1"))]
+    repeated = recorder.repeated(settings.QUERY_REPEAT_THRESHOLD)
+    if repeated:
+        worst = repeated[0]
+        headers.append((
+            b"x-query-repeated",
+            f"{len(repeated)}; {worst['kind']} {worst['count']}x {worst['query']}".encode("latin-1", "replace"),
+        ))
+    return headers
+
+class QueryAccountingMiddleware:
+    """
+    Counts the SQL, MongoDB and Redis calls of every request, logging repeated
+    queries (N+1) and, in debug mode, reporting the counts as response headers
+
+    Only installed when QUERY_ACCOUNTING_ENABLED is set.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # A profiled request already records its spans, which are shared
+        recorder = current_recorder.get()
+        context_token = None
+        if recorder is None:
+            recorder = SpanRecorder(0, scope["path"])
+            context_token = current_recorder.set(recorder)
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *query_headers(recorder)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if settings.DEBUG else send)
+        finally:
+            if context_token is not None:
+                current_recorder.reset(context_token)
+            endpoint = endpoint_name(scope)
+            repeated = recorder.repeated(settings.QUERY_REPEAT_THRESHOLD)
+            for repeat in repeated:
+                queries_logger.warning(
+                    "%s ran the same %s query %d times (%.1fms): %s",
+                    endpoint, repeat["kind"], repeat["count"], repeat["duration_ms"], repeat["query"],
+                )
+            query_stats.add(endpoint, recorder, repeated)
@@ -0,0 +1,297 @@
+import math
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+import anyio
+import redis
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.database import redis_client
+
+# Requests are charged tokens by what their route costs, from a bucket per
+# user (or client address) and route class. Each process admits from its
+# own buckets without waiting on Redis; a background thread adds the tokens
+# spent locally to shared Redis counters and takes what other processes
+# spent out of the local buckets, so the limit holds across workers to
+# within one sync interval.
+
+SYNC_KEY_PREFIX = "rate_limit:"
+# Shared counters of keys no process touched for this long expire
+SYNC_KEY_TTL_SECONDS = 3600
+
+class RouteClass(NamedTuple):
+    concurrency: int  # Requests of the class one process handles at once
+    queue_depth: int  # Requests waiting for a slot before new ones are shed
+
+ROUTE_CLASSES = {
+    "analysis": RouteClass(concurrency=8, queue_depth=16),
+    "reports": RouteClass(concurrency=4, queue_depth=8),
+    "collection": RouteClass(concurrency=8, queue_depth=16),
+    "default": RouteClass(concurrency=64, queue_depth=256),
+}
+
+# (method or *, path under the API prefix, route class, cost in tokens); the first match wins
+ROUTE_COSTS = [
+    ("POST", r"/analysis/batch-sentiment", "analysis", 20),
+    ("*", r"/analysis/.*", "analysis", 5),
+    ("GET", r"/competitors/comparison", "analysis", 5),
+    ("POST", r"/reports/generate", "reports", 20),
+    ("POST", r"/reports/[^/]+/regenerate", "reports", 20),
+    ("POST", r"/data/import", "collection", 10),
+    ("POST", r"/data/(web-scrape|social-media|news)", "collection", 5),
+    ("POST", r"/competitors/[^/]+/products/snapshots", "collection", 5),
+    ("GET", r"/data/semantic-search", "analysis", 5),
+    ("GET", r"/data/(data|search)", "default", 2),
+]
+
+# Never limited, so health checks and the session check stay fast under overload
+EXEMPT_PATHS = {"/", "/docs", "/redoc", f"{settings.API_V1_STR}/openapi.json", f"{settings.API_V1_STR}/users/me"}
+
+# Held open for a client's session, so charged on connect but never holding a route class slot
+LONG_LIVED_PATHS = {f"{settings.API_V1_STR}/events/stream"}
+
+_COMPILED_ROUTE_COSTS = [
+    (method, re.compile(settings.API_V1_STR + pattern), route_class, cost)
+    for method, pattern, route_class, cost in ROUTE_COSTS
+]
+
+def route_cost(method: str, path: str) -> Tuple[str, int]:
+    """
+    Route class and token cost of a request
+    """
+    for route_method, pattern, route_class, cost in _COMPILED_ROUTE_COSTS:
+        if route_method in ("*", method) and pattern.fullmatch(path):
+            return route_class, cost
+    return "default", 1
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "unsynced", "synced_total")
+
+    def __init__(self, tokens: float, now: float) -> None:
+        self.tokens = tokens
+        self.updated = now
+        # Tokens spent here since the last sync, and the shared total seen then
+        self.unsynced = 0.0
+        self.synced_total: Optional[float] = None
+
+class RateLimiter:
+    """
+    Token buckets per user and route class, shared between processes through Redis
+    """
+
+    def __init__(self, rate_per_second: float, burst: float, redis_client: Any, sync_interval: float) -> None:
+        self.rate = rate_per_second
+        self.burst = burst
+        self.redis_client = redis_client
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.limited = 0
+        self.sync_errors = 0
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def _refill(self, bucket: TokenBucket, now: float) -> None:
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+
+    def take(self, key: str, cost: float) -> float:
+        """
+        Spend ``cost`` tokens of a bucket; returns 0 when admitted, otherwise the seconds until enough have refilled
+        """
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.burst, now)
+            self._refill(bucket, now)
+            if bucket.tokens >= cost:
+                bucket.tokens -= cost
+                bucket.unsynced += cost
+                return 0.0
+            self.limited += 1
+            return (cost - bucket.tokens) / self.rate
+
+    def sync(self) -> None:
+        """
+        Exchange spent tokens with the other processes and drop buckets that refilled while idle
+        """
+        now = time.monotonic()
+        with self.lock:
+            idle = [key for key, bucket in self.buckets.items() if not bucket.unsynced and now - bucket.updated > self.burst / self.rate]
+            for key in idle:
+                del self.buckets[key]
+            pending = [(key, bucket.unsynced) for key, bucket in self.buckets.items()]
+            for bucket in self.buckets.values():
+                bucket.unsynced = 0.0
+        if not pending:
+            return
+
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key, spent in pending:
+            pipeline.incrbyfloat(SYNC_KEY_PREFIX + key, spent)
+            pipeline.expire(SYNC_KEY_PREFIX + key, SYNC_KEY_TTL_SECONDS)
+        try:
+            totals = pipeline.execute()[::2]
+        except redis.RedisError:
+            # Limits stay per process until Redis is back; the spent tokens are sent next time
+            self.sync_errors += 1
+            with self.lock:
+                for key, spent in pending:
+                    if key in self.buckets:
+                        self.buckets[key].unsynced += spent
+            return
+
+        with self.lock:
+            for (key, spent), total in zip(pending, totals):
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    continue
+                total = float(total)
+                if bucket.synced_total is not None:
+                    # Spent elsewhere since the last sync; the debt is capped at one burst
+                    others = total - bucket.synced_total - spent
+                    bucket.tokens = max(-self.burst, bucket.tokens - max(others, 0.0))
+                bucket.synced_total = total
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.sync_interval):
+            self.sync()
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="rate-limit-sync", daemon=True)
+            self.thread.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"buckets": len(self.buckets), "limited": self.limited, "sync_errors": self.sync_errors}
+
+class AdmissionGate:
+    """
+    Limits the requests of one route class handled at once, queueing a few and shedding the rest
+    """
+
+    def __init__(self, route_class: RouteClass) -> None:
+        self.limit = route_class.concurrency
+        self.queue_depth = route_class.queue_depth
+        self.semaphore = anyio.Semaphore(route_class.concurrency)
+        self.waiting = 0
+        self.shed = 0
+        # Moving average of how long admitted requests take, for Retry-After
+        self.average_seconds = 0.0
+
+    async def admit(self, timeout: float) -> bool:
+        """
+        Take a slot, queueing for one while the queue has room; False when the request is shed
+        """
+        try:
+            self.semaphore.acquire_nowait()
+            return True
+        except anyio.WouldBlock:
+            pass
+        if self.waiting < self.queue_depth:
+            self.waiting += 1
+            try:
+                with anyio.move_on_after(timeout):
+                    await self.semaphore.acquire()
+                    return True
+            finally:
+                self.waiting -= 1
+        self.shed += 1
+        return False
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.average_seconds * (self.waiting + 1) / self.limit))
+
+    def record(self, seconds: float) -> None:
+        self.average_seconds = seconds if not self.average_seconds else 0.9 * self.average_seconds + 0.1 * seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.limit,
+            "in_flight": self.limit - self.semaphore.value,
+            "waiting": self.waiting,
+            "shed": self.shed,
+            "average_ms": round(self.average_seconds * 1000, 1),
+        }
+
+rate_limiter = RateLimiter(
+    settings.RATE_LIMIT_TOKENS_PER_MINUTE / 60,
+    settings.RATE_LIMIT_BURST,
+    redis_client,
+    settings.RATE_LIMIT_SYNC_SECONDS,
+)
+
+admission_gates = {name: AdmissionGate(route_class) for name, route_class in ROUTE_CLASSES.items()}
+
+def rate_limit_stats() -> Dict[str, Any]:
+    """
+    Buckets, rejected requests and per route class admission of this process
+    """
+    return {
+        **rate_limiter.stats(),
+        "route_classes": {name: gate.stats() for name, gate in admission_gates.items()},
+    }
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def _rejection(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=status_code, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+class RateLimitMiddleware:
+    """
+    Rate limits requests per user and route class by cost, and sheds load past each class's queue depth
+
+    Requests over their rate get 429, shed requests 503, both with
+    Retry-After. Only installed when RATE_LIMIT_ENABLED is set.
+    """
+
+    def __init__(self, app: ASGIApp, identify: Callable[[str], Optional[str]]) -> None:
+        self.app = app
+        self.identify = identify
+
+    def _identity(self, scope: Scope) -> str:
+        scheme, _, token = (_header(scope, b"authorization") or "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            subject = self.identify(token)
+            if subject:
+                return f"user:{subject}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else '-'}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        rate_limiter.start()
+        route_class, cost = route_cost(scope["method"], scope["path"])
+        wait = rate_limiter.take(f"{self._identity(scope)}:{route_class}", cost)
+        if wait:
+            await _rejection(429, "Rate limit exceeded", wait)(scope, receive, send)
+            return
+
+        if scope["path"] in LONG_LIVED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        gate = admission_gates[route_class]
+        if not await gate.admit(settings.RATE_LIMIT_QUEUE_TIMEOUT_SECONDS):
+            await _rejection(503, "Server busy, try again later", gate.retry_after())(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.semaphore.release()
+            gate.record(time.perf_counter() - started)
@@ -0,0 +1,252 @@
+import os
+from decimal import Decimal
+from email.utils import formatdate
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import anyio
+import orjson
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+# Aware datetimes end in Z like pydantic's; naive ones are written as isoformat()
+JSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    # ObjectIds and anything else unknown, like json.dumps(default=str)
+    return str(value)
+
+def dumps_json(content: Any) -> bytes:
+    """
+    Encode content as compact JSON with orjson; ObjectIds and other unknown types become strings
+    """
+    return orjson.dumps(content, default=_json_default, option=JSON_OPTIONS)
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoded with orjson
+
+    Endpoints return it for content built from rows they already trust
+    (serialized MongoDB documents, selected SQL columns), which skips
+    FastAPI's jsonable_encoder walk and response model validation.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+def iter_json_rows(rows: Iterable[Any], batch_rows: int) -> Iterator[bytes]:
+    """
+    Encode rows as the comma separated items of a JSON array, one chunk per batch
+    """
+    separator = b""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield separator + dumps_json(batch)[1:-1]
+            separator = b","
+            batch = []
+    if batch:
+        yield separator + dumps_json(batch)[1:-1]
+
+def iter_json_list(
+    rows: Iterable[Any],
+    key: Optional[str] = None,
+    head: Optional[Dict[str, Any]] = None,
+    batch_rows: int = 200,
+) -> Iterator[bytes]:
+    """
+    Encode a JSON array, or an object with the ``head`` fields followed by the array under ``key``, in chunks
+    """
+    if key is None:
+        yield b"["
+    else:
+        yield (dumps_json(head)[:-1] + b"," if head else b"{") + dumps_json(key) + b":["
+    yield from iter_json_rows(rows, batch_rows)
+    yield b"]" if key is None else b"]}"
+
+def json_list_response(
+    rows: Sequence[Any],
+    key: Optional[str] = None,
+    head: Optional[Dict[str, Any]] = None,
+) -> Response:
+    """
+    Respond with a list of trusted rows, alone or under ``key`` after the ``head`` fields
+
+    Long lists are streamed in batches so the encoded body is never held
+    in memory whole.
+    """
+    if len(rows) < settings.JSON_STREAM_MIN_ROWS:
+        return FastJSONResponse(rows if key is None else {**(head or {}), key: rows})
+    return StreamingResponse(
+        iter_json_list(rows, key, head, settings.JSON_STREAM_BATCH_ROWS),
+        media_type="application/json",
+    )
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows a content coding
+    """
+    for part in (accept_encoding or "").split(","):
+        name, _, parameters = part.strip().partition(";")
+        if name.strip().lower() not in (encoding, "*"):
+            continue
+        quality = parameters.strip()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range Range header into an inclusive (start, end)
+
+    Returns None when the header should be ignored (other units, several
+    ranges) and raises ValueError when the range cannot be satisfied.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+class ArtifactResponse(Response):
+    """
+    Stream a stored file with strong ETags, conditional requests and single byte ranges
+
+    The body is sent with the server's zero-copy or path send extension when
+    it offers one, otherwise in fixed-size pread chunks, so memory use does
+    not depend on the file size.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        request_headers: Mapping[str, str],
+        etag: str,
+        media_type: str,
+        filename: Optional[str] = None,
+        content_encoding: Optional[str] = None,
+        vary: Optional[str] = None,
+        method: str = "GET",
+        background: Optional[BackgroundTask] = None,
+    ) -> None:
+        self.path = path
+        self.media_type = media_type
+        self.background = background
+        self.send_header_only = method.upper() == "HEAD"
+        stat_result = os.stat(path)
+        size = stat_result.st_size
+        self.etag = f'"{etag}"'
+
+        headers = {
+            "etag": self.etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "accept-ranges": "bytes",
+            "cache-control": "private, no-cache",
+        }
+        if vary:
+            headers["vary"] = vary
+        if content_encoding:
+            headers["content-encoding"] = content_encoding
+        if filename:
+            quoted = quote(filename)
+            if quoted == filename:
+                headers["content-disposition"] = f'attachment; filename="{filename}"'
+            else:
+                headers["content-disposition"] = f"attachment; filename*=utf-8''{quoted}"
+
+        self.status_code = 200
+        self.offset = 0
+        self.length = size
+        if_none_match = request_headers.get("if-none-match")
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if if_none_match and _etag_matches(if_none_match, self.etag):
+            self.status_code = 304
+            self.length = 0
+        elif range_header and (not if_range or if_range.strip() == self.etag):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                self.status_code = 416
+                self.length = 0
+                headers["content-range"] = f"bytes */{size}"
+            else:
+                if byte_range is not None:
+                    self.status_code = 206
+                    self.offset = byte_range[0]
+                    self.length = byte_range[1] - byte_range[0] + 1
+                    headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+        if self.status_code != 304:
+            headers["content-length"] = str(self.length)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        extensions = scope.get("extensions") or {}
+        if self.send_header_only or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.pathsend" in extensions and self.offset == 0 and self.status_code == 200:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+        else:
+            descriptor = await anyio.to_thread.run_sync(os.open, self.path, os.O_RDONLY)
+            try:
+                if "http.response.zerocopysend" in extensions:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": descriptor,
+                        "offset": self.offset,
+                        "count": self.length,
+                    })
+                else:
+                    position = self.offset
+                    remaining = self.length
+                    while remaining > 0:
+                        chunk = await anyio.to_thread.run_sync(
+                            os.pread, descriptor, min(self.chunk_size, remaining), position
+                        )
+                        if not chunk:
+                            break
+                        position += len(chunk)
+                        remaining -= len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                    if remaining > 0:
+                        # The file shrank while it was being sent
+                        await send({"type": "http.response.body", "body": b"", "more_body": False})
+            finally:
+                os.close(descriptor)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,224 @@
+import logging
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import redis
+from pymongo import monitoring
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+# Datastore calls are timed into the recorder of the current request, if any,
+# and logged when slower than their threshold. The hooks are only installed
+# when profiling or query accounting is enabled, so otherwise the database
+# handles are the plain clients.
+
+SPAN_NAME_LENGTH = 200
+
+# Slow queries of this process listed by /admin/queries, newest last
+RECENT_SLOW_QUERIES = 200
+
+SLOW_QUERY_THRESHOLDS_MS = {
+    "sql": settings.SLOW_QUERY_SQL_MS,
+    "mongo": settings.SLOW_QUERY_MONGO_MS,
+    "redis": settings.SLOW_QUERY_REDIS_MS,
+}
+
+# Ids inside Redis keys, so keys of the same kind share a shape
+REDIS_KEY_IDS = re.compile(r"[0-9a-f]{12,}|\d+")
+
+# Fields of MongoDB commands that hold the query they run
+MONGO_QUERY_FIELDS = ("filter", "query", "pipeline", "updates", "deletes")
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+if settings.SLOW_QUERY_LOG_FILE:
+    _handler = logging.FileHandler(settings.SLOW_QUERY_LOG_FILE)
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    slow_query_logger.addHandler(_handler)
+    slow_query_logger.setLevel(logging.INFO)
+
+recent_slow_queries: Deque[Dict[str, Any]] = deque(maxlen=RECENT_SLOW_QUERIES)
+
+class SpanRecorder:
+    """
+    Datastore calls of one request: counts and time per datastore, repeats per
+    query shape and individual spans with times relative to the request start
+    """
+
+    def __init__(self, limit: int, path: str = "-") -> None:
+        self.started = time.perf_counter()
+        self.limit = limit
+        self.path = path
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.counts: Dict[str, List[float]] = {}
+        self.shapes: Dict[Tuple[str, str], List[float]] = {}
+
+    def record(self, kind: str, name: str, started: float, ended: float, failed: bool = False) -> None:
+        duration_ms = (ended - started) * 1000
+        count = self.counts.setdefault(kind, [0, 0.0])
+        count[0] += 1
+        count[1] += duration_ms
+        shape = self.shapes.setdefault((kind, name), [0, 0.0])
+        shape[0] += 1
+        shape[1] += duration_ms
+        if len(self.spans) >= self.limit:
+            self.dropped += 1
+            return
+        self.spans.append({
+            "kind": kind,
+            "name": name[:SPAN_NAME_LENGTH],
+            "start_ms": round((started - self.started) * 1000, 3),
+            "duration_ms": round(duration_ms, 3),
+            "failed": failed,
+        })
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        """
+        Count and time spent per datastore
+        """
+        return {kind: {"count": count, "duration_ms": round(duration_ms, 3)} for kind, (count, duration_ms) in self.counts.items()}
+
+    def repeated(self, threshold: int) -> List[Dict[str, Any]]:
+        """
+        Query shapes run at least ``threshold`` times, the usual sign of an N+1 access pattern
+        """
+        return sorted(
+            (
+                {"kind": kind, "query": name[:SPAN_NAME_LENGTH], "count": count, "duration_ms": round(duration_ms, 3)}
+                for (kind, name), (count, duration_ms) in self.shapes.items()
+                if count >= threshold
+            ),
+            key=lambda repeat: -repeat["count"],
+        )
+
+current_recorder: ContextVar[Optional[SpanRecorder]] = ContextVar("current_span_recorder", default=None)
+
+def finish_span(kind: str, name: str, started: float, failed: bool = False) -> None:
+    """
+    Record a datastore call with the current request and log it when slow
+    """
+    ended = time.perf_counter()
+    recorder = current_recorder.get()
+    if recorder is not None:
+        recorder.record(kind, name, started, ended, failed)
+    duration_ms = (ended - started) * 1000
+    if duration_ms >= SLOW_QUERY_THRESHOLDS_MS[kind]:
+        entry = {
+            "kind": kind,
+            "query": name[:SPAN_NAME_LENGTH * 5],
+            "duration_ms": round(duration_ms, 3),
+            "failed": failed,
+            "path": recorder.path if recorder is not None else "-",
+            "at": datetime.utcnow().isoformat() + "Z",
+        }
+        recent_slow_queries.append(entry)
+        slow_query_logger.warning(
+            "slow %s query %.1fms on %s: %s", kind, duration_ms, entry["path"], entry["query"]
+        )
+
+def query_shape(value: Any) -> Any:
+    """
+    A query with its values replaced, so queries differing only in values compare equal
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        # Lists of values ($in, documents) collapse; pipelines keep their stages
+        shapes = [query_shape(item) for item in value]
+        return shapes if any(isinstance(item, dict) for item in value) else "?"
+    return "?"
+
+def mongo_span_name(command_name: str, command: Dict[str, Any]) -> str:
+    collection = command.get(command_name)
+    name = f"{command_name} {collection}" if isinstance(collection, str) else command_name
+    for field in MONGO_QUERY_FIELDS:
+        if field in command:
+            query = command[field]
+            if field in ("updates", "deletes") and query:
+                query = query[0].get("q", {})
+            return f"{name} {query_shape(query)}"
+    return name
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Time the SQL statements of an engine
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("span_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("span_started"):
+            # Statements are parameterized, so the text is already their shape
+            finish_span("sql", " ".join(statement.split()), conn.info["span_started"].pop())
+
+class MongoSpanListener(monitoring.CommandListener):
+    """
+    Times MongoDB commands; pymongo calls it in the thread issuing the command
+    """
+
+    def __init__(self) -> None:
+        # Command ids -> (started, name) until they complete
+        self.pending: Dict[Tuple[Any, int], Tuple[float, str]] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self.pending[(event.connection_id, event.request_id)] = (
+            time.perf_counter(),
+            mongo_span_name(event.command_name, event.command),
+        )
+
+    def _finished(self, event: Any, failed: bool) -> None:
+        pending = self.pending.pop((event.connection_id, event.request_id), None)
+        if pending is not None:
+            finish_span("mongo", pending[1], pending[0], failed)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finished(event, False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finished(event, True)
+
+def redis_span_name(args: Tuple[Any, ...]) -> str:
+    if len(args) < 2:
+        return str(args[0]) if args else ""
+    return f"{args[0]} {REDIS_KEY_IDS.sub('?', str(args[1]))}"
+
+class TracedRedis(redis.Redis):
+    """
+    Redis client timing each command; pipelines are timed as one span when executed
+    """
+
+    def execute_command(self, *args: Any, **options: Any) -> Any:
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute_command(*args, **options)
+            failed = False
+            return result
+        finally:
+            finish_span("redis", redis_span_name(args), started, failed)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Any = None) -> Any:
+        pipeline = super().pipeline(transaction, shard_hint)
+        execute = pipeline.execute
+
+        def traced_execute(raise_on_error: bool = True) -> Any:
+            started = time.perf_counter()
+            commands = sorted({str(command[0][0]) for command in pipeline.command_stack})
+            failed = True
+            try:
+                result = execute(raise_on_error)
+                failed = False
+                return result
+            finally:
+                finish_span("redis", f"PIPELINE {' '.join(commands)}", started, failed)
+
+        pipeline.execute = traced_execute
+        return pipeline
@@ -5,6 +5,24 @@ from fastapi.responses import JSONResponse
 from app.core.config import settings
 from app.api.routes import api_router
 from app.core.database import create_db_and_tables
+from app.core.profiling import ProfilingMiddleware
+from app.core.query_accounting import QueryAccountingMiddleware
+from app.core.rate_limiting import RateLimitMiddleware
+from app.services.collected_data import ensure_collected_data_indexes, ensure_text_index
+from app.services.collection_jobs import ensure_collection_job_indexes
+from app.services.activity_timeline import ensure_activity_bucket_indexes, start_compaction_scheduler
+from app.services.alert_engine import ensure_alert_indexes, flush_alerts
+from app.services.competitor_store import ensure_competitor_indexes
+from app.services.product_snapshots import ensure_product_snapshot_indexes
+from app.services.report_cache import ensure_section_cache_indexes
+from app.services.report_store import ensure_report_indexes
+from app.services.search_index import index_collected_documents
+from app.services.vector_index import embed_collected_documents
+from app.services.request_profiles import ensure_request_profile_indexes, save_profile
+from app.services.auth import is_superuser_token, token_subject
+from app.services.parquet_store import start_export_scheduler
+from app.services.collection_scheduler import ensure_collection_schedule_indexes, start_scheduler
+from app.services.report_scheduler import ensure_report_schedule_indexes, start_report_scheduler
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -15,6 +33,10 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
+# Rate limits and sheds load by route cost; added before CORS so rejections carry CORS headers
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, identify=token_subject)
+
 # Set up CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +46,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Counts datastore calls per request; runs inside profiling so both share the request's spans
+if settings.QUERY_ACCOUNTING_ENABLED:
+    app.add_middleware(QueryAccountingMiddleware)
+
+# Profiles requests on demand; without it requests pay nothing for profiling
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, store=save_profile, authorize=is_superuser_token)
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -35,13 +65,47 @@ async def startup_event():
     # Skip database initialization for now
     # create_db_and_tables()
     print("Skipping database initialization for development")
+    # Keyword filters need the text index, so it is never opt-in
+    ensure_text_index()
+    if settings.MONGODB_ENSURE_INDEXES:
+        ensure_collected_data_indexes()
+        ensure_collection_job_indexes()
+        ensure_collection_schedule_indexes()
+        ensure_competitor_indexes()
+        ensure_activity_bucket_indexes()
+        ensure_product_snapshot_indexes()
+        ensure_report_indexes()
+        ensure_section_cache_indexes()
+        ensure_report_schedule_indexes()
+        ensure_alert_indexes()
+        ensure_request_profile_indexes()
+    if settings.COLLECTION_SCHEDULER_ENABLED:
+        app.state.scheduler_stop = start_scheduler()
+    if settings.REPORT_SCHEDULER_ENABLED:
+        app.state.report_scheduler_stop = start_report_scheduler()
+    if settings.PARQUET_STORE_ENABLED:
+        app.state.parquet_export_stop = start_export_scheduler()
+    if settings.ACTIVITY_COMPACTION_ENABLED:
+        app.state.compaction_stop = start_compaction_scheduler()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """
     Clean up resources on shutdown
     """
-    pass
+    if getattr(app.state, "scheduler_stop", None) is not None:
+        app.state.scheduler_stop.set()
+    if getattr(app.state, "report_scheduler_stop", None) is not None:
+        app.state.report_scheduler_stop.set()
+    if getattr(app.state, "parquet_export_stop", None) is not None:
+        app.state.parquet_export_stop.set()
+    if getattr(app.state, "compaction_stop", None) is not None:
+        app.state.compaction_stop.set()
+    # Pending alerts would otherwise wait on a timer that dies with the process
+    flush_alerts()
+    # Buffered index entries would otherwise be lost with the process
+    index_collected_documents([], flush=True)
+    embed_collected_documents([], flush=True)
 
 @app.get("/", tags=["Health"])
 async def health_check():
@@ -0,0 +1,242 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import select
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+
+from app.core.config import settings
+
+# Production server: a master process loads the app, NLP models and lookup
+# tables once, then forks uvicorn workers that share its memory copy-on-write
+# and accept on one listening socket. The master restarts workers that exit
+# and reports each worker's memory and startup time:
+#
+#     python -m app.server --host 0.0.0.0 --port 8000 --workers 4
+#
+# Tokens stay valid across workers and restarts as the signing key is read
+# from SECRET_KEY or the shared SECRET_KEY_FILE. Unix only.
+
+logger = logging.getLogger("uvicorn.error")
+
+def process_memory(pid: int) -> Dict[str, float]:
+    """
+    Resident, proportional (shared pages split between their users), shared and private memory of a process in MiB
+    """
+    fields: Dict[str, float] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            for line in smaps:
+                name, _, value = line.partition(":")
+                if value.rstrip().endswith("kB"):
+                    fields[name] = int(value.split()[0]) / 1024
+    except OSError:
+        return {}
+    return {
+        "rss_mib": round(fields.get("Rss", 0.0), 1),
+        "pss_mib": round(fields.get("Pss", 0.0), 1),
+        "shared_mib": round(fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0), 1),
+        "private_mib": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0), 1),
+    }
+
+def format_memory(memory: Dict[str, float]) -> str:
+    if not memory:
+        return "memory unavailable"
+    return ", ".join(f"{name[:-4]} {value:.1f} MiB" for name, value in memory.items())
+
+class WorkerServer(uvicorn.Server):
+    """
+    uvicorn server of one forked worker, telling the master when its startup has run
+    """
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int, forked_at: float) -> None:
+        super().__init__(config)
+        self.ready_fd = ready_fd
+        self.forked_at = forked_at
+
+    async def startup(self, sockets: Optional[List[Any]] = None) -> None:
+        await super().startup(sockets)
+        if self.started:
+            report = {"pid": os.getpid(), "startup_ms": round((time.perf_counter() - self.forked_at) * 1000, 1)}
+            os.write(self.ready_fd, (json.dumps(report) + "\n").encode())
+
+class Master:
+    """
+    Forks and supervises the workers
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int, graceful_timeout: float, stats_interval: float) -> None:
+        self.config = config
+        self.worker_count = workers
+        self.graceful_timeout = graceful_timeout
+        self.stats_interval = stats_interval
+        self.socket = config.bind_socket()
+        self.ready_read, self.ready_write = os.pipe()
+        # Worker pid -> (worker number, started)
+        self.workers: Dict[int, List[Any]] = {}
+        self.stopping = False
+
+    def spawn(self, number: int) -> None:
+        forked_at = time.perf_counter()
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = [number, False]
+            return
+        # Worker: the server installs its own handlers for graceful shutdown
+        for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        os.close(self.ready_read)
+        status = 0
+        try:
+            WorkerServer(self.config, self.ready_write, forked_at).run(sockets=[self.socket])
+        except BaseException:
+            logger.exception("Worker %d failed", number)
+            status = 1
+        finally:
+            # Skips the master's atexit handlers and buffers
+            os._exit(status)
+
+    def stop(self, signum: int, frame: Any) -> None:
+        self.stopping = True
+
+    def report_ready(self, buffer: bytes) -> bytes:
+        lines = buffer.split(b"\n")
+        for line in lines[:-1]:
+            report = json.loads(line)
+            worker = self.workers.get(report["pid"])
+            if worker is None:
+                continue
+            worker[1] = True
+            logger.info(
+                "Worker %d [%d] started in %.0f ms: %s",
+                worker[0], report["pid"], report["startup_ms"], format_memory(process_memory(report["pid"])),
+            )
+            if all(started for _, started in self.workers.values()):
+                self.report_memory()
+        return lines[-1]
+
+    def report_memory(self) -> None:
+        totals: Dict[str, float] = {}
+        for pid in self.workers:
+            for name, value in process_memory(pid).items():
+                totals[name] = totals.get(name, 0.0) + value
+        logger.info(
+            "%d workers: %s; master: %s",
+            len(self.workers), format_memory({name: round(value, 1) for name, value in totals.items()}),
+            format_memory(process_memory(os.getpid())),
+        )
+
+    def reap(self) -> bool:
+        """
+        Restart workers that exited; False when one exited before it finished starting
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return True
+            if not pid:
+                return True
+            # Negative codes are the signal that ended the worker
+            status = os.waitstatus_to_exitcode(status)
+            number, started = self.workers.pop(pid, [None, False])
+            if number is None or self.stopping:
+                continue
+            if not started:
+                logger.error("Worker %d [%d] exited during startup with status %d; stopping", number, pid, status)
+                return False
+            logger.warning("Worker %d [%d] exited with status %d; restarting", number, pid, status)
+            self.spawn(number)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for number in range(self.worker_count):
+            self.spawn(number)
+        logger.info("Master [%d] listening on %s with %d workers", os.getpid(), self.socket.getsockname(), self.worker_count)
+
+        buffer = b""
+        last_stats = time.monotonic()
+        while not self.stopping:
+            readable, _, _ = select.select([self.ready_read], [], [], 1.0)
+            if readable:
+                buffer = self.report_ready(buffer + os.read(self.ready_read, 65536))
+            if not self.reap():
+                self.shutdown()
+                raise SystemExit(1)
+            if self.stats_interval and time.monotonic() - last_stats >= self.stats_interval:
+                self.report_memory()
+                last_stats = time.monotonic()
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        logger.info("Stopping %d workers", len(self.workers))
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.workers.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.workers:
+            logger.warning("Worker [%d] did not stop in time; killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+
+def preload_app() -> Any:
+    """
+    Import the app and load models and read-only tables in the master
+    """
+    started = time.perf_counter()
+    from app.core.database import close_connections
+    from app.main import app
+    from app.services.nlp_models import preload
+
+    timings = preload()
+    # Imports may have connected; children must not share the sockets
+    close_connections()
+    # Everything loaded so far is kept out of the collector, whose passes would
+    # otherwise write to the objects' headers and copy their pages per worker
+    gc.collect()
+    gc.freeze()
+    logger.info(
+        "Preloaded app in %.0f ms (%s); master: %s",
+        (time.perf_counter() - started) * 1000,
+        ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items()),
+        format_memory(process_memory(os.getpid())),
+    )
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the API with preforked uvicorn workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS)
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=settings.SERVER_PRELOAD,
+                        help="Load the app in the master and share it with the workers (default from SERVER_PRELOAD)")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0, help="Seconds workers get to finish requests on shutdown")
+    parser.add_argument("--stats-interval", type=float, default=0.0, help="Seconds between worker memory reports; 0 reports only at startup")
+    parser.add_argument("--log-level", default=settings.LOG_LEVEL.lower())
+    args = parser.parse_args()
+
+    # The config sets up uvicorn's logging, which the master logs through too
+    config = uvicorn.Config("app.main:app", host=args.host, port=args.port, log_level=args.log_level)
+    if args.preload:
+        config.app = preload_app()
+    Master(config, args.workers, args.graceful_timeout, args.stats_interval).run()
+
+if __name__ == "__main__":
+    main()
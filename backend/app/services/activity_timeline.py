@@ -0,0 +1,425 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pymongo
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.core.database import get_mongo_collection, redis_client
+from app.services.alert_engine import activity_events, evaluate_events
+
+ACTIVITY_BUCKETS_COLLECTION = "competitor_activity_buckets"
+DAILY_ACTIVITY_COLLECTION = "competitor_daily_activity"
+# Buckets taken out of the timeline by compaction and not yet merged
+COMPACTION_JOURNAL_COLLECTION = "competitor_activity_compaction"
+
+COMPACTION_LOCK_KEY = "activity_compaction:lock"
+
+compaction_logger = logging.getLogger("app.activity_timeline")
+
+ACTIVITY_TYPES = ["social", "news", "web", "product"]
+
+TIME_PERIOD_DAYS = {
+    "day": 1,
+    "week": 7,
+    "month": 30,
+    "quarter": 91,
+    "year": 365,
+}
+
+ACTIVITY_BUCKET_INDEXES = [
+    pymongo.IndexModel(
+        [
+            ("competitor_id", pymongo.ASCENDING),
+            ("activity_type", pymongo.ASCENDING),
+            ("granularity", pymongo.ASCENDING),
+            ("bucket_start", pymongo.ASCENDING),
+        ],
+        name="bucket_key",
+        unique=True,
+    ),
+    pymongo.IndexModel(
+        [("competitor_id", pymongo.ASCENDING), ("bucket_start", pymongo.DESCENDING)],
+        name="competitor_bucket_start",
+    ),
+    pymongo.IndexModel(
+        [("granularity", pymongo.ASCENDING), ("bucket_start", pymongo.ASCENDING)],
+        name="granularity_bucket_start",
+    ),
+]
+
+# Per-competitor daily totals, kept for the comparison matrix
+DAILY_ACTIVITY_INDEXES = [
+    pymongo.IndexModel(
+        [("competitor_id", pymongo.ASCENDING), ("day", pymongo.ASCENDING)],
+        name="competitor_day",
+        unique=True,
+    ),
+    pymongo.IndexModel([("updated_at", pymongo.ASCENDING)], name="updated_at"),
+]
+
+def get_buckets_collection() -> Any:
+    """
+    Get the MongoDB collection holding competitor activity buckets
+    """
+    return get_mongo_collection(ACTIVITY_BUCKETS_COLLECTION)
+
+def get_daily_activity_collection() -> Any:
+    """
+    Get the MongoDB collection holding per-competitor daily activity totals
+    """
+    return get_mongo_collection(DAILY_ACTIVITY_COLLECTION)
+
+def get_compaction_journal_collection() -> Any:
+    """
+    Get the MongoDB collection holding buckets claimed by a compaction run
+    """
+    return get_mongo_collection(COMPACTION_JOURNAL_COLLECTION)
+
+def ensure_activity_bucket_indexes() -> List[str]:
+    """
+    Create the indexes used by timeline queries if they don't exist
+    """
+    return get_buckets_collection().create_indexes(ACTIVITY_BUCKET_INDEXES) + get_daily_activity_collection().create_indexes(
+        DAILY_ACTIVITY_INDEXES
+    )
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    """
+    Truncate a datetime to the start of its hour, day or month bucket
+    """
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def bucket_end(start: datetime, granularity: str) -> datetime:
+    """
+    First instant after a bucket
+    """
+    if granularity == "hour":
+        return start + timedelta(hours=1)
+    if granularity == "day":
+        return start + timedelta(days=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+def granularity_for(value: datetime, now: datetime) -> str:
+    """
+    Bucket granularity for an event of a given age, matching what compaction keeps
+    """
+    age = now - value
+    if age < timedelta(days=settings.ACTIVITY_HOUR_BUCKET_RETENTION_DAYS):
+        return "hour"
+    if age < timedelta(days=settings.ACTIVITY_DAY_BUCKET_RETENTION_DAYS):
+        return "day"
+    return "month"
+
+def _bucket_update(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    increments: Dict[str, int] = {"count": len(events)}
+    for event in events:
+        sentiment = event.get("sentiment") or "unknown"
+        source = (event.get("source") or "unknown").replace(".", "_")
+        increments[f"sentiment_counts.{sentiment}"] = increments.get(f"sentiment_counts.{sentiment}", 0) + 1
+        increments[f"source_counts.{source}"] = increments.get(f"source_counts.{source}", 0) + 1
+    # Events stay sorted oldest first; only the newest ones are kept per bucket
+    return {
+        "$inc": increments,
+        "$push": {
+            "events": {
+                "$each": events,
+                "$sort": {"date": 1},
+                "$slice": -settings.ACTIVITY_BUCKET_MAX_EVENTS,
+            }
+        },
+    }
+
+def record_activities(competitor_id: str, activities: Iterable[Dict[str, Any]], now: Optional[datetime] = None) -> int:
+    """
+    Append activities to their timeline buckets
+
+    Each activity needs a ``type`` and ``date``; ``title``, ``description``,
+    ``source``, ``url`` and ``sentiment`` are stored as given.
+    """
+    now = now or datetime.utcnow()
+    grouped: Dict[Tuple[str, str, datetime], List[Dict[str, Any]]] = {}
+    for activity in activities:
+        date = activity["date"]
+        if isinstance(date, str):
+            date = datetime.fromisoformat(date.replace("Z", "+00:00")).replace(tzinfo=None)
+        granularity = granularity_for(date, now)
+        event = {
+            "id": activity.get("id") or uuid.uuid4().hex,
+            "title": activity.get("title"),
+            "description": activity.get("description"),
+            "source": activity.get("source"),
+            "url": activity.get("url"),
+            "sentiment": activity.get("sentiment"),
+            "date": date,
+        }
+        grouped.setdefault((activity["type"], granularity, bucket_start(date, granularity)), []).append(event)
+
+    operations = [
+        pymongo.UpdateOne(
+            {
+                "competitor_id": competitor_id,
+                "activity_type": activity_type,
+                "granularity": granularity,
+                "bucket_start": start,
+            },
+            _bucket_update(events),
+            upsert=True,
+        )
+        for (activity_type, granularity, start), events in grouped.items()
+    ]
+    if operations:
+        get_buckets_collection().bulk_write(operations, ordered=False)
+        _record_daily_totals(competitor_id, grouped)
+        evaluate_events(activity_events(
+            competitor_id,
+            [{**event, "type": activity_type} for (activity_type, _, _), events in grouped.items() for event in events],
+        ))
+    return sum(len(events) for events in grouped.values())
+
+def _record_daily_totals(competitor_id: str, grouped: Dict[Tuple[str, str, datetime], List[Dict[str, Any]]]) -> None:
+    increments: Dict[datetime, Dict[str, int]] = {}
+    for (activity_type, _, _), events in grouped.items():
+        for event in events:
+            day = increments.setdefault(bucket_start(event["date"], "day"), {})
+            day[f"counts.{activity_type}"] = day.get(f"counts.{activity_type}", 0) + 1
+            sentiment = event.get("sentiment") or "unknown"
+            day[f"sentiment_counts.{sentiment}"] = day.get(f"sentiment_counts.{sentiment}", 0) + 1
+    # updated_at is the write time, which readers use as a change watermark
+    updated_at = datetime.utcnow()
+    get_daily_activity_collection().bulk_write(
+        [
+            pymongo.UpdateOne(
+                {"competitor_id": competitor_id, "day": day},
+                {"$inc": day_increments, "$set": {"updated_at": updated_at}},
+                upsert=True,
+            )
+            for day, day_increments in increments.items()
+        ],
+        ordered=False,
+    )
+
+def _claim(buckets: List[Dict[str, Any]], target_granularity: str) -> List[Dict[str, Any]]:
+    """
+    Move buckets from the timeline to the compaction journal, skipping ones written to since they were read
+    """
+    collection = get_buckets_collection()
+    journal = get_compaction_journal_collection()
+    claimed = []
+    for bucket in buckets:
+        entry = {
+            **bucket,
+            "target_granularity": target_granularity,
+            "target_start": bucket_start(bucket["bucket_start"], target_granularity),
+        }
+        # Journaled first, so a crash before the delete below loses nothing
+        try:
+            journal.insert_one(entry)
+        except DuplicateKeyError:
+            pass
+        # A late write changes the count; the bucket is then left for the next run
+        if collection.delete_one({"_id": bucket["_id"], "count": bucket.get("count", 0)}).deleted_count:
+            claimed.append(entry)
+        else:
+            journal.delete_one({"_id": bucket["_id"]})
+    return claimed
+
+def _merge(entries: List[Dict[str, Any]]) -> None:
+    """
+    Add journaled buckets into their target buckets, each exactly once, and drop them from the journal
+    """
+    collection = get_buckets_collection()
+    for entry in entries:
+        increments = {"count": entry.get("count", 0)}
+        for field in ("sentiment_counts", "source_counts"):
+            for name, value in entry.get(field, {}).items():
+                increments[f"{field}.{name}"] = value
+        target = {
+            "competitor_id": entry["competitor_id"],
+            "activity_type": entry["activity_type"],
+            "granularity": entry["target_granularity"],
+            "bucket_start": entry["target_start"],
+            # Targets list the buckets merged into them, so a retried merge adds nothing
+            "compacted": {"$ne": entry["_id"]},
+        }
+        update = {
+            "$inc": increments,
+            "$push": {
+                "events": {
+                    "$each": entry.get("events", []),
+                    "$sort": {"date": 1},
+                    "$slice": -settings.ACTIVITY_BUCKET_MAX_EVENTS,
+                }
+            },
+            "$addToSet": {"compacted": entry["_id"]},
+        }
+        try:
+            collection.update_one(target, update, upsert=True)
+        except DuplicateKeyError:
+            # The target exists: it already holds this bucket, or a writer created it meanwhile
+            collection.update_one(target, update)
+        get_compaction_journal_collection().delete_one({"_id": entry["_id"]})
+
+def _compact(source_granularity: str, target_granularity: str, cutoff: datetime, batch_size: int) -> int:
+    collection = get_buckets_collection()
+    query = {"granularity": source_granularity, "bucket_start": {"$lt": bucket_start(cutoff, target_granularity)}}
+    compacted = 0
+    while True:
+        buckets = list(collection.find(query).sort("_id", pymongo.ASCENDING).limit(batch_size))
+        if not buckets:
+            return compacted
+        claimed = _claim(buckets, target_granularity)
+        _merge(claimed)
+        compacted += len(claimed)
+        if not claimed:
+            # Every bucket read was written to meanwhile; the next run retries them
+            return compacted
+
+def _resume_compaction() -> int:
+    """
+    Finish the merges of a compaction run that stopped part way
+    """
+    collection = get_buckets_collection()
+    journal = get_compaction_journal_collection()
+    entries = []
+    for entry in journal.find():
+        # Still in the timeline: the run stopped before claiming it
+        if collection.count_documents({"_id": entry["_id"]}, limit=1):
+            journal.delete_one({"_id": entry["_id"]})
+        else:
+            entries.append(entry)
+    _merge(entries)
+    return len(entries)
+
+def compact_activity_buckets(now: Optional[datetime] = None, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Roll old hour buckets into day buckets and old day buckets into month buckets
+
+    Each bucket is moved to a journal before it is merged, and targets record
+    the buckets merged into them, so a run can stop at any point and the next
+    one finishes its work without counting anything twice. One process at a
+    time should compact; run_compaction_loop holds a lock for it.
+    """
+    now = now or datetime.utcnow()
+    # Retried merges rely on the unique bucket_key index, whatever MONGODB_ENSURE_INDEXES says
+    ensure_activity_bucket_indexes()
+    return {
+        "resumed": _resume_compaction(),
+        "hour_buckets_compacted": _compact(
+            "hour", "day", now - timedelta(days=settings.ACTIVITY_HOUR_BUCKET_RETENTION_DAYS), batch_size
+        ),
+        "day_buckets_compacted": _compact(
+            "day", "month", now - timedelta(days=settings.ACTIVITY_DAY_BUCKET_RETENTION_DAYS), batch_size
+        ),
+    }
+
+def get_timeline(
+    competitor_id: str,
+    activity_type: Optional[str] = None,
+    time_period: str = "month",
+    limit: int = 20,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Read counts and the most recent events for a competitor over a period
+
+    Counts come from the precomputed per-bucket totals; events are read from
+    the newest buckets until ``limit`` is reached. Coarse buckets that only
+    partly overlap the period contribute the counts of their stored events.
+    """
+    now = now or datetime.utcnow()
+    since = now - timedelta(days=TIME_PERIOD_DAYS[time_period])
+    query: Dict[str, Any] = {
+        "competitor_id": competitor_id,
+        # A month bucket starting before the period may still overlap it
+        "bucket_start": {"$gte": bucket_start(since, "month"), "$lte": now},
+    }
+    if activity_type:
+        query["activity_type"] = activity_type
+    collection = get_buckets_collection()
+
+    by_type: Dict[str, int] = {}
+    by_sentiment: Dict[str, int] = {}
+    buckets_read = 0
+    for bucket in collection.find(query, {"events": 0}):
+        if bucket_end(bucket["bucket_start"], bucket["granularity"]) <= since:
+            continue
+        buckets_read += 1
+        if bucket["bucket_start"] >= since:
+            count = bucket.get("count", 0)
+            sentiments = bucket.get("sentiment_counts", {})
+        else:
+            events = collection.find_one({"_id": bucket["_id"]}, {"events": 1}).get("events", [])
+            in_period = [event for event in events if event["date"] >= since]
+            count = len(in_period)
+            sentiments = {}
+            for event in in_period:
+                sentiment = event.get("sentiment") or "unknown"
+                sentiments[sentiment] = sentiments.get(sentiment, 0) + 1
+        by_type[bucket["activity_type"]] = by_type.get(bucket["activity_type"], 0) + count
+        for sentiment, value in sentiments.items():
+            by_sentiment[sentiment] = by_sentiment.get(sentiment, 0) + value
+
+    activities: List[Dict[str, Any]] = []
+    for bucket in collection.find(query).sort("bucket_start", pymongo.DESCENDING):
+        if len(activities) >= limit:
+            activities.sort(key=lambda activity: activity["date"], reverse=True)
+            del activities[limit:]
+            # Older buckets cannot hold anything newer than what is already kept
+            if bucket_end(bucket["bucket_start"], bucket["granularity"]) <= activities[-1]["date"]:
+                break
+        for event in bucket.get("events", []):
+            if event["date"] >= since:
+                activities.append({**event, "type": bucket["activity_type"]})
+    activities.sort(key=lambda activity: activity["date"], reverse=True)
+    activities = [{**activity, "date": activity["date"].isoformat() + "Z"} for activity in activities[:limit]]
+
+    return {
+        "counts": {
+            "total": sum(by_type.values()),
+            "by_type": by_type,
+            "by_sentiment": by_sentiment,
+        },
+        "buckets_read": buckets_read,
+        "activities": activities,
+    }
+
+def run_compaction_loop(stop_event: threading.Event) -> None:
+    """
+    Compact activity buckets every interval; one API worker at a time holds the lock
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    interval = settings.ACTIVITY_COMPACTION_INTERVAL_SECONDS
+    while not stop_event.is_set():
+        lock_seconds = max(int(interval * 2), 1)
+        try:
+            acquired = redis_client.set(COMPACTION_LOCK_KEY, owner, nx=True, ex=lock_seconds)
+            if acquired or redis_client.get(COMPACTION_LOCK_KEY) == owner:
+                redis_client.expire(COMPACTION_LOCK_KEY, lock_seconds)
+                compaction_logger.info("Activity compaction: %s", compact_activity_buckets())
+        except Exception:
+            # A datastore outage skips this run instead of ending the thread
+            compaction_logger.exception("Activity compaction failed")
+        stop_event.wait(interval)
+
+def start_compaction_scheduler() -> threading.Event:
+    """
+    Start the compaction loop in a daemon thread and return its stop event
+    """
+    stop_event = threading.Event()
+    threading.Thread(target=run_compaction_loop, args=(stop_event,), name="activity-compaction", daemon=True).start()
+    return stop_event
+
+if __name__ == "__main__":
+    # One-off compaction, e.g. from cron when the background loop is disabled:
+    #     python -m app.services.activity_timeline
+    print(compact_activity_buckets())
@@ -0,0 +1,627 @@
+import logging
+import operator
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.core.config import settings
+from app.core.database import get_mongo_collection, redis_client
+from app.services.live_events import publish_event
+
+ALERT_RULES_COLLECTION = "alert_rules"
+ALERT_NOTIFICATIONS_COLLECTION = "alert_notifications"
+
+# Bumped on every rule change so other processes rebuild their index
+RULES_VERSION_KEY = "alert_rules:version"
+DEBOUNCE_KEY_PREFIX = "alert_rules:debounce:"
+
+alerts_logger = logging.getLogger("app.alert_engine")
+
+ALERT_RULE_INDEXES = [
+    pymongo.IndexModel([("user_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="user_created_at"),
+    pymongo.IndexModel([("active", pymongo.ASCENDING)], name="active"),
+]
+
+ALERT_NOTIFICATION_INDEXES = [
+    pymongo.IndexModel([("user_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="user_created_at"),
+]
+
+# Event metrics rules can watch, and what produces them
+METRICS = {
+    "price_change": "A tracked competitor product changed price",
+    "new_product": "A tracked competitor added a product",
+    "product_removed": "A tracked competitor removed a product",
+    "feature_change": "A tracked competitor product changed features",
+    "activity": "A competitor activity was recorded",
+    "mention": "A collected document mentions an entity; its value is the sentiment score",
+    "sentiment_shift": "An entity's recent sentiment score moved away from its baseline; its value is the change",
+}
+
+PRODUCT_CHANGE_METRICS = {
+    "created": "new_product",
+    "removed": "product_removed",
+    "price": "price_change",
+    "features": "feature_change",
+}
+
+OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+SENTIMENT_SCORES = {"positive": 1.0, "neutral": 0.5, "negative": 0.0}
+
+# Rules match any value of a dimension they don't set
+WILDCARD = "*"
+
+# An event is a dict with a "metric", optional "competitor_id", "entity" and
+# "source" it is indexed on, an optional numeric "value" for conditions, a
+# "text" keywords are matched against, a "title" and an "occurred_at".
+Event = Dict[str, Any]
+
+@dataclass(frozen=True)
+class CompiledRule:
+    id: str
+    user_id: int
+    name: str
+    metric: str
+    competitor_id: Optional[str]
+    entity: Optional[str]
+    source: Optional[str]
+    compare: Optional[Callable[[float, float], bool]]
+    threshold: Optional[float]
+    keywords: Tuple[str, ...]
+    debounce_seconds: int
+
+    @property
+    def key(self) -> Tuple[str, str, str, str]:
+        return (
+            self.metric,
+            self.competitor_id or WILDCARD,
+            self.entity.lower() if self.entity else WILDCARD,
+            self.source or WILDCARD,
+        )
+
+def compile_rule(rule: Dict[str, Any]) -> CompiledRule:
+    """
+    Compile a stored rule into its indexed, ready-to-evaluate form
+    """
+    condition = rule.get("condition") or {}
+    return CompiledRule(
+        id=str(rule["_id"]),
+        user_id=rule["user_id"],
+        name=rule["name"],
+        metric=rule["metric"],
+        competitor_id=rule.get("competitor_id"),
+        entity=rule.get("entity"),
+        source=rule.get("source"),
+        compare=OPERATORS[condition["op"]] if condition else None,
+        threshold=condition.get("threshold"),
+        keywords=tuple(keyword.lower() for keyword in rule.get("keywords") or []),
+        debounce_seconds=rule["debounce_minutes"] * 60,
+    )
+
+def rule_matches(rule: CompiledRule, event: Event) -> bool:
+    """
+    Whether an event that hit a rule's index key also meets its condition and keywords
+    """
+    if rule.compare is not None:
+        if event.get("value") is None or not rule.compare(event["value"], rule.threshold):
+            return False
+    if rule.keywords:
+        if "_text" not in event:
+            event["_text"] = (event.get("text") or "").lower()
+        if not any(keyword in event["_text"] for keyword in rule.keywords):
+            return False
+    return True
+
+class RuleIndex:
+    """
+    Active rules bucketed by (metric, competitor, entity, source), each possibly a wildcard
+
+    An event is only checked against the rules of the at most eight keys it
+    can match, instead of every rule.
+    """
+
+    def __init__(self) -> None:
+        self.rules: Dict[str, CompiledRule] = {}
+        self.buckets: Dict[Tuple[str, str, str, str], List[CompiledRule]] = {}
+        self.metric_counts: Dict[str, int] = {}
+
+    def add(self, rule: CompiledRule) -> None:
+        self.remove(rule.id)
+        self.rules[rule.id] = rule
+        self.buckets.setdefault(rule.key, []).append(rule)
+        self.metric_counts[rule.metric] = self.metric_counts.get(rule.metric, 0) + 1
+
+    def remove(self, rule_id: str) -> None:
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return
+        bucket = [other for other in self.buckets[rule.key] if other.id != rule_id]
+        if bucket:
+            self.buckets[rule.key] = bucket
+        else:
+            del self.buckets[rule.key]
+        self.metric_counts[rule.metric] -= 1
+
+    def candidates(self, event: Event) -> Iterable[CompiledRule]:
+        """
+        Rules whose key matches an event
+        """
+        metric = event["metric"]
+        if not self.metric_counts.get(metric):
+            return
+        competitors = (event["competitor_id"], WILDCARD) if event.get("competitor_id") else (WILDCARD,)
+        entities = (event["entity"].lower(), WILDCARD) if event.get("entity") else (WILDCARD,)
+        sources = (event["source"], WILDCARD) if event.get("source") else (WILDCARD,)
+        for competitor in competitors:
+            for entity in entities:
+                for source in sources:
+                    yield from self.buckets.get((metric, competitor, entity, source), ())
+
+    def match(self, event: Event) -> List[CompiledRule]:
+        return [rule for rule in self.candidates(event) if rule_matches(rule, event)]
+
+class SentimentTracker:
+    """
+    Rolling per-entity sentiment counts in fixed-size time buckets
+
+    Kept in the ingesting process; a shift compares the score of the last
+    ALERT_SENTIMENT_WINDOW_MINUTES with the baseline before it.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: Dict[str, Dict[int, List[float]]] = {}
+        # Ingestion threads add and read shifts concurrently
+        self.lock = threading.Lock()
+
+    def add(self, entity: str, score: float, at: datetime) -> None:
+        bucket = int(at.timestamp()) // (settings.ALERT_SENTIMENT_BUCKET_MINUTES * 60)
+        with self.lock:
+            counts = self.buckets.setdefault(entity, {}).setdefault(bucket, [0, 0.0])
+            counts[0] += 1
+            counts[1] += score
+
+    def shift(self, entity: str, now: datetime) -> Optional[Tuple[float, int]]:
+        """
+        Change of the entity's window score against its baseline, with the window's mentions
+        """
+        bucket_seconds = settings.ALERT_SENTIMENT_BUCKET_MINUTES * 60
+        current = int(now.timestamp()) // bucket_seconds
+        window = max(settings.ALERT_SENTIMENT_WINDOW_MINUTES * 60 // bucket_seconds, 1)
+        horizon = window + settings.ALERT_SENTIMENT_BASELINE_HOURS * 3600 // bucket_seconds
+        recent = [0, 0.0]
+        baseline = [0, 0.0]
+        with self.lock:
+            buckets = self.buckets.get(entity, {})
+            for bucket in [bucket for bucket in buckets if bucket <= current - horizon]:
+                del buckets[bucket]
+            for bucket, (count, total) in buckets.items():
+                target = recent if bucket > current - window else baseline
+                target[0] += count
+                target[1] += total
+        if recent[0] < settings.ALERT_SENTIMENT_MIN_MENTIONS or baseline[0] < settings.ALERT_SENTIMENT_MIN_MENTIONS:
+            return None
+        return round(recent[1] / recent[0] - baseline[1] / baseline[0], 4), recent[0]
+
+class AlertEngine:
+    """
+    Evaluates events against the rule index, debouncing and batching notifications
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.index = RuleIndex()
+        self.version: Optional[str] = None
+        self.checked_at = 0.0
+        self.sentiment = SentimentTracker()
+        # Rule id -> monotonic time until which it is debounced in this process
+        self.debounced_until: Dict[str, float] = {}
+        self.pending: List[Dict[str, Any]] = []
+        self.suppressed: Dict[str, int] = {}
+        self.flush_timer: Optional[threading.Timer] = None
+        self.stats = {"events": 0, "candidates": 0, "matches": 0, "suppressed": 0, "notifications": 0, "rebuilds": 0}
+
+    def rebuild(self) -> None:
+        index = RuleIndex()
+        for rule in get_alert_rules_collection().find({"active": True}):
+            index.add(compile_rule(rule))
+        self.index = index
+        self.stats["rebuilds"] += 1
+
+    def ensure_fresh(self) -> None:
+        """
+        Rebuild the index when another process changed rules, checking at most every few seconds
+        """
+        if time.monotonic() - self.checked_at < settings.ALERT_RULES_REFRESH_SECONDS and self.version is not None:
+            return
+        with self.lock:
+            version = redis_client.get(RULES_VERSION_KEY) or "0"
+            if version != self.version:
+                self.rebuild()
+                self.version = version
+            self.checked_at = time.monotonic()
+
+    def rule_changed(self, rule: Dict[str, Any], removed: bool = False) -> None:
+        """
+        Apply a rule change to this process's index and tell the others to rebuild
+        """
+        with self.lock:
+            if removed or not rule.get("active", True):
+                self.index.remove(str(rule["_id"]))
+            else:
+                self.index.add(compile_rule(rule))
+            version = str(redis_client.incr(RULES_VERSION_KEY))
+            # Only skip the rebuild if no other change happened in between
+            if self.version is not None and int(version) == int(self.version) + 1:
+                self.version = version
+
+    def _debounced(self, rule: CompiledRule, now: float) -> bool:
+        if self.debounced_until.get(rule.id, 0.0) > now:
+            return True
+        self.debounced_until[rule.id] = now + rule.debounce_seconds
+        if rule.debounce_seconds <= 0:
+            return False
+        # Shared across processes so each worker does not alert on its own
+        return not redis_client.set(DEBOUNCE_KEY_PREFIX + rule.id, 1, nx=True, ex=rule.debounce_seconds)
+
+    def evaluate(self, events: Iterable[Event]) -> int:
+        """
+        Queue notifications for every rule the events match, returning the number of matches
+        """
+        self.ensure_fresh()
+        index = self.index
+        matches = 0
+        now = time.monotonic()
+        with self.lock:
+            for event in events:
+                self.stats["events"] += 1
+                for rule in index.candidates(event):
+                    self.stats["candidates"] += 1
+                    if not rule_matches(rule, event):
+                        continue
+                    matches += 1
+                    if self._debounced(rule, now):
+                        self.suppressed[rule.id] = self.suppressed.get(rule.id, 0) + 1
+                        self.stats["suppressed"] += 1
+                        continue
+                    self.pending.append({
+                        "rule_id": rule.id,
+                        "user_id": rule.user_id,
+                        "rule_name": rule.name,
+                        "metric": rule.metric,
+                        "competitor_id": event.get("competitor_id"),
+                        "entity": event.get("entity"),
+                        "source": event.get("source"),
+                        "value": event.get("value"),
+                        "title": event.get("title"),
+                        "occurred_at": event.get("occurred_at") or datetime.utcnow(),
+                    })
+            self.stats["matches"] += matches
+            full = len(self.pending) >= settings.ALERT_BATCH_SIZE
+            if self.pending and not full and self.flush_timer is None:
+                # Notifications wait at most ALERT_BATCH_SECONDS for more to batch with
+                self.flush_timer = threading.Timer(settings.ALERT_BATCH_SECONDS, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+        if full:
+            self.flush()
+        return matches
+
+    def flush(self) -> int:
+        """
+        Store pending alerts as one notification per user, returning the number stored
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+            suppressed, self.suppressed = self.suppressed, {}
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+        if not pending and not suppressed:
+            return 0
+
+        now = datetime.utcnow()
+        by_user: Dict[int, List[Dict[str, Any]]] = {}
+        for alert in pending:
+            by_user.setdefault(alert["user_id"], []).append({key: value for key, value in alert.items() if key != "user_id"})
+        if by_user:
+            notifications = [
+                {"user_id": user_id, "alerts": alerts, "count": len(alerts), "read": False, "created_at": now}
+                for user_id, alerts in by_user.items()
+            ]
+            get_alert_notifications_collection().insert_many(notifications)
+            for notification in notifications:
+                publish_event(notification["user_id"], "alert", serialize_notification(notification))
+        triggered: Dict[str, int] = {}
+        for alert in pending:
+            triggered[alert["rule_id"]] = triggered.get(alert["rule_id"], 0) + 1
+        operations = []
+        for rule_id in set(triggered) | set(suppressed):
+            update: Dict[str, Any] = {"$inc": {"trigger_count": triggered.get(rule_id, 0), "suppressed_count": suppressed.get(rule_id, 0)}}
+            if rule_id in triggered:
+                update["$set"] = {"last_triggered_at": now}
+            operations.append(pymongo.UpdateOne({"_id": ObjectId(rule_id)}, update))
+        get_alert_rules_collection().bulk_write(operations, ordered=False)
+        self.stats["notifications"] += len(by_user)
+        return len(by_user)
+
+_engine: Optional[AlertEngine] = None
+_engine_lock = threading.Lock()
+
+def get_alert_engine() -> AlertEngine:
+    """
+    Get the alert engine of this process
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AlertEngine()
+        return _engine
+
+def get_alert_rules_collection() -> Any:
+    """
+    Get the MongoDB collection holding alert rules
+    """
+    return get_mongo_collection(ALERT_RULES_COLLECTION)
+
+def get_alert_notifications_collection() -> Any:
+    """
+    Get the MongoDB collection holding batched alert notifications
+    """
+    return get_mongo_collection(ALERT_NOTIFICATIONS_COLLECTION)
+
+def ensure_alert_indexes() -> List[str]:
+    """
+    Create the indexes used by alert rules and notifications if they don't exist
+    """
+    return get_alert_rules_collection().create_indexes(ALERT_RULE_INDEXES) + get_alert_notifications_collection().create_indexes(
+        ALERT_NOTIFICATION_INDEXES
+    )
+
+def to_rule_id(rule_id: str) -> Optional[ObjectId]:
+    """
+    Parse a rule id, returning None when it is malformed
+    """
+    try:
+        return ObjectId(rule_id)
+    except (InvalidId, TypeError):
+        return None
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() + "Z" if value else None
+
+def serialize_rule(rule: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert an alert rule document into the API representation
+    """
+    return {
+        "id": str(rule["_id"]),
+        "name": rule["name"],
+        "metric": rule["metric"],
+        "competitor_id": rule.get("competitor_id"),
+        "entity": rule.get("entity"),
+        "source": rule.get("source"),
+        "condition": rule.get("condition"),
+        "keywords": rule.get("keywords"),
+        "debounce_minutes": rule["debounce_minutes"],
+        "active": rule["active"],
+        "trigger_count": rule.get("trigger_count", 0),
+        "suppressed_count": rule.get("suppressed_count", 0),
+        "last_triggered_at": _isoformat(rule.get("last_triggered_at")),
+        "created_at": _isoformat(rule["created_at"]),
+    }
+
+def serialize_notification(notification: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a notification document into the API representation
+    """
+    return {
+        "id": str(notification["_id"]),
+        "count": notification["count"],
+        "read": notification["read"],
+        "created_at": _isoformat(notification["created_at"]),
+        "alerts": [
+            {**alert, "occurred_at": _isoformat(alert.get("occurred_at"))}
+            for alert in notification["alerts"]
+        ],
+    }
+
+def create_rule(user_id: int, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store an alert rule and add it to the rule index
+    """
+    rule = {
+        "user_id": user_id,
+        **fields,
+        "active": True,
+        "trigger_count": 0,
+        "suppressed_count": 0,
+        "last_triggered_at": None,
+        "created_at": datetime.utcnow(),
+    }
+    rule["_id"] = get_alert_rules_collection().insert_one(rule).inserted_id
+    get_alert_engine().rule_changed(rule)
+    return rule
+
+def list_rules(user_id: int) -> List[Dict[str, Any]]:
+    """
+    List a user's alert rules
+    """
+    return list(get_alert_rules_collection().find({"user_id": user_id}).sort("created_at", pymongo.DESCENDING))
+
+def set_rule_active(rule_id: str, user_id: int, active: bool) -> Optional[Dict[str, Any]]:
+    """
+    Pause or resume one of a user's alert rules
+    """
+    object_id = to_rule_id(rule_id)
+    if object_id is None:
+        return None
+    rule = get_alert_rules_collection().find_one_and_update(
+        {"_id": object_id, "user_id": user_id},
+        {"$set": {"active": active}},
+        return_document=pymongo.ReturnDocument.AFTER,
+    )
+    if rule is not None:
+        get_alert_engine().rule_changed(rule)
+    return rule
+
+def delete_rule(rule_id: str, user_id: int) -> bool:
+    """
+    Delete one of a user's alert rules
+    """
+    object_id = to_rule_id(rule_id)
+    if object_id is None:
+        return False
+    if not get_alert_rules_collection().delete_one({"_id": object_id, "user_id": user_id}).deleted_count:
+        return False
+    get_alert_engine().rule_changed({"_id": object_id}, removed=True)
+    return True
+
+def list_notifications(user_id: int, unread_only: bool = False, limit: int = 20, skip: int = 0) -> Dict[str, Any]:
+    """
+    List a user's alert notifications newest first
+    """
+    query: Dict[str, Any] = {"user_id": user_id}
+    if unread_only:
+        query["read"] = False
+    collection = get_alert_notifications_collection()
+    notifications = collection.find(query).sort("created_at", pymongo.DESCENDING).skip(skip).limit(limit)
+    return {"total": collection.count_documents(query), "notifications": list(notifications)}
+
+def mark_notifications_read(user_id: int) -> int:
+    """
+    Mark all of a user's notifications as read
+    """
+    return get_alert_notifications_collection().update_many({"user_id": user_id, "read": False}, {"$set": {"read": True}}).modified_count
+
+def document_events(documents: Iterable[Dict[str, Any]], engine: AlertEngine) -> List[Event]:
+    """
+    Mention events of collected documents, plus sentiment shifts of the entities they mention
+    """
+    events = []
+    touched = set()
+    track_sentiment = bool(engine.index.metric_counts.get("sentiment_shift"))
+    for document in documents:
+        score = SENTIMENT_SCORES.get(document.get("sentiment") or "")
+        occurred_at = document.get("collected_at") or datetime.utcnow()
+        text = " ".join(str(document.get(field) or "") for field in ("title", "content"))
+        for entity in document.get("entities") or [None]:
+            events.append({
+                "metric": "mention",
+                "entity": entity,
+                "source": document.get("source"),
+                "value": score,
+                "text": text,
+                "title": document.get("title") or text[:120],
+                "occurred_at": occurred_at,
+            })
+            if track_sentiment and entity and score is not None:
+                engine.sentiment.add(entity, score, occurred_at)
+                touched.add(entity)
+    now = datetime.utcnow()
+    for entity in touched:
+        shift = engine.sentiment.shift(entity, now)
+        if shift is not None:
+            change, mentions = shift
+            events.append({
+                "metric": "sentiment_shift",
+                "entity": entity,
+                "value": change,
+                "title": f"Sentiment for {entity} moved {change:+.2f} over {mentions} recent mentions",
+                "occurred_at": now,
+            })
+    return events
+
+def _price_change_percent(delta: Dict[str, Any]) -> Optional[float]:
+    previous = delta.get("previous", {}).get("price")
+    current = delta["set"].get("price")
+    if not isinstance(previous, (int, float)) or not isinstance(current, (int, float)) or not previous:
+        return None
+    return round((current - previous) / previous * 100, 2)
+
+def product_change_events(changes: Iterable[Dict[str, Any]]) -> List[Event]:
+    """
+    Events of recorded product changes; a price change's value is its percent change when prices are numeric
+    """
+    events = []
+    for change in changes:
+        for change_type in change["change_types"]:
+            metric = PRODUCT_CHANGE_METRICS.get(change_type)
+            if metric is None:
+                continue
+            events.append({
+                "metric": metric,
+                "competitor_id": change["competitor_id"],
+                "entity": change["product_key"],
+                "value": _price_change_percent(change["delta"]) if metric == "price_change" else None,
+                "text": change["summary"],
+                "title": change["summary"],
+                "occurred_at": change["changed_at"],
+            })
+    return events
+
+def activity_events(competitor_id: str, activities: Iterable[Dict[str, Any]]) -> List[Event]:
+    """
+    Events of recorded competitor activities; the value is the activity's sentiment score
+    """
+    return [
+        {
+            "metric": "activity",
+            "competitor_id": competitor_id,
+            "source": activity.get("source"),
+            "value": SENTIMENT_SCORES.get(activity.get("sentiment") or ""),
+            "text": " ".join(str(activity.get(field) or "") for field in ("type", "title", "description")),
+            "title": activity.get("title"),
+            "occurred_at": activity.get("date"),
+        }
+        for activity in activities
+    ]
+
+def evaluate_documents(documents: Iterable[Dict[str, Any]]) -> int:
+    """
+    Evaluate newly collected documents against alert rules when alerts are enabled
+    """
+    if not settings.ALERTS_ENABLED:
+        return 0
+    try:
+        engine = get_alert_engine()
+        engine.ensure_fresh()
+        return engine.evaluate(document_events(documents, engine))
+    except Exception:
+        # Alerts are best effort; a rule store or Redis outage must not fail ingestion
+        alerts_logger.exception("Could not evaluate alert rules for collected documents")
+        return 0
+
+def evaluate_events(events: Iterable[Event]) -> int:
+    """
+    Evaluate competitor events (product changes, activities) against alert rules when alerts are enabled
+    """
+    if not settings.ALERTS_ENABLED:
+        return 0
+    try:
+        return get_alert_engine().evaluate(events)
+    except Exception:
+        alerts_logger.exception("Could not evaluate alert rules for competitor events")
+        return 0
+
+def flush_alerts() -> int:
+    """
+    Store pending notifications now, e.g. at the end of an import or on shutdown
+    """
+    if not settings.ALERTS_ENABLED or _engine is None:
+        return 0
+    try:
+        return _engine.flush()
+    except Exception:
+        alerts_logger.exception("Could not store pending alert notifications")
+        return 0
@@ -0,0 +1,184 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from app.core.config import settings
+from app.services import parquet_store
+from app.services.collected_data import get_collected_data_collection
+from app.services.report_sections import SENTIMENT_SCORES, day_key
+
+# Analysis aggregates over slices of collected data loaded as DataFrames with
+# only the columns a query needs: from the Parquet store when it is enabled,
+# otherwise from MongoDB.
+
+COMPARISON_METRICS = ["sentiment", "volume", "trend"]
+
+RELATED_ENTITIES = 3
+
+def load_documents(
+    columns: List[str],
+    start: datetime,
+    end: datetime,
+    sources: Optional[List[str]] = None,
+    entities: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Columns of the documents collected in [start, end); ``date`` is the YYYY-MM-DD day they were collected
+    """
+    if settings.PARQUET_STORE_ENABLED:
+        return parquet_store.scan(columns, start, end, sources, entities).to_pandas()
+    query: Dict[str, Any] = {"collected_at": {"$gte": start, "$lt": end}}
+    if sources:
+        query["source"] = {"$in": sources}
+    if entities:
+        query["entities"] = {"$in": entities}
+    stored = [column for column in columns if column != "date"]
+    documents = get_collected_data_collection().find(query, {"_id": 0, "collected_at": 1, **{column: 1 for column in stored}})
+    frame = pd.DataFrame(list(documents), columns=list(dict.fromkeys(["collected_at", *stored])))
+    if "date" in columns:
+        frame["date"] = pd.to_datetime(frame["collected_at"]).dt.strftime("%Y-%m-%d")
+    return frame[columns]
+
+def _scores(sentiment: pd.Series) -> pd.Series:
+    # Unlabeled documents have no score and are left out of averages
+    return sentiment.map(SENTIMENT_SCORES).astype(float)
+
+def daily_sentiment(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Volume, sentiment label counts and score per day and source, from ``date``, ``source`` and ``sentiment`` columns
+    """
+    if frame.empty:
+        return []
+    frame = frame.assign(sentiment=frame["sentiment"].fillna("unknown"), score=_scores(frame["sentiment"]))
+    counts = frame.groupby(["date", "source", "sentiment"]).size().unstack(fill_value=0)
+    scores = frame.groupby(["date", "source"])["score"].mean()
+    daily = []
+    for (day, source), row in counts.iterrows():
+        score = scores.get((day, source))
+        daily.append({
+            "date": day,
+            "source": source,
+            "volume": int(row.sum()),
+            **{label: int(count) for label, count in row.items() if count},
+            "score": None if pd.isna(score) else round(float(score), 4),
+        })
+    return daily
+
+def entity_stats(frame: pd.DataFrame, window_start: datetime, window_end: datetime) -> pd.DataFrame:
+    """
+    Mentions and sentiment per entity over the window and its two halves, from ``date``, ``sentiment`` and ``entities`` columns
+    """
+    mentions = frame[["date", "sentiment", "entities"]].explode("entities").dropna(subset=["entities"])
+    if mentions.empty:
+        return pd.DataFrame(columns=["volume", "earlier", "later", "score", "earlier_score", "later_score"])
+    midpoint = day_key(window_start + (window_end - window_start) / 2)
+    mentions = mentions.assign(later=mentions["date"] >= midpoint, score=_scores(mentions["sentiment"]))
+    by_entity = mentions.groupby("entities")
+    by_half = mentions.groupby(["entities", "later"])
+    halves = by_half.size().unstack(fill_value=0).reindex(columns=[False, True], fill_value=0)
+    half_scores = by_half["score"].mean().unstack().reindex(columns=[False, True])
+    return pd.DataFrame({
+        "volume": by_entity.size(),
+        "earlier": halves[False],
+        "later": halves[True],
+        "score": by_entity["score"].mean(),
+        "earlier_score": half_scores[False],
+        "later_score": half_scores[True],
+    })
+
+def related_entities(frame: pd.DataFrame, entities: List[str]) -> Dict[str, List[str]]:
+    """
+    Entities most often mentioned together with each of the given ones
+    """
+    mentions = frame["entities"].explode().dropna()
+    pairs = mentions[mentions.isin(entities)].to_frame("entity").join(mentions.rename("related"), how="inner")
+    pairs = pairs[pairs["entity"] != pairs["related"]]
+    counts = pairs.groupby(["entity", "related"]).size().sort_values(ascending=False)
+    related: Dict[str, List[str]] = {entity: [] for entity in entities}
+    for entity, other in counts.index:
+        if len(related[entity]) < RELATED_ENTITIES:
+            related[entity].append(other)
+    return related
+
+def _change_percent(earlier: int, later: int) -> Optional[float]:
+    return round((later - earlier) / earlier * 100, 2) if earlier else None
+
+def _round(value: Any) -> Optional[float]:
+    return None if pd.isna(value) else round(float(value), 4)
+
+def entity_trends(
+    frame: pd.DataFrame,
+    window_start: datetime,
+    window_end: datetime,
+    topic: Optional[str] = None,
+    limit: int = 10,
+) -> List[Dict[str, Any]]:
+    """
+    Most mentioned entities, or the topic entity, with their change in mentions and sentiment from the first half of the window to the second
+    """
+    stats = entity_stats(frame, window_start, window_end)
+    if topic is not None:
+        stats = stats[stats.index == topic]
+    top = stats.sort_values("volume", ascending=False, kind="stable").head(limit)
+    related = related_entities(frame, list(top.index))
+    trends = []
+    for entity, row in top.iterrows():
+        change = _change_percent(int(row["earlier"]), int(row["later"]))
+        shift = row["later_score"] - row["earlier_score"]
+        trends.append({
+            "topic": entity,
+            "trend": "rising" if row["later"] > row["earlier"] else "falling" if row["later"] < row["earlier"] else "stable",
+            "mentions": int(row["volume"]),
+            "change_percent": change,
+            "sentiment_shift": _round(shift),
+            "related_terms": related[entity],
+        })
+    return trends
+
+def compare_entities(
+    frame: pd.DataFrame,
+    entities: List[str],
+    metrics: List[str],
+    window_start: datetime,
+    window_end: datetime,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Sentiment score, mention volume and volume trend (change from the first half of the window, as a fraction) of entities
+    """
+    stats = entity_stats(frame, window_start, window_end).reindex(entities)
+    # Entities without mentions in the window
+    stats[["volume", "earlier", "later"]] = stats[["volume", "earlier", "later"]].fillna(0)
+    comparison: Dict[str, Dict[str, Any]] = {}
+    for metric in metrics:
+        values = {}
+        for entity, row in stats.iterrows():
+            if metric == "sentiment":
+                values[entity] = _round(row["score"])
+            elif metric == "volume":
+                values[entity] = int(row["volume"])
+            else:
+                change = _change_percent(int(row["earlier"]), int(row["later"]))
+                values[entity] = None if change is None else round(change / 100, 4)
+        comparison[metric] = values
+    return comparison
+
+def detect_trends(source: str, window_start: datetime, window_end: datetime, topic: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Entity trends and daily sentiment of a source, optionally of the documents mentioning one topic entity
+    """
+    frame = load_documents(
+        ["date", "source", "sentiment", "entities"], window_start, window_end, [source], [topic] if topic else None
+    )
+    return {
+        "documents": len(frame),
+        "trends": entity_trends(frame, window_start, window_end, topic),
+        "daily": daily_sentiment(frame),
+    }
+
+def compare(entities: List[str], metrics: List[str], window_start: datetime, window_end: datetime) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare entities over every source
+    """
+    frame = load_documents(["date", "sentiment", "entities"], window_start, window_end, entities=entities)
+    return compare_entities(frame, entities, metrics, window_start, window_end)
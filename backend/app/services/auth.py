@@ -6,7 +6,7 @@ from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import SessionLocal, get_db
 from app.core.security import verify_password
 from app.models.user import User
 from app.schemas.token import TokenPayload
@@ -63,4 +63,29 @@ async def get_current_active_superuser(
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
         )
-    return current_user 
\ No newline at end of file
+    return current_user 
+
+def is_superuser_token(token: str) -> bool:
+    """
+    Whether a bearer token belongs to an active superuser, for checks made outside route dependencies
+    """
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except JWTError:
+        return False
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == payload.get("sub")).first()
+    finally:
+        db.close()
+    return user is not None and user.is_active and user.is_superuser
+
+def token_subject(token: str) -> Optional[str]:
+    """
+    The user a bearer token was issued to, checking only its signature and expiry
+    """
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    except JWTError:
+        return None
+    return payload.get("sub")
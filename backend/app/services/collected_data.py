@@ -0,0 +1,493 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.database import get_mongo_collection
+from app.core.responses import dumps_json
+from app.services.nlp_models import embed_texts
+from app.services.search_index import get_search_index, index_collected_documents
+from app.services.vector_index import embed_collected_documents, get_vector_index
+
+COLLECTED_DATA_COLLECTION = "collected_data"
+
+# Fields callers may request through the ``fields`` projection parameter
+COLLECTED_DATA_FIELDS = [
+    "id",
+    "source",
+    "query",
+    "url",
+    "content",
+    "metadata",
+    "sentiment",
+    "entities",
+    "collected_at",
+]
+
+# Every list query sorts on (collected_at, _id) so that keyset pagination can
+# resume from the last document seen instead of skipping over earlier pages
+SORT_ORDER = [("collected_at", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+
+# Keyword filters fall back to $text, which fails without this index
+TEXT_INDEX = pymongo.IndexModel([("content", pymongo.TEXT)], name="content_text")
+
+COLLECTED_DATA_INDEXES = [
+    pymongo.IndexModel(
+        [("source", pymongo.ASCENDING)] + SORT_ORDER,
+        name="source_collected_at",
+    ),
+    pymongo.IndexModel(SORT_ORDER, name="collected_at"),
+    pymongo.IndexModel(
+        [("query", pymongo.ASCENDING)] + SORT_ORDER,
+        name="query_collected_at",
+    ),
+    TEXT_INDEX,
+    # Change watermark of the Parquet export and report cache fingerprints
+    pymongo.IndexModel([("updated_at", pymongo.ASCENDING)], name="updated_at"),
+    # Stream ingestion relies on this to drop records replayed after a crash
+    pymongo.IndexModel(
+        [("dedupe_key", pymongo.ASCENDING)],
+        name="dedupe_key",
+        unique=True,
+        partialFilterExpression={"dedupe_key": {"$exists": True}},
+    ),
+]
+
+def get_collected_data_collection() -> Any:
+    """
+    Get the MongoDB collection holding collected documents
+    """
+    return get_mongo_collection(COLLECTED_DATA_COLLECTION)
+
+def ensure_collected_data_indexes() -> List[str]:
+    """
+    Create the indexes used by collected data queries if they don't exist
+    """
+    return get_collected_data_collection().create_indexes(COLLECTED_DATA_INDEXES)
+
+def ensure_text_index() -> List[str]:
+    """
+    Create the text index keyword filters need if it doesn't exist
+    """
+    return get_collected_data_collection().create_indexes([TEXT_INDEX])
+
+def stamp_written(documents: Iterable[Dict[str, Any]]) -> None:
+    """
+    Set ``updated_at`` to the write time; every insert and in-place update of collected data sets it
+    """
+    now = datetime.utcnow()
+    for document in documents:
+        document["updated_at"] = now
+
+def parse_date(value: Optional[str], field: str) -> Optional[datetime]:
+    """
+    Parse a YYYY-MM-DD query parameter
+    """
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid {field}, expected YYYY-MM-DD",
+        )
+
+def build_filter(
+    source: Optional[str] = None,
+    query: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Build a MongoDB filter for collected data
+
+    Keyword queries match every document, so pages, exports and counts are
+    never cut off: the search index resolves them to ids when it is enabled
+    and the match fits SEARCH_FILTER_MAX_IDS, the MongoDB text index otherwise.
+    """
+    mongo_filter: Dict[str, Any] = {}
+    if source:
+        mongo_filter["source"] = source
+
+    start = parse_date(date_from, "date_from")
+    end = parse_date(date_to, "date_to")
+    if query:
+        mongo_filter.update(keyword_filter(query, source, start, end))
+
+    if start or end:
+        date_range: Dict[str, datetime] = {}
+        if start:
+            date_range["$gte"] = start
+        if end:
+            # date_to is inclusive of the whole day
+            date_range["$lt"] = end + timedelta(days=1)
+        mongo_filter["collected_at"] = date_range
+    return mongo_filter
+
+def keyword_filter(
+    query: str,
+    source: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Build the MongoDB filter on documents matching a keyword query
+    """
+    if settings.SEARCH_INDEX_ENABLED:
+        doc_ids = get_search_index().match_ids(
+            query,
+            source,
+            start.date() if start else None,
+            end.date() if end else None,
+            limit=settings.SEARCH_FILTER_MAX_IDS,
+        )
+        if doc_ids is not None:
+            return {"_id": {"$in": [to_document_id(doc_id) for doc_id in doc_ids]}}
+    return {"$text": {"$search": query}}
+
+def build_projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """
+    Build a MongoDB projection from a comma separated list of field names
+    """
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in COLLECTED_DATA_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}",
+        )
+    # The sort keys are always returned so the next cursor can be built
+    projection = {"_id": 1, "collected_at": 1}
+    for field in requested:
+        if field != "id":
+            projection[field] = 1
+    return projection
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """
+    Encode the sort key of a document as an opaque pagination cursor
+    """
+    collected_at = document.get("collected_at")
+    payload = [
+        collected_at.isoformat() if isinstance(collected_at, datetime) else None,
+        str(document["_id"]),
+    ]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def to_document_id(value: str) -> Any:
+    """
+    Convert a string id back to an ObjectId when it is one
+    """
+    try:
+        return ObjectId(value)
+    except InvalidId:
+        return value
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], Any]:
+    """
+    Decode a pagination cursor produced by encode_cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        collected_at, document_id = json.loads(base64.urlsafe_b64decode(padded))
+        if collected_at is not None:
+            collected_at = datetime.fromisoformat(collected_at)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return collected_at, to_document_id(document_id)
+
+def apply_cursor(mongo_filter: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    Restrict a filter to documents that sort after the given cursor
+    """
+    if not cursor:
+        return mongo_filter
+    collected_at, document_id = decode_cursor(cursor)
+    after_cursor = {
+        "$or": [
+            {"collected_at": {"$lt": collected_at}},
+            {"collected_at": collected_at, "_id": {"$lt": document_id}},
+        ]
+    }
+    if not mongo_filter:
+        return after_cursor
+    return {"$and": [mongo_filter, after_cursor]}
+
+def serialize_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a MongoDB document into a JSON friendly dict
+    """
+    serialized = {"id": str(document["_id"])}
+    for key, value in document.items():
+        if key == "_id":
+            continue
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, ObjectId):
+            value = str(value)
+        serialized[key] = value
+    return serialized
+
+def find_collected_data(
+    mongo_filter: Dict[str, Any],
+    projection: Optional[Dict[str, int]] = None,
+    limit: int = 0,
+    skip: int = 0,
+    batch_size: int = 1000,
+) -> Any:
+    """
+    Open a sorted cursor over collected data
+    """
+    cursor = (
+        get_collected_data_collection()
+        .find(mongo_filter, projection)
+        .sort(SORT_ORDER)
+        .batch_size(batch_size)
+    )
+    if skip:
+        cursor = cursor.skip(skip)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+def get_collected_data_page(
+    mongo_filter: Dict[str, Any],
+    projection: Optional[Dict[str, int]],
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+) -> Dict[str, Any]:
+    """
+    Fetch one page of collected data and the cursor for the next page
+    """
+    page_filter = apply_cursor(mongo_filter, cursor)
+    # Fetch one extra document to know whether another page exists
+    documents = list(
+        find_collected_data(
+            page_filter,
+            projection,
+            limit=limit + 1,
+            skip=0 if cursor else skip,
+            batch_size=limit + 1,
+        )
+    )
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    return {
+        "data": [serialize_document(document) for document in documents],
+        "next_cursor": encode_cursor(documents[-1]) if has_more else None,
+    }
+
+def count_collected_data(mongo_filter: Dict[str, Any]) -> int:
+    """
+    Count collected documents matching a filter
+    """
+    collection = get_collected_data_collection()
+    if not mongo_filter:
+        # Served from collection metadata instead of scanning the index
+        return collection.estimated_document_count()
+    return collection.count_documents(mongo_filter)
+
+def iter_ndjson(documents: Any) -> Iterator[bytes]:
+    """
+    Stream documents as newline delimited JSON
+    """
+    for document in documents:
+        yield dumps_json(serialize_document(document)) + b"\n"
+
+def iter_csv(documents: Any, columns: List[str]) -> Iterator[bytes]:
+    """
+    Stream documents as CSV, JSON-encoding nested values
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for document in documents:
+        row = []
+        for column in columns:
+            value = document["_id"] if column == "id" else document.get(column)
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, default=str)
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            row.append("" if value is None else value)
+        writer.writerow(row)
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue().encode("utf-8")
+
+def hydrate_hits(hits: List[Tuple[str, float]], projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """
+    Serialize the documents of ranked (id, score) index hits, in rank order and with their scores
+    """
+    documents = {
+        str(document["_id"]): document
+        for document in get_collected_data_collection().find(
+            {"_id": {"$in": [to_document_id(doc_id) for doc_id, _ in hits]}},
+            projection,
+        )
+    }
+    results = []
+    for doc_id, score in hits:
+        # Documents deleted from MongoDB but not yet from the index are skipped
+        if doc_id in documents:
+            result = serialize_document(documents[doc_id])
+            result["score"] = score
+            results.append(result)
+    return results
+
+def search_collected_documents(
+    query: str,
+    source: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = 20,
+    projection: Optional[Dict[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rank collected documents by relevance to a keyword query
+    """
+    start = parse_date(date_from, "date_from")
+    end = parse_date(date_to, "date_to")
+    collection = get_collected_data_collection()
+
+    if not settings.SEARCH_INDEX_ENABLED:
+        # Fall back to the MongoDB text index and its own relevance score
+        mongo_filter = build_filter(source, query, date_from, date_to)
+        text_projection = dict(projection or {})
+        text_projection["score"] = {"$meta": "textScore"}
+        documents = (
+            collection.find(mongo_filter, text_projection)
+            .sort([("score", {"$meta": "textScore"})])
+            .limit(limit)
+        )
+        return [serialize_document(document) for document in documents]
+
+    hits = get_search_index().search(
+        query,
+        source=source,
+        date_from=start.date() if start else None,
+        date_to=end.date() if end else None,
+        limit=limit,
+    )
+    return hydrate_hits(hits, projection)
+
+def semantic_search_documents(
+    query: str,
+    source: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = 20,
+    projection: Optional[Dict[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rank collected documents by the similarity of their embeddings to a query's, so paraphrases match too
+    """
+    start = parse_date(date_from, "date_from")
+    end = parse_date(date_to, "date_to")
+    if not settings.VECTOR_INDEX_ENABLED or not settings.NLP_EMBEDDING_MODEL:
+        raise HTTPException(status_code=400, detail="Semantic search is not enabled")
+    hits = get_vector_index().search(
+        embed_texts([query])[0],
+        limit=limit,
+        source=source,
+        date_from=start.date() if start else None,
+        date_to=end.date() if end else None,
+        probes=settings.VECTOR_INDEX_PROBES,
+        rerank=settings.VECTOR_INDEX_RERANK,
+    )
+    return hydrate_hits(hits, projection)
+
+def rebuild_search_index(batch_size: int = 5000) -> Dict[str, int]:
+    """
+    Index every collected document, e.g. after enabling the index, and drop documents no longer stored
+    """
+    index = get_search_index()
+    stale = index.document_ids()
+    documents = find_collected_data(
+        {},
+        {"content": 1, "source": 1, "collected_at": 1},
+        batch_size=batch_size,
+    )
+    indexed = 0
+    batch = []
+    for document in documents:
+        stale.discard(str(document["_id"]))
+        batch.append(document)
+        if len(batch) >= batch_size:
+            indexed += index_collected_documents(batch)
+            batch = []
+    indexed += index_collected_documents(batch)
+    index.delete_documents(stale)
+    index.flush()
+    return {"indexed": indexed, "removed": len(stale)}
+
+def delete_collected_data(mongo_filter: Dict[str, Any], batch_size: int = 1000) -> int:
+    """
+    Delete the collected documents matching a filter, and their search and vector index entries and Parquet rows
+    """
+    collection = get_collected_data_collection()
+    deleted = 0
+    # (source, day) Parquet partitions holding deleted documents
+    partitions = set()
+    while True:
+        documents = list(collection.find(mongo_filter, {"_id": 1, "source": 1, "collected_at": 1}).limit(batch_size))
+        if not documents:
+            break
+        document_ids = [document["_id"] for document in documents]
+        deleted += collection.delete_many({"_id": {"$in": document_ids}}).deleted_count
+        if settings.SEARCH_INDEX_ENABLED:
+            get_search_index().delete_documents(str(document_id) for document_id in document_ids)
+        if settings.VECTOR_INDEX_ENABLED:
+            get_vector_index().delete(str(document_id) for document_id in document_ids)
+        for document in documents:
+            if isinstance(document.get("source"), str) and isinstance(document.get("collected_at"), datetime):
+                partitions.add((document["source"], document["collected_at"].strftime("%Y-%m-%d")))
+    if settings.SEARCH_INDEX_ENABLED:
+        get_search_index().flush()
+    if settings.VECTOR_INDEX_ENABLED:
+        get_vector_index().flush()
+    if settings.PARQUET_STORE_ENABLED and partitions:
+        # Imported here as the Parquet store reads collected data through this module
+        from app.services.parquet_store import export_partitions
+
+        export_partitions(partitions)
+    return deleted
+
+def rebuild_vector_index(batch_size: int = 5000) -> Dict[str, int]:
+    """
+    Embed and index every collected document, e.g. after enabling the index, and drop documents no longer stored
+    """
+    index = get_vector_index()
+    stale = index.document_ids()
+    documents = find_collected_data(
+        {"content": {"$type": "string"}},
+        {"content": 1, "source": 1, "collected_at": 1},
+        batch_size=batch_size,
+    )
+    indexed = 0
+    batch = []
+    for document in documents:
+        stale.discard(str(document["_id"]))
+        batch.append(document)
+        if len(batch) >= batch_size:
+            indexed += embed_collected_documents(batch)
+            batch = []
+    indexed += embed_collected_documents(batch)
+    index.delete(stale)
+    index.flush()
+    return {"indexed": indexed, "removed": len(stale)}
@@ -0,0 +1,163 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.core.database import get_mongo_collection
+from app.services.live_events import publish_event
+
+COLLECTION_JOBS_COLLECTION = "collection_jobs"
+
+JOB_STATUSES = ["pending", "running", "completed", "failed", "cancelled"]
+
+COLLECTION_JOB_INDEXES = [
+    pymongo.IndexModel(
+        [("user_id", pymongo.ASCENDING), ("status", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)],
+        name="user_status_created_at",
+    ),
+]
+
+def get_jobs_collection() -> Any:
+    """
+    Get the MongoDB collection holding collection jobs
+    """
+    return get_mongo_collection(COLLECTION_JOBS_COLLECTION)
+
+def ensure_collection_job_indexes() -> List[str]:
+    """
+    Create the indexes used by job queries if they don't exist
+    """
+    return get_jobs_collection().create_indexes(COLLECTION_JOB_INDEXES)
+
+def serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a job document into the API representation
+    """
+    return {
+        "id": str(job["_id"]),
+        "type": job["type"],
+        "status": job["status"],
+        "created_at": job["created_at"].isoformat() + "Z",
+        "completed_at": job["completed_at"].isoformat() + "Z" if job.get("completed_at") else None,
+        "params": job.get("params", {}),
+        "progress": job.get("progress", {}),
+        "results_count": job.get("results_count", 0),
+        "error": job.get("error"),
+    }
+
+def _publish(job: Optional[Dict[str, Any]]) -> None:
+    # Updates that matched no job (e.g. one cancelled meanwhile) have nothing to report
+    if job is not None:
+        publish_event(job["user_id"], "job", serialize_job(job))
+
+def _job_id(job_id: str) -> Any:
+    try:
+        return ObjectId(job_id)
+    except InvalidId:
+        return job_id
+
+def create_job(user_id: int, job_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Record a new pending collection job
+    """
+    job = {
+        "user_id": user_id,
+        "type": job_type,
+        "status": "pending",
+        "params": params,
+        "progress": {"percent": 0.0},
+        "results_count": 0,
+        "created_at": datetime.utcnow(),
+        "completed_at": None,
+    }
+    job["_id"] = get_jobs_collection().insert_one(job).inserted_id
+    _publish(job)
+    return job
+
+def get_job(job_id: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Get a job by id, optionally restricted to its owner
+    """
+    query: Dict[str, Any] = {"_id": _job_id(job_id)}
+    if user_id is not None:
+        query["user_id"] = user_id
+    return get_jobs_collection().find_one(query)
+
+def list_jobs(user_id: int, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    List a user's most recent jobs
+    """
+    query: Dict[str, Any] = {"user_id": user_id}
+    if status:
+        query["status"] = status
+    return list(get_jobs_collection().find(query).sort("created_at", pymongo.DESCENDING).limit(limit))
+
+def update_job_progress(
+    job_id: Any,
+    percent: float,
+    results_count: Optional[int] = None,
+    **details: Any,
+) -> None:
+    """
+    Mark a job as running and record its progress
+    """
+    update: Dict[str, Any] = {"status": "running", "progress.percent": round(percent, 2)}
+    for key, value in details.items():
+        update[f"progress.{key}"] = value
+    if results_count is not None:
+        update["results_count"] = results_count
+    # Never move a cancelled job back to running
+    _publish(get_jobs_collection().find_one_and_update(
+        {"_id": job_id, "status": {"$in": ["pending", "running"]}},
+        {"$set": update},
+        return_document=pymongo.ReturnDocument.AFTER,
+    ))
+
+def complete_job(job_id: Any, results_count: int, **details: Any) -> None:
+    """
+    Mark a job as completed
+    """
+    update: Dict[str, Any] = {
+        "status": "completed",
+        "progress.percent": 100.0,
+        "results_count": results_count,
+        "completed_at": datetime.utcnow(),
+    }
+    for key, value in details.items():
+        update[f"progress.{key}"] = value
+    _publish(get_jobs_collection().find_one_and_update(
+        {"_id": job_id, "status": {"$in": ["pending", "running"]}},
+        {"$set": update},
+        return_document=pymongo.ReturnDocument.AFTER,
+    ))
+
+def fail_job(job_id: Any, error: str) -> None:
+    """
+    Mark a job as failed
+    """
+    _publish(get_jobs_collection().find_one_and_update(
+        {"_id": job_id},
+        {"$set": {"status": "failed", "error": error, "completed_at": datetime.utcnow()}},
+        return_document=pymongo.ReturnDocument.AFTER,
+    ))
+
+def cancel_job(job_id: str, user_id: int) -> bool:
+    """
+    Cancel a pending or running job, returning whether anything was cancelled
+    """
+    job = get_jobs_collection().find_one_and_update(
+        {"_id": _job_id(job_id), "user_id": user_id, "status": {"$in": ["pending", "running"]}},
+        {"$set": {"status": "cancelled", "completed_at": datetime.utcnow()}},
+        return_document=pymongo.ReturnDocument.AFTER,
+    )
+    _publish(job)
+    return job is not None
+
+def is_job_cancelled(job_id: Any) -> bool:
+    """
+    Check whether a running job has been cancelled
+    """
+    job = get_jobs_collection().find_one({"_id": job_id}, {"status": 1})
+    return job is None or job["status"] == "cancelled"
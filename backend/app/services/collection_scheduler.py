@@ -0,0 +1,299 @@
+import logging
+import os
+import random
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.core.config import settings
+from app.core.database import get_mongo_collection, redis_client
+from app.services.collected_data import get_collected_data_collection, stamp_written
+from app.services.alert_engine import evaluate_documents
+from app.services.mention_tagger import record_competitor_mentions, tag_collected_documents
+from app.services.search_index import index_collected_documents
+from app.services.vector_index import embed_collected_documents
+from app.services.stream_ingestion import build_document, dedupe_key
+
+COLLECTION_SCHEDULES_COLLECTION = "collection_schedules"
+
+SCHEDULER_LOCK_KEY = "collection_scheduler:lock"
+
+scheduler_logger = logging.getLogger("app.collection_scheduler")
+
+COLLECTION_SCHEDULE_INDEXES = [
+    pymongo.IndexModel([("active", pymongo.ASCENDING), ("next_run_at", pymongo.ASCENDING)], name="active_next_run_at"),
+    pymongo.IndexModel([("user_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="user_created_at"),
+]
+
+# Upstream collectors by platform. A fetcher receives the query, the window
+# start and end and the optional list of sources, and returns raw records in
+# the same shape the stream consumer accepts.
+Fetcher = Callable[[str, datetime, datetime, Optional[List[str]]], List[Dict[str, Any]]]
+FETCHERS: Dict[str, Fetcher] = {}
+
+def register_fetcher(platform: str) -> Callable[[Fetcher], Fetcher]:
+    """
+    Register the upstream collector used for a platform
+    """
+    def decorator(fetcher: Fetcher) -> Fetcher:
+        FETCHERS[platform] = fetcher
+        return fetcher
+    return decorator
+
+def get_schedules_collection() -> Any:
+    """
+    Get the MongoDB collection holding recurring collection schedules
+    """
+    return get_mongo_collection(COLLECTION_SCHEDULES_COLLECTION)
+
+def ensure_collection_schedule_indexes() -> List[str]:
+    """
+    Create the indexes used by the scheduler if they don't exist
+    """
+    return get_schedules_collection().create_indexes(COLLECTION_SCHEDULE_INDEXES)
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query so equivalent ones from different users coalesce
+    """
+    return " ".join(query.lower().split())
+
+def coalesce_key(schedule: Dict[str, Any]) -> Tuple[str, str, Tuple[str, ...]]:
+    """
+    Subscriptions with the same key are served by one upstream fetch
+    """
+    return schedule["platform"], schedule["normalized_query"], tuple(sorted(schedule.get("sources") or []))
+
+def next_run_time(now: datetime, interval_seconds: int, jitter_seconds: int) -> datetime:
+    """
+    Next run time with random jitter so schedules don't all fire together
+    """
+    return now + timedelta(seconds=interval_seconds + random.uniform(-jitter_seconds, jitter_seconds))
+
+def serialize_schedule(schedule: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a schedule document into the API representation
+    """
+    return {
+        "id": str(schedule["_id"]),
+        "platform": schedule["platform"],
+        "query": schedule["query"],
+        "sources": schedule.get("sources"),
+        "interval_minutes": schedule["interval_seconds"] // 60,
+        "active": schedule["active"],
+        "next_run_at": schedule["next_run_at"].isoformat() + "Z",
+        "last_run_at": schedule["last_run_at"].isoformat() + "Z" if schedule.get("last_run_at") else None,
+        "runs": schedule.get("runs", 0),
+        "fetches": schedule.get("fetches", 0),
+        "fetches_saved": schedule.get("fetches_saved", 0),
+        "last_results_count": schedule.get("last_results_count", 0),
+        "last_error": schedule.get("last_error"),
+        "created_at": schedule["created_at"].isoformat() + "Z",
+    }
+
+def create_schedule(
+    user_id: int,
+    platform: str,
+    query: str,
+    interval_minutes: int,
+    sources: Optional[List[str]] = None,
+    lookback_hours: int = 24,
+) -> Dict[str, Any]:
+    """
+    Subscribe a user to a recurring collection
+    """
+    now = datetime.utcnow()
+    interval_seconds = interval_minutes * 60
+    schedule = {
+        "user_id": user_id,
+        "platform": platform.lower(),
+        "query": query,
+        "normalized_query": normalize_query(query),
+        "sources": sorted(sources) if sources else None,
+        "interval_seconds": interval_seconds,
+        "jitter_seconds": int(interval_seconds * settings.COLLECTION_SCHEDULE_JITTER_RATIO),
+        "active": True,
+        # The first run collects this far back
+        "window_start": now - timedelta(hours=lookback_hours),
+        "next_run_at": now,
+        "last_run_at": None,
+        "runs": 0,
+        "fetches": 0,
+        "fetches_saved": 0,
+        "created_at": now,
+    }
+    schedule["_id"] = get_schedules_collection().insert_one(schedule).inserted_id
+    return schedule
+
+def list_schedules(user_id: int) -> List[Dict[str, Any]]:
+    """
+    List a user's collection schedules
+    """
+    return list(get_schedules_collection().find({"user_id": user_id}).sort("created_at", pymongo.DESCENDING))
+
+def delete_schedule(schedule_id: str, user_id: int) -> bool:
+    """
+    Remove one of a user's collection schedules
+    """
+    try:
+        object_id = ObjectId(schedule_id)
+    except InvalidId:
+        return False
+    return get_schedules_collection().delete_one({"_id": object_id, "user_id": user_id}).deleted_count > 0
+
+def parse_published_at(record: Dict[str, Any]) -> Optional[datetime]:
+    """
+    Read a record's publication time as a naive UTC datetime
+    """
+    value = record.get("published_at")
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+def store_for_subscribers(
+    records: List[Dict[str, Any]],
+    subscribers: List[Dict[str, Any]],
+    until: datetime,
+) -> Dict[Any, int]:
+    """
+    Store fetched records once, tagged with every subscriber whose window covers them
+
+    Returns the number of records delivered to each subscriber.
+    """
+    delivered = {subscriber["_id"]: 0 for subscriber in subscribers}
+    operations = []
+    documents = []
+    for record in records:
+        published_at = parse_published_at(record)
+        schedule_ids = [
+            subscriber["_id"]
+            for subscriber in subscribers
+            if published_at is None or subscriber["window_start"] <= published_at <= until
+        ]
+        if not schedule_ids:
+            continue
+        for schedule_id in schedule_ids:
+            delivered[schedule_id] += 1
+        key = dedupe_key(record)
+        document = build_document(record, key)
+        tag_collected_documents([document])
+        documents.append(document)
+        operations.append(
+            pymongo.UpdateOne(
+                {"dedupe_key": key},
+                {"$setOnInsert": document, "$addToSet": {"schedule_ids": {"$each": schedule_ids}}},
+                upsert=True,
+            )
+        )
+    if operations:
+        stamp_written(documents)
+        result = get_collected_data_collection().bulk_write(operations, ordered=False)
+        # Only newly inserted documents need indexing
+        for position, document_id in result.upserted_ids.items():
+            documents[position]["_id"] = document_id
+        inserted = [document for document in documents if "_id" in document]
+        index_collected_documents(inserted)
+        embed_collected_documents(inserted)
+        evaluate_documents(inserted)
+        record_competitor_mentions(inserted)
+    return delivered
+
+def run_group(subscribers: List[Dict[str, Any]], now: datetime) -> int:
+    """
+    Fetch once for a group of coalesced subscriptions and fan results out; returns the fetches saved
+    """
+    schedules = get_schedules_collection()
+    platform, _, sources = coalesce_key(subscribers[0])
+    # The earliest window start covers every subscriber's window
+    since = min(subscriber["window_start"] for subscriber in subscribers)
+    fetcher = FETCHERS.get(platform)
+    error = None
+    delivered: Dict[Any, int] = {}
+    try:
+        if fetcher is None:
+            raise LookupError(f"No collector registered for platform '{platform}'")
+        records = fetcher(subscribers[0]["query"], since, now, list(sources) or None)
+        for record in records:
+            record.setdefault("platform", platform)
+            record.setdefault("query", subscribers[0]["normalized_query"])
+        delivered = store_for_subscribers(records, subscribers, now)
+    except Exception as exc:
+        # A failing upstream must not stop the other groups in this tick
+        error = str(exc)
+
+    for position, subscriber in enumerate(subscribers):
+        update: Dict[str, Any] = {
+            "$set": {
+                "next_run_at": next_run_time(now, subscriber["interval_seconds"], subscriber["jitter_seconds"]),
+                "last_error": error,
+            },
+            "$inc": {"runs": 1, "fetches": 1 if position == 0 else 0},
+        }
+        if error is None:
+            # A failed fetch saved nobody a fetch
+            update["$inc"]["fetches_saved"] = 0 if position == 0 else 1
+            update["$set"]["last_run_at"] = now
+            update["$set"]["window_start"] = now
+            update["$set"]["last_results_count"] = delivered.get(subscriber["_id"], 0)
+        schedules.update_one({"_id": subscriber["_id"]}, update)
+    return len(subscribers) - 1 if error is None else 0
+
+def run_due_schedules(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Run every due schedule, coalescing identical queries into one fetch
+
+    Schedules due within COLLECTION_COALESCE_WINDOW_SECONDS are pulled forward
+    into the current tick, so jitter does not stop identical subscriptions
+    from sharing a fetch.
+    """
+    now = now or datetime.utcnow()
+    horizon = now + timedelta(seconds=settings.COLLECTION_COALESCE_WINDOW_SECONDS)
+    due = get_schedules_collection().find({"active": True, "next_run_at": {"$lte": horizon}}).sort("next_run_at", pymongo.ASCENDING)
+
+    groups: Dict[Tuple[str, str, Tuple[str, ...]], List[Dict[str, Any]]] = {}
+    for schedule in due:
+        groups.setdefault(coalesce_key(schedule), []).append(schedule)
+    # Only fetch for groups with at least one schedule actually due
+    groups = {key: members for key, members in groups.items() if members[0]["next_run_at"] <= now}
+
+    fetches_saved = sum(run_group(subscribers, now) for subscribers in groups.values())
+    if groups:
+        # Make this tick's documents searchable from other processes too
+        index_collected_documents([], flush=True)
+        embed_collected_documents([], flush=True)
+    subscriptions = sum(len(subscribers) for subscribers in groups.values())
+    return {"fetches": len(groups), "subscriptions": subscriptions, "fetches_saved": fetches_saved}
+
+def run_scheduler_loop(stop_event: threading.Event) -> None:
+    """
+    Run due schedules every tick; one API worker at a time holds the lock
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    tick = settings.COLLECTION_SCHEDULER_TICK_SECONDS
+    while not stop_event.is_set():
+        lock_seconds = max(int(tick * 2), 1)
+        try:
+            acquired = redis_client.set(SCHEDULER_LOCK_KEY, owner, nx=True, ex=lock_seconds)
+            if acquired or redis_client.get(SCHEDULER_LOCK_KEY) == owner:
+                redis_client.expire(SCHEDULER_LOCK_KEY, lock_seconds)
+                run_due_schedules()
+        except Exception:
+            # A datastore outage skips this tick instead of ending the thread
+            scheduler_logger.exception("Collection scheduler tick failed")
+        stop_event.wait(tick)
+
+def start_scheduler() -> threading.Event:
+    """
+    Start the scheduler loop in a daemon thread and return its stop event
+    """
+    stop_event = threading.Event()
+    threading.Thread(target=run_scheduler_loop, args=(stop_event,), name="collection-scheduler", daemon=True).start()
+    return stop_event
@@ -0,0 +1,369 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.activity_timeline import (
+    ACTIVITY_TYPES,
+    TIME_PERIOD_DAYS,
+    bucket_start,
+    get_daily_activity_collection,
+)
+from app.services.competitor_store import get_competitors_collection, to_object_id
+from app.services.product_snapshots import get_products_collection
+
+METRICS = ["sentiment", "activity", "features"]
+
+SENTIMENTS = ["positive", "neutral", "negative"]
+
+# Score given to each sentiment when averaging into a 0-1 sentiment score
+SENTIMENT_SCORES = np.array([1.0, 0.5, 0.0])
+
+# Daily history kept per competitor, enough for the longest time period
+HISTORY_DAYS = max(TIME_PERIOD_DAYS.values())
+
+# Watermark reads overlap by this much to tolerate clock skew between writers;
+# applying a daily document twice is harmless since cells are overwritten
+WATERMARK_OVERLAP = timedelta(seconds=5)
+
+# Comparisons re-read competitors whose industry changed while being compared
+MEMBERSHIP_ATTEMPTS = 3
+
+class ComparisonMatrix:
+    """
+    Materialized metrics for one user's competitors in one industry
+
+    Daily activity and sentiment counts are kept as (competitor, kind, day)
+    arrays and feature overlap as a pairwise Jaccard matrix. Refreshes only
+    read daily totals and products changed since the last refresh.
+    """
+
+    def __init__(self, owner_id: int, industry: str):
+        self.owner_id = owner_id
+        self.industry = industry
+        self.lock = threading.Lock()
+        self.competitor_ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.first_day: Optional[datetime] = None
+        self.activity = np.zeros((0, len(ACTIVITY_TYPES), HISTORY_DAYS), dtype=np.int64)
+        self.sentiment = np.zeros((0, len(SENTIMENTS), HISTORY_DAYS), dtype=np.int64)
+        self.features: List[Set[str]] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.feature_matrix = np.zeros((0, 0), dtype=bool)
+        self.feature_jaccard = np.zeros((0, 0))
+        self.watermark: Optional[datetime] = None
+        self.refreshed_at: Optional[datetime] = None
+        self.checked_at = 0.0
+        self.data_updated_at: Optional[datetime] = None
+        self.full_rebuilds = 0
+        self.incremental_updates = 0
+
+    def _load_members(self) -> List[str]:
+        competitors = get_competitors_collection().find(
+            {"owner_id": self.owner_id, "industry": self.industry}, {"_id": 1}
+        ).sort("_id", 1)
+        return [str(competitor["_id"]) for competitor in competitors]
+
+    def _apply_daily(self, document: Dict[str, Any]) -> None:
+        position = self.positions.get(document["competitor_id"])
+        offset = (document["day"] - self.first_day).days
+        if position is None or not 0 <= offset < HISTORY_DAYS:
+            return
+        counts = document.get("counts", {})
+        sentiments = document.get("sentiment_counts", {})
+        self.activity[position, :, offset] = [counts.get(activity_type, 0) for activity_type in ACTIVITY_TYPES]
+        self.sentiment[position, :, offset] = [sentiments.get(sentiment, 0) for sentiment in SENTIMENTS]
+        if self.data_updated_at is None or document["updated_at"] > self.data_updated_at:
+            self.data_updated_at = document["updated_at"]
+
+    def _load_features(self, competitor_ids: List[str]) -> Dict[str, Set[str]]:
+        features: Dict[str, Set[str]] = {competitor_id: set() for competitor_id in competitor_ids}
+        products = get_products_collection().find(
+            {"competitor_id": {"$in": competitor_ids}, "removed": False},
+            {"competitor_id": 1, "record.features": 1},
+        )
+        for product in products:
+            features[product["competitor_id"]].update(product.get("record", {}).get("features") or [])
+        return features
+
+    def _set_feature_row(self, position: int, features: Set[str]) -> None:
+        new_features = [feature for feature in features if feature not in self.vocabulary]
+        if new_features:
+            for feature in new_features:
+                self.vocabulary[feature] = len(self.vocabulary)
+            self.feature_matrix = np.pad(self.feature_matrix, ((0, 0), (0, len(new_features))))
+        self.features[position] = features
+        self.feature_matrix[position] = False
+        self.feature_matrix[position, [self.vocabulary[feature] for feature in features]] = True
+
+    def _update_jaccard_row(self, position: int) -> None:
+        matrix = self.feature_matrix.astype(np.int64)
+        sizes = matrix.sum(axis=1)
+        intersection = matrix @ matrix[position]
+        union = sizes + sizes[position] - intersection
+        row = np.divide(intersection, union, out=np.zeros(len(sizes)), where=union > 0)
+        self.feature_jaccard[position, :] = row
+        self.feature_jaccard[:, position] = row
+
+    def rebuild(self, members: List[str], now: datetime) -> None:
+        """
+        Recompute every array from the stored daily totals and products
+        """
+        watermark = now - WATERMARK_OVERLAP
+        self.competitor_ids = list(members)
+        self.positions = {competitor_id: position for position, competitor_id in enumerate(self.competitor_ids)}
+        self.first_day = bucket_start(now, "day") - timedelta(days=HISTORY_DAYS - 1)
+        count = len(members)
+        self.activity = np.zeros((count, len(ACTIVITY_TYPES), HISTORY_DAYS), dtype=np.int64)
+        self.sentiment = np.zeros((count, len(SENTIMENTS), HISTORY_DAYS), dtype=np.int64)
+        self.data_updated_at = None
+        for document in get_daily_activity_collection().find(
+            {"competitor_id": {"$in": self.competitor_ids}, "day": {"$gte": self.first_day}}
+        ):
+            self._apply_daily(document)
+
+        features = self._load_features(self.competitor_ids)
+        self.features = [features[competitor_id] for competitor_id in self.competitor_ids]
+        self.vocabulary = {feature: index for index, feature in enumerate(sorted(set().union(*self.features)))}
+        self.feature_matrix = np.zeros((count, len(self.vocabulary)), dtype=bool)
+        for position, competitor_features in enumerate(self.features):
+            self.feature_matrix[position, [self.vocabulary[feature] for feature in competitor_features]] = True
+        matrix = self.feature_matrix.astype(np.int64)
+        sizes = matrix.sum(axis=1)
+        intersection = matrix @ matrix.T
+        union = sizes[:, None] + sizes[None, :] - intersection
+        self.feature_jaccard = np.divide(intersection, union, out=np.zeros((count, count)), where=union > 0)
+
+        self.watermark = watermark
+        self.refreshed_at = now
+        self.full_rebuilds += 1
+
+    def refresh(self, now: Optional[datetime] = None) -> None:
+        """
+        Bring the arrays up to date, rebuilding only when membership or the day changes
+        """
+        now = now or datetime.utcnow()
+        members = self._load_members()
+        if (
+            self.watermark is None
+            or members != self.competitor_ids
+            or bucket_start(now, "day") - timedelta(days=HISTORY_DAYS - 1) != self.first_day
+        ):
+            self.rebuild(members, now)
+            return
+
+        watermark = now - WATERMARK_OVERLAP
+        for document in get_daily_activity_collection().find(
+            {"competitor_id": {"$in": self.competitor_ids}, "updated_at": {"$gte": self.watermark}}
+        ):
+            self._apply_daily(document)
+            self.incremental_updates += 1
+
+        changed = get_products_collection().distinct(
+            "competitor_id",
+            {"competitor_id": {"$in": self.competitor_ids}, "last_changed_at": {"$gte": self.watermark}},
+        )
+        if changed:
+            features = self._load_features(changed)
+            for competitor_id in changed:
+                position = self.positions[competitor_id]
+                if features[competitor_id] != self.features[position]:
+                    self._set_feature_row(position, features[competitor_id])
+                    self._update_jaccard_row(position)
+                    self.incremental_updates += 1
+
+        self.watermark = watermark
+        self.refreshed_at = now
+
+    def contains(self, competitor_ids: List[str]) -> bool:
+        return all(competitor_id in self.positions for competitor_id in competitor_ids)
+
+    def ensure_fresh(self) -> None:
+        """
+        Refresh when the last check is older than COMPARISON_MATRIX_REFRESH_SECONDS
+        """
+        if time.monotonic() - self.checked_at >= settings.COMPARISON_MATRIX_REFRESH_SECONDS:
+            self.refresh()
+            self.checked_at = time.monotonic()
+
+    def compare(self, competitor_ids: List[str], days: int, metrics: List[str]) -> Dict[str, Any]:
+        """
+        Slice the arrays for some of the matrix's competitors, keyed by competitor id
+        """
+        index = np.array([self.positions[competitor_id] for competitor_id in competitor_ids], dtype=np.intp)
+        comparison: Dict[str, Any] = {}
+        similarity: Dict[str, Any] = {}
+
+        if "sentiment" in metrics:
+            counts = self.sentiment[index, :, HISTORY_DAYS - days:].sum(axis=2)
+            totals = counts.sum(axis=1)
+            scores = np.divide(counts @ SENTIMENT_SCORES, totals, out=np.full(len(index), np.nan), where=totals > 0)
+            comparison["sentiment"] = {
+                competitor_id: None if np.isnan(score) else round(float(score), 4)
+                for competitor_id, score in zip(competitor_ids, scores)
+            }
+            deltas = np.round(scores[:, None] - scores[None, :], 4)
+            similarity["sentiment_delta"] = [[None if np.isnan(value) else float(value) for value in row] for row in deltas]
+
+        if "activity" in metrics:
+            counts = self.activity[index, :, HISTORY_DAYS - days:].sum(axis=2)
+            comparison["activity"] = {
+                competitor_id: {**dict(zip(ACTIVITY_TYPES, row.tolist())), "total": int(row.sum())}
+                for competitor_id, row in zip(competitor_ids, counts)
+            }
+
+        if "features" in metrics:
+            feature_sets = [self.features[position] for position in index]
+            common = set.intersection(*feature_sets) if feature_sets else set()
+            comparison["features"] = {
+                "common": sorted(common),
+                "unique": {
+                    competitor_id: sorted(features - set().union(*(other for other in feature_sets if other is not features)))
+                    for competitor_id, features in zip(competitor_ids, feature_sets)
+                },
+            }
+            similarity["feature_jaccard"] = np.round(self.feature_jaccard[np.ix_(index, index)], 4).tolist()
+
+        return {"comparison": comparison, "similarity": similarity}
+
+    def freshness(self) -> Dict[str, Any]:
+        """
+        How current the served arrays are
+        """
+        now = datetime.utcnow()
+        return {
+            "refreshed_at": self.refreshed_at.isoformat() + "Z" if self.refreshed_at else None,
+            "age_seconds": round((now - self.refreshed_at).total_seconds(), 3) if self.refreshed_at else None,
+            "data_updated_at": self.data_updated_at.isoformat() + "Z" if self.data_updated_at else None,
+            "full_rebuilds": self.full_rebuilds,
+            "incremental_updates": self.incremental_updates,
+        }
+
+# Least recently used first; the oldest are dropped past COMPARISON_MATRIX_CACHE_SIZE
+_matrices: "OrderedDict[Tuple[int, str], ComparisonMatrix]" = OrderedDict()
+_matrices_lock = threading.Lock()
+
+def get_matrix(owner_id: int, industry: str, competitor_ids: List[str]) -> ComparisonMatrix:
+    """
+    Get the process-wide matrix for a user's industry, refreshed if due
+
+    Competitors added since the last refresh force an immediate one.
+    """
+    with _matrices_lock:
+        matrix = _matrices.get((owner_id, industry))
+        if matrix is None:
+            matrix = _matrices[(owner_id, industry)] = ComparisonMatrix(owner_id, industry)
+        _matrices.move_to_end((owner_id, industry))
+        while len(_matrices) > settings.COMPARISON_MATRIX_CACHE_SIZE:
+            _matrices.popitem(last=False)
+    with matrix.lock:
+        if not matrix.contains(competitor_ids):
+            matrix.checked_at = 0.0
+        matrix.ensure_fresh()
+    return matrix
+
+def compare_competitors(
+    owner_id: int,
+    competitor_ids: List[str],
+    metrics: List[str],
+    time_period: str,
+) -> Dict[str, Any]:
+    """
+    Compare competitors by slicing their industry matrices
+
+    Per-competitor values are keyed by competitor id, since names need not be
+    unique; ``competitors`` lists ids with their names in the order of the
+    similarity rows.
+    Raises LookupError with the unknown ids when some competitors don't exist.
+    Feature overlap between competitors in different industries is computed
+    from their feature sets, since they live in different matrices.
+    """
+    object_ids = [to_object_id(competitor_id) for competitor_id in competitor_ids]
+    competitor_ids = list(dict.fromkeys(competitor_ids))
+    days = TIME_PERIOD_DAYS[time_period]
+    for _ in range(MEMBERSHIP_ATTEMPTS):
+        competitors = {
+            str(competitor["_id"]): competitor
+            for competitor in get_competitors_collection().find(
+                {"_id": {"$in": [object_id for object_id in object_ids if object_id is not None]}, "owner_id": owner_id},
+                {"name": 1, "industry": 1},
+            )
+        }
+        missing = [competitor_id for competitor_id in competitor_ids if competitor_id not in competitors]
+        if missing:
+            raise LookupError(", ".join(missing))
+        compared = _compare(owner_id, competitors, competitor_ids, metrics, days)
+        if compared is not None:
+            return compared
+    # Industries kept changing under the comparison
+    raise LookupError(", ".join(competitor_ids))
+
+def _compare(
+    owner_id: int,
+    competitors: Dict[str, Dict[str, Any]],
+    competitor_ids: List[str],
+    metrics: List[str],
+    days: int,
+) -> Optional[Dict[str, Any]]:
+    # None when a competitor is missing from its industry's matrix, because
+    # its industry changed since it was read or the matrix refreshed meanwhile
+    by_industry: Dict[str, List[str]] = {}
+    for competitor_id in competitor_ids:
+        by_industry.setdefault(competitors[competitor_id]["industry"], []).append(competitor_id)
+    matrices = {industry: get_matrix(owner_id, industry, industry_ids) for industry, industry_ids in by_industry.items()}
+
+    if len(matrices) == 1:
+        matrix = next(iter(matrices.values()))
+        with matrix.lock:
+            if not matrix.contains(competitor_ids):
+                return None
+            result = matrix.compare(competitor_ids, days, metrics)
+            freshness = matrix.freshness()
+    else:
+        result = {"comparison": {}, "similarity": {}}
+        feature_sets = []
+        for industry, industry_ids in by_industry.items():
+            matrix = matrices[industry]
+            with matrix.lock:
+                if not matrix.contains(industry_ids):
+                    return None
+                part = matrix.compare(industry_ids, days, [metric for metric in metrics if metric != "features"])
+                feature_sets.extend(matrix.features[matrix.positions[competitor_id]] for competitor_id in industry_ids)
+            for metric, values in part["comparison"].items():
+                result["comparison"].setdefault(metric, {}).update(values)
+        # Pairwise values across matrices follow the request order
+        ordered = [competitor_id for industry_ids in by_industry.values() for competitor_id in industry_ids]
+        if "sentiment" in metrics:
+            sentiment = result["comparison"]["sentiment"]
+            scores = np.array([np.nan if sentiment[competitor_id] is None else sentiment[competitor_id] for competitor_id in ordered])
+            result["similarity"]["sentiment_delta"] = [
+                [None if np.isnan(value) else float(value) for value in row]
+                for row in np.round(scores[:, None] - scores[None, :], 4)
+            ]
+        if "features" in metrics:
+            common = set.intersection(*feature_sets)
+            result["comparison"]["features"] = {
+                "common": sorted(common),
+                "unique": {
+                    competitor_id: sorted(features - set().union(*(other for other in feature_sets if other is not features)))
+                    for competitor_id, features in zip(ordered, feature_sets)
+                },
+            }
+            result["similarity"]["feature_jaccard"] = [
+                [round(len(left & right) / len(left | right), 4) if left | right else 0.0 for right in feature_sets]
+                for left in feature_sets
+            ]
+        competitor_ids = ordered
+        freshness = min((matrix.freshness() for matrix in matrices.values()), key=lambda value: value["refreshed_at"] or "")
+
+    return {
+        "competitors": [
+            {"id": competitor_id, "name": competitors[competitor_id]["name"]} for competitor_id in competitor_ids
+        ],
+        **result,
+        "freshness": freshness,
+    }
@@ -0,0 +1,220 @@
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.core.database import get_mongo_collection, redis_client
+
+COMPETITORS_COLLECTION = "competitors"
+
+CACHE_KEY_PREFIX = "competitor:"
+
+# Ids of deleted competitors scored by deletion time, for readers that
+# follow changes through updated_at (which a deleted document no longer has)
+REMOVED_COMPETITORS_KEY = "competitors:removed"
+REMOVED_RETENTION_SECONDS = 86400
+
+# Fields returned by list queries; heavy profile fields are left out
+LIST_PROJECTION = {
+    "name": 1,
+    "website": 1,
+    "industry": 1,
+    "tags": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+COMPETITOR_INDEXES = [
+    pymongo.IndexModel([("owner_id", pymongo.ASCENDING), ("_id", pymongo.DESCENDING)], name="owner_id"),
+    pymongo.IndexModel(
+        [("owner_id", pymongo.ASCENDING), ("industry", pymongo.ASCENDING), ("_id", pymongo.DESCENDING)],
+        name="owner_industry",
+    ),
+    # Multikey: one index entry per tag
+    pymongo.IndexModel(
+        [("owner_id", pymongo.ASCENDING), ("tags", pymongo.ASCENDING), ("_id", pymongo.DESCENDING)],
+        name="owner_tags",
+    ),
+    # Change feed for the mention tagger
+    pymongo.IndexModel([("updated_at", pymongo.ASCENDING)], name="updated_at"),
+]
+
+def get_competitors_collection() -> Any:
+    """
+    Get the MongoDB collection holding tracked competitors
+    """
+    return get_mongo_collection(COMPETITORS_COLLECTION)
+
+def ensure_competitor_indexes() -> List[str]:
+    """
+    Create the indexes used by competitor queries if they don't exist
+    """
+    return get_competitors_collection().create_indexes(COMPETITOR_INDEXES)
+
+def to_object_id(competitor_id: str) -> Optional[ObjectId]:
+    """
+    Parse a competitor id, returning None when it is malformed
+    """
+    try:
+        return ObjectId(competitor_id)
+    except (InvalidId, TypeError):
+        return None
+
+def serialize_competitor(competitor: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a competitor document into the API representation
+    """
+    serialized = {"id": str(competitor["_id"])}
+    for key, value in competitor.items():
+        if key in ("_id", "owner_id"):
+            continue
+        if isinstance(value, datetime):
+            value = value.isoformat() + "Z"
+        serialized[key] = value
+    return serialized
+
+def _cache_key(object_id: ObjectId) -> str:
+    # Keyed by the parsed id, so differently cased spellings of one id share an entry
+    return CACHE_KEY_PREFIX + str(object_id)
+
+def invalidate_competitor(competitor_id: str) -> None:
+    """
+    Drop a competitor profile from the read-through cache
+    """
+    object_id = to_object_id(competitor_id)
+    if object_id is not None:
+        redis_client.delete(_cache_key(object_id))
+
+def create_competitor(owner_id: int, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store a new competitor
+    """
+    now = datetime.utcnow()
+    competitor = {
+        "owner_id": owner_id,
+        "name": fields["name"],
+        "website": fields["website"],
+        "description": fields.get("description"),
+        "industry": fields["industry"],
+        "social_profiles": fields.get("social_profiles") or {},
+        "aliases": fields.get("aliases") or [],
+        "tags": fields.get("tags") or [],
+        "created_at": now,
+        "updated_at": now,
+    }
+    competitor["_id"] = get_competitors_collection().insert_one(competitor).inserted_id
+    return competitor
+
+def get_competitor(competitor_id: str, owner_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Get a serialized competitor profile through the read-through cache
+    """
+    object_id = to_object_id(competitor_id)
+    if object_id is None:
+        return None
+    cached = redis_client.get(_cache_key(object_id))
+    if cached:
+        competitor = json.loads(cached)
+        return competitor["profile"] if competitor["owner_id"] == owner_id else None
+
+    competitor = get_competitors_collection().find_one({"_id": object_id})
+    if competitor is None:
+        return None
+    profile = serialize_competitor(competitor)
+    redis_client.set(
+        _cache_key(object_id),
+        json.dumps({"owner_id": competitor["owner_id"], "profile": profile}),
+        ex=settings.COMPETITOR_CACHE_TTL_SECONDS,
+    )
+    return profile if competitor["owner_id"] == owner_id else None
+
+def list_competitors(
+    owner_id: int,
+    industry: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    include_total: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """
+    List competitors newest first with keyset pagination on _id
+
+    The total is counted on the first page, and on later pages only when
+    include_total asks for it, so walking the cursor doesn't recount.
+    """
+    query: Dict[str, Any] = {"owner_id": owner_id}
+    if industry:
+        query["industry"] = industry
+    if tags:
+        query["tags"] = {"$in": tags}
+    if include_total is None:
+        include_total = cursor is None
+    total = get_competitors_collection().count_documents(query) if include_total else None
+
+    if cursor:
+        after = to_object_id(cursor)
+        if after is None:
+            raise ValueError("Invalid cursor")
+        query["_id"] = {"$lt": after}
+        skip = 0
+    competitors = list(
+        get_competitors_collection()
+        .find(query, LIST_PROJECTION)
+        .sort("_id", pymongo.DESCENDING)
+        .skip(skip)
+        .limit(limit + 1)
+    )
+    has_more = len(competitors) > limit
+    competitors = competitors[:limit]
+    return {
+        "total": total,
+        "next_cursor": str(competitors[-1]["_id"]) if has_more else None,
+        "competitors": [serialize_competitor(competitor) for competitor in competitors],
+    }
+
+def update_competitor(competitor_id: str, owner_id: int, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Update the given fields of a competitor and invalidate its cached profile
+    """
+    object_id = to_object_id(competitor_id)
+    if object_id is None:
+        return None
+    changes = {key: value for key, value in fields.items() if value is not None}
+    changes["updated_at"] = datetime.utcnow()
+    competitor = get_competitors_collection().find_one_and_update(
+        {"_id": object_id, "owner_id": owner_id},
+        {"$set": changes},
+        return_document=ReturnDocument.AFTER,
+    )
+    invalidate_competitor(competitor_id)
+    return competitor
+
+def delete_competitor(competitor_id: str, owner_id: int) -> bool:
+    """
+    Delete a competitor and invalidate its cached profile
+    """
+    object_id = to_object_id(competitor_id)
+    if object_id is None:
+        return False
+    deleted = get_competitors_collection().delete_one({"_id": object_id, "owner_id": owner_id}).deleted_count > 0
+    invalidate_competitor(competitor_id)
+    if deleted:
+        now = time.time()
+        redis_client.zadd(REMOVED_COMPETITORS_KEY, {competitor_id: now})
+        redis_client.zremrangebyscore(REMOVED_COMPETITORS_KEY, "-inf", now - REMOVED_RETENTION_SECONDS)
+    return deleted
+
+def removed_competitors_since(since: float) -> Optional[List[str]]:
+    """
+    Ids of competitors deleted since a timestamp, or None when the log no longer reaches back that far
+    """
+    if since < time.time() - REMOVED_RETENTION_SECONDS:
+        return None
+    return redis_client.zrangebyscore(REMOVED_COMPETITORS_KEY, since, "+inf")
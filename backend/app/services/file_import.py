@@ -0,0 +1,238 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from pymongo.errors import BulkWriteError
+
+from app.services.collected_data import get_collected_data_collection, stamp_written
+from app.services.collection_jobs import complete_job, fail_job, is_job_cancelled, update_job_progress
+from app.services.alert_engine import evaluate_documents, flush_alerts
+from app.services.mention_tagger import record_competitor_mentions, tag_collected_documents
+from app.services.search_index import index_collected_documents
+from app.services.vector_index import embed_collected_documents
+
+SUPPORTED_FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".json": "jsonl",
+    ".xlsx": "excel",
+    ".xlsm": "excel",
+}
+
+# Source columns tried, in order, when no explicit mapping is given
+DEFAULT_COLUMN_CANDIDATES = {
+    "content": ["content", "text", "body", "message", "tweet", "description"],
+    "url": ["url", "link", "permalink"],
+    "collected_at": ["collected_at", "timestamp", "created_at", "date", "published_at"],
+    "sentiment": ["sentiment"],
+    "entities": ["entities", "tags"],
+}
+
+def detect_format(filename: str) -> str:
+    """
+    Get the import format from a file name
+    """
+    extension = os.path.splitext(filename.lower())[1]
+    if extension not in SUPPORTED_FORMATS:
+        raise ValueError(
+            f"Unsupported file type '{extension}', expected one of: {', '.join(sorted(SUPPORTED_FORMATS))}"
+        )
+    return SUPPORTED_FORMATS[extension]
+
+def spool_upload(upload: BinaryIO, directory: str, suffix: str) -> Tuple[str, int]:
+    """
+    Copy an uploaded file to disk in fixed-size pieces, returning its path and size
+    """
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=suffix, delete=False) as spooled:
+        shutil.copyfileobj(upload, spooled, length=1024 * 1024)
+        return spooled.name, spooled.tell()
+
+def iter_excel_chunks(path: str, chunk_rows: int) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """
+    Read the first worksheet row by row in read-only mode
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        total_rows = worksheet.max_row or 0
+        rows = worksheet.iter_rows(values_only=True)
+        header = [str(value) if value is not None else f"column_{number}" for number, value in enumerate(next(rows, []))]
+        chunk: List[Tuple[Any, ...]] = []
+        read_rows = 1
+        for row in rows:
+            chunk.append(row)
+            read_rows += 1
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=header), read_rows / max(total_rows, 1)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header), 1.0
+    finally:
+        workbook.close()
+
+def iter_chunks(path: str, file_format: str, chunk_rows: int) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """
+    Yield (chunk, fraction of the file read) without loading the whole file
+    """
+    if file_format == "excel":
+        yield from iter_excel_chunks(path, chunk_rows)
+        return
+    size = os.path.getsize(path) or 1
+    if file_format == "csv":
+        handle = open(path, "rb")
+        reader = pd.read_csv(handle, chunksize=chunk_rows)
+    else:
+        handle = open(path, "r", encoding="utf-8")
+        reader = pd.read_json(handle, lines=True, chunksize=chunk_rows, dtype=False)
+    with handle:
+        for chunk in reader:
+            yield chunk, min(handle.tell() / size, 1.0)
+
+def resolve_column_mapping(columns: List[str], mapping: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """
+    Map collected data fields to source columns
+    """
+    if mapping:
+        missing = [column for column in mapping.values() if column not in columns]
+        if missing:
+            raise ValueError(f"Mapped columns not found in file: {', '.join(missing)}")
+        resolved = dict(mapping)
+    else:
+        lowered = {column.lower(): column for column in columns}
+        resolved = {}
+        for field, candidates in DEFAULT_COLUMN_CANDIDATES.items():
+            for candidate in candidates:
+                if candidate in lowered:
+                    resolved[field] = lowered[candidate]
+                    break
+    if "content" not in resolved:
+        raise ValueError("No content column found; pass a column_mapping with a 'content' entry")
+    return resolved
+
+def split_entities(value: Any) -> List[str]:
+    """
+    Read an entities cell given either as a list or a comma separated string
+    """
+    if isinstance(value, list):
+        return value
+    if value is None or pd.isna(value):
+        return []
+    return [entity.strip() for entity in str(value).split(",") if entity.strip()]
+
+def normalize_chunk(
+    chunk: pd.DataFrame,
+    mapping: Dict[str, str],
+    source: str,
+    query: Optional[str],
+    imported_at: datetime,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Validate a chunk column-wise and convert it to collected data documents
+
+    Returns the documents and the number of rejected rows.
+    """
+    frame = pd.DataFrame(index=chunk.index)
+    content = chunk[mapping["content"]].astype("string").str.strip()
+    valid = content.notna() & (content != "")
+    frame["content"] = content
+
+    if "collected_at" in mapping:
+        timestamps = pd.to_datetime(chunk[mapping["collected_at"]], errors="coerce", utc=True)
+        frame["collected_at"] = timestamps.dt.tz_localize(None).fillna(pd.Timestamp(imported_at))
+    else:
+        frame["collected_at"] = pd.Timestamp(imported_at)
+
+    if "url" in mapping:
+        frame["url"] = chunk[mapping["url"]].astype("string")
+    if "sentiment" in mapping:
+        frame["sentiment"] = chunk[mapping["sentiment"]].astype("string").str.lower()
+    if "entities" in mapping:
+        frame["entities"] = chunk[mapping["entities"]].map(split_entities)
+
+    # Columns that are not mapped are kept as metadata
+    mapped_columns = set(mapping.values())
+    extra_columns = [column for column in chunk.columns if column not in mapped_columns]
+
+    frame = frame[valid]
+    rejected = int((~valid).sum())
+    if frame.empty:
+        return [], rejected
+
+    # BSON needs plain datetimes rather than pandas timestamps
+    collected_at = list(frame.pop("collected_at").dt.to_pydatetime())
+    frame = frame.astype(object).where(frame.notna(), None)
+    documents = frame.to_dict("records")
+    if extra_columns:
+        metadata = chunk.loc[valid, extra_columns].astype(object)
+        metadata = metadata.where(metadata.notna(), None).to_dict("records")
+        for document, document_metadata in zip(documents, metadata):
+            document["metadata"] = document_metadata
+    for document, document_collected_at in zip(documents, collected_at):
+        document["collected_at"] = document_collected_at
+        document["source"] = source
+        document["query"] = query
+        document["imported_at"] = imported_at
+    return documents, rejected
+
+def run_file_import(
+    job_id: Any,
+    path: str,
+    file_format: str,
+    source: str,
+    query: Optional[str] = None,
+    column_mapping: Optional[Dict[str, str]] = None,
+    chunk_rows: int = 50000,
+) -> None:
+    """
+    Import a file into collected data, reporting progress on the job
+    """
+    collection = get_collected_data_collection()
+    imported_at = datetime.utcnow()
+    inserted = 0
+    rejected = 0
+    try:
+        mapping = None
+        cancelled = False
+        for chunk, fraction in iter_chunks(path, file_format, chunk_rows):
+            if mapping is None:
+                mapping = resolve_column_mapping([str(column) for column in chunk.columns], column_mapping)
+            documents, chunk_rejected = normalize_chunk(chunk, mapping, source, query, imported_at)
+            rejected += chunk_rejected
+            if documents:
+                tag_collected_documents(documents)
+                stamp_written(documents)
+                # Unordered bulk inserts keep going past individual bad documents,
+                # which are counted as rejected rows
+                try:
+                    collection.insert_many(documents, ordered=False)
+                except BulkWriteError as exc:
+                    failed = {error["index"] for error in exc.details.get("writeErrors", [])}
+                    rejected += len(failed)
+                    documents = [document for position, document in enumerate(documents) if position not in failed]
+                inserted += len(documents)
+                index_collected_documents(documents)
+                embed_collected_documents(documents)
+                evaluate_documents(documents)
+                record_competitor_mentions(documents)
+            if is_job_cancelled(job_id):
+                cancelled = True
+                break
+            update_job_progress(job_id, fraction * 100, results_count=inserted, rows_rejected=rejected)
+        # Documents stored before a cancellation are kept, so they are flushed too
+        index_collected_documents([], flush=True)
+        embed_collected_documents([], flush=True)
+        flush_alerts()
+        if not cancelled:
+            complete_job(job_id, inserted, rows_rejected=rejected)
+    except Exception as exc:
+        # Runs as a background task, so the job is the only place to report errors
+        fail_job(job_id, str(exc))
+    finally:
+        os.remove(path)
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set
+
+import anyio
+import redis
+import redis.asyncio
+
+from app.core.config import settings
+from app.core.database import redis_client
+from app.core.responses import dumps_json
+
+# Job progress, report progress and alert notifications are published to a
+# Redis channel per user as they are written, from whichever process does
+# the work. Each API worker holds one Redis subscription, to the channels of
+# the users with an open stream there, and fans messages out to the streams
+# of its event loop; an idle stream costs a coroutine and a small queue.
+#
+# Pub/sub keeps no history: clients load current state when they (re)connect
+# and apply events on top of it.
+
+EVENT_CHANNEL_PREFIX = "events:user:"
+STREAM_RETRY_MS = 3000
+
+events_logger = logging.getLogger("app.live_events")
+
+def user_channel(user_id: int) -> str:
+    return f"{EVENT_CHANNEL_PREFIX}{user_id}"
+
+def publish_event(user_id: int, event_type: str, data: Dict[str, Any]) -> None:
+    """
+    Publish an event to a user's open streams; a Redis outage loses the event, not the caller's write
+    """
+    if not settings.LIVE_EVENTS_ENABLED:
+        return
+    try:
+        # Published as a server-sent event frame, so workers forward it unparsed
+        redis_client.publish(user_channel(user_id), b"event: " + event_type.encode() + b"\ndata: " + dumps_json(data) + b"\n\n")
+    except redis.RedisError as exc:
+        events_logger.warning("Could not publish %s event for user %s: %s", event_type, user_id, exc)
+
+class EventHub:
+    """
+    Fans the events of one Redis subscription out to the open streams of this process
+    """
+
+    def __init__(self, client_factory: Callable[[], Any]) -> None:
+        self.client_factory = client_factory
+        self.pubsub: Optional[Any] = None
+        self.reader: Optional["asyncio.Task[None]"] = None
+        # Channel -> queues of the streams subscribed to it
+        self.streams: Dict[str, Set["asyncio.Queue[bytes]"]] = {}
+        self.lock = asyncio.Lock()
+        self.open_streams = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+
+    async def subscribe(self, user_id: int) -> "asyncio.Queue[bytes]":
+        """
+        Queue of a new stream of a user's events
+        """
+        channel = user_channel(user_id)
+        queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=settings.LIVE_EVENTS_QUEUE_SIZE)
+        async with self.lock:
+            if self.pubsub is None:
+                self.pubsub = self.client_factory().pubsub(ignore_subscribe_messages=True)
+            subscribers = self.streams.get(channel)
+            if subscribers is None:
+                subscribers = self.streams[channel] = set()
+                await self.pubsub.subscribe(channel)
+            subscribers.add(queue)
+            self.open_streams += 1
+            if self.reader is None or self.reader.done():
+                self.reader = asyncio.create_task(self._read())
+        return queue
+
+    async def unsubscribe(self, user_id: int, queue: "asyncio.Queue[bytes]") -> None:
+        channel = user_channel(user_id)
+        async with self.lock:
+            subscribers = self.streams.get(channel)
+            if subscribers is None or queue not in subscribers:
+                return
+            subscribers.discard(queue)
+            self.open_streams -= 1
+            if not subscribers:
+                del self.streams[channel]
+                await self.pubsub.unsubscribe(channel)
+
+    async def _read(self) -> None:
+        # Runs for the life of the process once the first stream opens
+        while True:
+            try:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except redis.RedisError as exc:
+                # The subscription reconnects and resubscribes on the next read
+                self.errors += 1
+                events_logger.warning("Event subscription failed: %s", exc)
+                await asyncio.sleep(1.0)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            subscribers = self.streams.get(message["channel"])
+            if not subscribers:
+                continue
+            frame = message["data"].encode()
+            for queue in subscribers:
+                try:
+                    queue.put_nowait(frame)
+                    self.delivered += 1
+                except asyncio.QueueFull:
+                    self.dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streams": self.open_streams,
+            "users": len(self.streams),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+def _subscription_client() -> Any:
+    # Connected in the worker's event loop, never shared across a fork
+    return redis.asyncio.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        decode_responses=True,
+    )
+
+_hub: Optional[EventHub] = None
+
+def get_event_hub() -> EventHub:
+    """
+    Get the event hub of this process
+    """
+    global _hub
+    # Only created and used on the event loop's thread
+    if _hub is None:
+        _hub = EventHub(_subscription_client)
+    return _hub
+
+async def event_stream(hub: EventHub, user_id: int) -> AsyncIterator[bytes]:
+    """
+    Server-sent events of a user until the client disconnects, with comments as heartbeats
+    """
+    queue = await hub.subscribe(user_id)
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n: connected\n\n".encode()
+        while True:
+            frame = b": heartbeat\n\n"
+            with anyio.move_on_after(settings.LIVE_EVENTS_HEARTBEAT_SECONDS):
+                frame = await queue.get()
+            yield frame
+    finally:
+        # The response is cancelled when the client goes away
+        with anyio.CancelScope(shield=True):
+            await hub.unsubscribe(user_id, queue)
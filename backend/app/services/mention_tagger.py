@@ -0,0 +1,293 @@
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.activity_timeline import record_activities
+from app.services.competitor_store import get_competitors_collection, removed_competitors_since
+
+# Collected documents are tagged with the tracked competitors they mention,
+# by name, alias or social handle, and each mention is recorded on the
+# competitor's activity timeline (which also feeds the comparison matrix).
+#
+# Text and patterns are split into the same case-folded tokens (words, and
+# punctuation marks on their own), and one Aho-Corasick automaton over
+# token sequences finds every pattern in a single pass, however many
+# competitors are tracked. Matching whole tokens means "Acme" is found in
+# "@Acme's" but not in "Acmeology".
+#
+# Each process follows competitor changes through updated_at and the log of
+# deleted ids. Patterns added since the automaton was built go into a small
+# second automaton, rebuilt on every change; the large one is rebuilt once
+# the small one outgrows MENTION_TAGGER_DELTA_PATTERNS. Removed patterns
+# stay in the automata until then but no longer map to any competitor.
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+SOCIAL_SOURCES = {"social", "twitter", "reddit", "linkedin", "facebook", "instagram", "youtube", "tiktok", "mastodon"}
+NEWS_SOURCES = {"news"}
+
+ACTIVITY_TITLE_LENGTH = 200
+
+# Overlap of watermark reads, as in the comparison matrix
+WATERMARK_OVERLAP = timedelta(seconds=5)
+
+Pattern = Tuple[str, ...]
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.casefold())
+
+def competitor_patterns(competitor: Dict[str, Any]) -> Set[Pattern]:
+    """
+    Token sequences a competitor is mentioned by: its name, aliases and social handles
+    """
+    names = [competitor.get("name"), *(competitor.get("aliases") or [])]
+    for profile in (competitor.get("social_profiles") or {}).values():
+        if isinstance(profile, str) and profile.strip("/@ "):
+            # Profiles are handles or profile URLs ending in one
+            names.append("@" + profile.rstrip("/").rsplit("/", 1)[-1].lstrip("@"))
+    patterns = set()
+    for name in names:
+        if isinstance(name, str) and len(name.strip()) >= settings.MENTION_TAGGER_MIN_PATTERN_LENGTH:
+            tokens = tuple(tokenize(name))
+            if tokens:
+                patterns.add(tokens)
+    return patterns
+
+class MentionAutomaton:
+    """
+    Aho-Corasick automaton over token sequences
+    """
+
+    def __init__(self, patterns: Iterable[Pattern]) -> None:
+        self.goto: List[Dict[str, int]] = [{}]
+        # Patterns ending at each state, including through its failure links
+        self.outputs: List[List[Pattern]] = [[]]
+        for pattern in patterns:
+            state = 0
+            for token in pattern:
+                next_state = self.goto[state].get(token)
+                if next_state is None:
+                    next_state = self.goto[state][token] = len(self.goto)
+                    self.goto.append({})
+                    self.outputs.append([])
+                state = next_state
+            self.outputs[state].append(pattern)
+        self.fail = [0] * len(self.goto)
+        # Breadth first, so the failure state of a state is complete before it
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(token, 0)
+                if self.outputs[self.fail[child]]:
+                    self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    @property
+    def states(self) -> int:
+        return len(self.goto)
+
+    def find(self, tokens: List[str]) -> Iterator[Tuple[int, Pattern]]:
+        """
+        (end position, pattern) of every occurrence of a pattern
+        """
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        for position, token in enumerate(tokens):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for pattern in outputs[state]:
+                yield position, pattern
+
+class MentionTagger:
+    """
+    Patterns of every tracked competitor, kept current with their changes
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.competitors: Dict[str, Set[Pattern]] = {}
+        self.patterns: Dict[Pattern, Set[str]] = {}
+        self.base = MentionAutomaton([])
+        self.base_patterns: Set[Pattern] = set()
+        self.delta = MentionAutomaton([])
+        self.delta_patterns: Set[Pattern] = set()
+        self.watermark: Optional[datetime] = None
+        self.checked_at = 0.0
+        self.full_rebuilds = 0
+        self.incremental_updates = 0
+
+    def _set_competitor(self, competitor_id: str, patterns: Set[Pattern]) -> None:
+        previous = self.competitors.pop(competitor_id, set())
+        for pattern in previous - patterns:
+            owners = self.patterns[pattern]
+            owners.discard(competitor_id)
+            if not owners:
+                del self.patterns[pattern]
+        for pattern in patterns:
+            self.patterns.setdefault(pattern, set()).add(competitor_id)
+        if patterns:
+            self.competitors[competitor_id] = patterns
+
+    def rebuild(self, competitors: Iterable[Dict[str, Any]]) -> None:
+        """
+        Rebuild from every competitor
+        """
+        self.competitors = {}
+        self.patterns = {}
+        for competitor in competitors:
+            self._set_competitor(str(competitor["_id"]), competitor_patterns(competitor))
+        self._build_base()
+
+    def _build_base(self) -> None:
+        self.base_patterns = set(self.patterns)
+        self.base = MentionAutomaton(self.base_patterns)
+        self.delta_patterns = set()
+        self.delta = MentionAutomaton([])
+        self.full_rebuilds += 1
+
+    def apply(self, changed: Iterable[Dict[str, Any]], removed: Iterable[str] = ()) -> None:
+        """
+        Update the patterns of changed and removed competitors
+        """
+        added: Set[Pattern] = set()
+        for competitor in changed:
+            patterns = competitor_patterns(competitor)
+            self._set_competitor(str(competitor["_id"]), patterns)
+            added.update(pattern for pattern in patterns if pattern not in self.base_patterns and pattern not in self.delta_patterns)
+            self.incremental_updates += 1
+        for competitor_id in removed:
+            self._set_competitor(competitor_id, set())
+            self.incremental_updates += 1
+        if not added:
+            return
+        if len(self.delta_patterns) + len(added) > settings.MENTION_TAGGER_DELTA_PATTERNS:
+            self._build_base()
+        else:
+            self.delta_patterns.update(added)
+            self.delta = MentionAutomaton(self.delta_patterns)
+
+    def refresh(self, now: Optional[datetime] = None) -> None:
+        """
+        Apply competitor changes since the last refresh, rebuilding when deletions can no longer be followed
+        """
+        now = now or datetime.utcnow()
+        projection = {"name": 1, "aliases": 1, "social_profiles": 1}
+        watermark = now - WATERMARK_OVERLAP
+        removed = None
+        if self.watermark is not None:
+            removed = removed_competitors_since(self.watermark.replace(tzinfo=timezone.utc).timestamp())
+        if removed is None:
+            self.rebuild(get_competitors_collection().find({}, projection))
+        else:
+            self.apply(get_competitors_collection().find({"updated_at": {"$gte": self.watermark}}, projection), removed)
+        self.watermark = watermark
+
+    def ensure_fresh(self) -> None:
+        """
+        Refresh when the last check is older than MENTION_TAGGER_REFRESH_SECONDS
+        """
+        with self.lock:
+            if time.monotonic() - self.checked_at >= settings.MENTION_TAGGER_REFRESH_SECONDS:
+                self.refresh()
+                self.checked_at = time.monotonic()
+
+    def tag(self, text: str) -> List[str]:
+        """
+        Ids of the competitors a text mentions; a match inside a longer one (a name within an alias) is not counted
+        """
+        tokens = tokenize(text)
+        competitor_ids: Set[str] = set()
+        with self.lock:
+            spans = [
+                (end - len(pattern) + 1, end, pattern)
+                for automaton in (self.base, self.delta)
+                for end, pattern in automaton.find(tokens)
+                if pattern in self.patterns
+            ]
+            # Longest first among matches starting at the same token
+            spans.sort(key=lambda span: (span[0], -span[1]))
+            covered_to = -1
+            for _, end, pattern in spans:
+                if end > covered_to:
+                    competitor_ids.update(self.patterns[pattern])
+                    covered_to = end
+        return sorted(competitor_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "competitors": len(self.competitors),
+            "patterns": len(self.patterns),
+            "states": self.base.states + self.delta.states,
+            "delta_patterns": len(self.delta_patterns),
+            "refreshed_at": self.watermark.isoformat() + "Z" if self.watermark else None,
+            "full_rebuilds": self.full_rebuilds,
+            "incremental_updates": self.incremental_updates,
+        }
+
+_tagger: Optional[MentionTagger] = None
+_tagger_lock = threading.Lock()
+
+def get_mention_tagger() -> MentionTagger:
+    """
+    Get the process-wide mention tagger
+    """
+    global _tagger
+    with _tagger_lock:
+        if _tagger is None:
+            _tagger = MentionTagger()
+    return _tagger
+
+def tag_collected_documents(documents: Iterable[Dict[str, Any]]) -> int:
+    """
+    Set ``competitor_ids`` on documents mentioning tracked competitors, before they are stored; returns how many were tagged
+    """
+    if not settings.MENTION_TAGGING_ENABLED:
+        return 0
+    tagger = get_mention_tagger()
+    tagger.ensure_fresh()
+    tagged = 0
+    for document in documents:
+        competitor_ids = tagger.tag(document.get("content") or "")
+        if competitor_ids:
+            document["competitor_ids"] = competitor_ids
+            tagged += 1
+    return tagged
+
+def activity_type(source: Optional[str]) -> str:
+    if source in SOCIAL_SOURCES:
+        return "social"
+    if source in NEWS_SOURCES:
+        return "news"
+    return "web"
+
+def record_competitor_mentions(documents: Iterable[Dict[str, Any]]) -> int:
+    """
+    Record tagged documents, once stored, as activity of the competitors they mention
+    """
+    if not settings.MENTION_TAGGING_ENABLED:
+        return 0
+    by_competitor: Dict[str, List[Dict[str, Any]]] = {}
+    for document in documents:
+        if not document.get("competitor_ids"):
+            continue
+        activity = {
+            "id": str(document["_id"]),
+            "type": activity_type(document.get("source")),
+            "date": document.get("collected_at") or datetime.utcnow(),
+            "title": (document.get("content") or "")[:ACTIVITY_TITLE_LENGTH],
+            "source": document.get("source"),
+            "url": document.get("url"),
+            "sentiment": document.get("sentiment"),
+        }
+        for competitor_id in document["competitor_ids"]:
+            by_competitor.setdefault(competitor_id, []).append(activity)
+    return sum(record_activities(competitor_id, activities) for competitor_id, activities in by_competitor.items())
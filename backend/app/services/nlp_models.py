@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.report_render import office_template, pdf_assets
+
+# Models and read-only tables are loaded once per process on first use. The
+# preforking server loads them in the master before forking, so workers
+# share their memory copy-on-write instead of each loading a copy.
+
+_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+def _model_path(name: str) -> str:
+    # A directory under NLP_MODELS_DIR wins over a downloadable model of the same name
+    local = os.path.join(settings.NLP_MODELS_DIR, name)
+    return local if os.path.isdir(local) else name
+
+def _load_sentiment_model() -> Any:
+    from transformers import pipeline
+
+    return pipeline("sentiment-analysis", model=_model_path(settings.NLP_SENTIMENT_MODEL), top_k=None)
+
+def _load_spacy_model() -> Any:
+    import spacy
+
+    return spacy.load(_model_path(settings.NLP_SPACY_MODEL))
+
+def _load_embedding_model() -> Any:
+    from transformers import AutoModel, AutoTokenizer
+
+    path = _model_path(settings.NLP_EMBEDDING_MODEL)
+    return AutoTokenizer.from_pretrained(path), AutoModel.from_pretrained(path).eval()
+
+MODEL_LOADERS: Dict[str, Callable[[], Any]] = {
+    "sentiment": _load_sentiment_model,
+    "spacy": _load_spacy_model,
+    "embedding": _load_embedding_model,
+}
+
+def configured_models() -> List[str]:
+    """
+    Models enabled in the settings
+    """
+    configured = {
+        "sentiment": settings.NLP_SENTIMENT_MODEL,
+        "spacy": settings.NLP_SPACY_MODEL,
+        "embedding": settings.NLP_EMBEDDING_MODEL,
+    }
+    return [name for name, model in configured.items() if model]
+
+def get_model(name: str) -> Optional[Any]:
+    """
+    Get a loaded model, loading it on first use; None when the model isn't configured
+    """
+    if name not in configured_models():
+        return None
+    model = _models.get(name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(name)
+            if model is None:
+                model = _models[name] = MODEL_LOADERS[name]()
+    return model
+
+def analyze_sentiment(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Sentiment label, confidence and per-label scores of a text; None without a sentiment model
+    """
+    model = get_model("sentiment")
+    if model is None:
+        return None
+    scores = {result["label"].lower(): round(result["score"], 4) for result in model(text, truncation=True)[0]}
+    label = max(scores, key=scores.get)
+    return {"sentiment": label, "confidence": scores[label], "details": scores}
+
+def embed_texts(texts: List[str]) -> Optional[np.ndarray]:
+    """
+    Unit-length float32 embeddings of texts (mean-pooled encoder states), computed on the CPU in batches; None without an embedding model
+    """
+    model = get_model("embedding")
+    if model is None:
+        return None
+    import torch
+
+    tokenizer, encoder = model
+    batch_size = settings.NLP_EMBEDDING_BATCH_SIZE
+    # Batches of similar lengths waste less work on padding
+    order = sorted(range(len(texts)), key=lambda position: len(texts[position]))
+    embeddings = np.zeros((len(texts), encoder.config.hidden_size), dtype=np.float32)
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            positions = order[start:start + batch_size]
+            batch = tokenizer(
+                [texts[position] for position in positions],
+                padding=True,
+                truncation=True,
+                max_length=settings.NLP_EMBEDDING_MAX_TOKENS,
+                return_tensors="pt",
+            )
+            states = encoder(**batch).last_hidden_state
+            mask = batch["attention_mask"].unsqueeze(-1).to(states.dtype)
+            pooled = (states * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            embeddings[positions] = torch.nn.functional.normalize(pooled, dim=1).numpy()
+    return embeddings
+
+def preload() -> Dict[str, float]:
+    """
+    Load the configured models and the read-only tables of the render and search code, returning seconds per item
+    """
+    loaders: Dict[str, Callable[[], Any]] = {name: (lambda name=name: get_model(name)) for name in configured_models()}
+    loaders["pdf_assets"] = pdf_assets
+    loaders["docx_template"] = lambda: office_template("docx")
+    loaders["pptx_template"] = lambda: office_template("pptx")
+    if settings.SEARCH_INDEX_ENABLED:
+        from app.services.search_index import get_search_index
+
+        loaders["search_index"] = get_search_index
+    if settings.VECTOR_INDEX_ENABLED:
+        from app.services.vector_index import get_vector_index
+
+        loaders["vector_index"] = get_vector_index
+
+    timings = {}
+    for name, load in loaders.items():
+        started = time.perf_counter()
+        load()
+        timings[name] = time.perf_counter() - started
+    return timings
@@ -0,0 +1,253 @@
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from bson import ObjectId
+from pyarrow import fs
+
+from app.core.config import settings
+from app.core.database import redis_client
+from app.services.collected_data import get_collected_data_collection
+from app.services.report_sections import day_key, iter_days
+
+# Collected data and its NLP results (sentiment, entities) are exported to
+# Parquet files partitioned by source and day, one file per partition:
+#
+#     PARQUET_STORE_DIR/source=twitter/date=2024-01-31/part-0.parquet
+#
+# Analysis scans open only the partitions of their sources and days, read
+# only the columns they use, push time filters down to row group statistics
+# and memory-map the files. The export job rewrites whole partitions, so it
+# can rerun safely; incremental runs rewrite the partitions of documents
+# written (inserted or updated in place) since the last run, by their
+# updated_at. The store directory must be shared by every API host reading
+# it. Sources are percent-encoded in partition paths, so one cannot name a
+# path outside the store or nest partition directories.
+
+EXPORT_LOCK_KEY = "parquet_export:lock"
+EXPORT_STATE_FILE = "_export_state.json"
+PARTITION_FILE = "part-0.parquet"
+
+# Write times come from each writer's clock and a write lands some time
+# after it is stamped, so incremental runs re-read this far behind the last
+# one; rewriting a partition twice is harmless
+EXPORT_WATERMARK_OVERLAP = timedelta(minutes=5)
+
+export_logger = logging.getLogger("app.parquet_store")
+
+COLLECTED_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("collected_at", pa.timestamp("ms")),
+    ("query", pa.string()),
+    ("url", pa.string()),
+    ("content", pa.string()),
+    ("sentiment", pa.string()),
+    ("entities", pa.list_(pa.string())),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([("source", pa.string()), ("date", pa.string())]), flavor="hive")
+
+# Columns scans can read: the stored ones and the partition keys
+DATASET_SCHEMA = pa.schema([*COLLECTED_SCHEMA, *PARTITIONING.schema])
+
+Partition = Tuple[str, str]
+
+def partition_path(source: str, day: str) -> str:
+    return os.path.join(settings.PARQUET_STORE_DIR, f"source={quote(source, safe='')}", f"date={day}", PARTITION_FILE)
+
+def _partition_table(documents: Iterable[Dict[str, Any]]) -> pa.Table:
+    columns: Dict[str, List[Any]] = {name: [] for name in COLLECTED_SCHEMA.names}
+    for document in documents:
+        columns["id"].append(str(document["_id"]))
+        columns["collected_at"].append(document["collected_at"])
+        for name in ("query", "url", "content"):
+            value = document.get(name)
+            columns[name].append(value if isinstance(value, str) else None)
+        sentiment = document.get("sentiment")
+        columns["sentiment"].append(sentiment if isinstance(sentiment, str) else None)
+        entities = document.get("entities")
+        columns["entities"].append([str(entity) for entity in entities] if isinstance(entities, list) else [])
+    return pa.table(columns, schema=COLLECTED_SCHEMA)
+
+def export_partition(source: str, day: str) -> int:
+    """
+    Rewrite one partition from MongoDB; returns the rows written
+    """
+    start = datetime.strptime(day, "%Y-%m-%d")
+    documents = (
+        get_collected_data_collection()
+        .find(
+            {"source": source, "collected_at": {"$gte": start, "$lt": start + timedelta(days=1)}},
+            {name: 1 for name in ("collected_at", "query", "url", "content", "sentiment", "entities")},
+        )
+        .sort("collected_at", 1)
+        .batch_size(10000)
+    )
+    table = _partition_table(documents)
+    path = partition_path(source, day)
+    if not table.num_rows:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Readers see the old file or the new one, never a partial one
+    temporary = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, temporary, compression="zstd", row_group_size=settings.PARQUET_ROW_GROUP_SIZE)
+    os.replace(temporary, path)
+    return table.num_rows
+
+def _read_state() -> Dict[str, Any]:
+    try:
+        with open(os.path.join(settings.PARQUET_STORE_DIR, EXPORT_STATE_FILE)) as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {}
+
+def _write_state(state: Dict[str, Any]) -> None:
+    path = os.path.join(settings.PARQUET_STORE_DIR, EXPORT_STATE_FILE)
+    os.makedirs(settings.PARQUET_STORE_DIR, exist_ok=True)
+    with open(f"{path}.tmp", "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(f"{path}.tmp", path)
+
+def export_partitions(partitions: Iterable[Partition]) -> Dict[str, Any]:
+    """
+    Rewrite the given partitions
+    """
+    started = time.perf_counter()
+    partitions = sorted(set(partitions))
+    rows = sum(export_partition(source, day) for source, day in partitions)
+    return {"partitions": len(partitions), "rows": rows, "seconds": round(time.perf_counter() - started, 3)}
+
+def export_new_documents() -> Dict[str, Any]:
+    """
+    Rewrite the partitions of documents written since the last export
+    """
+    state = _read_state()
+    started_at = datetime.utcnow()
+    query: Dict[str, Any] = {"source": {"$type": "string"}, "collected_at": {"$type": "date"}}
+    if state.get("watermark"):
+        query["updated_at"] = {"$gte": datetime.fromisoformat(state["watermark"])}
+    elif state.get("last_id"):
+        # State of an export from before updated_at was tracked
+        last_id = ObjectId(state["last_id"])
+        query["$or"] = [
+            {"updated_at": {"$gte": last_id.generation_time.replace(tzinfo=None) - EXPORT_WATERMARK_OVERLAP}},
+            {"_id": {"$gt": last_id}},
+        ]
+    partitions: Set[Partition] = set()
+    for document in get_collected_data_collection().find(query, {"source": 1, "collected_at": 1}):
+        partitions.add((document["source"], day_key(document["collected_at"])))
+    result = export_partitions(partitions)
+    _write_state({
+        "watermark": (started_at - EXPORT_WATERMARK_OVERLAP).isoformat(),
+        "exported_at": started_at.isoformat() + "Z",
+        **result,
+    })
+    return result
+
+def export_range(start: datetime, end: datetime, sources: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Rewrite every partition of a window of whole days, for backfills and data changed in place
+    """
+    sources = sources or get_collected_data_collection().distinct("source")
+    return export_partitions((source, day) for source in sources for day in iter_days(start, end))
+
+def stored_sources() -> List[str]:
+    try:
+        entries = os.listdir(settings.PARQUET_STORE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(unquote(entry.split("=", 1)[1]) for entry in entries if entry.startswith("source="))
+
+def scan(
+    columns: List[str],
+    start: datetime,
+    end: datetime,
+    sources: Optional[List[str]] = None,
+    entities: Optional[List[str]] = None,
+) -> pa.Table:
+    """
+    Read columns of the documents collected in [start, end), optionally only of some sources or mentioning some entities
+
+    ``source`` and ``date`` come from the partition paths. Only the
+    partitions of the window are opened.
+    """
+    first_day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    # Days overlapping the window; the time filter trims partial days at its edges
+    days = iter_days(first_day, first_day + timedelta(days=math.ceil((end - first_day) / timedelta(days=1))))
+    paths = [
+        path
+        for source in (sources or stored_sources())
+        for day in days
+        if os.path.exists(path := partition_path(source, day))
+    ]
+    read_columns = list(dict.fromkeys(columns + (["entities"] if entities else [])))
+    if not paths:
+        return DATASET_SCHEMA.empty_table().select(columns)
+    dataset = ds.dataset(
+        paths,
+        schema=DATASET_SCHEMA,
+        format="parquet",
+        partitioning=PARTITIONING,
+        partition_base_dir=settings.PARQUET_STORE_DIR,
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+    time_filter = (ds.field("collected_at") >= pa.scalar(start, pa.timestamp("ms"))) & (
+        ds.field("collected_at") < pa.scalar(end, pa.timestamp("ms"))
+    )
+    table = dataset.to_table(columns=read_columns, filter=time_filter)
+    if entities:
+        mentions = table["entities"].combine_chunks()
+        matched = pc.filter(pc.list_parent_indices(mentions), pc.is_in(pc.list_flatten(mentions), value_set=pa.array(entities)))
+        table = table.take(pc.unique(matched))
+    return table.select(columns)
+
+def store_stats() -> Dict[str, Any]:
+    """
+    Partitions, size and last export of the store
+    """
+    partitions = 0
+    size_bytes = 0
+    for root, _, files in os.walk(settings.PARQUET_STORE_DIR):
+        if PARTITION_FILE in files:
+            partitions += 1
+            size_bytes += os.path.getsize(os.path.join(root, PARTITION_FILE))
+    return {"sources": stored_sources(), "partitions": partitions, "size_bytes": size_bytes, "last_export": _read_state()}
+
+def run_export_loop(stop_event: threading.Event) -> None:
+    """
+    Export new documents every interval; one API worker at a time holds the lock
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    interval = settings.PARQUET_EXPORT_INTERVAL_SECONDS
+    while not stop_event.is_set():
+        lock_seconds = max(int(interval * 2), 1)
+        try:
+            acquired = redis_client.set(EXPORT_LOCK_KEY, owner, nx=True, ex=lock_seconds)
+            if acquired or redis_client.get(EXPORT_LOCK_KEY) == owner:
+                redis_client.expire(EXPORT_LOCK_KEY, lock_seconds)
+                export_new_documents()
+        except Exception:
+            # A datastore outage skips this tick instead of ending the thread
+            export_logger.exception("Parquet export failed")
+        stop_event.wait(interval)
+
+def start_export_scheduler() -> threading.Event:
+    """
+    Start the export loop in a daemon thread and return its stop event
+    """
+    stop_event = threading.Event()
+    threading.Thread(target=run_export_loop, args=(stop_event,), name="parquet-export", daemon=True).start()
+    return stop_event
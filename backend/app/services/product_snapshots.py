@@ -0,0 +1,331 @@
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import pymongo
+
+from app.core.database import get_mongo_collection
+from app.services.activity_timeline import record_activities
+from app.services.alert_engine import evaluate_events, product_change_events
+
+PRODUCTS_COLLECTION = "competitor_products"
+PRODUCT_CHANGES_COLLECTION = "competitor_product_changes"
+
+# Fields whose changes are reported as price changes
+PRICE_FIELDS = {"price", "price_range", "pricing_model", "currency", "plans"}
+
+CHANGE_TYPES = ["created", "removed", "price", "features", "content"]
+
+PRODUCT_INDEXES = [
+    pymongo.IndexModel(
+        [("competitor_id", pymongo.ASCENDING), ("product_key", pymongo.ASCENDING)],
+        name="competitor_product_key",
+        unique=True,
+    ),
+]
+
+PRODUCT_CHANGE_INDEXES = [
+    pymongo.IndexModel(
+        [("competitor_id", pymongo.ASCENDING), ("changed_at", pymongo.DESCENDING)],
+        name="competitor_changed_at",
+    ),
+    # Multikey: one index entry per change type
+    pymongo.IndexModel(
+        [("competitor_id", pymongo.ASCENDING), ("change_types", pymongo.ASCENDING), ("changed_at", pymongo.DESCENDING)],
+        name="competitor_change_type_changed_at",
+    ),
+    pymongo.IndexModel(
+        [("competitor_id", pymongo.ASCENDING), ("product_key", pymongo.ASCENDING), ("version", pymongo.DESCENDING)],
+        name="competitor_product_version",
+        unique=True,
+    ),
+]
+
+def get_products_collection() -> Any:
+    """
+    Get the MongoDB collection holding the current version of each product
+    """
+    return get_mongo_collection(PRODUCTS_COLLECTION)
+
+def get_product_changes_collection() -> Any:
+    """
+    Get the MongoDB collection holding product deltas
+    """
+    return get_mongo_collection(PRODUCT_CHANGES_COLLECTION)
+
+def ensure_product_snapshot_indexes() -> List[str]:
+    """
+    Create the indexes used by product snapshot queries if they don't exist
+    """
+    return get_products_collection().create_indexes(PRODUCT_INDEXES) + get_product_changes_collection().create_indexes(
+        PRODUCT_CHANGE_INDEXES
+    )
+
+def product_key(product: Dict[str, Any]) -> str:
+    """
+    Stable key of a product across crawls
+    """
+    if product.get("id"):
+        return str(product["id"])
+    if product.get("url"):
+        return str(product["url"]).rstrip("/").lower()
+    if product.get("name"):
+        return re.sub(r"[^a-z0-9]+", "-", str(product["name"]).lower()).strip("-")
+    raise ValueError("Products need an id, url or name")
+
+def fingerprint(record: Dict[str, Any]) -> str:
+    """
+    Hash of a product record's canonical JSON form
+    """
+    canonical = json.dumps(record, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+def compute_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Top-level fields set or removed between two versions, with their old values
+    """
+    changed = {field: value for field, value in current.items() if previous.get(field) != value or field not in previous}
+    removed = [field for field in previous if field not in current]
+    return {
+        "set": changed,
+        "unset": removed,
+        "previous": {field: previous[field] for field in list(changed) + removed if field in previous},
+    }
+
+def classify_delta(delta: Dict[str, Any]) -> List[str]:
+    """
+    Change types of a delta, used by the change index
+    """
+    fields = set(delta["set"]) | set(delta["unset"])
+    change_types = []
+    if fields & PRICE_FIELDS:
+        change_types.append("price")
+    if "features" in fields:
+        change_types.append("features")
+    if fields - PRICE_FIELDS - {"features"}:
+        change_types.append("content")
+    return change_types
+
+def revert_delta(record: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn a version back into the one before a delta was applied
+    """
+    reverted = {field: value for field, value in record.items() if field not in delta["set"]}
+    reverted.update(delta.get("previous", {}))
+    return reverted
+
+def _summarize(record: Dict[str, Any], change_types: List[str], delta: Dict[str, Any]) -> str:
+    name = record.get("name") or "Product"
+    if "created" in change_types:
+        return f"{name} added"
+    if "removed" in change_types:
+        return f"{name} removed"
+    if "price" in change_types:
+        fields = [field for field in list(delta["set"]) + delta["unset"] if field in PRICE_FIELDS]
+        before = ", ".join(str(delta["previous"].get(field)) for field in fields)
+        after = ", ".join(str(delta["set"].get(field)) for field in fields)
+        return f"{name} price changed from {before} to {after}"
+    return f"{name} updated ({', '.join(sorted(set(delta['set']) | set(delta['unset'])))})"
+
+def record_snapshot(
+    competitor_id: str,
+    products: Iterable[Dict[str, Any]],
+    observed_at: Optional[datetime] = None,
+    complete: bool = True,
+) -> Dict[str, int]:
+    """
+    Store a crawl of a competitor's products as deltas against the last version
+
+    Unchanged products (same fingerprint) only have their last_seen_at moved.
+    With ``complete`` the crawl is taken to list every product, so known
+    products missing from it are marked removed.
+    """
+    observed_at = observed_at or datetime.utcnow()
+    products_collection = get_products_collection()
+    # Removed products are kept so a product that comes back continues its history
+    current = {stored["product_key"]: stored for stored in products_collection.find({"competitor_id": competitor_id})}
+
+    product_operations = []
+    changes = []
+    unchanged = []
+    seen = set()
+    for product in products:
+        key = product_key(product)
+        if key in seen:
+            continue
+        seen.add(key)
+        record = {field: value for field, value in product.items() if field != "id"}
+        record_fingerprint = fingerprint(record)
+        stored = current.get(key)
+        if stored is not None and not stored["removed"] and stored["fingerprint"] == record_fingerprint:
+            unchanged.append(key)
+            continue
+
+        delta = compute_delta(stored["record"] if stored else {}, record)
+        if stored is None or stored["removed"]:
+            change_types = ["created"]
+        else:
+            change_types = classify_delta(delta)
+        version = stored["version"] + 1 if stored else 1
+        changes.append(
+            {
+                "competitor_id": competitor_id,
+                "product_key": key,
+                "version": version,
+                "changed_at": observed_at,
+                "change_types": change_types,
+                "fingerprint": record_fingerprint,
+                "delta": delta,
+                "summary": _summarize(record, change_types, delta),
+            }
+        )
+        product_operations.append(
+            pymongo.UpdateOne(
+                {"competitor_id": competitor_id, "product_key": key},
+                {
+                    "$set": {
+                        "record": record,
+                        "fingerprint": record_fingerprint,
+                        "version": version,
+                        "removed": False,
+                        "last_changed_at": observed_at,
+                        "last_seen_at": observed_at,
+                    },
+                    "$setOnInsert": {"first_seen_at": observed_at},
+                },
+                upsert=True,
+            )
+        )
+
+    if complete:
+        for key, stored in current.items():
+            if key in seen or stored["removed"]:
+                continue
+            delta = {"set": {}, "unset": [], "previous": {}}
+            changes.append(
+                {
+                    "competitor_id": competitor_id,
+                    "product_key": key,
+                    "version": stored["version"] + 1,
+                    "changed_at": observed_at,
+                    "change_types": ["removed"],
+                    "fingerprint": stored["fingerprint"],
+                    "delta": delta,
+                    "summary": _summarize(stored["record"], ["removed"], delta),
+                }
+            )
+            product_operations.append(
+                pymongo.UpdateOne(
+                    {"_id": stored["_id"]},
+                    {"$set": {"removed": True, "version": stored["version"] + 1, "last_changed_at": observed_at}},
+                )
+            )
+
+    if product_operations:
+        products_collection.bulk_write(product_operations, ordered=False)
+    if changes:
+        get_product_changes_collection().insert_many(changes, ordered=False)
+        evaluate_events(product_change_events(changes))
+        record_activities(
+            competitor_id,
+            [
+                {"type": "product", "date": observed_at, "title": change["summary"], "source": "product_tracking"}
+                for change in changes
+            ],
+        )
+    if unchanged:
+        products_collection.update_many(
+            {"competitor_id": competitor_id, "product_key": {"$in": unchanged}},
+            {"$set": {"last_seen_at": observed_at}},
+        )
+    return {
+        "products_seen": len(seen),
+        "unchanged": len(unchanged),
+        "changes": len(changes),
+    }
+
+def serialize_product(product: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a current product document into the API representation
+    """
+    return {
+        "id": product["product_key"],
+        **product["record"],
+        "version": product["version"],
+        "first_seen_at": product["first_seen_at"].isoformat() + "Z",
+        "last_changed_at": product["last_changed_at"].isoformat() + "Z",
+        "last_seen_at": product["last_seen_at"].isoformat() + "Z",
+    }
+
+def serialize_change(change: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a change document into the API representation
+    """
+    return {
+        "product_id": change["product_key"],
+        "version": change["version"],
+        "changed_at": change["changed_at"].isoformat() + "Z",
+        "change_types": change["change_types"],
+        "summary": change["summary"],
+        "changed_fields": {
+            field: {"from": change["delta"]["previous"].get(field), "to": value}
+            for field, value in change["delta"]["set"].items()
+        },
+        "removed_fields": change["delta"]["unset"],
+    }
+
+def list_products(competitor_id: str, include_removed: bool = False) -> List[Dict[str, Any]]:
+    """
+    Current version of each of a competitor's products
+    """
+    query: Dict[str, Any] = {"competitor_id": competitor_id}
+    if not include_removed:
+        query["removed"] = False
+    return list(get_products_collection().find(query).sort("product_key", pymongo.ASCENDING))
+
+def list_changes(
+    competitor_id: str,
+    days: int = 30,
+    change_type: Optional[str] = None,
+    limit: int = 100,
+    now: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Changes in the last ``days`` days, newest first, read from the change index only
+    """
+    now = now or datetime.utcnow()
+    query: Dict[str, Any] = {"competitor_id": competitor_id, "changed_at": {"$gte": now - timedelta(days=days)}}
+    if change_type:
+        query["change_types"] = change_type
+    return list(
+        get_product_changes_collection().find(query).sort("changed_at", pymongo.DESCENDING).limit(limit)
+    )
+
+def get_product_history(competitor_id: str, key: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Rebuild the last ``limit`` versions of a product by reverting deltas from the current one
+    """
+    product = get_products_collection().find_one({"competitor_id": competitor_id, "product_key": key})
+    if product is None:
+        return []
+    changes = (
+        get_product_changes_collection()
+        .find({"competitor_id": competitor_id, "product_key": key})
+        .sort("version", pymongo.DESCENDING)
+        .limit(limit)
+    )
+    record = product["record"]
+    history = []
+    for change in changes:
+        history.append(
+            {
+                "version": change["version"],
+                "changed_at": change["changed_at"].isoformat() + "Z",
+                "change_types": change["change_types"],
+                "record": None if "removed" in change["change_types"] else record,
+            }
+        )
+        record = revert_delta(record, change["delta"])
+    return history
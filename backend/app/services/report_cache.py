@@ -0,0 +1,348 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import pymongo
+
+from app.core.config import settings
+from app.core.database import get_mongo_collection
+from app.services.activity_timeline import get_daily_activity_collection
+from app.services.collected_data import get_collected_data_collection
+from app.services.report_sections import (
+    ACTIVITY_SOURCE,
+    Partials,
+    ReportSection,
+    collected_match,
+    combine_partials,
+    entity_signature,
+    filter_matcher,
+    iter_days,
+    split_signature_partials,
+)
+
+SECTION_CACHE_COLLECTION = "report_section_cache"
+
+SECTION_CACHE_INDEXES = [
+    pymongo.IndexModel([("key", pymongo.ASCENDING)], name="key", unique=True),
+    pymongo.IndexModel(
+        [("computed_at", pymongo.ASCENDING)],
+        name="computed_at_ttl",
+        expireAfterSeconds=settings.REPORT_SECTION_CACHE_TTL_DAYS * 24 * 3600,
+    ),
+]
+
+# Fingerprint of a day without any data
+EMPTY_DAY = "0"
+
+def get_section_cache_collection() -> Any:
+    """
+    Get the MongoDB collection holding cached per-day section partials
+    """
+    return get_mongo_collection(SECTION_CACHE_COLLECTION)
+
+def ensure_section_cache_indexes() -> List[str]:
+    """
+    Create the indexes used by the section cache if they don't exist
+    """
+    return get_section_cache_collection().create_indexes(SECTION_CACHE_INDEXES)
+
+def entity_set_key(entities: Any) -> str:
+    """
+    Order-independent key of a report's entity filter
+    """
+    if not entities:
+        return "*"
+    return hashlib.sha1(json.dumps(sorted(entities)).encode("utf-8")).hexdigest()
+
+def cache_key(section: str, source: str, entity_set: str, scope: str, day: str) -> str:
+    return hashlib.sha1(f"{section}|{source}|{entity_set}|{scope}|{day}".encode("utf-8")).hexdigest()
+
+def _collected_fingerprint(count: int, last_id: Any, updated_at: Optional[datetime]) -> str:
+    return f"{count}:{last_id}:{updated_at.isoformat() if updated_at else ''}"
+
+def source_fingerprints(context: Dict[str, Any], source: str) -> Dict[str, str]:
+    """
+    Per-day fingerprints of the data a source contributes to a report
+
+    A cached partial is only reused while its day's fingerprint is unchanged,
+    so days that received new, late, updated or deleted documents are recomputed.
+    """
+    start, end = context["window_start"], context["window_end"]
+    fingerprints = {}
+    if source == ACTIVITY_SOURCE:
+        competitor_ids = [competitor["id"] for competitor in context["competitors"]]
+        for row in get_daily_activity_collection().aggregate([
+            {"$match": {"competitor_id": {"$in": competitor_ids}, "day": {"$gte": start, "$lt": end}}},
+            {
+                "$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$day"}},
+                    "count": {"$sum": 1},
+                    "updated_at": {"$max": "$updated_at"},
+                }
+            },
+        ]):
+            fingerprints[row["_id"]] = f"{row['count']}:{row['updated_at'].isoformat()}"
+        return fingerprints
+
+    for row in get_collected_data_collection().aggregate([
+        {"$match": collected_match(context, source, start, end)},
+        {
+            "$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$collected_at"}},
+                "count": {"$sum": 1},
+                "last_id": {"$max": "$_id"},
+                # Every write sets updated_at, so updates in place and deletes
+                # replaced by inserts change the fingerprint too
+                "updated_at": {"$max": "$updated_at"},
+            }
+        },
+    ]):
+        fingerprints[row["_id"]] = _collected_fingerprint(row["count"], row["last_id"], row.get("updated_at"))
+    return fingerprints
+
+def _contiguous_ranges(days: List[str]) -> List[Tuple[datetime, datetime, List[str]]]:
+    ranges: List[Tuple[datetime, datetime, List[str]]] = []
+    for day in days:
+        start = datetime.strptime(day, "%Y-%m-%d")
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], start + timedelta(days=1), ranges[-1][2] + [day])
+        else:
+            ranges.append((start, start + timedelta(days=1), [day]))
+    return ranges
+
+def load_section_partials(
+    section: ReportSection,
+    context: Dict[str, Any],
+    fingerprints: Dict[str, Dict[str, str]],
+) -> Tuple[Partials, Dict[str, Any]]:
+    """
+    Per-day partials of a section over the report window, reusing cached days
+
+    Only days that are missing from the cache or whose data changed are
+    aggregated, one query per contiguous run of days and source. Returns the
+    partials summed over sources and the cache statistics of the section.
+    """
+    days = iter_days(context["window_start"], context["window_end"])
+    sources = list(context["data_sources"]) + section.extra_sources
+    entity_set = entity_set_key(context.get("entities"))
+    scope = section.scope(context) if section.scope else ""
+    keys = {
+        (source, day): cache_key(section.name, source, entity_set, scope, day)
+        for source in sources
+        for day in days
+    }
+    collection = get_section_cache_collection()
+    cached = {
+        entry["key"]: entry
+        for entry in collection.find({"key": {"$in": list(keys.values())}}, {"_id": 0, "key": 1, "fingerprint": 1, "partial": 1, "compute_ms": 1})
+    }
+
+    hits = 0
+    misses = 0
+    time_saved_ms = 0.0
+    compute_ms = 0.0
+    operations = []
+    partials_by_source = []
+    now = datetime.utcnow()
+    for source in sources:
+        partials: Partials = {}
+        missing = []
+        for day in days:
+            entry = cached.get(keys[(source, day)])
+            if entry is not None and entry["fingerprint"] == fingerprints[source].get(day, EMPTY_DAY):
+                hits += 1
+                time_saved_ms += entry["compute_ms"]
+                partial = json.loads(entry["partial"])
+                if partial:
+                    partials[day] = partial
+            else:
+                missing.append(day)
+
+        for start, end, range_days in _contiguous_ranges(missing):
+            started = time.perf_counter()
+            computed = section.aggregate(context, source, start, end)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            compute_ms += elapsed_ms
+            misses += len(range_days)
+            for day in range_days:
+                partial = computed.get(day, {})
+                if partial:
+                    partials[day] = partial
+                # Partials are stored as JSON since their keys (sources,
+                # entities) may contain characters MongoDB field names can't
+                operations.append(
+                    pymongo.UpdateOne(
+                        {"key": keys[(source, day)]},
+                        {
+                            "$set": {
+                                "section": section.name,
+                                "source": source,
+                                "entity_set": entity_set,
+                                "day": day,
+                                "fingerprint": fingerprints[source].get(day, EMPTY_DAY),
+                                "partial": json.dumps(partial),
+                                "compute_ms": elapsed_ms / len(range_days),
+                                "computed_at": now,
+                            }
+                        },
+                        upsert=True,
+                    )
+                )
+        partials_by_source.append(partials)
+
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return combine_partials(partials_by_source), {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "time_saved_ms": round(time_saved_ms, 1),
+        "compute_ms": round(compute_ms, 1),
+    }
+
+def batch_context(contexts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Context of a batch of reports over the same window, covering all their filters
+
+    Documents are grouped by the batch entities they mention, so the partials
+    of every report can be split out of one aggregation.
+    """
+    entity_filters = [context.get("entities") for context in contexts]
+    union = sorted({entity for entities in entity_filters if entities for entity in entities})
+    return {
+        "user_id": None,
+        "data_sources": sorted({source for context in contexts for source in context["data_sources"]}),
+        # Unfiltered reports need every document, not only those mentioning an entity
+        "entities": None if any(not entities for entities in entity_filters) else union,
+        "signature_entities": union,
+        "window_start": contexts[0]["window_start"],
+        "window_end": contexts[0]["window_end"],
+        "competitors": [],
+    }
+
+def batch_fingerprints(
+    batch: Dict[str, Any],
+    source: str,
+    entity_filters: Dict[str, Optional[List[str]]],
+) -> Dict[str, Dict[str, str]]:
+    """
+    Per-day fingerprints of a data source for each entity filter of a batch, from one query
+
+    Matches source_fingerprints for a report with that filter, keyed by
+    entity set key.
+    """
+    match = filter_matcher(entity_filters)
+    totals: Dict[str, Dict[str, List[Any]]] = {key: {} for key in entity_filters}
+    for row in get_collected_data_collection().aggregate([
+        {"$match": collected_match(batch, source, batch["window_start"], batch["window_end"])},
+        {
+            "$group": {
+                "_id": {
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$collected_at"}},
+                    "signature": entity_signature(batch["signature_entities"]),
+                },
+                "count": {"$sum": 1},
+                "last_id": {"$max": "$_id"},
+                "updated_at": {"$max": "$updated_at"},
+            }
+        },
+    ]):
+        for key in match(row["_id"]["signature"]):
+            total = totals[key].setdefault(row["_id"]["day"], [0, None, None])
+            total[0] += row["count"]
+            if total[1] is None or row["last_id"] > total[1]:
+                total[1] = row["last_id"]
+            updated_at = row.get("updated_at")
+            if updated_at is not None and (total[2] is None or updated_at > total[2]):
+                total[2] = updated_at
+    return {
+        key: {day: _collected_fingerprint(*total) for day, total in days.items()}
+        for key, days in totals.items()
+    }
+
+def fill_batch_section_cache(
+    section: ReportSection,
+    batch: Dict[str, Any],
+    members: Dict[str, Dict[str, Any]],
+    fingerprints: Dict[str, Dict[str, Dict[str, str]]],
+) -> Dict[str, Any]:
+    """
+    Compute a section once for a batch and cache the per-day partials of each member
+
+    Members are the batch's distinct entity filters, keyed by entity set key,
+    each with its "entities" and the "data_sources" its reports read.
+    Fingerprints are per source and member. Only days some member is missing
+    are aggregated, one query per contiguous run of days and source, so the
+    reports of the batch then load the section entirely from the cache.
+    """
+    days = iter_days(batch["window_start"], batch["window_end"])
+    collection = get_section_cache_collection()
+    aggregations = 0
+    computed_days = 0
+    compute_ms = 0.0
+    operations = []
+    now = datetime.utcnow()
+    for source in batch["data_sources"]:
+        readers = {key: member for key, member in members.items() if source in member["data_sources"]}
+        if not readers:
+            continue
+        keys = {
+            (member_key, day): cache_key(section.name, source, member_key, "", day)
+            for member_key in readers
+            for day in days
+        }
+        cached = {
+            entry["key"]: entry["fingerprint"]
+            for entry in collection.find({"key": {"$in": list(keys.values())}}, {"_id": 0, "key": 1, "fingerprint": 1})
+        }
+        missing = {
+            member_key: {
+                day
+                for day in days
+                if cached.get(keys[(member_key, day)]) != fingerprints[source][member_key].get(day, EMPTY_DAY)
+            }
+            for member_key in readers
+        }
+        for start, end, range_days in _contiguous_ranges(sorted(set().union(*missing.values()))):
+            started = time.perf_counter()
+            computed = section.aggregate(batch, source, start, end)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            aggregations += 1
+            computed_days += len(range_days)
+            compute_ms += elapsed_ms
+            split = split_signature_partials(
+                computed,
+                {member_key: member["entities"] for member_key, member in readers.items() if missing[member_key]},
+            )
+            for member_key, partials in split.items():
+                for day in (day for day in range_days if day in missing[member_key]):
+                    operations.append(
+                        pymongo.UpdateOne(
+                            {"key": keys[(member_key, day)]},
+                            {
+                                "$set": {
+                                    "section": section.name,
+                                    "source": source,
+                                    "entity_set": member_key,
+                                    "day": day,
+                                    "fingerprint": fingerprints[source][member_key].get(day, EMPTY_DAY),
+                                    "partial": json.dumps(partials.get(day, {})),
+                                    # Cost of computing the day alone, as a report would have
+                                    "compute_ms": elapsed_ms / len(range_days),
+                                    "computed_at": now,
+                                }
+                            },
+                            upsert=True,
+                        )
+                    )
+
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return {
+        "aggregations": aggregations,
+        "computed_days": computed_days,
+        "entries_written": len(operations),
+        "compute_ms": round(compute_ms, 1),
+    }
@@ -0,0 +1,64 @@
+from html import escape
+from typing import Any, Dict, List, Optional
+
+# Charts are laid out in worker processes, so this module only depends on
+# the standard library and stays cheap to import.
+
+CHART_WIDTH = 640
+CHART_HEIGHT = 220
+CHART_MARGIN = 36
+
+def chart_spec(name: str, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Daily series charted for a section, or None when it has nothing to chart
+    """
+    if name == "sentiment":
+        points = [(day["date"], day["score"]) for day in result["daily"] if day["score"] is not None]
+        title, y_max = "Daily sentiment score", 1.0
+    elif name == "trends":
+        points = [(day["date"], day["volume"]) for day in result["daily"]]
+        title, y_max = "Daily volume", None
+    else:
+        return None
+    if len(points) < 2:
+        return None
+    return {
+        "title": title,
+        "labels": [label for label, _ in points],
+        "values": [value for _, value in points],
+        "y_max": y_max,
+    }
+
+def layout_chart(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Lay out a line chart, returning its points in chart coordinates and an SVG rendering
+
+    Points have their origin at the bottom left, as PDF drawings expect; the
+    SVG flips them.
+    """
+    values = spec["values"]
+    y_max = spec["y_max"] or max(max(values), 1)
+    plot_width = CHART_WIDTH - 2 * CHART_MARGIN
+    plot_height = CHART_HEIGHT - 2 * CHART_MARGIN
+    step = plot_width / (len(values) - 1)
+    points: List[List[float]] = [
+        [round(CHART_MARGIN + position * step, 2), round(CHART_MARGIN + min(value / y_max, 1.0) * plot_height, 2)]
+        for position, value in enumerate(values)
+    ]
+
+    polyline = " ".join(f"{x},{CHART_HEIGHT - y}" for x, y in points)
+    bottom = CHART_HEIGHT - CHART_MARGIN
+    svg = "".join([
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{CHART_WIDTH}" height="{CHART_HEIGHT}" '
+        f'viewBox="0 0 {CHART_WIDTH} {CHART_HEIGHT}" role="img" aria-label="{escape(spec["title"])}">',
+        f'<text x="{CHART_MARGIN}" y="{CHART_MARGIN - 14}" font-size="13">{escape(spec["title"])}</text>',
+        f'<line x1="{CHART_MARGIN}" y1="{bottom}" x2="{CHART_WIDTH - CHART_MARGIN}" y2="{bottom}" stroke="#999"/>',
+        f'<line x1="{CHART_MARGIN}" y1="{CHART_MARGIN}" x2="{CHART_MARGIN}" y2="{bottom}" stroke="#999"/>',
+        f'<text x="{CHART_MARGIN - 4}" y="{CHART_MARGIN + 4}" font-size="10" text-anchor="end">{y_max:g}</text>',
+        f'<text x="{CHART_MARGIN}" y="{bottom + 14}" font-size="10">{escape(spec["labels"][0])}</text>',
+        f'<text x="{CHART_WIDTH - CHART_MARGIN}" y="{bottom + 14}" font-size="10" text-anchor="end">'
+        f'{escape(spec["labels"][-1])}</text>',
+        f'<polyline fill="none" stroke="#2563eb" stroke-width="2" points="{polyline}"/>',
+        "</svg>",
+    ])
+    return {**spec, "width": CHART_WIDTH, "height": CHART_HEIGHT, "y_max": y_max, "points": points, "svg": svg}
@@ -0,0 +1,222 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import BackgroundTasks
+
+from app.core.config import settings
+from app.services.report_cache import load_section_partials, source_fingerprints
+from app.services.report_render import RenderPlan, compile_plan, failed_block, render_chart, section_outline, summary_block
+from app.services.report_sections import SECTIONS, load_competitors
+from app.services.report_store import (
+    complete_report,
+    create_report,
+    fail_report,
+    get_reports_collection,
+    save_artifact,
+    update_section,
+)
+
+TIME_PERIOD_DAYS = {
+    "last_day": 1,
+    "last_week": 7,
+    "last_month": 30,
+    "last_quarter": 91,
+    "last_year": 365,
+}
+
+# Shared by all reports so concurrent reports don't multiply the load on MongoDB
+_executor = ThreadPoolExecutor(max_workers=settings.REPORT_SECTION_WORKERS, thread_name_prefix="report-section")
+
+def report_window(
+    time_period: str,
+    custom_start_date: Optional[str] = None,
+    custom_end_date: Optional[str] = None,
+    now: Optional[datetime] = None,
+) -> Tuple[datetime, datetime]:
+    """
+    Day-aligned [start, end) window of a report; the current day is included
+    """
+    if time_period == "custom":
+        if not custom_start_date or not custom_end_date:
+            raise ValueError("custom_start_date and custom_end_date are required for a custom time period")
+        try:
+            start = datetime.strptime(custom_start_date, "%Y-%m-%d")
+            end = datetime.strptime(custom_end_date, "%Y-%m-%d") + timedelta(days=1)
+        except ValueError:
+            raise ValueError("Custom dates must be YYYY-MM-DD")
+        if start >= end:
+            raise ValueError("custom_start_date must not be after custom_end_date")
+        return start, end
+    if time_period not in TIME_PERIOD_DAYS:
+        raise ValueError(f"time_period must be one of: {', '.join(list(TIME_PERIOD_DAYS) + ['custom'])}")
+    now = now or datetime.utcnow()
+    end = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return end - timedelta(days=TIME_PERIOD_DAYS[time_period]), end
+
+def build_context(report: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parameters shared by every section of a report
+    """
+    context = {
+        "user_id": report["user_id"],
+        "data_sources": report["data_sources"],
+        "entities": report.get("entities") or None,
+        "window_start": report["window_start"],
+        "window_end": report["window_end"],
+    }
+    context["competitors"] = load_competitors(context)
+    return context
+
+def run_section(
+    report_id: Any,
+    position: int,
+    name: str,
+    context: Dict[str, Any],
+    fingerprints: Dict[str, Dict[str, str]],
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Compute one section, recording its progress, timing and cache use on the report
+    """
+    section = SECTIONS[name]
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    update_section(report_id, position, {"status": "running", "started_at": started_at})
+    try:
+        partials, cache = load_section_partials(section, context, fingerprints)
+        result = section.merge(partials, context)
+    except Exception as exc:
+        update_section(
+            report_id,
+            position,
+            {
+                "status": "failed",
+                "error": str(exc),
+                "completed_at": datetime.utcnow(),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            },
+        )
+        return None, {}
+    update_section(
+        report_id,
+        position,
+        {
+            "status": "completed",
+            "completed_at": datetime.utcnow(),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "cache": cache,
+        },
+    )
+    return result, cache
+
+def compute_section(
+    report_id: Any,
+    position: int,
+    name: str,
+    context: Dict[str, Any],
+    fingerprints: Dict[str, Dict[str, str]],
+    plan: RenderPlan,
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any], Optional[Dict[str, Any]], Any]:
+    """
+    Compute one section and render its block right away, while other sections are still running
+    """
+    result, cache = run_section(report_id, position, name, context, fingerprints)
+    if result is None:
+        return None, cache, None, None
+    block = {"title": SECTIONS[name].title, **section_outline(name, result)}
+    return result, cache, block, plan.render_block(block, render_chart(name, result))
+
+def summarize_cache(section_caches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Cache statistics of a whole report
+    """
+    hits = sum(cache.get("hits", 0) for cache in section_caches)
+    misses = sum(cache.get("misses", 0) for cache in section_caches)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "time_saved_ms": round(sum(cache.get("time_saved_ms", 0.0) for cache in section_caches), 1),
+        "compute_ms": round(sum(cache.get("compute_ms", 0.0) for cache in section_caches), 1),
+    }
+
+def run_report(report_id: Any, known_fingerprints: Optional[Dict[str, Dict[str, str]]] = None) -> None:
+    """
+    Compute a report's sections in parallel, render it and store the artifact
+
+    Fingerprints a scheduled batch already computed for some sources are
+    passed in so they are not queried again.
+    """
+    started = time.perf_counter()
+    report = get_reports_collection().find_one({"_id": report_id})
+    try:
+        context = build_context(report)
+        # Fingerprints are shared by every section reading the same source
+        sources = set(context["data_sources"])
+        for section in report["sections"]:
+            sources.update(SECTIONS[section["name"]].extra_sources)
+        fingerprints = dict(known_fingerprints or {})
+        fingerprint_futures = {
+            source: _executor.submit(source_fingerprints, context, source) for source in sources if source not in fingerprints
+        }
+        fingerprints.update({source: future.result() for source, future in fingerprint_futures.items()})
+
+        plan = compile_plan(report["format"], tuple((section["name"], section["title"]) for section in report["sections"]))
+        futures = [
+            _executor.submit(compute_section, report_id, position, section["name"], context, fingerprints, plan)
+            for position, section in enumerate(report["sections"])
+        ]
+        outcomes = [future.result() for future in futures]
+        if all(result is None for result, _, _, _ in outcomes):
+            fail_report(report_id, "All report sections failed")
+            return
+        blocks = []
+        rendered = []
+        for section, (result, _, block, fragment) in zip(report["sections"], outcomes):
+            if result is None:
+                block = failed_block(section["title"])
+                fragment = plan.render_block(block, None)
+            blocks.append(block)
+            rendered.append(fragment)
+        summary = plan.render_block(summary_block(report, blocks), None)
+        artifact = save_artifact(report_id, plan.assemble(report, summary, rendered), report["format"])
+        complete_report(
+            report_id,
+            artifact,
+            round((time.perf_counter() - started) * 1000, 1),
+            cache=summarize_cache([cache for _, cache, _, _ in outcomes]),
+        )
+    except Exception as exc:
+        # Runs as a background task, so the report is the only place to report errors
+        fail_report(report_id, str(exc))
+
+def start_report(
+    background_tasks: BackgroundTasks,
+    user_id: int,
+    fields: Dict[str, Any],
+    section_names: List[str],
+) -> Dict[str, Any]:
+    """
+    Store a report in the generating state and queue its generation
+    """
+    report = create_report(
+        user_id,
+        fields,
+        [{"name": name, "title": SECTIONS[name].title} for name in section_names],
+    )
+    background_tasks.add_task(run_report, report["_id"])
+    return {
+        "status": "success",
+        "message": "Report generation initiated",
+        "report_id": str(report["_id"]),
+        "report_status": report["status"],
+        "details": {
+            "title": fields["title"],
+            "report_type": fields["report_type"],
+            "data_sources": fields["data_sources"],
+            "time_period": fields["time_period"],
+            "format": fields["format"],
+            "sections": section_names,
+        }
+    }
@@ -0,0 +1,343 @@
+import html
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape as xml_escape
+
+from app.core.config import settings
+from app.services.report_charts import CHART_MARGIN, chart_spec, layout_chart
+
+# A block is the rendering-independent content of one part of a report:
+# a title, highlight lines and a table. Sections render their block (and
+# chart) as soon as they are computed; the document is assembled afterwards.
+Block = Dict[str, Any]
+
+HTML_STYLE = (
+    "body{font-family:Helvetica,Arial,sans-serif;margin:2em auto;max-width:56em;color:#1f2937}"
+    "table{border-collapse:collapse;margin:1em 0}th,td{border:1px solid #d1d5db;padding:4px 8px;text-align:left}"
+    "figure{margin:1em 0}"
+)
+
+_chart_pool: Optional[ProcessPoolExecutor] = None
+_chart_pool_lock = threading.Lock()
+# Set when the pool broke, after which charts are laid out in-thread
+_chart_pool_broken = False
+
+def _percent(value: Any) -> str:
+    return f"{value * 100:.1f}%" if isinstance(value, (int, float)) else "n/a"
+
+def section_outline(name: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Highlights and a table for a section, shared by every output format
+    """
+    if name == "sentiment":
+        return {
+            "highlights": [
+                f"{result['total']} documents analysed, sentiment score {_percent(result['score'])}",
+            ] + [f"{label.title()}: {_percent(share)}" for label, share in sorted(result["shares"].items())],
+            "columns": ["Date", "Positive", "Neutral", "Negative", "Score"],
+            "rows": [
+                [day["date"], day.get("positive", 0), day.get("neutral", 0), day.get("negative", 0), _percent(day["score"])]
+                for day in result["daily"]
+            ],
+        }
+    if name == "trends":
+        highlights = [f"{result['total']} documents, {result['average_per_day']} per day on average"]
+        if result["peak_day"]:
+            highlights.append(f"Peak on {result['peak_day']['date']} with {result['peak_day']['volume']} documents")
+        if result["change_pct"] is not None:
+            highlights.append(f"Volume changed {result['change_pct']:+.1f}% between the first and second half")
+        return {
+            "highlights": highlights,
+            "columns": ["Source", "Documents"],
+            "rows": [[source, count] for source, count in sorted(result["by_source"].items(), key=lambda item: -item[1])],
+        }
+    if name == "entities":
+        return {
+            "highlights": [f"{result['distinct']} distinct entities mentioned"]
+            + [f"Rising: {item['entity']} (+{item['growth']})" for item in result["rising"][:3]],
+            "columns": ["Entity", "Mentions"],
+            "rows": [[item["entity"], item["mentions"]] for item in result["top"]],
+        }
+    if name == "competitors":
+        leader = result["competitors"][0]["name"] if result["competitors"] else None
+        return {
+            "highlights": [f"{result['total_mentions']} competitor mentions"]
+            + ([f"{leader} leads share of voice"] if leader else []),
+            "columns": ["Competitor", "Mentions", "Share of voice", "Sentiment", "Activity"],
+            "rows": [
+                [
+                    competitor["name"],
+                    competitor["mentions"],
+                    _percent(competitor["share_of_voice"]),
+                    _percent(competitor["sentiment_score"]),
+                    sum(competitor["activity"].values()),
+                ]
+                for competitor in result["competitors"]
+            ],
+        }
+    return {"highlights": [], "columns": [], "rows": []}
+
+def failed_block(title: str) -> Block:
+    return {"title": title, "highlights": ["This section could not be generated."], "columns": [], "rows": []}
+
+def summary_block(report: Dict[str, Any], blocks: List[Block]) -> Block:
+    """
+    Executive summary of a report from the first highlight of each section
+    """
+    period = f"{report['window_start']:%Y-%m-%d} to {report['window_end'] - timedelta(days=1):%Y-%m-%d}"
+    summary = [block["highlights"][0] for block in blocks if block["highlights"]]
+    return {"title": "Executive Summary", "highlights": [f"Period: {period}"] + summary, "columns": [], "rows": []}
+
+def render_chart(name: str, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Lay out a section's chart, in the chart process pool when one is configured
+    """
+    global _chart_pool, _chart_pool_broken
+    spec = chart_spec(name, result)
+    if spec is None:
+        return None
+    if settings.REPORT_CHART_WORKERS <= 0 or _chart_pool_broken:
+        return layout_chart(spec)
+    with _chart_pool_lock:
+        if _chart_pool is None:
+            # Spawned rather than forked since the API process runs threads
+            _chart_pool = ProcessPoolExecutor(
+                max_workers=settings.REPORT_CHART_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        pool = _chart_pool
+    try:
+        return pool.submit(layout_chart, spec).result()
+    except BrokenProcessPool:
+        # Workers that can't start or crash must not fail reports
+        _chart_pool_broken = True
+        return layout_chart(spec)
+
+@lru_cache(maxsize=None)
+def pdf_assets() -> Dict[str, Any]:
+    """
+    Paragraph and table styles shared by every PDF render
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    return {
+        "styles": getSampleStyleSheet(),
+        "table_style": TableStyle([
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ("FONTSIZE", (0, 0), (-1, -1), 8),
+        ]),
+    }
+
+@lru_cache(maxsize=None)
+def office_template(file_format: str) -> bytes:
+    """
+    The default DOCX or PPTX template, read once and opened from memory for each render
+    """
+    package = __import__(file_format)
+    with open(os.path.join(os.path.dirname(package.__file__), "templates", f"default.{file_format}"), "rb") as template:
+        return template.read()
+
+@dataclass(frozen=True)
+class RenderPlan:
+    """
+    Compiled rendering of one format and section layout, shared by every report using it
+    """
+    file_format: str
+    sections: Tuple[Tuple[str, str], ...]
+    # Called from the section workers as soon as a section is computed
+    render_block: Callable[[Block, Optional[Dict[str, Any]]], Any]
+    # Yields the document from the report, its rendered summary and its rendered blocks
+    assemble: Callable[[Dict[str, Any], Any, List[Any]], Iterator[bytes]]
+
+def _html_block(block: Block, chart: Optional[Dict[str, Any]]) -> bytes:
+    parts = [f"<section><h2>{html.escape(block['title'])}</h2><ul>"]
+    parts.extend(f"<li>{html.escape(str(line))}</li>" for line in block["highlights"])
+    parts.append("</ul>")
+    if chart:
+        parts.append(f"<figure>{chart['svg']}</figure>")
+    if block["rows"]:
+        parts.append("<table><thead><tr>")
+        parts.extend(f"<th>{html.escape(column)}</th>" for column in block["columns"])
+        parts.append("</tr></thead><tbody>")
+        for row in block["rows"]:
+            parts.append("<tr>" + "".join(f"<td>{html.escape(str(cell))}</td>" for cell in row) + "</tr>")
+        parts.append("</tbody></table>")
+    parts.append("</section>")
+    return "".join(parts).encode("utf-8")
+
+def _assemble_html(report: Dict[str, Any], summary: bytes, blocks: List[bytes]) -> Iterator[bytes]:
+    title = html.escape(report["title"])
+    head = f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{title}</title><style>{HTML_STYLE}</style></head><body><h1>{title}</h1>"
+    if report.get("description"):
+        head += f"<p>{html.escape(report['description'])}</p>"
+    yield head.encode("utf-8")
+    yield summary
+    yield from blocks
+    yield b"</body></html>"
+
+def _pdf_chart(chart: Dict[str, Any]) -> Any:
+    from reportlab.graphics.shapes import Drawing, Line, PolyLine, String
+    from reportlab.lib import colors
+
+    # Scaled down to fit the page's frame
+    scale = 0.7
+    drawing = Drawing(chart["width"] * scale, chart["height"] * scale)
+    drawing.add(String(CHART_MARGIN * scale, (chart["height"] - CHART_MARGIN + 10) * scale, chart["title"], fontSize=9))
+    drawing.add(Line(CHART_MARGIN * scale, CHART_MARGIN * scale, (chart["width"] - CHART_MARGIN) * scale, CHART_MARGIN * scale, strokeColor=colors.grey))
+    drawing.add(PolyLine(
+        [coordinate * scale for point in chart["points"] for coordinate in point],
+        strokeColor=colors.HexColor("#2563eb"),
+        strokeWidth=1.5,
+    ))
+    return drawing
+
+def _pdf_block(block: Block, chart: Optional[Dict[str, Any]]) -> List[Any]:
+    from reportlab.platypus import ListFlowable, Paragraph, Table
+
+    assets = pdf_assets()
+    styles = assets["styles"]
+    flowables = [
+        Paragraph(html.escape(block["title"]), styles["Heading2"]),
+        ListFlowable([Paragraph(html.escape(str(line)), styles["Normal"]) for line in block["highlights"]], bulletType="bullet"),
+    ]
+    if chart:
+        flowables.append(_pdf_chart(chart))
+    if block["rows"]:
+        flowables.append(
+            Table([block["columns"]] + [[str(cell) for cell in row] for row in block["rows"]], repeatRows=1, style=assets["table_style"])
+        )
+    return flowables
+
+def _assemble_pdf(report: Dict[str, Any], summary: List[Any], blocks: List[List[Any]]) -> Iterator[bytes]:
+    from reportlab.platypus import Paragraph, SimpleDocTemplate
+
+    styles = pdf_assets()["styles"]
+    story = [Paragraph(html.escape(report["title"]), styles["Title"])]
+    if report.get("description"):
+        story.append(Paragraph(html.escape(report["description"]), styles["Normal"]))
+    story.extend(summary)
+    for flowables in blocks:
+        story.extend(flowables)
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, title=report["title"]).build(story)
+    yield buffer.getvalue()
+
+def _office_block(block: Block, chart: Optional[Dict[str, Any]]) -> Tuple[Block, Optional[Dict[str, Any]]]:
+    # Office elements can only be created inside their document, so blocks
+    # are added when the document is assembled
+    return block, chart
+
+@lru_cache(maxsize=64)
+def _docx_row_template(widths: Tuple[int, ...]) -> str:
+    return "<w:tr>" + "".join(
+        f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>'
+        f'<w:p><w:r><w:t xml:space="preserve">{{{position}}}</w:t></w:r></w:p></w:tc>'
+        for position, width in enumerate(widths)
+    ) + "</w:tr>"
+
+def _assemble_docx(report: Dict[str, Any], summary: Tuple[Block, None], blocks: List[Tuple[Block, Any]]) -> Iterator[bytes]:
+    from docx import Document
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
+
+    document = Document(io.BytesIO(office_template("docx")))
+    document.add_heading(report["title"], level=0)
+    if report.get("description"):
+        document.add_paragraph(report["description"])
+    # DOCX has no vector drawing support here, so charts are left to the tables
+    for block, _ in [summary] + blocks:
+        document.add_heading(block["title"], level=1)
+        for line in block["highlights"]:
+            document.add_paragraph(str(line), style="List Bullet")
+        if block["rows"]:
+            table = document.add_table(rows=1, cols=len(block["columns"]))
+            for cell, column in zip(table.rows[0].cells, block["columns"]):
+                cell.text = column
+            # Adding rows through python-docx costs several XPath lookups per
+            # cell, so body rows are parsed in one go from a compiled template
+            row_template = _docx_row_template(tuple(cell.width.twips for cell in table.rows[0].cells))
+            rows = "".join(row_template.format(*(xml_escape(str(value)) for value in row)) for row in block["rows"])
+            for row_element in parse_xml(f"<w:tbl {nsdecls('w')}>{rows}</w:tbl>"):
+                table._tbl.append(row_element)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    yield buffer.getvalue()
+
+def _assemble_pptx(report: Dict[str, Any], summary: Tuple[Block, None], blocks: List[Tuple[Block, Any]]) -> Iterator[bytes]:
+    from pptx import Presentation
+    from pptx.chart.data import CategoryChartData
+    from pptx.enum.chart import XL_CHART_TYPE
+    from pptx.util import Inches
+
+    presentation = Presentation(io.BytesIO(office_template("pptx")))
+    title_slide = presentation.slides.add_slide(presentation.slide_layouts[0])
+    title_slide.shapes.title.text = report["title"]
+    title_slide.placeholders[1].text = report.get("description") or ""
+    for block, chart in [summary] + blocks:
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = block["title"]
+        body = slide.placeholders[1].text_frame
+        lines = [str(line) for line in block["highlights"]]
+        # Slides only have room for the top rows of a table
+        lines += [" | ".join(str(cell) for cell in row) for row in block["rows"][:8]]
+        body.text = lines[0] if lines else ""
+        for line in lines[1:]:
+            body.add_paragraph().text = line
+        if chart:
+            # Native charts stay editable in PowerPoint
+            chart_slide = presentation.slides.add_slide(presentation.slide_layouts[5])
+            chart_slide.shapes.title.text = chart["title"]
+            chart_data = CategoryChartData()
+            chart_data.categories = chart["labels"]
+            chart_data.add_series(chart["title"], chart["values"])
+            chart_slide.shapes.add_chart(XL_CHART_TYPE.LINE, Inches(0.5), Inches(1.5), Inches(9), Inches(5), chart_data)
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    yield buffer.getvalue()
+
+FORMAT_RENDERERS: Dict[str, Tuple[Callable[..., Any], Callable[..., Iterator[bytes]]]] = {
+    "html": (_html_block, _assemble_html),
+    "pdf": (_pdf_block, _assemble_pdf),
+    "docx": (_office_block, _assemble_docx),
+    "pptx": (_office_block, _assemble_pptx),
+}
+
+@lru_cache(maxsize=128)
+def compile_plan(file_format: str, sections: Tuple[Tuple[str, str], ...]) -> RenderPlan:
+    """
+    Compile the render plan of a format and section layout, once per process
+
+    Loads the format's renderer, styles and template up front so renders
+    only do the work that depends on the report's data.
+    """
+    render_block, assemble = FORMAT_RENDERERS[file_format]
+    if file_format == "pdf":
+        pdf_assets()
+    elif file_format in ("docx", "pptx"):
+        office_template(file_format)
+    return RenderPlan(file_format, sections, render_block, assemble)
+
+def render_report(report: Dict[str, Any], results: Dict[str, Optional[Dict[str, Any]]]) -> Iterator[bytes]:
+    """
+    Render a report from its section results in one go
+    """
+    plan = compile_plan(report["format"], tuple((section["name"], section["title"]) for section in report["sections"]))
+    blocks = []
+    rendered = []
+    for name, title in plan.sections:
+        result = results.get(name)
+        block = {"title": title, **section_outline(name, result)} if result is not None else failed_block(title)
+        blocks.append(block)
+        rendered.append(plan.render_block(block, render_chart(name, result) if result is not None else None))
+    return plan.assemble(report, plan.render_block(summary_block(report, blocks), None), rendered)
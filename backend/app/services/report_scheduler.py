@@ -0,0 +1,243 @@
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.core.database import get_mongo_collection, redis_client
+from app.services.collection_scheduler import next_run_time
+from app.services.report_cache import batch_context, batch_fingerprints, entity_set_key, fill_batch_section_cache
+from app.services.report_pipeline import build_context, report_window, run_report
+from app.services.report_sections import SECTIONS
+from app.services.report_store import create_report
+
+REPORT_SCHEDULES_COLLECTION = "report_schedules"
+
+REPORT_SCHEDULER_LOCK_KEY = "report_scheduler:lock"
+
+scheduler_logger = logging.getLogger("app.report_scheduler")
+
+REPORT_SCHEDULE_INDEXES = [
+    pymongo.IndexModel([("active", pymongo.ASCENDING), ("next_run_at", pymongo.ASCENDING)], name="active_next_run_at"),
+    pymongo.IndexModel([("user_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="user_created_at"),
+]
+
+# Report settings copied from a schedule onto each report it generates
+SCHEDULED_REPORT_FIELDS = ["title", "description", "report_type", "data_sources", "time_period", "entities", "format", "template_id"]
+
+def get_report_schedules_collection() -> Any:
+    """
+    Get the MongoDB collection holding scheduled reports
+    """
+    return get_mongo_collection(REPORT_SCHEDULES_COLLECTION)
+
+def ensure_report_schedule_indexes() -> List[str]:
+    """
+    Create the indexes used by the report scheduler if they don't exist
+    """
+    return get_report_schedules_collection().create_indexes(REPORT_SCHEDULE_INDEXES)
+
+def serialize_report_schedule(schedule: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a report schedule document into the API representation
+    """
+    return {
+        "id": str(schedule["_id"]),
+        **{field: schedule.get(field) for field in SCHEDULED_REPORT_FIELDS},
+        "sections": schedule["sections"],
+        "interval_hours": schedule["interval_seconds"] // 3600,
+        "active": schedule["active"],
+        "next_run_at": schedule["next_run_at"].isoformat() + "Z",
+        "last_run_at": schedule["last_run_at"].isoformat() + "Z" if schedule.get("last_run_at") else None,
+        "last_report_id": str(schedule["last_report_id"]) if schedule.get("last_report_id") else None,
+        "runs": schedule.get("runs", 0),
+        "last_batch": schedule.get("last_batch"),
+        "created_at": schedule["created_at"].isoformat() + "Z",
+    }
+
+def create_report_schedule(
+    user_id: int,
+    fields: Dict[str, Any],
+    sections: List[str],
+    interval_hours: int,
+) -> Dict[str, Any]:
+    """
+    Schedule a recurring report; the first one is generated on the next tick
+    """
+    now = datetime.utcnow()
+    interval_seconds = interval_hours * 3600
+    schedule = {
+        "user_id": user_id,
+        **{field: fields.get(field) for field in SCHEDULED_REPORT_FIELDS},
+        "sections": sections,
+        "interval_seconds": interval_seconds,
+        "jitter_seconds": int(interval_seconds * settings.COLLECTION_SCHEDULE_JITTER_RATIO),
+        "active": True,
+        "next_run_at": now,
+        "last_run_at": None,
+        "runs": 0,
+        "created_at": now,
+    }
+    schedule["_id"] = get_report_schedules_collection().insert_one(schedule).inserted_id
+    return schedule
+
+def list_report_schedules(user_id: int) -> List[Dict[str, Any]]:
+    """
+    List a user's scheduled reports
+    """
+    return list(get_report_schedules_collection().find({"user_id": user_id}).sort("created_at", pymongo.DESCENDING))
+
+def delete_report_schedule(schedule_id: str, user_id: int) -> bool:
+    """
+    Remove one of a user's scheduled reports
+    """
+    try:
+        object_id = ObjectId(schedule_id)
+    except InvalidId:
+        return False
+    return get_report_schedules_collection().delete_one({"_id": object_id, "user_id": user_id}).deleted_count > 0
+
+def run_batch(schedules: List[Dict[str, Any]], now: datetime) -> Dict[str, Any]:
+    """
+    Generate the reports of schedules sharing a time period from shared aggregates
+
+    Every section that only depends on data sources and entities is computed
+    once for the batch and split into the section cache entries of each
+    distinct entity filter; each report then merges and renders its own
+    output from the cache. Competitor sections depend on the user's
+    competitors and are computed per report.
+    """
+    window_start, window_end = report_window(schedules[0]["time_period"], now=now)
+    reports = []
+    for schedule in schedules:
+        fields = {field: schedule.get(field) for field in SCHEDULED_REPORT_FIELDS}
+        fields.update({"window_start": window_start, "window_end": window_end, "schedule_id": schedule["_id"]})
+        report = create_report(
+            schedule["user_id"],
+            fields,
+            [{"name": name, "title": SECTIONS[name].title} for name in schedule["sections"]],
+        )
+        reports.append((schedule, report, build_context(report)))
+
+    batch = batch_context([context for _, _, context in reports])
+    entity_filters = {entity_set_key(context["entities"]): context["entities"] for _, _, context in reports}
+    stats: Dict[str, Any] = {"reports": len(reports), "entity_filters": len(entity_filters), "aggregations": 0, "compute_ms": 0.0}
+    fingerprints: Dict[str, Dict[str, Dict[str, str]]] = {}
+    try:
+        for source in batch["data_sources"]:
+            fingerprints[source] = batch_fingerprints(batch, source, entity_filters)
+        for name in SECTIONS:
+            if SECTIONS[name].scope is not None:
+                continue
+            members: Dict[str, Dict[str, Any]] = {}
+            for schedule, _, context in reports:
+                if name not in schedule["sections"]:
+                    continue
+                member = members.setdefault(
+                    entity_set_key(context["entities"]),
+                    {"entities": context["entities"], "data_sources": set()},
+                )
+                member["data_sources"].update(context["data_sources"])
+            if members:
+                section_stats = fill_batch_section_cache(SECTIONS[name], batch, members, fingerprints)
+                stats["aggregations"] += section_stats["aggregations"]
+                stats["compute_ms"] += section_stats["compute_ms"]
+    except Exception as exc:
+        # Reports still compute whatever the batch could not share
+        stats["error"] = str(exc)
+        fingerprints = {}
+    stats["compute_ms"] = round(stats["compute_ms"], 1)
+
+    collection = get_report_schedules_collection()
+    for schedule, report, context in reports:
+        key = entity_set_key(context["entities"])
+        run_report(report["_id"], {source: fingerprints[source][key] for source in context["data_sources"] if source in fingerprints})
+        collection.update_one(
+            {"_id": schedule["_id"]},
+            {
+                "$set": {
+                    "last_run_at": now,
+                    "last_report_id": report["_id"],
+                    "last_batch": stats,
+                },
+                "$inc": {"runs": 1},
+            },
+        )
+    return stats
+
+def claim_schedule(schedule: Dict[str, Any], now: datetime) -> Optional[Dict[str, Any]]:
+    """
+    Advance a schedule's next run before generating its report; None when another worker already claimed this run
+
+    A scheduler that loses its lock mid-batch cannot make a new leader
+    generate the same reports again, at the cost of skipping a run if the
+    worker dies before finishing it.
+    """
+    return get_report_schedules_collection().find_one_and_update(
+        {"_id": schedule["_id"], "active": True, "next_run_at": schedule["next_run_at"]},
+        {"$set": {"next_run_at": next_run_time(now, schedule["interval_seconds"], schedule["jitter_seconds"])}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+def run_due_report_schedules(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Generate every due scheduled report, batching those over the same time period
+
+    Schedules due within REPORT_SCHEDULE_BATCH_WINDOW_SECONDS are pulled
+    forward into the current tick so they can share the batch's aggregates.
+    """
+    now = now or datetime.utcnow()
+    horizon = now + timedelta(seconds=settings.REPORT_SCHEDULE_BATCH_WINDOW_SECONDS)
+    due = get_report_schedules_collection().find({"active": True, "next_run_at": {"$lte": horizon}}).sort(
+        "next_run_at", pymongo.ASCENDING
+    )
+
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for schedule in due:
+        groups.setdefault(schedule["time_period"], []).append(schedule)
+    # Only run batches with at least one schedule actually due
+    groups = {key: members for key, members in groups.items() if members[0]["next_run_at"] <= now}
+
+    totals = {"batches": 0, "reports": 0, "aggregations": 0}
+    for schedules in groups.values():
+        schedules = [claimed for claimed in (claim_schedule(schedule, now) for schedule in schedules) if claimed]
+        if not schedules:
+            continue
+        totals["batches"] += 1
+        stats = run_batch(schedules, now)
+        totals["reports"] += stats["reports"]
+        totals["aggregations"] += stats["aggregations"]
+    return totals
+
+def run_report_scheduler_loop(stop_event: threading.Event) -> None:
+    """
+    Run due report schedules every tick; one API worker at a time holds the lock
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    tick = settings.REPORT_SCHEDULER_TICK_SECONDS
+    while not stop_event.is_set():
+        lock_seconds = max(int(tick * 2), 1)
+        try:
+            acquired = redis_client.set(REPORT_SCHEDULER_LOCK_KEY, owner, nx=True, ex=lock_seconds)
+            if acquired or redis_client.get(REPORT_SCHEDULER_LOCK_KEY) == owner:
+                redis_client.expire(REPORT_SCHEDULER_LOCK_KEY, lock_seconds)
+                run_due_report_schedules()
+        except Exception:
+            # A datastore outage skips this tick instead of ending the thread
+            scheduler_logger.exception("Report scheduler tick failed")
+        stop_event.wait(tick)
+
+def start_report_scheduler() -> threading.Event:
+    """
+    Start the report scheduler loop in a daemon thread and return its stop event
+    """
+    stop_event = threading.Event()
+    threading.Thread(target=run_report_scheduler_loop, args=(stop_event,), name="report-scheduler", daemon=True).start()
+    return stop_event
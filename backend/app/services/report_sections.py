@@ -0,0 +1,348 @@
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.activity_timeline import ACTIVITY_TYPES, get_daily_activity_collection
+from app.services.collected_data import get_collected_data_collection
+from app.services.competitor_store import get_competitors_collection
+
+# Section results are built from per-day partial aggregates keyed by
+# YYYY-MM-DD, so the same partials can be merged over any day-aligned window.
+# Partials are nested dicts of counts, computed per data source and summed.
+Partials = Dict[str, Dict[str, Any]]
+
+# Partials of a batch of reports, keyed by day and by the batch entities a
+# document mentions, so each report can pick the documents its filter matches
+SignaturePartials = Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]]
+
+# Pseudo data source for competitor activity, which is not per data source
+ACTIVITY_SOURCE = "competitor_activity"
+
+SENTIMENT_SCORES = {"positive": 1.0, "neutral": 0.5, "negative": 0.0}
+
+MAX_COMPETITORS = 20
+TOP_ENTITIES = 20
+
+@dataclass
+class ReportSection:
+    name: str
+    title: str
+    # Returns signature partials instead when the context is a batch's
+    aggregate: Callable[[Dict[str, Any], str, datetime, datetime], Partials]
+    merge: Callable[[Partials, Dict[str, Any]], Dict[str, Any]]
+    # Pseudo sources read besides the report's data sources
+    extra_sources: List[str] = field(default_factory=list)
+    # Cache key part for sections that depend on more than sources and entities
+    scope: Optional[Callable[[Dict[str, Any]], str]] = None
+
+def day_key(value: datetime) -> str:
+    return value.strftime("%Y-%m-%d")
+
+def iter_days(start: datetime, end: datetime) -> List[str]:
+    """
+    Day keys of a [start, end) window of whole days
+    """
+    return [day_key(start + timedelta(days=offset)) for offset in range((end - start).days)]
+
+def add_partials(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Sum two partials of the same day
+    """
+    total = dict(left)
+    for key, value in right.items():
+        if isinstance(value, dict):
+            total[key] = add_partials(total.get(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+def combine_partials(partials_by_source: List[Partials]) -> Partials:
+    """
+    Sum per-source partials day by day
+    """
+    combined: Partials = {}
+    for partials in partials_by_source:
+        for day, partial in partials.items():
+            combined[day] = add_partials(combined[day], partial) if day in combined else partial
+    return combined
+
+def filter_matcher(entity_filters: Dict[str, Optional[List[str]]]) -> Callable[[Iterable[str]], Set[str]]:
+    """
+    Function returning the keys of the entity filters a signature matches
+
+    An empty filter matches every signature.
+    """
+    unfiltered = {key for key, entities in entity_filters.items() if not entities}
+    readers: Dict[str, List[str]] = {}
+    for key, entities in entity_filters.items():
+        for entity in set(entities or []):
+            readers.setdefault(entity, []).append(key)
+
+    def match(signature: Iterable[str]) -> Set[str]:
+        matched = set(unfiltered)
+        for entity in signature:
+            matched.update(readers.get(entity, []))
+        return matched
+    return match
+
+def split_signature_partials(
+    partials: SignaturePartials,
+    entity_filters: Dict[str, Optional[List[str]]],
+) -> Dict[str, Partials]:
+    """
+    Partials of each report of a batch, keyed like the given entity filters
+    """
+    match = filter_matcher(entity_filters)
+    split: Dict[str, Partials] = {key: {} for key in entity_filters}
+    for (day, signature), partial in partials.items():
+        for key in match(signature):
+            days = split[key]
+            days[day] = add_partials(days[day], partial) if day in days else partial
+    return split
+
+def _day_expression() -> Dict[str, Any]:
+    return {"$dateToString": {"format": "%Y-%m-%d", "date": "$collected_at"}}
+
+def entity_signature(entities: List[str]) -> Dict[str, Any]:
+    """
+    Expression of the given entities a collected document mentions
+    """
+    return {
+        "$filter": {
+            "input": {"$ifNull": ["$entities", []]},
+            "as": "entity",
+            "cond": {"$in": ["$$entity", entities]},
+        }
+    }
+
+def _signature_stages(context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Batched reports group documents by which of the batch's entities they
+    # mention; the stage runs before any $unwind of entities
+    if context.get("signature_entities") is None:
+        return []
+    return [{"$addFields": {"_signature": entity_signature(context["signature_entities"])}}]
+
+def _group_id(context: Dict[str, Any], **fields: Any) -> Dict[str, Any]:
+    group_id = {"day": _day_expression(), **fields}
+    if context.get("signature_entities") is not None:
+        group_id["signature"] = "$_signature"
+    return group_id
+
+def _partial_key(group_id: Dict[str, Any]) -> Any:
+    if "signature" in group_id:
+        return group_id["day"], tuple(sorted(set(group_id["signature"])))
+    return group_id["day"]
+
+def collected_match(context: Dict[str, Any], source: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    """
+    Filter on collected data shared by every section
+    """
+    match: Dict[str, Any] = {
+        "source": source,
+        "collected_at": {"$gte": start, "$lt": end},
+    }
+    if context.get("entities"):
+        match["entities"] = {"$in": context["entities"]}
+    return match
+
+def _sentiment_score(counts: Dict[str, int]) -> Any:
+    scored = {label: count for label, count in counts.items() if label in SENTIMENT_SCORES}
+    total = sum(scored.values())
+    if not total:
+        return None
+    return round(sum(SENTIMENT_SCORES[label] * count for label, count in scored.items()) / total, 4)
+
+def aggregate_sentiment(context: Dict[str, Any], source: str, start: datetime, end: datetime) -> Partials:
+    partials: Partials = {}
+    for row in get_collected_data_collection().aggregate([
+        {"$match": collected_match(context, source, start, end)},
+        *_signature_stages(context),
+        {"$group": {"_id": _group_id(context, sentiment="$sentiment"), "count": {"$sum": 1}}},
+    ]):
+        label = str(row["_id"].get("sentiment") or "unknown")
+        # Signatures listing the same entities in another order share a key
+        partial = partials.setdefault(_partial_key(row["_id"]), {})
+        partial[label] = partial.get(label, 0) + row["count"]
+    return partials
+
+def merge_sentiment(partials: Partials, context: Dict[str, Any]) -> Dict[str, Any]:
+    counts: Dict[str, int] = {}
+    daily = []
+    for day in sorted(partials):
+        for label, count in partials[day].items():
+            counts[label] = counts.get(label, 0) + count
+        daily.append({"date": day, "score": _sentiment_score(partials[day]), **partials[day]})
+    total = sum(counts.values())
+    return {
+        "total": total,
+        "counts": counts,
+        "shares": {label: round(count / total, 4) for label, count in counts.items()} if total else {},
+        "score": _sentiment_score(counts),
+        "daily": daily,
+    }
+
+def aggregate_trends(context: Dict[str, Any], source: str, start: datetime, end: datetime) -> Partials:
+    partials: Partials = {}
+    for row in get_collected_data_collection().aggregate([
+        {"$match": collected_match(context, source, start, end)},
+        *_signature_stages(context),
+        {"$group": {"_id": _group_id(context, source="$source"), "count": {"$sum": 1}}},
+    ]):
+        partial = partials.setdefault(_partial_key(row["_id"]), {"volume": 0, "by_source": {}})
+        partial["volume"] += row["count"]
+        partial["by_source"][row["_id"]["source"]] = partial["by_source"].get(row["_id"]["source"], 0) + row["count"]
+    return partials
+
+def merge_trends(partials: Partials, context: Dict[str, Any]) -> Dict[str, Any]:
+    days = iter_days(context["window_start"], context["window_end"])
+    volumes = [partials.get(day, {}).get("volume", 0) for day in days]
+    by_source: Dict[str, int] = {}
+    for partial in partials.values():
+        for source, count in partial["by_source"].items():
+            by_source[source] = by_source.get(source, 0) + count
+    half = len(days) // 2
+    earlier, later = sum(volumes[:half]), sum(volumes[half:])
+    peak = max(range(len(days)), key=lambda position: volumes[position]) if days else None
+    return {
+        "total": sum(volumes),
+        "average_per_day": round(sum(volumes) / len(days), 2) if days else 0,
+        "peak_day": {"date": days[peak], "volume": volumes[peak]} if peak is not None and volumes[peak] else None,
+        # Volume in the second half of the window relative to the first
+        "change_pct": round((later - earlier) / earlier * 100, 2) if earlier else None,
+        "by_source": by_source,
+        "daily": [{"date": day, "volume": volume} for day, volume in zip(days, volumes)],
+    }
+
+def aggregate_entities(context: Dict[str, Any], source: str, start: datetime, end: datetime) -> Partials:
+    partials: Partials = {}
+    for row in get_collected_data_collection().aggregate([
+        {"$match": collected_match(context, source, start, end)},
+        *_signature_stages(context),
+        {"$unwind": "$entities"},
+        {"$group": {"_id": _group_id(context, entity="$entities"), "count": {"$sum": 1}}},
+    ]):
+        partial = partials.setdefault(_partial_key(row["_id"]), {})
+        partial[str(row["_id"]["entity"])] = partial.get(str(row["_id"]["entity"]), 0) + row["count"]
+    return partials
+
+def merge_entities(partials: Partials, context: Dict[str, Any]) -> Dict[str, Any]:
+    days = iter_days(context["window_start"], context["window_end"])
+    half = set(days[len(days) // 2:])
+    totals: Dict[str, int] = {}
+    recent: Dict[str, int] = {}
+    for day, counts in partials.items():
+        for entity, count in counts.items():
+            totals[entity] = totals.get(entity, 0) + count
+            if day in half:
+                recent[entity] = recent.get(entity, 0) + count
+    top = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:TOP_ENTITIES]
+    # Entities whose mentions are concentrated in the second half of the window
+    rising = sorted(
+        ((entity, recent.get(entity, 0) - (count - recent.get(entity, 0))) for entity, count in totals.items()),
+        key=lambda item: (-item[1], item[0]),
+    )
+    return {
+        "distinct": len(totals),
+        "top": [{"entity": entity, "mentions": count} for entity, count in top],
+        "rising": [{"entity": entity, "growth": growth} for entity, growth in rising[:10] if growth > 0],
+    }
+
+def load_competitors(context: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Competitors covered by a report: those named in its entities, or all of the user's
+    """
+    query: Dict[str, Any] = {"owner_id": context["user_id"]}
+    if context.get("entities"):
+        query["name"] = {"$in": context["entities"]}
+    competitors = get_competitors_collection().find(query, {"name": 1}).sort("_id", -1).limit(MAX_COMPETITORS)
+    return [{"id": str(competitor["_id"]), "name": competitor["name"]} for competitor in competitors]
+
+def competitors_scope(context: Dict[str, Any]) -> str:
+    pairs = sorted(f"{competitor['id']}:{competitor['name']}" for competitor in context["competitors"])
+    return hashlib.sha1("|".join(pairs).encode("utf-8")).hexdigest()
+
+def aggregate_competitors(context: Dict[str, Any], source: str, start: datetime, end: datetime) -> Partials:
+    competitors = context["competitors"]
+    partials: Partials = {}
+    if not competitors:
+        return partials
+
+    if source == ACTIVITY_SOURCE:
+        names_by_id = {competitor["id"]: competitor["name"] for competitor in competitors}
+        for document in get_daily_activity_collection().find(
+            {"competitor_id": {"$in": list(names_by_id)}, "day": {"$gte": start, "$lt": end}}
+        ):
+            day = day_key(document["day"])
+            activity = {"activity": {names_by_id[document["competitor_id"]]: document.get("counts", {})}}
+            partials[day] = add_partials(partials.get(day, {}), activity)
+        return partials
+
+    names = [competitor["name"] for competitor in competitors]
+    match = collected_match(context, source, start, end)
+    match["entities"] = {"$in": names}
+    for row in get_collected_data_collection().aggregate([
+        {"$match": match},
+        {"$unwind": "$entities"},
+        {"$match": {"entities": {"$in": names}}},
+        {
+            "$group": {
+                "_id": {"day": _day_expression(), "name": "$entities", "sentiment": "$sentiment"},
+                "count": {"$sum": 1},
+            }
+        },
+    ]):
+        mentions = partials.setdefault(row["_id"]["day"], {"mentions": {}})["mentions"]
+        label = str(row["_id"].get("sentiment") or "unknown")
+        mentions.setdefault(row["_id"]["name"], {})[label] = row["count"]
+    return partials
+
+def merge_competitors(partials: Partials, context: Dict[str, Any]) -> Dict[str, Any]:
+    mentions: Dict[str, Dict[str, int]] = {}
+    activity: Dict[str, Dict[str, int]] = {}
+    for partial in partials.values():
+        for name, counts in partial.get("mentions", {}).items():
+            target = mentions.setdefault(name, {})
+            for label, count in counts.items():
+                target[label] = target.get(label, 0) + count
+        for name, counts in partial.get("activity", {}).items():
+            target = activity.setdefault(name, {})
+            for activity_type, count in counts.items():
+                target[activity_type] = target.get(activity_type, 0) + count
+    total_mentions = sum(sum(counts.values()) for counts in mentions.values())
+    competitors = []
+    for name in sorted(set(mentions) | set(activity)):
+        mention_count = sum(mentions.get(name, {}).values())
+        competitors.append({
+            "name": name,
+            "mentions": mention_count,
+            "share_of_voice": round(mention_count / total_mentions, 4) if total_mentions else 0.0,
+            "sentiment_score": _sentiment_score(mentions.get(name, {})),
+            "activity": {activity_type: activity.get(name, {}).get(activity_type, 0) for activity_type in ACTIVITY_TYPES},
+        })
+    competitors.sort(key=lambda competitor: (-competitor["mentions"], competitor["name"]))
+    return {"total_mentions": total_mentions, "competitors": competitors}
+
+SECTIONS: Dict[str, ReportSection] = {
+    section.name: section
+    for section in [
+        ReportSection("sentiment", "Consumer Sentiment", aggregate_sentiment, merge_sentiment),
+        ReportSection("trends", "Emerging Trends", aggregate_trends, merge_trends),
+        ReportSection("entities", "Key Entities", aggregate_entities, merge_entities),
+        ReportSection(
+            "competitors",
+            "Competitor Analysis",
+            aggregate_competitors,
+            merge_competitors,
+            extra_sources=[ACTIVITY_SOURCE],
+            scope=competitors_scope,
+        ),
+    ]
+}
+
+REPORT_TYPE_SECTIONS = {
+    "market_overview": ["trends", "sentiment", "competitors", "entities"],
+    "competitor_analysis": ["competitors", "sentiment", "entities"],
+    "sentiment_analysis": ["sentiment", "entities", "trends"],
+    "trend_report": ["trends", "entities", "sentiment"],
+}
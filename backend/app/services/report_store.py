@@ -0,0 +1,357 @@
+import gzip
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.core.config import settings
+from app.core.database import get_mongo_collection
+from app.services.live_events import publish_event
+
+REPORTS_COLLECTION = "reports"
+REPORT_TEMPLATES_COLLECTION = "report_templates"
+
+REPORT_STATUSES = ["generating", "completed", "failed"]
+
+REPORT_FORMATS = {
+    "pdf": ("application/pdf", "pdf"),
+    "docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx"),
+    "pptx": ("application/vnd.openxmlformats-officedocument.presentationml.presentation", "pptx"),
+    "html": ("text/html", "html"),
+}
+
+REPORT_INDEXES = [
+    pymongo.IndexModel([("user_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="user_created_at"),
+    pymongo.IndexModel(
+        [("user_id", pymongo.ASCENDING), ("report_type", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)],
+        name="user_type_created_at",
+    ),
+    pymongo.IndexModel(
+        [("user_id", pymongo.ASCENDING), ("status", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)],
+        name="user_status_created_at",
+    ),
+]
+
+REPORT_TEMPLATE_INDEXES = [
+    pymongo.IndexModel(
+        [("user_id", pymongo.ASCENDING), ("report_type", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)],
+        name="user_type_created_at",
+    ),
+]
+
+def get_reports_collection() -> Any:
+    """
+    Get the MongoDB collection holding generated reports
+    """
+    return get_mongo_collection(REPORTS_COLLECTION)
+
+def get_report_templates_collection() -> Any:
+    """
+    Get the MongoDB collection holding report templates
+    """
+    return get_mongo_collection(REPORT_TEMPLATES_COLLECTION)
+
+def ensure_report_indexes() -> List[str]:
+    """
+    Create the indexes used by report queries if they don't exist
+    """
+    return get_reports_collection().create_indexes(REPORT_INDEXES) + get_report_templates_collection().create_indexes(
+        REPORT_TEMPLATE_INDEXES
+    )
+
+def to_report_id(report_id: str) -> Optional[ObjectId]:
+    """
+    Parse a report id, returning None when it is malformed
+    """
+    try:
+        return ObjectId(report_id)
+    except (InvalidId, TypeError):
+        return None
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() + "Z" if value else None
+
+def serialize_report(report: Dict[str, Any], detailed: bool = False) -> Dict[str, Any]:
+    """
+    Convert a report document into the API representation
+    """
+    report_id = str(report["_id"])
+    serialized = {
+        "id": report_id,
+        "title": report["title"],
+        "description": report.get("description"),
+        "report_type": report["report_type"],
+        "format": report["format"],
+        "status": report["status"],
+        "created_at": _isoformat(report["created_at"]),
+        "completed_at": _isoformat(report.get("completed_at")),
+        "download_url": f"{settings.API_V1_STR}/reports/{report_id}/download" if report["status"] == "completed" else None,
+    }
+    if not detailed:
+        return serialized
+    artifact = report.get("artifact") or {}
+    serialized.update({
+        "data_sources": report["data_sources"],
+        "entities": report.get("entities"),
+        "time_period": report["time_period"],
+        "window_start": _isoformat(report["window_start"]),
+        "window_end": _isoformat(report["window_end"]),
+        "size_bytes": artifact.get("size_bytes"),
+        "duration_ms": report.get("duration_ms"),
+        "cache": report.get("cache"),
+        "template_id": report.get("template_id"),
+        "error": report.get("error"),
+        "sections": [
+            {
+                "name": section["name"],
+                "title": section["title"],
+                "status": section["status"],
+                "started_at": _isoformat(section.get("started_at")),
+                "completed_at": _isoformat(section.get("completed_at")),
+                "duration_ms": section.get("duration_ms"),
+                "cache": section.get("cache"),
+                "error": section.get("error"),
+            }
+            for section in report["sections"]
+        ],
+        "progress": round(
+            100 * sum(section["status"] in ("completed", "failed") for section in report["sections"])
+            / max(len(report["sections"]), 1),
+            1,
+        ),
+    })
+    return serialized
+
+def _publish(report: Optional[Dict[str, Any]]) -> None:
+    if report is not None:
+        publish_event(report["user_id"], "report", serialize_report(report, detailed=True))
+
+def create_report(user_id: int, fields: Dict[str, Any], sections: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Record a new report in the generating state
+    """
+    report = {
+        "user_id": user_id,
+        **fields,
+        "status": "generating",
+        "sections": [{**section, "status": "pending"} for section in sections],
+        "created_at": datetime.utcnow(),
+        "completed_at": None,
+    }
+    report["_id"] = get_reports_collection().insert_one(report).inserted_id
+    _publish(report)
+    return report
+
+def get_report(report_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Get one of a user's reports
+    """
+    object_id = to_report_id(report_id)
+    if object_id is None:
+        return None
+    return get_reports_collection().find_one({"_id": object_id, "user_id": user_id})
+
+def list_reports(
+    user_id: int,
+    report_type: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 10,
+    skip: int = 0,
+) -> Dict[str, Any]:
+    """
+    List a user's reports newest first
+    """
+    query: Dict[str, Any] = {"user_id": user_id}
+    if report_type:
+        query["report_type"] = report_type
+    if status:
+        query["status"] = status
+    collection = get_reports_collection()
+    reports = collection.find(query, {"sections": 0}).sort("created_at", pymongo.DESCENDING).skip(skip).limit(limit)
+    return {"total": collection.count_documents(query), "reports": list(reports)}
+
+def update_section(report_id: Any, position: int, fields: Dict[str, Any]) -> None:
+    """
+    Record progress of one report section
+    """
+    _publish(get_reports_collection().find_one_and_update(
+        {"_id": report_id},
+        {"$set": {f"sections.{position}.{key}": value for key, value in fields.items()}},
+        return_document=pymongo.ReturnDocument.AFTER,
+    ))
+
+def complete_report(
+    report_id: Any,
+    artifact: Dict[str, Any],
+    duration_ms: float,
+    cache: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Mark a report as completed with its stored artifact
+    """
+    _publish(get_reports_collection().find_one_and_update(
+        {"_id": report_id},
+        {
+            "$set": {
+                "status": "completed",
+                "artifact": artifact,
+                "duration_ms": duration_ms,
+                "cache": cache,
+                "completed_at": datetime.utcnow(),
+            }
+        },
+        return_document=pymongo.ReturnDocument.AFTER,
+    ))
+
+def fail_report(report_id: Any, error: str) -> None:
+    """
+    Mark a report as failed
+    """
+    _publish(get_reports_collection().find_one_and_update(
+        {"_id": report_id},
+        {"$set": {"status": "failed", "error": error, "completed_at": datetime.utcnow()}},
+        return_document=pymongo.ReturnDocument.AFTER,
+    ))
+
+def delete_report(report_id: str, user_id: int) -> bool:
+    """
+    Delete one of a user's reports together with its artifact
+    """
+    report = get_report(report_id, user_id)
+    if report is None:
+        return False
+    get_reports_collection().delete_one({"_id": report["_id"]})
+    if report.get("artifact"):
+        delete_artifact(report["artifact"])
+    return True
+
+def _artifact_dir() -> str:
+    directory = settings.REPORT_ARTIFACT_DIR
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def save_artifact(report_id: Any, chunks: Iterable[bytes], file_format: str) -> Dict[str, Any]:
+    """
+    Store a rendered report, returning the artifact metadata kept on the report
+
+    The content is written chunk by chunk as the renderer produces it. HTML
+    reports also get a gzip variant, compressed in the same pass, so
+    downloads can be served pre-compressed without compressing on every
+    request.
+    """
+    content_type, extension = REPORT_FORMATS[file_format]
+    directory = _artifact_dir()
+    path = os.path.join(directory, f"{report_id}.{extension}")
+    digest = hashlib.sha256()
+    size = 0
+    # Written under temporary names so readers never see a partial file
+    temporary = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+    compressed = None
+    if file_format == "html" and settings.REPORT_GZIP_HTML:
+        compressed = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+    try:
+        with temporary:
+            compressor = gzip.GzipFile(fileobj=compressed, mode="wb", compresslevel=9, mtime=0) if compressed else None
+            for chunk in chunks:
+                temporary.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+                if compressor:
+                    compressor.write(chunk)
+            if compressor:
+                compressor.close()
+                compressed.close()
+    except BaseException:
+        for leftover in [temporary] + ([compressed] if compressed else []):
+            leftover.close()
+            os.remove(leftover.name)
+        raise
+    os.replace(temporary.name, path)
+    artifact = {
+        "path": path,
+        "content_type": content_type,
+        "size_bytes": size,
+        "sha256": digest.hexdigest(),
+    }
+    if compressed:
+        gzip_path = path + ".gz"
+        os.replace(compressed.name, gzip_path)
+        artifact["gzip"] = {
+            "path": gzip_path,
+            "size_bytes": os.path.getsize(gzip_path),
+            "sha256": _file_sha256(gzip_path),
+        }
+    return artifact
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as stored:
+        for block in iter(lambda: stored.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def delete_artifact(artifact: Dict[str, Any]) -> None:
+    """
+    Remove a stored report file and its variants
+    """
+    for path in [artifact["path"]] + ([artifact["gzip"]["path"]] if artifact.get("gzip") else []):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def serialize_template(template: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a template document into the API representation
+    """
+    return {
+        "id": str(template["_id"]),
+        "name": template["name"],
+        "description": template.get("description"),
+        "report_type": template["report_type"],
+        "is_default": template["is_default"],
+        "sections": template["sections"],
+        "data_sources": template["data_sources"],
+        "created_at": _isoformat(template["created_at"]),
+    }
+
+def create_template(user_id: int, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store a report template; a new default replaces the previous default of its type
+    """
+    collection = get_report_templates_collection()
+    if fields.get("is_default"):
+        collection.update_many(
+            {"user_id": user_id, "report_type": fields["report_type"], "is_default": True},
+            {"$set": {"is_default": False}},
+        )
+    template = {"user_id": user_id, **fields, "created_at": datetime.utcnow()}
+    template["_id"] = collection.insert_one(template).inserted_id
+    return template
+
+def get_template(template_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Get one of a user's report templates
+    """
+    object_id = to_report_id(template_id)
+    if object_id is None:
+        return None
+    return get_report_templates_collection().find_one({"_id": object_id, "user_id": user_id})
+
+def list_templates(user_id: int, report_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    List a user's report templates, defaults first
+    """
+    query: Dict[str, Any] = {"user_id": user_id}
+    if report_type:
+        query["report_type"] = report_type
+    return list(
+        get_report_templates_collection()
+        .find(query)
+        .sort([("is_default", pymongo.DESCENDING), ("created_at", pymongo.DESCENDING)])
+    )
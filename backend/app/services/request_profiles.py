@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pymongo
+
+from app.core.config import settings
+from app.core.database import get_mongo_collection
+
+REQUEST_PROFILES_COLLECTION = "request_profiles"
+
+REQUEST_PROFILE_INDEXES = [
+    pymongo.IndexModel([("profile_id", pymongo.ASCENDING)], name="profile_id", unique=True),
+    pymongo.IndexModel([("path", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="path_created_at"),
+    # Profiles expire on their own
+    pymongo.IndexModel(
+        [("created_at", pymongo.ASCENDING)],
+        name="created_at_ttl",
+        expireAfterSeconds=settings.PROFILING_RETENTION_HOURS * 3600,
+    ),
+]
+
+def get_request_profiles_collection() -> Any:
+    """
+    Get the MongoDB collection holding request profiles
+    """
+    return get_mongo_collection(REQUEST_PROFILES_COLLECTION)
+
+def ensure_request_profile_indexes() -> List[str]:
+    """
+    Create the indexes used by request profiles if they don't exist
+    """
+    return get_request_profiles_collection().create_indexes(REQUEST_PROFILE_INDEXES)
+
+def save_profile(profile: Dict[str, Any]) -> None:
+    """
+    Store a finished request profile
+    """
+    get_request_profiles_collection().insert_one(profile)
+
+def serialize_profile(profile: Dict[str, Any], detailed: bool = False) -> Dict[str, Any]:
+    """
+    Convert a profile document into the API representation; the folded stacks are downloaded separately
+    """
+    serialized = {
+        "id": profile["profile_id"],
+        "trigger": profile["trigger"],
+        "method": profile["method"],
+        "path": profile["path"],
+        "query_string": profile["query_string"],
+        "status_code": profile["status_code"],
+        "duration_ms": profile["duration_ms"],
+        "samples": profile["samples"],
+        "span_totals": profile["span_totals"],
+        "created_at": profile["created_at"].isoformat() + "Z",
+    }
+    if detailed:
+        serialized.update({
+            "interval_ms": profile["interval_ms"],
+            "summary": profile["summary"],
+            "repeated_queries": profile["repeated_queries"],
+            "spans": profile["spans"],
+            "dropped_spans": profile["dropped_spans"],
+        })
+    return serialized
+
+def list_profiles(path: Optional[str] = None, limit: int = 20, skip: int = 0) -> Dict[str, Any]:
+    """
+    List stored profiles newest first, optionally for one path
+    """
+    query: Dict[str, Any] = {"path": path} if path else {}
+    collection = get_request_profiles_collection()
+    profiles = (
+        collection.find(query, {"folded": 0, "spans": 0, "summary": 0})
+        .sort("created_at", pymongo.DESCENDING)
+        .skip(skip)
+        .limit(limit)
+    )
+    return {"total": collection.count_documents(query), "profiles": list(profiles)}
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get a stored profile
+    """
+    return get_request_profiles_collection().find_one({"profile_id": profile_id})
+
+def delete_profiles(before: Optional[datetime] = None) -> int:
+    """
+    Delete stored profiles, all of them or those created before a time
+    """
+    query = {"created_at": {"$lt": before}} if before else {}
+    return get_request_profiles_collection().delete_many(query).deleted_count
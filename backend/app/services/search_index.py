@@ -0,0 +1,792 @@
+import fcntl
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+TOKEN_PATTERN = re.compile(r"\w+")
+QUERY_TOKEN_PATTERN = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# A clause is a tuple of terms; more than one term means a phrase
+Clause = Tuple[str, ...]
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase index terms
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """
+    Append an unsigned integer to a buffer using 7-bit variable length encoding
+    """
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(buffer: Any, offset: int) -> Tuple[int, int]:
+    """
+    Read a variable length integer, returning the value and the next offset
+    """
+    result = 0
+    shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+def encode_postings(postings: Dict[int, List[int]]) -> bytes:
+    """
+    Encode a term's postings as delta-compressed varints
+
+    Layout: doc count, then per document the doc id delta, term frequency,
+    byte length of the positions block and the delta-encoded positions. The
+    positions length lets readers skip positions unless a phrase needs them.
+    """
+    out = bytearray()
+    encode_varint(len(postings), out)
+    previous_doc = 0
+    for doc in sorted(postings):
+        positions = postings[doc]
+        encoded_positions = bytearray()
+        previous_position = 0
+        for position in positions:
+            encode_varint(position - previous_position, encoded_positions)
+            previous_position = position
+        encode_varint(doc - previous_doc, out)
+        encode_varint(len(positions), out)
+        encode_varint(len(encoded_positions), out)
+        out += encoded_positions
+        previous_doc = doc
+    return bytes(out)
+
+def decode_positions(buffer: Any, start: int, end: int) -> List[int]:
+    """
+    Decode a delta-encoded positions block
+    """
+    positions = []
+    position = 0
+    offset = start
+    while offset < end:
+        delta, offset = decode_varint(buffer, offset)
+        position += delta
+        positions.append(position)
+    return positions
+
+def to_day(value: Any) -> int:
+    """
+    Convert a date, datetime or ISO string into a day ordinal
+    """
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    if isinstance(value, str) and value:
+        return datetime.fromisoformat(value[:10]).date().toordinal()
+    return date.today().toordinal()
+
+class QueryGroup:
+    """
+    Conjunction of required clauses minus excluded clauses
+    """
+
+    def __init__(self) -> None:
+        self.required: List[Clause] = []
+        self.excluded: List[Clause] = []
+
+def parse_query(query: str) -> List[QueryGroup]:
+    """
+    Parse a keyword query into OR-ed groups of AND-ed clauses
+
+    Terms are AND-ed by default, ``OR`` starts a new group, ``-term`` or
+    ``NOT term`` excludes documents and ``"quoted text"`` matches a phrase.
+    """
+    groups = [QueryGroup()]
+    negate_next = False
+    for match in QUERY_TOKEN_PATTERN.finditer(query):
+        minus, phrase, word = match.groups()
+        if word in ("OR", "|"):
+            groups.append(QueryGroup())
+            continue
+        if word == "AND":
+            continue
+        if word == "NOT":
+            negate_next = True
+            continue
+        negate = negate_next or bool(minus)
+        if word is not None and word.startswith("-") and len(word) > 1:
+            negate = True
+            word = word[1:]
+        negate_next = False
+        terms = tuple(tokenize(phrase if phrase is not None else word))
+        if not terms:
+            continue
+        if negate:
+            groups[-1].excluded.append(terms)
+        else:
+            groups[-1].required.append(terms)
+    return [group for group in groups if group.required]
+
+class MemorySegment:
+    """
+    Searchable buffer of documents added since the last flush
+    """
+
+    def __init__(self) -> None:
+        self.name = "memory"
+        self.ids: List[str] = []
+        self.sources: List[str] = []
+        self.days: List[int] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, List[int]]] = {}
+        self.deleted: Set[int] = set()
+        self.total_length = 0
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.ids)
+
+    def add(self, doc_id: str, source: str, day: int, tokens: List[str]) -> int:
+        doc = len(self.ids)
+        self.ids.append(doc_id)
+        self.sources.append(source)
+        self.days.append(day)
+        self.lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        for position, term in enumerate(tokens):
+            self.postings.setdefault(term, {}).setdefault(doc, []).append(position)
+        return doc
+
+    def may_match(self, source: Optional[str], start_day: Optional[int], end_day: Optional[int]) -> bool:
+        return self.doc_count > 0
+
+    def document_frequency(self, term: str) -> int:
+        return len(self.postings.get(term, ()))
+
+    def term_postings(self, term: str) -> Dict[int, Tuple[int, Any]]:
+        return {doc: (len(positions), positions) for doc, positions in self.postings.get(term, {}).items()}
+
+    def positions(self, handle: Any) -> List[int]:
+        return handle
+
+    def doc_id(self, doc: int) -> str:
+        return self.ids[doc]
+
+    def doc_source(self, doc: int) -> str:
+        return self.sources[doc]
+
+class DiskSegment:
+    """
+    Immutable, memory-mapped segment written by a flush or merge
+
+    Postings and the per-document length, day and source arrays are mapped
+    from disk so the OS page cache, not the Python heap, holds the index.
+    """
+
+    def __init__(self, path: str, meta: Dict[str, Any]) -> None:
+        self.path = path
+        self.name = meta["name"]
+        self.doc_count = meta["doc_count"]
+        self.total_length = meta["total_length"]
+        self.source_table: List[str] = meta["sources"]
+        self.min_day = meta["min_day"]
+        self.max_day = meta["max_day"]
+        self.deleted: Set[int] = set(meta.get("deleted", []))
+        with open(os.path.join(path, "terms.json"), encoding="utf-8") as terms_file:
+            self.terms: Dict[str, List[int]] = json.load(terms_file)
+        self._files = []
+        self._maps = []
+        self.postings = self._map("postings.bin")
+        self.lengths = memoryview(self._map("lengths.bin")).cast("I")
+        self.days = memoryview(self._map("days.bin")).cast("i")
+        self.source_codes = memoryview(self._map("sources.bin")).cast("H")
+        self._ids: Optional[List[str]] = None
+
+    def _map(self, filename: str) -> mmap.mmap:
+        handle = open(os.path.join(self.path, filename), "rb")
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._files.append(handle)
+        self._maps.append(mapped)
+        return mapped
+
+    @property
+    def ids(self) -> List[str]:
+        if self._ids is None:
+            with open(os.path.join(self.path, "ids.txt"), encoding="utf-8") as ids_file:
+                self._ids = ids_file.read().split("\n")[: self.doc_count]
+        return self._ids
+
+    def may_match(self, source: Optional[str], start_day: Optional[int], end_day: Optional[int]) -> bool:
+        if source is not None and source not in self.source_table:
+            return False
+        if start_day is not None and self.max_day < start_day:
+            return False
+        if end_day is not None and self.min_day > end_day:
+            return False
+        return len(self.deleted) < self.doc_count
+
+    def document_frequency(self, term: str) -> int:
+        entry = self.terms.get(term)
+        return entry[2] if entry else 0
+
+    def term_postings(self, term: str) -> Dict[int, Tuple[int, Any]]:
+        entry = self.terms.get(term)
+        if not entry:
+            return {}
+        offset = entry[0]
+        buffer = self.postings
+        count, offset = decode_varint(buffer, offset)
+        result = {}
+        doc = 0
+        for _ in range(count):
+            delta, offset = decode_varint(buffer, offset)
+            tf, offset = decode_varint(buffer, offset)
+            size, offset = decode_varint(buffer, offset)
+            doc += delta
+            result[doc] = (tf, (offset, offset + size))
+            offset += size
+        return result
+
+    def positions(self, handle: Any) -> List[int]:
+        return decode_positions(self.postings, handle[0], handle[1])
+
+    def doc_id(self, doc: int) -> str:
+        return self.ids[doc]
+
+    def doc_source(self, doc: int) -> str:
+        return self.source_table[self.source_codes[doc]]
+
+    def iter_documents(self) -> Iterator[int]:
+        for doc in range(self.doc_count):
+            if doc not in self.deleted:
+                yield doc
+
+    def close(self) -> None:
+        # Views must be released before their maps can be closed
+        for view in (self.lengths, self.days, self.source_codes):
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+        for handle in self._files:
+            handle.close()
+
+def write_segment(
+    path: str,
+    ids: List[str],
+    sources: List[str],
+    days: List[int],
+    lengths: List[int],
+    postings: Dict[str, Dict[int, List[int]]],
+) -> Dict[str, Any]:
+    """
+    Write a segment directory and return its manifest entry
+    """
+    os.makedirs(path, exist_ok=True)
+    source_table = sorted(set(sources))
+    source_index = {source: code for code, source in enumerate(source_table)}
+
+    terms = {}
+    with open(os.path.join(path, "postings.bin"), "wb") as postings_file:
+        offset = 0
+        for term in sorted(postings):
+            encoded = encode_postings(postings[term])
+            postings_file.write(encoded)
+            terms[term] = [offset, len(encoded), len(postings[term])]
+            offset += len(encoded)
+        if offset == 0:
+            # mmap cannot map an empty file
+            postings_file.write(b"\0")
+    with open(os.path.join(path, "terms.json"), "w", encoding="utf-8") as terms_file:
+        json.dump(terms, terms_file, separators=(",", ":"))
+    with open(os.path.join(path, "lengths.bin"), "wb") as lengths_file:
+        array("I", lengths).tofile(lengths_file)
+    with open(os.path.join(path, "days.bin"), "wb") as days_file:
+        array("i", days).tofile(days_file)
+    with open(os.path.join(path, "sources.bin"), "wb") as sources_file:
+        array("H", [source_index[source] for source in sources]).tofile(sources_file)
+    with open(os.path.join(path, "ids.txt"), "w", encoding="utf-8") as ids_file:
+        ids_file.write("\n".join(ids))
+
+    return {
+        "name": os.path.basename(path),
+        "doc_count": len(ids),
+        "total_length": sum(lengths),
+        "sources": source_table,
+        "min_day": min(days),
+        "max_day": max(days),
+        "deleted": [],
+    }
+
+class SearchIndex:
+    """
+    Incrementally maintained inverted index over collected documents
+
+    New documents are buffered in a MemorySegment and flushed into immutable
+    segments, one per source, so source and date filters can skip whole
+    segments. Deletes are recorded as tombstones and dropped when segments of
+    the same source are merged. The manifest is updated under a file lock so
+    several ingestion processes can flush into the same directory.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        flush_documents: int = 10000,
+        merge_factor: int = 8,
+        max_segment_documents: int = 1000000,
+    ) -> None:
+        self.directory = directory
+        self.flush_documents = flush_documents
+        self.merge_factor = merge_factor
+        self.max_segment_documents = max_segment_documents
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._buffer = MemorySegment()
+        self._buffer_locations: Dict[str, int] = {}
+        self._pending_deletes: Set[str] = set()
+        self._segments: Dict[str, DiskSegment] = {}
+        self._manifest_mtime = 0.0
+        self._locations: Optional[Dict[str, Tuple[str, int]]] = None
+        self.refresh()
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    @contextmanager
+    def _manifest_lock(self) -> Iterator[None]:
+        with open(os.path.join(self.directory, "index.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        if not os.path.exists(self._manifest_path):
+            return {"next_segment": 1, "segments": []}
+        with open(self._manifest_path, encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        temporary_path = self._manifest_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary_path, self._manifest_path)
+
+    def refresh(self) -> None:
+        """
+        Reload the segment list if another process changed the manifest
+        """
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self._manifest_path)
+            except OSError:
+                return
+            if mtime == self._manifest_mtime:
+                return
+            self._load_segments(self._read_manifest())
+            self._manifest_mtime = mtime
+
+    def _load_segments(self, manifest: Dict[str, Any]) -> None:
+        # The id to location map is kept up to date segment by segment, so a
+        # flush costs what it writes rather than the size of the corpus
+        segments = {}
+        added = []
+        for meta in manifest["segments"]:
+            segment = self._segments.get(meta["name"])
+            if segment is None:
+                segment = DiskSegment(os.path.join(self.directory, meta["name"]), meta)
+                added.append(segment)
+            else:
+                deleted = set(meta.get("deleted", []))
+                self._forget_locations(segment, deleted - segment.deleted)
+                segment.deleted = deleted
+            segments[meta["name"]] = segment
+        for name, segment in self._segments.items():
+            if name not in segments:
+                self._forget_locations(segment, segment.iter_documents())
+                segment.close()
+        for segment in added:
+            self._remember_locations(segment)
+        self._segments = segments
+
+    def _remember_locations(self, segment: DiskSegment) -> None:
+        if self._locations is not None:
+            for doc in segment.iter_documents():
+                self._locations[segment.doc_id(doc)] = (segment.name, doc)
+
+    def _forget_locations(self, segment: DiskSegment, docs: Iterable[int]) -> None:
+        if self._locations is not None:
+            for doc in docs:
+                doc_id = segment.doc_id(doc)
+                if self._locations.get(doc_id) == (segment.name, doc):
+                    del self._locations[doc_id]
+
+    def _document_locations(self) -> Dict[str, Tuple[str, int]]:
+        if self._locations is None:
+            self._locations = {}
+            for segment in self._segments.values():
+                self._remember_locations(segment)
+        return self._locations
+
+    def add_documents(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """
+        Index documents, replacing earlier versions with the same id
+        """
+        added = 0
+        with self._lock:
+            for document in documents:
+                doc_id = str(document.get("id") or document["_id"])
+                self._delete_buffered(doc_id)
+                self._pending_deletes.add(doc_id)
+                tokens = tokenize(document.get("content") or "")
+                doc = self._buffer.add(
+                    doc_id,
+                    document.get("source") or "unknown",
+                    to_day(document.get("collected_at")),
+                    tokens,
+                )
+                self._buffer_locations[doc_id] = doc
+                added += 1
+                if self._buffer.doc_count >= self.flush_documents:
+                    self.flush()
+        return added
+
+    def document_ids(self) -> Set[str]:
+        """
+        Ids of every indexed document, buffered or stored
+        """
+        with self._lock:
+            self.refresh()
+            return (set(self._document_locations()) - self._pending_deletes) | set(self._buffer_locations)
+
+    def delete_documents(self, doc_ids: Iterable[str]) -> None:
+        """
+        Remove documents from the index
+        """
+        with self._lock:
+            for doc_id in doc_ids:
+                doc_id = str(doc_id)
+                self._delete_buffered(doc_id)
+                self._pending_deletes.add(doc_id)
+
+    def _delete_buffered(self, doc_id: str) -> None:
+        doc = self._buffer_locations.pop(doc_id, None)
+        if doc is not None:
+            self._buffer.deleted.add(doc)
+
+    def flush(self) -> None:
+        """
+        Write buffered documents and deletes to disk
+        """
+        with self._lock, self._manifest_lock():
+            manifest = self._read_manifest()
+            self._load_segments(manifest)
+
+            if self._pending_deletes:
+                locations = self._document_locations()
+                tombstones: Dict[str, Set[int]] = {}
+                for doc_id in self._pending_deletes:
+                    location = locations.pop(doc_id, None)
+                    if location is not None:
+                        tombstones.setdefault(location[0], set()).add(location[1])
+                for meta in manifest["segments"]:
+                    if meta["name"] in tombstones:
+                        meta["deleted"] = sorted(set(meta.get("deleted", [])) | tombstones[meta["name"]])
+
+            for segment_meta in self._write_buffered(manifest):
+                manifest["segments"].append(segment_meta)
+
+            self._merge_segments(manifest)
+            self._write_manifest(manifest)
+            self._load_segments(manifest)
+            self._manifest_mtime = os.path.getmtime(self._manifest_path)
+
+            # Reset under the lock, so documents added by other threads meanwhile are kept
+            self._buffer = MemorySegment()
+            self._buffer_locations = {}
+            self._pending_deletes = set()
+
+    def _write_buffered(self, manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # One segment per source; documents are renumbered densely per segment
+        buffer = self._buffer
+        renumber: Dict[int, Tuple[str, int]] = {}
+        docs_by_source: Dict[str, List[int]] = {}
+        for doc in range(buffer.doc_count):
+            if doc not in buffer.deleted:
+                source_docs = docs_by_source.setdefault(buffer.sources[doc], [])
+                renumber[doc] = (buffer.sources[doc], len(source_docs))
+                source_docs.append(doc)
+
+        postings_by_source: Dict[str, Dict[str, Dict[int, List[int]]]] = {source: {} for source in docs_by_source}
+        for term, term_postings in buffer.postings.items():
+            for doc, positions in term_postings.items():
+                location = renumber.get(doc)
+                if location is not None:
+                    postings_by_source[location[0]].setdefault(term, {})[location[1]] = positions
+
+        segment_metas = []
+        for source, docs in docs_by_source.items():
+            name = f"seg-{manifest['next_segment']:08d}"
+            manifest["next_segment"] += 1
+            segment_metas.append(
+                write_segment(
+                    os.path.join(self.directory, name),
+                    [buffer.ids[doc] for doc in docs],
+                    [source] * len(docs),
+                    [buffer.days[doc] for doc in docs],
+                    [buffer.lengths[doc] for doc in docs],
+                    postings_by_source[source],
+                )
+            )
+        return segment_metas
+
+    def _merge_segments(self, manifest: Dict[str, Any]) -> None:
+        # Merge small single-source segments once merge_factor of them pile
+        # up, so segments keep pruning well on source filters
+        by_source: Dict[str, List[Dict[str, Any]]] = {}
+        for meta in manifest["segments"]:
+            if len(meta["sources"]) == 1 and meta["doc_count"] < self.max_segment_documents:
+                by_source.setdefault(meta["sources"][0], []).append(meta)
+        for metas in by_source.values():
+            if len(metas) < self.merge_factor:
+                continue
+            metas = sorted(metas, key=lambda meta: meta["doc_count"])[: self.merge_factor]
+            segments = [DiskSegment(os.path.join(self.directory, meta["name"]), meta) for meta in metas]
+            name = f"seg-{manifest['next_segment']:08d}"
+            manifest["next_segment"] += 1
+            merged = self._write_merged(name, segments)
+            for segment in segments:
+                segment.close()
+            merged_names = {meta["name"] for meta in metas}
+            manifest["segments"] = [meta for meta in manifest["segments"] if meta["name"] not in merged_names]
+            if merged is not None:
+                manifest["segments"].append(merged)
+            for merged_name in merged_names:
+                shutil.rmtree(os.path.join(self.directory, merged_name), ignore_errors=True)
+
+    def _write_merged(self, name: str, segments: List[DiskSegment]) -> Optional[Dict[str, Any]]:
+        ids: List[str] = []
+        sources: List[str] = []
+        days: List[int] = []
+        lengths: List[int] = []
+        postings: Dict[str, Dict[int, List[int]]] = {}
+        for segment in segments:
+            renumber = {}
+            for doc in segment.iter_documents():
+                renumber[doc] = len(ids)
+                ids.append(segment.doc_id(doc))
+                sources.append(segment.doc_source(doc))
+                days.append(segment.days[doc])
+                lengths.append(segment.lengths[doc])
+            for term in segment.terms:
+                for doc, (tf, handle) in segment.term_postings(term).items():
+                    if doc in renumber:
+                        postings.setdefault(term, {})[renumber[doc]] = segment.positions(handle)
+        if not ids:
+            return None
+        return write_segment(os.path.join(self.directory, name), ids, sources, days, lengths, postings)
+
+    def _searchable_segments(self) -> List[Any]:
+        return list(self._segments.values()) + [self._buffer]
+
+    def search(
+        self,
+        query: str,
+        source: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        limit: int = 10,
+    ) -> List[Tuple[str, float]]:
+        """
+        Return the ids and BM25 scores of the best matching documents
+        """
+        hits = self._iter_hits(query, source, date_from, date_to)
+        return [(doc_id, score) for score, doc_id in heapq.nlargest(limit, hits)]
+
+    def count(
+        self,
+        query: str,
+        source: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> int:
+        """
+        Count documents matching a query
+        """
+        return sum(1 for _ in self._iter_hits(query, source, date_from, date_to))
+
+    def match_ids(
+        self,
+        query: str,
+        source: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        limit: Optional[int] = None,
+    ) -> Optional[List[str]]:
+        """
+        Return the ids of every document matching a query, or None past limit
+        """
+        ids: List[str] = []
+        for _, doc_id in self._iter_hits(query, source, date_from, date_to):
+            if limit is not None and len(ids) >= limit:
+                return None
+            ids.append(doc_id)
+        return ids
+
+    def _iter_hits(
+        self,
+        query: str,
+        source: Optional[str],
+        date_from: Optional[date],
+        date_to: Optional[date],
+    ) -> Iterator[Tuple[float, str]]:
+        groups = parse_query(query)
+        if not groups:
+            return
+        self.refresh()
+        with self._lock:
+            segments = self._searchable_segments()
+            start_day = date_from.toordinal() if date_from else None
+            end_day = date_to.toordinal() if date_to else None
+
+            stored_count = sum(segment.doc_count for segment in segments)
+            document_count = stored_count - sum(len(segment.deleted) for segment in segments)
+            if document_count <= 0:
+                return
+            average_length = sum(segment.total_length for segment in segments) / stored_count or 1.0
+            idf = {}
+            for term in {term for group in groups for clause in group.required for term in clause}:
+                frequency = sum(segment.document_frequency(term) for segment in segments)
+                idf[term] = math.log(1 + (document_count - frequency + 0.5) / (frequency + 0.5))
+
+            for segment in segments:
+                if not segment.may_match(source, start_day, end_day):
+                    continue
+                for doc, score in self._search_segment(segment, groups, idf, average_length, source, start_day, end_day):
+                    yield score, segment.doc_id(doc)
+
+    def _search_segment(
+        self,
+        segment: Any,
+        groups: List[QueryGroup],
+        idf: Dict[str, float],
+        average_length: float,
+        source: Optional[str],
+        start_day: Optional[int],
+        end_day: Optional[int],
+    ) -> Iterator[Tuple[int, float]]:
+        postings_cache: Dict[str, Dict[int, Tuple[int, Any]]] = {}
+
+        def postings_for(term: str) -> Dict[int, Tuple[int, Any]]:
+            if term not in postings_cache:
+                postings_cache[term] = segment.term_postings(term)
+            return postings_cache[term]
+
+        def clause_documents(clause: Clause) -> Set[int]:
+            if len(clause) == 1:
+                return set(postings_for(clause[0]))
+            candidates = None
+            for term in sorted(set(clause), key=segment.document_frequency):
+                term_docs = set(postings_for(term))
+                candidates = term_docs if candidates is None else candidates & term_docs
+                if not candidates:
+                    return set()
+            matched = set()
+            for doc in candidates:
+                starts = None
+                for offset, term in enumerate(clause):
+                    shifted = {position - offset for position in segment.positions(postings_for(term)[doc][1])}
+                    starts = shifted if starts is None else starts & shifted
+                    if not starts:
+                        break
+                if starts:
+                    matched.add(doc)
+            return matched
+
+        matched: Set[int] = set()
+        for group in groups:
+            docs: Optional[Set[int]] = None
+            for clause in sorted(group.required, key=lambda clause: min(segment.document_frequency(term) for term in clause)):
+                clause_docs = clause_documents(clause)
+                docs = clause_docs if docs is None else docs & clause_docs
+                if not docs:
+                    break
+            if not docs:
+                continue
+            for clause in group.excluded:
+                docs -= clause_documents(clause)
+            matched |= docs
+        matched -= segment.deleted
+
+        for doc in matched:
+            if source is not None and segment.doc_source(doc) != source:
+                continue
+            day = segment.days[doc]
+            if (start_day is not None and day < start_day) or (end_day is not None and day > end_day):
+                continue
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.lengths[doc] / average_length)
+            score = 0.0
+            for term, term_idf in idf.items():
+                entry = postings_for(term).get(doc)
+                if entry:
+                    tf = entry[0]
+                    score += term_idf * tf * (BM25_K1 + 1) / (tf + length_norm)
+            yield doc, score
+
+    def close(self) -> None:
+        """
+        Unmap all segments
+        """
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments = {}
+
+_search_index: Optional[SearchIndex] = None
+_search_index_lock = threading.Lock()
+
+def get_search_index() -> SearchIndex:
+    """
+    Get the process-wide search index over collected data
+    """
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                _search_index = SearchIndex(
+                    settings.SEARCH_INDEX_DIR,
+                    flush_documents=settings.SEARCH_INDEX_FLUSH_DOCUMENTS,
+                )
+    return _search_index
+
+def index_collected_documents(documents: Iterable[Dict[str, Any]], flush: bool = False) -> int:
+    """
+    Add collected documents to the search index when it is enabled
+    """
+    if not settings.SEARCH_INDEX_ENABLED:
+        return 0
+    index = get_search_index()
+    added = index.add_documents(documents)
+    if flush:
+        index.flush()
+    return added
@@ -0,0 +1,440 @@
+import abc
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+from app.core.config import settings
+from app.core.database import redis_client
+from app.services.collected_data import ensure_collected_data_indexes, get_collected_data_collection, stamp_written
+from app.services.alert_engine import evaluate_documents, flush_alerts
+from app.services.mention_tagger import record_competitor_mentions, tag_collected_documents
+from app.services.search_index import index_collected_documents
+from app.services.vector_index import embed_collected_documents
+
+ingestion_logger = logging.getLogger("app.stream_ingestion")
+
+STATS_KEY_PREFIX = "stream_ingestion:stats:"
+STATS_TTL_SECONDS = 60
+
+DUPLICATE_KEY_ERROR = 11000
+
+# How often run_workers checks for, and restarts, dead worker processes
+WORKER_CHECK_SECONDS = 5.0
+
+class StreamRecord(NamedTuple):
+    partition: int
+    offset: int
+    value: Dict[str, Any]
+    timestamp: Optional[datetime] = None
+
+class StreamSource(abc.ABC):
+    """
+    Partitioned record source whose offsets are committed explicitly
+    """
+
+    @abc.abstractmethod
+    def all_partitions(self) -> List[int]:
+        ...
+
+    @abc.abstractmethod
+    def assign(self, partitions: List[int]) -> None:
+        ...
+
+    @abc.abstractmethod
+    def poll(self, max_records: int, timeout_ms: int) -> List[StreamRecord]:
+        ...
+
+    @abc.abstractmethod
+    def commit(self, offsets: Dict[int, int]) -> None:
+        """
+        Commit the next offset to read for each partition
+        """
+
+    @abc.abstractmethod
+    def lag(self) -> Dict[int, int]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+class InMemoryStreamSource(StreamSource):
+    """
+    Stand-in source backed by per-partition lists, for tests and local runs
+    """
+
+    def __init__(self, partitions: Dict[int, List[Dict[str, Any]]]) -> None:
+        self.records = partitions
+        self.committed = {partition: 0 for partition in partitions}
+        self.positions = dict(self.committed)
+        self.assigned = list(partitions)
+        self._lock = threading.Lock()
+
+    def all_partitions(self) -> List[int]:
+        return sorted(self.records)
+
+    def assign(self, partitions: List[int]) -> None:
+        self.assigned = list(partitions)
+
+    def append(self, partition: int, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self.records.setdefault(partition, []).append(value)
+            self.committed.setdefault(partition, 0)
+            self.positions.setdefault(partition, 0)
+
+    def poll(self, max_records: int, timeout_ms: int) -> List[StreamRecord]:
+        batch: List[StreamRecord] = []
+        with self._lock:
+            for partition in self.assigned:
+                values = self.records[partition]
+                while self.positions[partition] < len(values) and len(batch) < max_records:
+                    offset = self.positions[partition]
+                    batch.append(StreamRecord(partition, offset, values[offset]))
+                    self.positions[partition] += 1
+        if not batch:
+            time.sleep(timeout_ms / 1000)
+        return batch
+
+    def commit(self, offsets: Dict[int, int]) -> None:
+        with self._lock:
+            self.committed.update(offsets)
+
+    def rewind(self) -> None:
+        """
+        Reset read positions to the committed offsets, as after a restart
+        """
+        with self._lock:
+            self.positions = dict(self.committed)
+
+    def lag(self) -> Dict[int, int]:
+        return {partition: len(self.records[partition]) - self.committed[partition] for partition in self.assigned}
+
+class KafkaStreamSource(StreamSource):
+    """
+    Kafka topic consumed with auto-commit disabled
+    """
+
+    def __init__(
+        self,
+        topic: str,
+        bootstrap_servers: str,
+        group_id: str,
+    ) -> None:
+        from kafka import KafkaConsumer
+
+        self.topic = topic
+        self.consumer = KafkaConsumer(
+            bootstrap_servers=bootstrap_servers.split(","),
+            group_id=group_id,
+            enable_auto_commit=False,
+            auto_offset_reset="earliest",
+            value_deserializer=lambda value: json.loads(value.decode("utf-8")),
+        )
+
+    def all_partitions(self) -> List[int]:
+        return sorted(self.consumer.partitions_for_topic(self.topic) or [])
+
+    def assign(self, partitions: List[int]) -> None:
+        from kafka import TopicPartition
+
+        self.consumer.assign([TopicPartition(self.topic, partition) for partition in partitions])
+
+    def poll(self, max_records: int, timeout_ms: int) -> List[StreamRecord]:
+        polled = self.consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+        batch = []
+        for topic_partition, messages in polled.items():
+            for message in messages:
+                timestamp = datetime.utcfromtimestamp(message.timestamp / 1000) if message.timestamp else None
+                batch.append(StreamRecord(topic_partition.partition, message.offset, message.value, timestamp))
+        return batch
+
+    def commit(self, offsets: Dict[int, int]) -> None:
+        from kafka import TopicPartition
+        from kafka.structs import OffsetAndMetadata
+
+        self.consumer.commit(
+            {TopicPartition(self.topic, partition): OffsetAndMetadata(offset, None) for partition, offset in offsets.items()}
+        )
+
+    def lag(self) -> Dict[int, int]:
+        assignment = list(self.consumer.assignment())
+        end_offsets = self.consumer.end_offsets(assignment)
+        return {
+            topic_partition.partition: end_offsets[topic_partition] - self.consumer.position(topic_partition)
+            for topic_partition in assignment
+        }
+
+    def close(self) -> None:
+        self.consumer.close(autocommit=False)
+
+def dedupe_key(value: Dict[str, Any]) -> str:
+    """
+    Stable identity of a social post: platform id when present, else content hash
+    """
+    platform = value.get("platform") or "social"
+    if value.get("id") is not None:
+        return f"{platform}:{value['id']}"
+    content = value.get("content") or value.get("text") or ""
+    digest = hashlib.sha1(f"{value.get('author')}|{content}".encode("utf-8")).hexdigest()
+    return f"{platform}:sha1:{digest}"
+
+def build_document(value: Dict[str, Any], key: str, timestamp: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Convert a raw social media record into a collected data document
+    """
+    known_fields = {"id", "platform", "content", "text", "url", "query", "hashtags", "author", "published_at"}
+    metadata = {name: field for name, field in value.items() if name not in known_fields}
+    metadata["author"] = value.get("author")
+    metadata["published_at"] = value.get("published_at") or (timestamp.isoformat() if timestamp else None)
+    return {
+        "dedupe_key": key,
+        "source": value.get("platform") or "social",
+        "query": value.get("query"),
+        "url": value.get("url"),
+        "content": (value.get("content") or value.get("text") or "").strip(),
+        "entities": list(value.get("hashtags") or []),
+        "metadata": metadata,
+        "collected_at": datetime.utcnow(),
+    }
+
+def enrich_record(record: StreamRecord, key: str) -> Dict[str, Any]:
+    """
+    Convert a stream record into a collected data document
+    """
+    document = build_document(record.value, key, record.timestamp)
+    document["stream"] = {"partition": record.partition, "offset": record.offset}
+    return document
+
+class IngestionStats:
+    """
+    Running counters for one consumer worker
+    """
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.records = 0
+        self.written = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.lag: Dict[int, int] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "records": self.records,
+            "written": self.written,
+            "duplicates": self.duplicates,
+            "batches": self.batches,
+            "records_per_second": round(self.records / elapsed, 2),
+            "lag": {str(partition): lag for partition, lag in self.lag.items()},
+            "total_lag": sum(self.lag.values()),
+            "updated_at": datetime.utcnow().isoformat() + "Z",
+        }
+
+def write_documents(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Durably insert documents, skipping ones already stored; returns the documents inserted
+
+    Uses majority write concern so a committed offset never points past data
+    that could be rolled back. Duplicate key errors come from replays after a
+    crash between the write and the offset commit and are expected.
+    """
+    collection = get_collected_data_collection().with_options(write_concern=WriteConcern(w="majority"))
+    stamp_written(documents)
+    try:
+        collection.insert_many(documents, ordered=False)
+        return documents
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        duplicates = {error["index"] for error in errors}
+        return [document for position, document in enumerate(documents) if position not in duplicates]
+
+class StreamIngestionPipeline:
+    """
+    Batch consumer: poll, dedupe, enrich, durable write, then commit offsets
+    """
+
+    def __init__(
+        self,
+        source: StreamSource,
+        batch_size: int = 500,
+        poll_timeout_ms: int = 1000,
+        dedupe_cache_size: int = 100000,
+        writer: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]] = write_documents,
+        worker_name: str = "worker-0",
+    ) -> None:
+        self.source = source
+        self.batch_size = batch_size
+        self.poll_timeout_ms = poll_timeout_ms
+        self.writer = writer
+        self.worker_name = worker_name
+        self.stats = IngestionStats()
+        self._recent_keys: "OrderedDict[str, None]" = OrderedDict()
+        self._dedupe_cache_size = dedupe_cache_size
+
+    def _remember(self, keys: List[str]) -> None:
+        for key in keys:
+            self._recent_keys[key] = None
+            self._recent_keys.move_to_end(key)
+        while len(self._recent_keys) > self._dedupe_cache_size:
+            self._recent_keys.popitem(last=False)
+
+    def process_batch(self, records: List[StreamRecord]) -> int:
+        """
+        Run one polled batch through the pipeline and commit its offsets
+        """
+        documents = []
+        batch_keys: Dict[str, None] = {}
+        next_offsets: Dict[int, int] = {}
+        for record in records:
+            next_offsets[record.partition] = max(next_offsets.get(record.partition, 0), record.offset + 1)
+            key = dedupe_key(record.value)
+            if key in batch_keys or key in self._recent_keys:
+                self.stats.duplicates += 1
+                continue
+            batch_keys[key] = None
+            document = enrich_record(record, key)
+            if document["content"]:
+                documents.append(document)
+
+        tag_collected_documents(documents)
+        inserted = self.writer(documents) if documents else []
+        # Offsets are only committed once the batch is durably stored
+        self.source.commit(next_offsets)
+        self._remember(list(batch_keys))
+        # Documents replayed after a crash were handled when first stored, so
+        # with the offsets committed a failing stage is logged, not retried
+        for stage in (index_collected_documents, embed_collected_documents, evaluate_documents, record_competitor_mentions):
+            try:
+                stage(inserted)
+            except Exception:
+                ingestion_logger.exception("Stream ingestion stage %s failed", stage.__name__)
+
+        self.stats.records += len(records)
+        self.stats.written += len(inserted)
+        self.stats.duplicates += len(documents) - len(inserted)
+        self.stats.batches += 1
+        return len(inserted)
+
+    def publish_stats(self) -> None:
+        """
+        Publish throughput and lag so the API can report them
+        """
+        self.stats.lag = self.source.lag()
+        redis_client.set(
+            STATS_KEY_PREFIX + self.worker_name,
+            json.dumps(self.stats.as_dict()),
+            ex=STATS_TTL_SECONDS,
+        )
+
+    def run(self, stop_event: Optional[threading.Event] = None, stats_interval: float = 5.0) -> None:
+        """
+        Consume until stopped
+        """
+        stop_event = stop_event or threading.Event()
+        last_published = 0.0
+        try:
+            while not stop_event.is_set():
+                records = self.source.poll(self.batch_size, self.poll_timeout_ms)
+                if records:
+                    self.process_batch(records)
+                if time.monotonic() - last_published >= stats_interval:
+                    try:
+                        self.publish_stats()
+                    except Exception:
+                        # Stats are advisory; a Redis outage must not stop consumption
+                        ingestion_logger.exception("Publishing stream ingestion stats failed")
+                    last_published = time.monotonic()
+        finally:
+            index_collected_documents([], flush=True)
+            embed_collected_documents([], flush=True)
+            flush_alerts()
+            self.source.close()
+
+def get_stream_stats() -> Dict[str, Any]:
+    """
+    Aggregate the stats published by all live consumer workers
+    """
+    workers = {}
+    for key in redis_client.scan_iter(match=STATS_KEY_PREFIX + "*"):
+        value = redis_client.get(key)
+        if value:
+            workers[key[len(STATS_KEY_PREFIX):]] = json.loads(value)
+    return {
+        "workers": workers,
+        "records_per_second": round(sum(worker["records_per_second"] for worker in workers.values()), 2),
+        "total_lag": sum(worker["total_lag"] for worker in workers.values()),
+    }
+
+def create_kafka_source() -> KafkaStreamSource:
+    """
+    Create a source for the configured social media topic
+    """
+    return KafkaStreamSource(
+        settings.KAFKA_SOCIAL_TOPIC,
+        settings.KAFKA_BOOTSTRAP_SERVERS,
+        settings.KAFKA_CONSUMER_GROUP,
+    )
+
+def run_worker(worker_index: int, worker_count: int) -> None:
+    """
+    Consume the partitions owned by one worker process
+    """
+    source = create_kafka_source()
+    partitions = [partition for partition in source.all_partitions() if partition % worker_count == worker_index]
+    if not partitions:
+        source.close()
+        return
+    source.assign(partitions)
+    StreamIngestionPipeline(
+        source,
+        batch_size=settings.STREAM_BATCH_SIZE,
+        poll_timeout_ms=settings.STREAM_POLL_TIMEOUT_MS,
+        worker_name=f"worker-{worker_index}",
+    ).run()
+
+def run_workers(worker_count: int) -> None:
+    """
+    Start one consumer process per worker, partitioned by partition number
+
+    Partitions are assigned statically, so a worker that dies is restarted;
+    it resumes from the offsets committed for its partitions.
+    """
+    # Replays are only dropped by the unique dedupe_key index, whatever MONGODB_ENSURE_INDEXES says
+    ensure_collected_data_indexes()
+    # Spawned rather than forked so each worker opens its own Mongo and Kafka connections
+    context = multiprocessing.get_context("spawn")
+
+    def start(index: int) -> Any:
+        process = context.Process(target=run_worker, args=(index, worker_count), name=f"stream-worker-{index}")
+        process.start()
+        return process
+
+    processes = {index: start(index) for index in range(worker_count)}
+    while processes:
+        time.sleep(WORKER_CHECK_SECONDS)
+        for index, process in list(processes.items()):
+            if process.is_alive():
+                continue
+            if process.exitcode == 0:
+                # Workers only return when they own no partitions
+                del processes[index]
+                continue
+            ingestion_logger.error("Stream worker %d exited with code %s, restarting it", index, process.exitcode)
+            processes[index] = start(index)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consume social media records from Kafka into collected data")
+    parser.add_argument("--workers", type=int, default=settings.STREAM_WORKERS)
+    run_workers(parser.parse_args().workers)
@@ -0,0 +1,694 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.nlp_models import embed_texts
+from app.services.search_index import to_day
+
+# Approximate nearest-neighbour index over document embeddings (IVF-PQ).
+# Vectors are assigned to the nearest of a few thousand coarse centroids,
+# and their residuals are product-quantized into one byte per subvector.
+# A query probes the clusters nearest to it and scores their codes with
+# per-cluster lookup tables. The best candidates are then re-scored exactly
+# against float16 copies of the vectors stored beside the codes.
+#
+# Storage works like the keyword search index: inserts are buffered, then
+# flushed into immutable memory-mapped segments, one per source. Deletes
+# are tombstones. Small segments are merged, and the manifest is updated
+# under a file lock. The quantizer is trained once, at the first flush that
+# reaches VECTOR_INDEX_TRAIN_SIZE vectors; until then segments hold only
+# vectors and are searched exactly.
+
+CODEBOOK_SIZE = 256
+KMEANS_ITERATIONS = 20
+# k-means needs this many training points per centroid to place them well
+POINTS_PER_CENTROID = 39
+# Rows compared against centroids at a time, bounding temporary memory
+ASSIGN_CHUNK_ROWS = 16384
+
+def nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Index of the nearest centroid (squared L2) of each vector
+    """
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        # |v - c|^2 without the |v|^2 term, which doesn't change the nearest
+        assignment[start:start + len(chunk)] = (centroid_norms - 2 * chunk @ centroids.T).argmin(axis=1)
+    return assignment
+
+def kmeans(vectors: np.ndarray, clusters: int, rng: np.random.Generator, iterations: int = KMEANS_ITERATIONS) -> np.ndarray:
+    """
+    Centroids of vectors by Lloyd's algorithm; empty clusters are reseeded from random vectors
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = nearest(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=clusters)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        centroids[filled] = np.add.reduceat(vectors[order], starts) / counts[filled, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+class Quantizer:
+    """
+    Coarse centroids and residual product-quantization codebooks
+    """
+
+    def __init__(self, centroids: np.ndarray, codebooks: np.ndarray) -> None:
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.lists = len(centroids)
+        self.subvectors, self.codebook_size, self.subvector_size = codebooks.shape
+        # Offsets turning (subvector, code) into an index of a flattened lookup table
+        self.table_offsets = np.arange(self.subvectors, dtype=np.intp) * self.codebook_size
+        self.codeword_norms = (codebooks ** 2).sum(axis=2)
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, lists: int, subvectors: int, seed: int = 0) -> "Quantizer":
+        dimensions = vectors.shape[1]
+        if dimensions % subvectors:
+            raise ValueError(f"VECTOR_INDEX_SUBVECTORS ({subvectors}) must divide the embedding dimension ({dimensions})")
+        rng = np.random.default_rng(seed)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        centroids = kmeans(vectors, max(1, min(lists, len(vectors) // POINTS_PER_CENTROID)), rng)
+        residuals = vectors - centroids[nearest(vectors, centroids)]
+        size = dimensions // subvectors
+        codebook_size = min(CODEBOOK_SIZE, len(vectors))
+        codebooks = np.stack([
+            kmeans(residuals[:, part * size:(part + 1) * size], codebook_size, rng) for part in range(subvectors)
+        ])
+        return cls(centroids, codebooks)
+
+    @classmethod
+    def load(cls, path: str) -> "Quantizer":
+        with np.load(path) as arrays:
+            return cls(arrays["centroids"], arrays["codebooks"])
+
+    def save(self, path: str) -> None:
+        temporary_path = path + ".tmp.npz"
+        np.savez(temporary_path, centroids=self.centroids, codebooks=self.codebooks)
+        os.replace(temporary_path, path)
+
+    def encode(self, vectors: np.ndarray, lists: np.ndarray) -> np.ndarray:
+        """
+        Codes of the residuals of vectors to their assigned centroids
+        """
+        residuals = np.asarray(vectors, dtype=np.float32) - self.centroids[lists]
+        size = self.subvector_size
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        for part in range(self.subvectors):
+            codes[:, part] = nearest(residuals[:, part * size:(part + 1) * size], self.codebooks[part])
+        return codes
+
+    def lookup_tables(self, query: np.ndarray, list_ids: np.ndarray) -> np.ndarray:
+        """
+        Flattened squared distances from each subvector of a query's residual in each list to every codeword
+        """
+        residuals = (query - self.centroids[list_ids]).reshape(len(list_ids), self.subvectors, self.subvector_size)
+        # |r - c|^2 = |r|^2 - 2 r.c + |c|^2, with the dot products as one matrix product per subvector
+        dots = np.matmul(residuals.transpose(1, 0, 2), self.codebooks.transpose(0, 2, 1)).transpose(1, 0, 2)
+        tables = (residuals ** 2).sum(axis=2)[:, :, None] - 2 * dots + self.codeword_norms
+        return tables.reshape(len(list_ids), -1)
+
+    def score(self, tables: np.ndarray, table_of_rows: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """
+        Approximate squared distances of coded rows, each looked up in the table of its list
+        """
+        flat_tables = tables.ravel()
+        bases = table_of_rows * tables.shape[1]
+        distances = np.zeros(len(codes), dtype=np.float32)
+        # One gather per subvector is faster than a two-dimensional fancy index
+        for part, part_codes in enumerate(np.ascontiguousarray(codes.T)):
+            distances += flat_tables[bases + (self.table_offsets[part] + part_codes)]
+        return distances
+
+class VectorSegment:
+    """
+    Immutable, memory-mapped segment of vectors with their days and sources, and PQ codes grouped by cluster once trained
+    """
+
+    def __init__(self, path: str, meta: Dict[str, Any]) -> None:
+        self.path = path
+        self.name = meta["name"]
+        self.doc_count = meta["doc_count"]
+        self.source_table: List[str] = meta["sources"]
+        self.min_day = meta["min_day"]
+        self.max_day = meta["max_day"]
+        self.encoded = meta["encoded"]
+        self.set_deleted(meta.get("deleted", []))
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.days = np.load(os.path.join(path, "days.npy"), mmap_mode="r")
+        self.source_codes = np.load(os.path.join(path, "sources.npy"), mmap_mode="r")
+        if self.encoded:
+            self.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+            # Rows of cluster c are offsets[c]:offsets[c + 1]
+            self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self._ids: Optional[List[str]] = None
+
+    def row_lists(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets))
+
+    def set_deleted(self, deleted: Iterable[int]) -> None:
+        self.deleted: Set[int] = set(deleted)
+        self.live: Optional[np.ndarray] = None
+        if self.deleted:
+            self.live = np.ones(self.doc_count, dtype=bool)
+            self.live[list(self.deleted)] = False
+
+    @property
+    def ids(self) -> List[str]:
+        if self._ids is None:
+            with open(os.path.join(self.path, "ids.txt"), encoding="utf-8") as ids_file:
+                self._ids = ids_file.read().split("\n")[: self.doc_count]
+        return self._ids
+
+    def may_match(self, source: Optional[str], start_day: Optional[int], end_day: Optional[int]) -> bool:
+        if source is not None and source not in self.source_table:
+            return False
+        if start_day is not None and self.max_day < start_day:
+            return False
+        if end_day is not None and self.min_day > end_day:
+            return False
+        return len(self.deleted) < self.doc_count
+
+    def row_filter(self, rows: Any, source: Optional[str], start_day: Optional[int], end_day: Optional[int]) -> Optional[np.ndarray]:
+        """
+        Mask of the rows (a slice or an index array) that are live and pass the filters; None when all do
+        """
+        mask = None if self.live is None else self.live[rows]
+        if source is not None and len(self.source_table) > 1:
+            matches = self.source_codes[rows] == self.source_table.index(source)
+            mask = matches if mask is None else mask & matches
+        if start_day is not None and self.min_day < start_day:
+            matches = self.days[rows] >= start_day
+            mask = matches if mask is None else mask & matches
+        if end_day is not None and self.max_day > end_day:
+            matches = self.days[rows] <= end_day
+            mask = matches if mask is None else mask & matches
+        return mask
+
+def write_segment(
+    path: str,
+    ids: List[str],
+    vectors: np.ndarray,
+    sources: List[str],
+    days: np.ndarray,
+    quantizer: Optional[Quantizer],
+    lists: Optional[np.ndarray] = None,
+    codes: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Write a segment directory and return its manifest entry; clusters and codes of already encoded vectors are reused
+    """
+    os.makedirs(path, exist_ok=True)
+    source_table = sorted(set(sources))
+    source_index = {source: code for code, source in enumerate(source_table)}
+    source_codes = np.array([source_index[source] for source in sources], dtype=np.uint16)
+    days = np.asarray(days, dtype=np.int32)
+    if quantizer is not None:
+        # Rows are grouped by cluster so probing a cluster reads one contiguous range
+        if lists is None:
+            lists = nearest(vectors, quantizer.centroids)
+        order = np.argsort(lists, kind="stable")
+        lists = lists[order]
+        vectors = np.asarray(vectors)[order]
+        ids = [ids[row] for row in order]
+        source_codes = source_codes[order]
+        days = days[order]
+        codes = quantizer.encode(vectors, lists) if codes is None else codes[order]
+        np.save(os.path.join(path, "codes.npy"), codes)
+        np.save(os.path.join(path, "offsets.npy"), np.searchsorted(lists, np.arange(quantizer.lists + 1)).astype(np.int64))
+    np.save(os.path.join(path, "vectors.npy"), np.asarray(vectors, dtype=np.float16))
+    np.save(os.path.join(path, "days.npy"), days)
+    np.save(os.path.join(path, "sources.npy"), source_codes)
+    with open(os.path.join(path, "ids.txt"), "w", encoding="utf-8") as ids_file:
+        ids_file.write("\n".join(ids))
+
+    return {
+        "name": os.path.basename(path),
+        "doc_count": len(ids),
+        "sources": source_table,
+        "min_day": int(days.min()),
+        "max_day": int(days.max()),
+        "encoded": quantizer is not None,
+        "deleted": [],
+    }
+
+class VectorIndex:
+    """
+    Incrementally maintained IVF-PQ index of document embeddings, filterable by source and day
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        flush_documents: int = 10000,
+        train_size: int = 50000,
+        lists: int = 1024,
+        subvectors: int = 48,
+        merge_factor: int = 8,
+        max_segment_documents: int = 1000000,
+    ) -> None:
+        self.directory = directory
+        self.flush_documents = flush_documents
+        self.train_size = train_size
+        self.lists = lists
+        self.subvectors = subvectors
+        self.merge_factor = merge_factor
+        self.max_segment_documents = max_segment_documents
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._buffer_ids: List[str] = []
+        self._buffer_vectors: List[np.ndarray] = []
+        self._buffer_sources: List[str] = []
+        self._buffer_days: List[int] = []
+        self._buffer_locations: Dict[str, int] = {}
+        self._buffer_deleted: Set[int] = set()
+        self._pending_deletes: Set[str] = set()
+        self._segments: Dict[str, VectorSegment] = {}
+        self._quantizer: Optional[Quantizer] = None
+        self._manifest_mtime = 0.0
+        self._locations: Optional[Dict[str, Tuple[str, int]]] = None
+        self.refresh()
+
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    @contextmanager
+    def _manifest_lock(self) -> Iterator[None]:
+        with open(os.path.join(self.directory, "index.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        if not os.path.exists(self._manifest_path):
+            return {"next_segment": 1, "dimensions": None, "quantizer": None, "segments": []}
+        with open(self._manifest_path, encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        temporary_path = self._manifest_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary_path, self._manifest_path)
+
+    def refresh(self) -> None:
+        """
+        Reload the segment list if another process changed the manifest
+        """
+        with self._lock:
+            try:
+                mtime = os.path.getmtime(self._manifest_path)
+            except OSError:
+                return
+            if mtime == self._manifest_mtime:
+                return
+            self._load_segments(self._read_manifest())
+            self._manifest_mtime = mtime
+
+    def _load_segments(self, manifest: Dict[str, Any]) -> None:
+        # The id to location map is kept up to date segment by segment, so a
+        # flush costs what it writes rather than the size of the corpus
+        if manifest["quantizer"] and self._quantizer is None:
+            self._quantizer = Quantizer.load(os.path.join(self.directory, manifest["quantizer"]))
+        segments = {}
+        added = []
+        for meta in manifest["segments"]:
+            segment = self._segments.get(meta["name"])
+            if segment is None:
+                segment = VectorSegment(os.path.join(self.directory, meta["name"]), meta)
+                added.append(segment)
+            else:
+                deleted = set(meta.get("deleted", []))
+                self._forget_locations(segment, deleted - segment.deleted)
+                segment.set_deleted(deleted)
+            segments[meta["name"]] = segment
+        for name, segment in self._segments.items():
+            if name not in segments:
+                self._forget_locations(segment, (row for row in range(segment.doc_count) if row not in segment.deleted))
+        for segment in added:
+            self._remember_locations(segment)
+        self._segments = segments
+
+    def _remember_locations(self, segment: VectorSegment) -> None:
+        if self._locations is not None:
+            for row, doc_id in enumerate(segment.ids):
+                if row not in segment.deleted:
+                    self._locations[doc_id] = (segment.name, row)
+
+    def _forget_locations(self, segment: VectorSegment, rows: Iterable[int]) -> None:
+        if self._locations is not None:
+            for row in rows:
+                doc_id = segment.ids[row]
+                if self._locations.get(doc_id) == (segment.name, row):
+                    del self._locations[doc_id]
+
+    def _document_locations(self) -> Dict[str, Tuple[str, int]]:
+        if self._locations is None:
+            self._locations = {}
+            for segment in self._segments.values():
+                self._remember_locations(segment)
+        return self._locations
+
+    def _stored_count(self) -> int:
+        return sum(segment.doc_count - len(segment.deleted) for segment in self._segments.values())
+
+    @property
+    def doc_count(self) -> int:
+        return self._stored_count() + len(self._buffer_ids) - len(self._buffer_deleted)
+
+    def add(self, ids: List[str], vectors: np.ndarray, sources: List[str], days: List[int]) -> int:
+        """
+        Index unit-length vectors, replacing earlier versions with the same id
+        """
+        with self._lock:
+            for doc_id, vector, source, day in zip(ids, vectors, sources, days):
+                self._delete_buffered(doc_id)
+                self._pending_deletes.add(doc_id)
+                self._buffer_locations[doc_id] = len(self._buffer_ids)
+                self._buffer_ids.append(doc_id)
+                self._buffer_vectors.append(np.asarray(vector, dtype=np.float32))
+                self._buffer_sources.append(source)
+                self._buffer_days.append(day)
+                if len(self._buffer_ids) >= self.flush_documents:
+                    self.flush()
+        return len(ids)
+
+    def document_ids(self) -> Set[str]:
+        """
+        Ids of every indexed document, buffered or stored
+        """
+        with self._lock:
+            self.refresh()
+            return (set(self._document_locations()) - self._pending_deletes) | set(self._buffer_locations)
+
+    def delete(self, doc_ids: Iterable[str]) -> None:
+        """
+        Remove documents from the index
+        """
+        with self._lock:
+            for doc_id in doc_ids:
+                doc_id = str(doc_id)
+                self._delete_buffered(doc_id)
+                self._pending_deletes.add(doc_id)
+
+    def _delete_buffered(self, doc_id: str) -> None:
+        row = self._buffer_locations.pop(doc_id, None)
+        if row is not None:
+            self._buffer_deleted.add(row)
+
+    def flush(self) -> None:
+        """
+        Write buffered vectors and deletes to disk, training the quantizer once enough vectors are stored
+        """
+        with self._lock, self._manifest_lock():
+            manifest = self._read_manifest()
+            self._load_segments(manifest)
+
+            if self._pending_deletes:
+                locations = self._document_locations()
+                tombstones: Dict[str, Set[int]] = {}
+                for doc_id in self._pending_deletes:
+                    location = locations.pop(doc_id, None)
+                    if location is not None:
+                        tombstones.setdefault(location[0], set()).add(location[1])
+                for meta in manifest["segments"]:
+                    if meta["name"] in tombstones:
+                        meta["deleted"] = sorted(set(meta.get("deleted", [])) | tombstones[meta["name"]])
+                self._load_segments(manifest)
+
+            rows = [row for row in range(len(self._buffer_ids)) if row not in self._buffer_deleted]
+            if rows:
+                vectors = np.stack([self._buffer_vectors[row] for row in rows])
+                if manifest["dimensions"] is None:
+                    manifest["dimensions"] = int(vectors.shape[1])
+                elif vectors.shape[1] != manifest["dimensions"]:
+                    raise ValueError(
+                        f"Embeddings have {vectors.shape[1]} dimensions, the index {manifest['dimensions']}; rebuild it after changing the model"
+                    )
+                by_source: Dict[str, List[int]] = {}
+                for position, row in enumerate(rows):
+                    by_source.setdefault(self._buffer_sources[row], []).append(position)
+                for source, positions in by_source.items():
+                    manifest["segments"].append(self._write(
+                        manifest,
+                        [self._buffer_ids[rows[position]] for position in positions],
+                        vectors[positions],
+                        [source] * len(positions),
+                        np.array([self._buffer_days[rows[position]] for position in positions], dtype=np.int32),
+                    ))
+                self._load_segments(manifest)
+
+            if manifest["quantizer"] is None and self._stored_count() >= self.train_size:
+                self._train(manifest)
+            self._merge_segments(manifest)
+            self._write_manifest(manifest)
+            self._load_segments(manifest)
+            self._manifest_mtime = os.path.getmtime(self._manifest_path)
+
+            # Reset under the lock, so vectors added by other threads meanwhile are kept
+            self._buffer_ids = []
+            self._buffer_vectors = []
+            self._buffer_sources = []
+            self._buffer_days = []
+            self._buffer_locations = {}
+            self._buffer_deleted = set()
+            self._pending_deletes = set()
+
+    def _write(
+        self,
+        manifest: Dict[str, Any],
+        ids: List[str],
+        vectors: np.ndarray,
+        sources: List[str],
+        days: np.ndarray,
+        lists: Optional[np.ndarray] = None,
+        codes: Optional[np.ndarray] = None,
+    ) -> Dict[str, Any]:
+        name = f"seg-{manifest['next_segment']:08d}"
+        manifest["next_segment"] += 1
+        return write_segment(os.path.join(self.directory, name), ids, vectors, sources, days, self._quantizer, lists, codes)
+
+    def _train(self, manifest: Dict[str, Any]) -> None:
+        # Trained on the stored vectors, then the segments written before are rewritten with codes
+        segments = list(self._segments.values())
+        sample = np.concatenate([np.asarray(segment.vectors, dtype=np.float32) for segment in segments])
+        if len(sample) > 2 * self.train_size:
+            sample = sample[np.random.default_rng(0).choice(len(sample), 2 * self.train_size, replace=False)]
+        self._quantizer = Quantizer.train(sample, self.lists, self.subvectors)
+        manifest["quantizer"] = "quantizer.npz"
+        self._quantizer.save(os.path.join(self.directory, manifest["quantizer"]))
+        self._rewrite(manifest, [segment for segment in segments if not segment.encoded])
+
+    def _rewrite(self, manifest: Dict[str, Any], segments: List[VectorSegment]) -> None:
+        # Replaces segments of one source or more with one segment per source, dropping deleted rows
+        by_source: Dict[str, List[Tuple[VectorSegment, np.ndarray]]] = {}
+        for segment in segments:
+            live = np.arange(segment.doc_count) if segment.live is None else np.flatnonzero(segment.live)
+            codes = segment.source_codes[live]
+            for code, source in enumerate(segment.source_table):
+                by_source.setdefault(source, []).append((segment, live[codes == code]))
+        rewritten = {segment.name for segment in segments}
+        manifest["segments"] = [meta for meta in manifest["segments"] if meta["name"] not in rewritten]
+        for source, parts in by_source.items():
+            ids = [segment.ids[row] for segment, rows in parts for row in rows]
+            if not ids:
+                continue
+            lists = codes = None
+            if all(segment.encoded for segment, _ in parts):
+                # Merging encoded segments only regroups their codes
+                lists = np.concatenate([segment.row_lists()[rows] for segment, rows in parts])
+                codes = np.concatenate([segment.codes[rows] for segment, rows in parts])
+            manifest["segments"].append(self._write(
+                manifest,
+                ids,
+                np.concatenate([np.asarray(segment.vectors[rows], dtype=np.float32) for segment, rows in parts]),
+                [source] * len(ids),
+                np.concatenate([segment.days[rows] for segment, rows in parts]),
+                lists,
+                codes,
+            ))
+        for name in rewritten:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def _merge_segments(self, manifest: Dict[str, Any]) -> None:
+        # Merge small single-source segments once merge_factor of them pile
+        # up, so probing a cluster touches few segments
+        by_source: Dict[str, List[Dict[str, Any]]] = {}
+        for meta in manifest["segments"]:
+            if len(meta["sources"]) == 1 and meta["doc_count"] < self.max_segment_documents:
+                by_source.setdefault(meta["sources"][0], []).append(meta)
+        for metas in by_source.values():
+            if len(metas) < self.merge_factor:
+                continue
+            metas = sorted(metas, key=lambda meta: meta["doc_count"])[: self.merge_factor]
+            self._load_segments(manifest)
+            self._rewrite(manifest, [self._segments[meta["name"]] for meta in metas])
+
+    def search(
+        self,
+        vector: np.ndarray,
+        limit: int = 10,
+        source: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        probes: int = 16,
+        rerank: int = 40,
+    ) -> List[Tuple[str, float]]:
+        """
+        Ids and cosine similarities of the nearest documents to a unit-length vector
+        """
+        self.refresh()
+        query = np.asarray(vector, dtype=np.float32)
+        start_day = date_from.toordinal() if date_from else None
+        end_day = date_to.toordinal() if date_to else None
+        with self._lock:
+            segments = [segment for segment in self._segments.values() if segment.may_match(source, start_day, end_day)]
+            # (segment, rows, approximate squared distances) of candidates
+            candidates: List[Tuple[Any, np.ndarray, np.ndarray]] = []
+            quantizer = self._quantizer
+            encoded = [segment for segment in segments if segment.encoded]
+            if encoded:
+                probed = np.argsort(((quantizer.centroids - query) ** 2).sum(axis=1))[:probes]
+                tables = quantizer.lookup_tables(query, probed)
+                for segment in encoded:
+                    # Rows of every probed list, scored against their list's table in one pass
+                    starts, ends = segment.offsets[probed], segment.offsets[probed + 1]
+                    lengths = ends - starts
+                    if not lengths.any():
+                        continue
+                    rows = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+                    mask = segment.row_filter(rows, source, start_day, end_day)
+                    table_of_rows = np.repeat(np.arange(len(probed)), lengths)
+                    if mask is not None:
+                        rows, table_of_rows = rows[mask], table_of_rows[mask]
+                    candidates.append((segment, rows, quantizer.score(tables, table_of_rows, segment.codes[rows])))
+            # Segments written before training, and the buffer, are scored exactly
+            for segment in segments:
+                if not segment.encoded:
+                    rows = np.arange(segment.doc_count)
+                    mask = segment.row_filter(rows, source, start_day, end_day)
+                    if mask is not None:
+                        rows = rows[mask]
+                    candidates.append((segment, rows, 2 - 2 * (segment.vectors[rows].astype(np.float32) @ query)))
+            buffered = self._buffered_candidates(query, source, start_day, end_day)
+            if buffered is not None:
+                candidates.append(buffered)
+            return self._rerank(query, candidates, limit, limit * rerank)
+
+    def _buffered_candidates(
+        self, query: np.ndarray, source: Optional[str], start_day: Optional[int], end_day: Optional[int]
+    ) -> Optional[Tuple[Any, np.ndarray, np.ndarray]]:
+        rows = [
+            row
+            for row in range(len(self._buffer_ids))
+            if row not in self._buffer_deleted
+            and (source is None or self._buffer_sources[row] == source)
+            and (start_day is None or self._buffer_days[row] >= start_day)
+            and (end_day is None or self._buffer_days[row] <= end_day)
+        ]
+        if not rows:
+            return None
+        vectors = np.stack([self._buffer_vectors[row] for row in rows])
+        return self._buffer_ids, np.array(rows), 2 - 2 * (vectors @ query)
+
+    def _rerank(
+        self, query: np.ndarray, candidates: List[Tuple[Any, np.ndarray, np.ndarray]], limit: int, shortlist: int
+    ) -> List[Tuple[str, float]]:
+        if not candidates:
+            return []
+        owners = np.concatenate([np.full(len(rows), number) for number, (_, rows, _) in enumerate(candidates)])
+        rows = np.concatenate([rows for _, rows, _ in candidates])
+        distances = np.concatenate([distances for _, _, distances in candidates])
+        if len(distances) > shortlist:
+            keep = np.argpartition(distances, shortlist)[:shortlist]
+            owners, rows = owners[keep], rows[keep]
+        scored = []
+        for number in np.unique(owners):
+            owner = candidates[number][0]
+            owner_rows = np.sort(rows[owners == number])
+            if isinstance(owner, VectorSegment):
+                # Reads only the shortlisted rows from the mapped vectors
+                similarities = owner.vectors[owner_rows].astype(np.float32) @ query
+                # Versions deleted or replaced since the last flush are skipped
+                scored.extend(
+                    (float(similarity), owner.ids[row])
+                    for similarity, row in zip(similarities, owner_rows)
+                    if owner.ids[row] not in self._pending_deletes
+                )
+            else:
+                similarities = np.stack([self._buffer_vectors[row] for row in owner_rows]) @ query
+                scored.extend((float(similarity), owner[row]) for similarity, row in zip(similarities, owner_rows))
+        scored.sort(reverse=True)
+        return [(doc_id, round(similarity, 4)) for similarity, doc_id in scored[:limit]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": self.doc_count,
+                "segments": len(self._segments),
+                "buffered": len(self._buffer_ids) - len(self._buffer_deleted),
+                "trained": self._quantizer is not None,
+                "lists": self._quantizer.lists if self._quantizer else None,
+            }
+
+_vector_index: Optional[VectorIndex] = None
+_vector_index_lock = threading.Lock()
+
+def get_vector_index() -> VectorIndex:
+    """
+    Get the process-wide vector index over collected data
+    """
+    global _vector_index
+    if _vector_index is None:
+        with _vector_index_lock:
+            if _vector_index is None:
+                _vector_index = VectorIndex(
+                    settings.VECTOR_INDEX_DIR,
+                    flush_documents=settings.VECTOR_INDEX_FLUSH_DOCUMENTS,
+                    train_size=settings.VECTOR_INDEX_TRAIN_SIZE,
+                    lists=settings.VECTOR_INDEX_LISTS,
+                    subvectors=settings.VECTOR_INDEX_SUBVECTORS,
+                )
+    return _vector_index
+
+def embed_collected_documents(documents: Iterable[Dict[str, Any]], flush: bool = False) -> int:
+    """
+    Embed collected documents with content and add them to the vector index when it is enabled
+    """
+    if not settings.VECTOR_INDEX_ENABLED:
+        return 0
+    documents = [document for document in documents if document.get("content")]
+    index = get_vector_index()
+    added = 0
+    if documents:
+        vectors = embed_texts([document["content"] for document in documents])
+        if vectors is not None:
+            added = index.add(
+                [str(document.get("id") or document["_id"]) for document in documents],
+                vectors,
+                [document.get("source") or "unknown" for document in documents],
+                [to_day(document.get("collected_at")) for document in documents],
+            )
+    if flush:
+        index.flush()
+    return added
@@ -0,0 +1,133 @@
+"""
+Throughput benchmark for alert rule evaluation
+
+Builds a rule index of many active rules spread over competitors, entities
+and sources with a Zipf-like popularity, some with value conditions or
+keywords, then matches a stream of synthetic mention, product and sentiment
+events against it. Reports the index build time and events per second of
+the index against scanning every rule per event; the scan runs on a sample
+of events and both sides are checked to find the same rules:
+
+    python -m benchmarks.alert_engine_benchmark --rules 100000 --events 50000
+"""
+import argparse
+import itertools
+import random
+import time
+
+from app.services.alert_engine import OPERATORS, RuleIndex, compile_rule, rule_matches
+
+SOURCES = ["twitter", "news", "reddit", "linkedin"]
+METRICS = ["mention", "mention", "mention", "price_change", "new_product", "sentiment_shift", "activity"]
+KEYWORDS = ["launch", "outage", "acquisition", "pricing", "layoffs", "funding"]
+WORDS = ["market", "product", "customers", "growth", "quarter", "team", "release", "update", "review", "support"]
+
+def zipf_sampler(population: list, rng: random.Random):
+    cumulative_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(population) + 1)))
+    return lambda: rng.choices(population, cum_weights=cumulative_weights)[0]
+
+def generate_rules(count: int, competitors: list, entities: list, rng: random.Random):
+    competitor = zipf_sampler(competitors, rng)
+    entity = zipf_sampler(entities, rng)
+    for number in range(count):
+        metric = rng.choice(METRICS)
+        rule = {
+            "_id": f"rule-{number}",
+            "user_id": number % 5000,
+            "name": f"Rule {number}",
+            "metric": metric,
+            "debounce_minutes": 60,
+        }
+        if metric in ("price_change", "new_product", "activity"):
+            rule["competitor_id"] = competitor()
+        elif rng.random() < 0.99:
+            rule["entity"] = entity()
+        else:
+            # Custom alerts watching every entity for keywords
+            rule["keywords"] = rng.sample(KEYWORDS, 2)
+        if metric == "mention" and rng.random() < 0.3:
+            rule["source"] = rng.choice(SOURCES)
+        if metric in ("mention", "price_change", "sentiment_shift") and rng.random() < 0.6:
+            rule["condition"] = {"op": rng.choice(list(OPERATORS)), "threshold": round(rng.uniform(-0.5, 0.5), 2)}
+        if metric == "mention" and "keywords" not in rule and rng.random() < 0.2:
+            rule["keywords"] = rng.sample(KEYWORDS, 2)
+        yield rule
+
+def generate_events(count: int, competitors: list, entities: list, rng: random.Random):
+    competitor = zipf_sampler(competitors, rng)
+    entity = zipf_sampler(entities, rng)
+    for _ in range(count):
+        metric = rng.choice(METRICS)
+        words = rng.choices(WORDS, k=12)
+        if rng.random() < 0.05:
+            words.append(rng.choice(KEYWORDS))
+        event = {"metric": metric, "value": round(rng.uniform(-1, 1), 2), "text": " ".join(words)}
+        if metric in ("price_change", "new_product", "activity"):
+            event["competitor_id"] = competitor()
+        else:
+            event["entity"] = entity()
+        if metric == "mention":
+            event["source"] = rng.choice(SOURCES)
+        yield event
+
+def naive_match(rules: list, event: dict) -> list:
+    entity = (event.get("entity") or "").lower()
+    return [
+        rule
+        for rule in rules
+        if rule.metric == event["metric"]
+        and (rule.competitor_id is None or rule.competitor_id == event.get("competitor_id"))
+        and (rule.entity is None or rule.entity.lower() == entity)
+        and (rule.source is None or rule.source == event.get("source"))
+        and rule_matches(rule, event)
+    ]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=100000)
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--competitors", type=int, default=2000)
+    parser.add_argument("--entities", type=int, default=20000)
+    parser.add_argument("--naive-sample", type=int, default=200, help="Events scanned against every rule and extrapolated")
+    args = parser.parse_args()
+
+    rng = random.Random(17)
+    competitors = [f"competitor-{number}" for number in range(args.competitors)]
+    entities = [f"Brand {number}" for number in range(args.entities)]
+    compiled = [compile_rule(rule) for rule in generate_rules(args.rules, competitors, entities, rng)]
+    events = list(generate_events(args.events, competitors, entities, rng))
+
+    started = time.perf_counter()
+    index = RuleIndex()
+    for rule in compiled:
+        index.add(rule)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    candidates = 0
+    matches = 0
+    for event in events:
+        for rule in index.candidates(event):
+            candidates += 1
+            matches += rule_matches(rule, event)
+    indexed_rate = len(events) / (time.perf_counter() - started)
+
+    sample = events[: args.naive_sample]
+    started = time.perf_counter()
+    naive_results = [naive_match(compiled, event) for event in sample]
+    naive_rate = len(sample) / (time.perf_counter() - started)
+
+    mismatches = sum(
+        sorted(rule.id for rule in index.match(event)) != sorted(rule.id for rule in naive)
+        for event, naive in zip(sample, naive_results)
+    )
+
+    print(f"{args.rules} active rules in {len(index.buckets)} index keys, built in {build_seconds * 1000:.0f} ms")
+    print(f"{len(events)} events, {candidates / len(events):.1f} candidate rules and {matches / len(events):.2f} matches per event")
+    print(f"{'approach':<8} {'events/s':>12}")
+    print(f"{'scan':<8} {naive_rate:>12,.0f}  (sampled on {len(sample)} events)")
+    print(f"{'indexed':<8} {indexed_rate:>12,.0f}")
+    print(f"speedup {indexed_rate / naive_rate:.0f}x, sampled match mismatches: {mismatches}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""
+End-to-end load and latency benchmark for the API
+
+Boots the FastAPI app in-process against local stand-ins: SQLite (or the
+SQL database given by --sqlalchemy-url) for users, mongomock for MongoDB and
+fakeredis for Redis, unless --mongodb-url / --redis-url point at scratch
+servers. It seeds users, competitors with product histories and activity,
+collected documents and finished reports, then drives a weighted mix of
+requests across the auth, users, data, analysis, reports, competitors and
+alerts routers through an httpx ASGI client with a number of concurrent
+clients. Throughput, error counts and p50/p95/p99 latency are reported per
+route and written as JSON; --compare checks a run against an earlier file
+and exits non-zero when a route's p95 regressed past --threshold:
+
+    python -m benchmarks.api_load_benchmark --requests 20000 --output baseline.json
+    python -m benchmarks.api_load_benchmark --requests 20000 --output current.json --compare baseline.json
+
+Latencies are in-process and include the stand-ins, so they are only
+comparable between runs with the same backends and seed sizes.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple
+
+import httpx
+import pymongo
+import redis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core import database
+from app.core.config import settings
+
+SOURCES = ["twitter", "news", "reddit", "web"]
+SENTIMENTS = ["positive", "neutral", "negative"]
+WORDS = [
+    "pricing", "launch", "release", "customers", "support", "growth", "outage", "feature", "integration",
+    "review", "quality", "market", "partnership", "security", "performance", "roadmap", "hiring", "funding",
+]
+PASSWORD = "benchmark-password"
+
+class Operation(NamedTuple):
+    route: str
+    weight: int
+    request: Callable[[Dict[str, Any], random.Random], Dict[str, Any]]
+
+def configure_backends(args: argparse.Namespace, workdir: str) -> None:
+    """
+    Point the app's database handles at the stand-ins before any app module binds them
+    """
+    if args.sqlalchemy_url:
+        database.engine = create_engine(args.sqlalchemy_url)
+    else:
+        database.engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=database.engine)
+
+    if args.mongodb_url:
+        client = pymongo.MongoClient(args.mongodb_url)
+        client.drop_database(args.database)
+        database.mongo_db = client[args.database]
+    else:
+        import mongomock
+
+        database.mongo_db = mongomock.MongoClient()[args.database]
+
+    if args.redis_url:
+        database.redis_client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+        database.redis_client.flushdb()
+    else:
+        import fakeredis
+
+        database.redis_client = fakeredis.FakeRedis(decode_responses=True)
+
+    settings.MONGODB_ENSURE_INDEXES = bool(args.mongodb_url)
+    settings.COLLECTION_SCHEDULER_ENABLED = False
+    settings.REPORT_SCHEDULER_ENABLED = False
+    # mongomock has no $text search, so search and keyword filters go through the local index
+    settings.SEARCH_INDEX_ENABLED = True
+    settings.SEARCH_INDEX_DIR = f"{workdir}/search_index"
+    settings.REPORT_ARTIFACT_DIR = f"{workdir}/reports"
+    settings.REPORT_CHART_WORKERS = 0
+    # The benchmark measures latency; a few users driving the whole mix would be rate limited
+    settings.RATE_LIMIT_ENABLED = False
+
+def seed(args: argparse.Namespace, rng: random.Random) -> Dict[str, Any]:
+    """
+    Seed every store and return what the workload needs to address it
+    """
+    from app.core.security import create_access_token, get_password_hash
+    from app.models.user import User
+    from app.services.activity_timeline import ACTIVITY_TYPES, record_activities
+    from app.services.collected_data import get_collected_data_collection
+    from app.services.competitor_store import create_competitor
+    from app.services.product_snapshots import record_snapshot
+    from app.services.report_pipeline import report_window, run_report
+    from app.services.report_sections import REPORT_TYPE_SECTIONS, SECTIONS
+    from app.services.report_store import create_report
+    from app.services.search_index import get_search_index, index_collected_documents
+
+    database.Base.metadata.create_all(bind=database.engine)
+    # Hashing is deliberately slow, so every user shares one hash
+    hashed_password = get_password_hash(PASSWORD)
+    session = database.SessionLocal()
+    users = [
+        User(email=f"user{number}@example.com", full_name=f"User {number}", hashed_password=hashed_password, is_superuser=number == 0)
+        for number in range(args.users)
+    ]
+    session.add_all(users)
+    session.commit()
+    users = [{"id": user.id, "email": user.email, "token": create_access_token({"sub": user.email})} for user in users]
+    session.close()
+
+    now = datetime.utcnow()
+    entities = [f"Brand {number}" for number in range(50)]
+    documents = [
+        {
+            "source": rng.choice(SOURCES),
+            "query": rng.choice(WORDS),
+            "url": f"https://example.com/{number}",
+            "content": " ".join(rng.choices(WORDS, k=rng.randint(8, 30))),
+            "sentiment": rng.choice(SENTIMENTS),
+            "entities": rng.sample(entities, rng.randint(0, 3)),
+            "metadata": {},
+            "collected_at": now - timedelta(seconds=rng.uniform(0, 90 * 86400)),
+        }
+        for number in range(args.documents)
+    ]
+    get_collected_data_collection().insert_many(documents)
+    index_collected_documents(documents)
+    get_search_index().flush()
+
+    for user in users:
+        user["competitors"] = []
+        for number in range(args.competitors):
+            competitor = create_competitor(
+                user["id"],
+                {"name": f"Competitor {user['id']}-{number}", "website": "https://example.com", "industry": rng.choice(["saas", "retail"]), "tags": ["tracked"]},
+            )
+            competitor_id = str(competitor["_id"])
+            products = [{"id": f"sku-{sku}", "name": f"Product {sku}", "price": rng.randint(10, 500)} for sku in range(args.products)]
+            for week in range(4, 0, -1):
+                for product in rng.sample(products, max(len(products) // 4, 1)):
+                    product["price"] = round(product["price"] * rng.uniform(0.9, 1.1), 2)
+                record_snapshot(competitor_id, products, observed_at=now - timedelta(weeks=week))
+            record_activities(
+                competitor_id,
+                [
+                    {"type": rng.choice(ACTIVITY_TYPES), "date": now - timedelta(days=rng.uniform(0, 90)), "title": " ".join(rng.choices(WORDS, k=5)), "sentiment": rng.choice(SENTIMENTS)}
+                    for _ in range(50)
+                ],
+            )
+            user["competitors"].append({"id": competitor_id, "products": [product["id"] for product in products]})
+
+        user["reports"] = []
+        for number in range(args.reports):
+            window_start, window_end = report_window("last_month")
+            report = create_report(
+                user["id"],
+                {
+                    "title": f"Report {number}",
+                    "description": None,
+                    "report_type": "market_overview",
+                    "data_sources": SOURCES[:2],
+                    "time_period": "last_month",
+                    "window_start": window_start,
+                    "window_end": window_end,
+                    "entities": None,
+                    "format": "html",
+                    "template_id": None,
+                },
+                [{"name": name, "title": SECTIONS[name].title} for name in REPORT_TYPE_SECTIONS["market_overview"]],
+            )
+            run_report(report["_id"])
+            user["reports"].append(str(report["_id"]))
+    return {"users": users, "entities": entities}
+
+def _user(context: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    # The superuser is kept for admin routes
+    return rng.choice(context["users"][1:] or context["users"])
+
+def _auth(user: Dict[str, Any]) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {user['token']}"}
+
+def _call(method: str, path: str, params: Callable[[Dict[str, Any], random.Random, Dict[str, Any]], Any] = None, superuser: bool = False):
+    """
+    Request builder for a route addressed as a random user, filling in ids that user owns
+    """
+    def build(context: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+        user = context["users"][0] if superuser else _user(context, rng)
+        competitor = rng.choice(user["competitors"]) if user["competitors"] else {"id": "", "products": [""]}
+        url = path.format(
+            competitor_id=competitor["id"],
+            product_id=rng.choice(competitor["products"]),
+            report_id=rng.choice(user["reports"]) if user["reports"] else "",
+            user_id=user["id"],
+        )
+        return {"method": method, "url": url, "params": params(context, rng, user) if params else None, "headers": _auth(user)}
+    return build
+
+def _login(context: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    user = _user(context, rng)
+    return {"method": "POST", "url": "/auth/login", "data": {"username": user["email"], "password": PASSWORD}}
+
+def _snapshot(context: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    user = _user(context, rng)
+    competitor = rng.choice(user["competitors"])
+    products = [{"id": product_id, "name": product_id, "price": rng.randint(10, 500)} for product_id in competitor["products"]]
+    return {
+        "method": "POST",
+        "url": f"/competitors/{competitor['id']}/products/snapshots",
+        "json": {"products": products, "complete": True},
+        "headers": _auth(user),
+    }
+
+def _alert_rule(context: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    user = _user(context, rng)
+    return {
+        "method": "POST",
+        "url": "/alerts/rules",
+        "json": {"name": "Negative mentions", "metric": "mention", "entity": rng.choice(context["entities"]), "condition": {"op": "lt", "threshold": 0.3}},
+        "headers": _auth(user),
+    }
+
+OPERATIONS = [
+    Operation("POST /auth/login", 1, _login),
+    Operation("GET /users/me", 40, _call("GET", "/users/me")),
+    Operation("GET /users/", 2, _call("GET", "/users/", superuser=True)),
+    Operation("GET /data/data", 30, _call("GET", "/data/data", lambda context, rng, user: {"source": rng.choice(SOURCES), "limit": 50})),
+    Operation("GET /data/search", 20, _call("GET", "/data/search", lambda context, rng, user: {"q": " ".join(rng.sample(WORDS, 2)), "limit": 20})),
+    Operation("GET /data/jobs", 5, _call("GET", "/data/jobs")),
+    Operation(
+        "POST /analysis/batch-sentiment",
+        5,
+        _call("POST", "/analysis/batch-sentiment", lambda context, rng, user: {"data_source": rng.choice(SOURCES), "query": rng.choice(WORDS)}),
+    ),
+    Operation("GET /analysis/trends", 5, _call("GET", "/analysis/trends", lambda context, rng, user: {"data_source": rng.choice(SOURCES)})),
+    Operation("GET /reports/", 15, _call("GET", "/reports/")),
+    Operation("GET /reports/{report_id}", 10, _call("GET", "/reports/{report_id}")),
+    Operation("GET /reports/{report_id}/download", 5, _call("GET", "/reports/{report_id}/download")),
+    Operation("GET /reports/templates", 3, _call("GET", "/reports/templates")),
+    Operation("GET /competitors/", 25, _call("GET", "/competitors/")),
+    Operation("GET /competitors/{competitor_id}", 20, _call("GET", "/competitors/{competitor_id}")),
+    Operation(
+        "GET /competitors/comparison",
+        8,
+        _call("GET", "/competitors/comparison", lambda context, rng, user: {"competitor_ids": [competitor["id"] for competitor in user["competitors"]]}),
+    ),
+    Operation("GET /competitors/{competitor_id}/activity", 10, _call("GET", "/competitors/{competitor_id}/activity")),
+    Operation("GET /competitors/{competitor_id}/products", 10, _call("GET", "/competitors/{competitor_id}/products")),
+    Operation("GET /competitors/{competitor_id}/products/changes", 8, _call("GET", "/competitors/{competitor_id}/products/changes")),
+    Operation("GET /competitors/{competitor_id}/products/{product_id}/history", 5, _call("GET", "/competitors/{competitor_id}/products/{product_id}/history")),
+    Operation("POST /competitors/{competitor_id}/products/snapshots", 3, _snapshot),
+    Operation("POST /alerts/rules", 1, _alert_rule),
+    Operation("GET /alerts/notifications", 5, _call("GET", "/alerts/notifications")),
+]
+
+async def run_load(app: Any, context: Dict[str, Any], args: argparse.Namespace, rng: random.Random) -> Dict[str, Any]:
+    """
+    Send the weighted request mix from concurrent clients, returning latencies and statuses per route
+    """
+    samples: Dict[str, List[float]] = {operation.route: [] for operation in OPERATIONS}
+    statuses: Dict[str, Dict[int, int]] = {operation.route: {} for operation in OPERATIONS}
+    weights = [operation.weight for operation in OPERATIONS]
+    planned = rng.choices(OPERATIONS, weights=weights, k=args.warmup + args.requests)
+    requests = [(operation.route, operation.request(context, rng)) for operation in planned]
+    position = 0
+
+    # Unhandled errors come back as 500s and are counted, rather than ending the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url=f"http://benchmark{settings.API_V1_STR}") as client:
+        async def worker() -> None:
+            nonlocal position
+            while position < len(requests):
+                index = position
+                position += 1
+                route, request = requests[index]
+                started = time.perf_counter()
+                response = await client.request(**{key: value for key, value in request.items() if value is not None})
+                elapsed = (time.perf_counter() - started) * 1000
+                if index < args.warmup:
+                    continue
+                samples[route].append(elapsed)
+                statuses[route][response.status_code] = statuses[route].get(response.status_code, 0) + 1
+
+        await app.router.startup()
+        try:
+            # The first requests also pay for imports and cold caches
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+        finally:
+            await app.router.shutdown()
+    return {"samples": samples, "statuses": statuses, "elapsed": elapsed}
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    position = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[position]
+
+def summarize(load: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Per-route and overall throughput, errors and latency percentiles in milliseconds
+    """
+    def stats(values: List[float], statuses: Dict[int, int]) -> Dict[str, Any]:
+        ordered = sorted(values)
+        return {
+            "requests": len(values),
+            "errors": sum(count for code, count in statuses.items() if code >= 400),
+            "statuses": {str(code): count for code, count in sorted(statuses.items())},
+            "throughput_rps": round(len(values) / load["elapsed"], 2),
+            "mean_ms": round(statistics.fmean(values), 3),
+            "p50_ms": round(percentile(ordered, 0.50), 3),
+            "p95_ms": round(percentile(ordered, 0.95), 3),
+            "p99_ms": round(percentile(ordered, 0.99), 3),
+            "max_ms": round(ordered[-1], 3),
+        }
+
+    routes = {
+        route: stats(values, load["statuses"][route])
+        for route, values in load["samples"].items()
+        if values
+    }
+    all_statuses: Dict[int, int] = {}
+    for statuses in load["statuses"].values():
+        for code, count in statuses.items():
+            all_statuses[code] = all_statuses.get(code, 0) + count
+    overall = stats([value for values in load["samples"].values() for value in values], all_statuses)
+    return {"overall": overall, "routes": routes}
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Print p95 and throughput changes against a baseline, returning the routes whose p95 regressed
+    """
+    regressions = []
+    print(f"\ncompared with {baseline['meta']['git_commit'] or 'baseline'} ({baseline['meta']['started_at']})")
+    if baseline["meta"]["arguments"] != current["meta"]["arguments"] or baseline["meta"]["backends"] != current["meta"]["backends"]:
+        print("warning: the runs used different arguments or backends, so latencies are not directly comparable")
+    print(f"{'route':<64} {'p95 ms':>9} {'baseline':>9} {'change':>8}")
+    for route, stats in current["routes"].items():
+        previous = baseline["routes"].get(route)
+        if previous is None:
+            print(f"{route:<64} {stats['p95_ms']:>9.2f} {'-':>9} {'new':>8}")
+            continue
+        change = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100 if previous["p95_ms"] else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(route)
+            flag = "  REGRESSED"
+        print(f"{route:<64} {stats['p95_ms']:>9.2f} {previous['p95_ms']:>9.2f} {change:>+7.1f}%{flag}")
+    throughput_change = (current["overall"]["throughput_rps"] / baseline["overall"]["throughput_rps"] - 1) * 100
+    print(f"overall throughput {current['overall']['throughput_rps']:.0f} req/s ({throughput_change:+.1f}%)")
+    return regressions
+
+def git_commit() -> Any:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000, help="Measured requests")
+    parser.add_argument("--warmup", type=int, default=200, help="Requests sent first and not measured")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--competitors", type=int, default=5, help="Competitors per user")
+    parser.add_argument("--products", type=int, default=20, help="Products per competitor")
+    parser.add_argument("--reports", type=int, default=2, help="Finished reports per user")
+    parser.add_argument("--documents", type=int, default=20000, help="Collected documents")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--sqlalchemy-url", help="SQL database for users instead of in-memory SQLite; tables are created")
+    parser.add_argument("--mongodb-url", help="MongoDB server instead of mongomock")
+    parser.add_argument("--database", default="bench_api_load", help="Scratch MongoDB database, dropped first")
+    parser.add_argument("--redis-url", help="Scratch Redis database instead of fakeredis; it is flushed first")
+    parser.add_argument("--output", default="api_load_benchmark.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p95 increase in percent counted as a regression")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="api_load_")
+    configure_backends(args, workdir)
+    # Imported after the handles are replaced, as modules bind them at import
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    started_at = datetime.utcnow()
+    seed_started = time.perf_counter()
+    context = seed(args, rng)
+    seed_seconds = time.perf_counter() - seed_started
+    load = asyncio.run(run_load(app, context, args, rng))
+    results = {
+        "meta": {
+            "started_at": started_at.isoformat() + "Z",
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "backends": {
+                "sql": database.engine.url.get_backend_name(),
+                "mongodb": "mongodb" if args.mongodb_url else "mongomock",
+                "redis": "redis" if args.redis_url else "fakeredis",
+            },
+            "seed_seconds": round(seed_seconds, 1),
+            "duration_seconds": round(load["elapsed"], 2),
+            "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "threshold")},
+        },
+        **summarize(load),
+    }
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+
+    print(f"{args.requests} requests from {args.concurrency} clients in {load['elapsed']:.1f}s, seeded in {seed_seconds:.1f}s")
+    print(f"{'route':<64} {'count':>6} {'err':>4} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, stats in [*results["routes"].items(), ("overall", results["overall"])]:
+        print(
+            f"{route:<64} {stats['requests']:>6} {stats['errors']:>4} {stats['throughput_rps']:>7.1f} "
+            f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}"
+        )
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
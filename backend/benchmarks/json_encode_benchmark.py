@@ -0,0 +1,143 @@
+"""
+Encode time and peak memory of large JSON list responses
+
+Builds synthetic collected-data documents, as read from MongoDB, and user
+rows, as read from SQL, then encodes lists of them the way FastAPI does for
+a returned dict or response_model (jsonable_encoder or pydantic validation,
+then json.dumps) against the orjson response and the batched stream the
+list endpoints use. Time is the best of a few runs; peak memory is traced
+separately and excludes the input rows. Every way of encoding is checked to
+produce the same JSON:
+
+    python -m benchmarks.json_encode_benchmark --rows 10000 100000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse
+
+from app.core.responses import FastJSONResponse, iter_json_list
+from app.models.user import User
+from app.schemas.user import User as UserSchema
+from app.services.collected_data import serialize_document
+
+SOURCES = ["twitter", "news", "reddit", "linkedin"]
+WORDS = ["market", "product", "customers", "growth", "quarter", "team", "release", "update", "review", "support"]
+
+def generate_documents(count: int, rng: random.Random) -> list:
+    started = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "source": rng.choice(SOURCES),
+            "query": "acme",
+            "url": f"https://example.com/posts/{number}",
+            "content": " ".join(rng.choices(WORDS, k=40)),
+            "metadata": {"author": f"user{rng.randrange(5000)}", "likes": rng.randrange(1000), "lang": "en"},
+            "sentiment": {"label": rng.choice(["positive", "neutral", "negative"]), "score": round(rng.uniform(-1, 1), 3)},
+            "entities": [f"Brand {rng.randrange(200)}" for _ in range(3)],
+            "collected_at": started + timedelta(seconds=number),
+        }
+        for number in range(count)
+    ]
+
+def generate_users(count: int) -> list:
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "email": f"user{number}@example.com",
+            "full_name": f"User {number}",
+            "is_active": True,
+            "is_superuser": number % 100 == 0,
+            "id": number + 1,
+            "created_at": created_at + timedelta(minutes=number),
+            "updated_at": None,
+        }
+        for number in range(count)
+    ]
+
+def streamed(chunks) -> int:
+    # Chunks are handed to the server one at a time; only their size is kept
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+    return size
+
+def document_encoders(documents: list) -> dict:
+    return {
+        "jsonable_encoder + json": lambda: JSONResponse(
+            jsonable_encoder({"next_cursor": None, "data": [serialize_document(document) for document in documents]})
+        ).body,
+        "orjson response": lambda: FastJSONResponse(
+            {"next_cursor": None, "data": [serialize_document(document) for document in documents]}
+        ).body,
+        "orjson stream": lambda: streamed(
+            iter_json_list([serialize_document(document) for document in documents], "data", {"next_cursor": None})
+        ),
+    }
+
+def user_encoders(rows: list) -> dict:
+    users = [User(hashed_password="-", **row) for row in rows]
+    adapter = TypeAdapter(List[UserSchema])
+    return {
+        "response_model + json": lambda: JSONResponse(
+            adapter.dump_python(adapter.validate_python(users, from_attributes=True), mode="json")
+        ).body,
+        "orjson response": lambda: FastJSONResponse(rows).body,
+        "orjson stream": lambda: streamed(iter_json_list(rows)),
+    }
+
+def measure(encode, repeats: int) -> tuple:
+    seconds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = encode()
+        seconds.append(time.perf_counter() - started)
+    size = result if isinstance(result, int) else len(result)
+    tracemalloc.start()
+    encode()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(seconds), peak, size
+
+def check_equal(encoders: dict) -> bool:
+    bodies = []
+    for name, encode in encoders.items():
+        if name == "orjson stream":
+            continue
+        bodies.append(json.loads(encode()))
+    return all(body == bodies[0] for body in bodies)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(17)
+    for rows in args.rows:
+        documents = generate_documents(rows, rng)
+        users = generate_users(rows)
+        for kind, encoders in (("documents", document_encoders(documents)), ("users", user_encoders(users))):
+            # The stream's body is the orjson response's, cut into batches
+            identical = check_equal(encoders)
+            print(f"{rows} {kind}{'' if identical else ' (OUTPUT DIFFERS)'}")
+            baseline = None
+            for name, encode in encoders.items():
+                seconds, peak, size = measure(encode, args.repeats)
+                baseline = baseline or seconds
+                print(
+                    f"  {name:<24} {seconds * 1000:9.1f} ms {baseline / seconds:6.1f}x"
+                    f"  peak {peak / 2**20:8.1f} MiB  body {size / 2**20:7.1f} MiB"
+                )
+
+if __name__ == "__main__":
+    main()
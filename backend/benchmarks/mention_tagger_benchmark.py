@@ -0,0 +1,122 @@
+"""
+Throughput benchmark for the competitor mention tagger
+
+Builds the tagger over synthetic competitors (a name, an alias and a social
+handle each) and tags documents of filler words with a few competitors
+mentioned in each. Reports the automaton build time, the time to apply a
+batch of competitor updates incrementally, and tagging throughput against
+the per-competitor regex loop it replaces (timed on a sample of documents,
+since it is thousands of times slower at this size). The run from the design
+review is:
+
+    python -m benchmarks.mention_tagger_benchmark --patterns 50000
+"""
+import argparse
+import random
+import re
+import time
+
+from bson import ObjectId
+
+from app.services.mention_tagger import MentionTagger
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "to", "ne", "su", "vi", "do", "pe", "zu", "ba", "ri", "qu", "fe", "xo"]
+FILLER = ["the", "new", "release", "market", "customers", "said", "today", "price", "launch", "team", "with", "and", "for", "on"]
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+
+def generate_competitors(count: int, rng: random.Random) -> list:
+    competitors = []
+    names = set()
+    while len(competitors) < count:
+        name = " ".join(word(rng) for _ in range(rng.randint(1, 2))).title()
+        if name in names:
+            continue
+        names.add(name)
+        competitors.append({
+            "_id": ObjectId(),
+            "name": name,
+            "aliases": [f"{name} {rng.choice(['Cloud', 'Labs', 'Pro', 'One'])}"],
+            "social_profiles": {"twitter": name.replace(" ", "_").lower()},
+        })
+    return competitors
+
+def generate_documents(count: int, words: int, mentions: int, competitors: list, rng: random.Random) -> list:
+    documents = []
+    for _ in range(count):
+        tokens = rng.choices(FILLER, k=words)
+        for _ in range(mentions):
+            competitor = rng.choice(competitors)
+            mention = rng.choice([competitor["name"], competitor["aliases"][0], "@" + competitor["social_profiles"]["twitter"]])
+            tokens.insert(rng.randrange(len(tokens)), mention)
+        documents.append(" ".join(tokens) + ".")
+    return documents
+
+def regex_tag(matchers: list, text: str) -> list:
+    return sorted({competitor_id for competitor_id, matcher in matchers if matcher.search(text)})
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patterns", type=int, default=50000)
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--words", type=int, default=60, help="Filler words per document")
+    parser.add_argument("--mentions", type=int, default=3, help="Competitor mentions per document")
+    parser.add_argument("--updates", type=int, default=100, help="Competitors changed in the incremental batch")
+    parser.add_argument("--regex-documents", type=int, default=20, help="Documents tagged by the regex loop")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    competitors = generate_competitors(args.patterns // 3, rng)
+    documents = generate_documents(args.documents, args.words, args.mentions, competitors, rng)
+    megabytes = sum(len(document) for document in documents) / 2**20
+
+    tagger = MentionTagger()
+    started = time.perf_counter()
+    tagger.rebuild(competitors)
+    stats = tagger.stats()
+    print(
+        f"{stats['competitors']} competitors, {stats['patterns']} patterns:"
+        f" automaton of {stats['states']} states built in {time.perf_counter() - started:.2f} s"
+    )
+
+    changed = []
+    for competitor in rng.sample(competitors, args.updates):
+        competitor["aliases"].append(word(rng).title())
+        changed.append(competitor)
+    started = time.perf_counter()
+    tagger.apply(changed)
+    print(f"  {args.updates} competitor updates applied in {(time.perf_counter() - started) * 1000:.1f} ms ({tagger.stats()['delta_patterns']} delta patterns)")
+
+    started = time.perf_counter()
+    tagged = [tagger.tag(document) for document in documents]
+    seconds = time.perf_counter() - started
+    print(
+        f"  automaton: {len(documents)} documents ({megabytes:.1f} MiB) in {seconds:.2f} s,"
+        f" {len(documents) / seconds:,.0f} documents/s, {megabytes / seconds:.1f} MiB/s,"
+        f" {sum(map(len, tagged)) / len(documents):.2f} competitors per document"
+    )
+
+    started = time.perf_counter()
+    matchers = [
+        (str(competitor["_id"]), re.compile(r"(?<!\w)" + re.escape(name) + r"(?!\w)", re.IGNORECASE))
+        for competitor in competitors
+        for name in [competitor["name"], *competitor["aliases"], "@" + competitor["social_profiles"]["twitter"]]
+    ]
+    compile_seconds = time.perf_counter() - started
+    sample = documents[:args.regex_documents]
+    started = time.perf_counter()
+    regex_tagged = [regex_tag(matchers, document) for document in sample]
+    regex_seconds = (time.perf_counter() - started) / len(sample)
+    # The regex loop also counts names inside a longer matched alias
+    missed = sum(not set(found) <= set(expected) for found, expected in zip(tagged, regex_tagged))
+    print(
+        f"  regex loop: {len(matchers)} patterns compiled in {compile_seconds:.1f} s,"
+        f" {regex_seconds * 1000:.0f} ms per document, {1 / regex_seconds:.1f} documents/s"
+        f" ({regex_seconds * len(documents) / seconds:,.0f}x slower)"
+        f"{'' if not missed else f'  ({missed} DOCUMENTS DIFFER)'}"
+    )
+
+if __name__ == "__main__":
+    main()
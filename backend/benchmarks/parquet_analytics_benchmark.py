@@ -0,0 +1,161 @@
+"""
+Query benchmark for the Parquet analytics store against MongoDB aggregation
+
+Seeds a year of collected documents across sources, exports them to a
+scratch Parquet store and times the analysis queries both ways: sentiment
+per day and source over the year, the same for one source and month (where
+the store opens only that month's partitions), and the most mentioned
+entities. MongoDB runs $group pipelines; the store scans only the columns a
+query reads and groups them with pandas or pyarrow. Time is the best of a
+few runs and both sides are checked to count the same. Runs against the
+configured MongoDB in a scratch database, or in-process with mongomock:
+
+    python -m benchmarks.parquet_analytics_benchmark --documents 1000000
+    python -m benchmarks.parquet_analytics_benchmark --documents 100000 --mongomock
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pyarrow.compute as pc
+import pymongo
+
+from app.core import database
+from app.core.config import settings
+from app.services import parquet_store
+from app.services.analysis_queries import load_documents
+from app.services.collected_data import get_collected_data_collection
+
+SOURCES = ["twitter", "news", "reddit", "linkedin"]
+SENTIMENTS = ["positive", "neutral", "negative"]
+WORDS = ["market", "product", "customers", "growth", "quarter", "team", "release", "update", "review", "support"]
+
+def generate_documents(count: int, entities: list, start: datetime, rng: random.Random):
+    for _ in range(count):
+        yield {
+            "source": rng.choice(SOURCES),
+            "query": "acme",
+            "url": "https://example.com/posts",
+            "content": " ".join(rng.choices(WORDS, k=30)),
+            "collected_at": start + timedelta(seconds=rng.uniform(0, 365 * 86400)),
+            "sentiment": rng.choice(SENTIMENTS),
+            "entities": rng.sample(entities, rng.randint(0, 3)),
+        }
+
+def mongo_daily_sentiment(start: datetime, end: datetime, sources: list) -> dict:
+    counts = {}
+    for row in get_collected_data_collection().aggregate([
+        {"$match": {"source": {"$in": sources}, "collected_at": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {
+                "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$collected_at"}},
+                "source": "$source",
+                "sentiment": "$sentiment",
+            },
+            "count": {"$sum": 1},
+        }},
+    ]):
+        key = row["_id"]
+        counts[(key["date"], key["source"], key["sentiment"])] = row["count"]
+    return counts
+
+def parquet_daily_sentiment(start: datetime, end: datetime, sources: list) -> dict:
+    frame = load_documents(["date", "source", "sentiment"], start, end, sources)
+    return frame.groupby(["date", "source", "sentiment"]).size().to_dict()
+
+def mongo_top_entities(start: datetime, end: datetime, limit: int) -> dict:
+    return {
+        row["_id"]: row["count"]
+        for row in get_collected_data_collection().aggregate([
+            {"$match": {"collected_at": {"$gte": start, "$lt": end}}},
+            {"$unwind": "$entities"},
+            {"$group": {"_id": "$entities", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": limit},
+        ])
+    }
+
+def parquet_top_entities(start: datetime, end: datetime, limit: int) -> dict:
+    mentions = parquet_store.scan(["entities"], start, end)["entities"].combine_chunks()
+    counts = pc.value_counts(pc.list_flatten(mentions))
+    top = sorted(zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()), key=lambda item: (-item[1], item[0]))
+    return dict(top[:limit])
+
+def measure(query, repeats: int) -> tuple:
+    seconds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = query()
+        seconds.append(time.perf_counter() - started)
+    return min(seconds), result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=1000000)
+    parser.add_argument("--entities", type=int, default=500)
+    parser.add_argument("--top", type=int, default=20, help="Most mentioned entities to return")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--mongomock", action="store_true", help="Use an in-process mongomock database")
+    parser.add_argument("--database", default="bench_parquet_analytics", help="Scratch database on MONGODB_URL, dropped first")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+
+        database.mongo_db = mongomock.MongoClient()[args.database]
+    else:
+        client = pymongo.MongoClient(settings.MONGODB_URL)
+        client.drop_database(args.database)
+        database.mongo_db = client[args.database]
+    settings.PARQUET_STORE_DIR = tempfile.mkdtemp(prefix="parquet-store-")
+    settings.PARQUET_STORE_ENABLED = True
+
+    try:
+        rng = random.Random(23)
+        start = datetime(2024, 1, 1)
+        end = start + timedelta(days=365)
+        entities = [f"Brand {number}" for number in range(args.entities)]
+        collection = get_collected_data_collection()
+        documents = generate_documents(args.documents, entities, start, rng)
+        while batch := [document for _, document in zip(range(10000), documents)]:
+            collection.insert_many(batch)
+        collection.create_index([("source", 1), ("collected_at", 1)])
+
+        export = parquet_store.export_new_documents()
+        stats = parquet_store.store_stats()
+        print(
+            f"{args.documents} documents; exported {export['partitions']} partitions in {export['seconds']:.1f} s,"
+            f" {stats['size_bytes'] / 2**20:.1f} MiB"
+        )
+
+        month_start = datetime(2024, 6, 1)
+        queries = {
+            "daily sentiment, year": (
+                lambda: mongo_daily_sentiment(start, end, SOURCES),
+                lambda: parquet_daily_sentiment(start, end, SOURCES),
+            ),
+            "daily sentiment, 1 source 1 month": (
+                lambda: mongo_daily_sentiment(month_start, datetime(2024, 7, 1), SOURCES[:1]),
+                lambda: parquet_daily_sentiment(month_start, datetime(2024, 7, 1), SOURCES[:1]),
+            ),
+            f"top {args.top} entities, year": (
+                lambda: mongo_top_entities(start, end, args.top),
+                lambda: parquet_top_entities(start, end, args.top),
+            ),
+        }
+        for name, (mongo_query, parquet_query) in queries.items():
+            mongo_seconds, mongo_result = measure(mongo_query, args.repeats)
+            parquet_seconds, parquet_result = measure(parquet_query, args.repeats)
+            same = mongo_result == parquet_result
+            print(
+                f"  {name:<36} mongo {mongo_seconds * 1000:9.1f} ms  parquet {parquet_seconds * 1000:8.1f} ms"
+                f"  {mongo_seconds / parquet_seconds:6.1f}x{'' if same else '  (RESULTS DIFFER)'}"
+            )
+    finally:
+        shutil.rmtree(settings.PARQUET_STORE_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
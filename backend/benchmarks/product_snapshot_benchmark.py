@@ -0,0 +1,120 @@
+"""
+Storage benchmark for delta-compressed product snapshots
+
+Simulates daily crawls of competitor product catalogues where a small share
+of products change between crawls, and compares the BSON bytes of storing
+every crawl in full with storing the current version plus deltas. It also
+counts the documents a "price changes in the last N days" query has to read
+in each layout:
+
+    python -m benchmarks.product_snapshot_benchmark --products 500 --crawls 180
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+import bson
+
+from app.services.product_snapshots import classify_delta, compute_delta, fingerprint
+
+FEATURES = [f"Feature {number}" for number in range(60)]
+
+def generate_catalogue(count: int, rng: random.Random) -> dict:
+    catalogue = {}
+    for number in range(count):
+        catalogue[f"prod-{number}"] = {
+            "name": f"Product {number}",
+            "description": " ".join(rng.choice(["Advanced", "market", "analysis", "platform", "for", "teams"]) for _ in range(30)),
+            "url": f"https://competitor.example.com/products/{number}",
+            "pricing_model": rng.choice(["subscription", "usage-based", "one-time"]),
+            "price_range": f"${rng.randint(10, 2000)}/month",
+            "features": rng.sample(FEATURES, rng.randint(4, 12)),
+        }
+    return catalogue
+
+def mutate(record: dict, rng: random.Random) -> dict:
+    record = dict(record)
+    roll = rng.random()
+    if roll < 0.6:
+        record["price_range"] = f"${rng.randint(10, 2000)}/month"
+    elif roll < 0.85:
+        record["features"] = rng.sample(FEATURES, rng.randint(4, 12))
+    else:
+        record["description"] = record["description"] + " Updated."
+    return record
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--crawls", type=int, default=180, help="Number of daily crawls")
+    parser.add_argument("--change-rate", type=float, default=0.03, help="Share of products changed per crawl")
+    parser.add_argument("--days", type=int, default=30, help="Window of the price change query")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    catalogue = generate_catalogue(args.products, rng)
+    start = datetime(2024, 1, 1)
+    competitor_id = "bench"
+
+    full_bytes = 0
+    full_documents_in_window = 0
+    change_bytes = 0
+    price_changes_in_window = 0
+    fingerprints = {}
+    window_start = start + timedelta(days=args.crawls - args.days)
+
+    for day in range(args.crawls):
+        observed_at = start + timedelta(days=day)
+        if day:
+            for key in rng.sample(list(catalogue), int(args.products * args.change_rate)):
+                catalogue[key] = mutate(catalogue[key], rng)
+
+        for key, record in catalogue.items():
+            full_bytes += len(bson.encode({"competitor_id": competitor_id, "product_key": key, "observed_at": observed_at, "record": record}))
+            if observed_at >= window_start:
+                full_documents_in_window += 1
+
+            record_fingerprint = fingerprint(record)
+            previous = fingerprints.get(key)
+            if previous is not None and previous[0] == record_fingerprint:
+                continue
+            delta = compute_delta(previous[1] if previous else {}, record)
+            change_types = classify_delta(delta) if previous else ["created"]
+            change_bytes += len(bson.encode({
+                "competitor_id": competitor_id,
+                "product_key": key,
+                "version": 1,
+                "changed_at": observed_at,
+                "change_types": change_types,
+                "fingerprint": record_fingerprint,
+                "delta": delta,
+            }))
+            if "price" in change_types and observed_at >= window_start:
+                price_changes_in_window += 1
+            fingerprints[key] = (record_fingerprint, record)
+
+    current_bytes = sum(
+        len(bson.encode({
+            "competitor_id": competitor_id,
+            "product_key": key,
+            "record": record,
+            "fingerprint": fingerprints[key][0],
+            "version": 1,
+            "removed": False,
+            "first_seen_at": start,
+            "last_changed_at": start,
+            "last_seen_at": start,
+        }))
+        for key, record in catalogue.items()
+    )
+    delta_bytes = current_bytes + change_bytes
+
+    print(f"{args.products} products, {args.crawls} daily crawls, {args.change_rate:.0%} changed per crawl")
+    print(f"full snapshots   {full_bytes / 1e6:10.2f} MB")
+    print(f"current + deltas {delta_bytes / 1e6:10.2f} MB  ({full_bytes / delta_bytes:.1f}x smaller, "
+          f"{1 - delta_bytes / full_bytes:.1%} saved)")
+    print(f"price changes in the last {args.days} days: {price_changes_in_window} found; documents read "
+          f"{full_documents_in_window} with full snapshots, {price_changes_in_window} with the change index")
+
+if __name__ == "__main__":
+    main()
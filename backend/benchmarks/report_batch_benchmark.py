@@ -0,0 +1,147 @@
+"""
+Compute benchmark for batched scheduled reports
+
+Simulates a tick in which many users' scheduled reports over the same time
+period fall due, with entity filters drawn from a Zipf-like popularity so
+that filters overlap, and compares computing the shareable sections of every
+report on its own with computing them once for the batch and splitting the
+signature partials per entity filter. The naive side is timed on a sample of
+reports and extrapolated; both sides are checked to produce the same
+partials on that sample. Runs against the configured MongoDB in a scratch
+database, or in-process with mongomock:
+
+    python -m benchmarks.report_batch_benchmark --reports 10000 --mongomock
+"""
+import argparse
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+import pymongo
+
+from app.core import database
+from app.core.config import settings
+from app.services.collected_data import get_collected_data_collection
+from app.services.report_cache import batch_context, entity_set_key
+from app.services.report_pipeline import report_window
+from app.services.report_sections import REPORT_TYPE_SECTIONS, SECTIONS, split_signature_partials
+
+SOURCES = ["twitter", "news", "reddit"]
+SENTIMENTS = ["positive", "neutral", "negative"]
+
+def zipf_sampler(population: list, rng: random.Random):
+    cumulative_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, len(population) + 1)))
+    return lambda count: rng.choices(population, cum_weights=cumulative_weights, k=count)
+
+def generate_documents(count: int, entities: list, window_start: datetime, window_end: datetime, rng: random.Random):
+    pick = zipf_sampler(entities, rng)
+    span = (window_end - window_start).total_seconds()
+    for _ in range(count):
+        yield {
+            "source": rng.choice(SOURCES),
+            "collected_at": window_start + timedelta(seconds=rng.uniform(0, span)),
+            "sentiment": rng.choice(SENTIMENTS),
+            "entities": sorted(set(pick(rng.randint(0, 3)))),
+            "content": "",
+        }
+
+def generate_contexts(count: int, entities: list, window_start: datetime, window_end: datetime, rng: random.Random):
+    pick = zipf_sampler(entities, rng)
+    for user_id in range(count):
+        # Some users report on everything they collected
+        filtered = rng.random() > 0.05
+        yield {
+            "user_id": user_id,
+            "report_type": rng.choice(list(REPORT_TYPE_SECTIONS)),
+            "data_sources": sorted(rng.sample(SOURCES, rng.randint(1, len(SOURCES)))),
+            "entities": sorted(set(pick(rng.randint(1, 3)))) if filtered else None,
+            "window_start": window_start,
+            "window_end": window_end,
+            "competitors": [],
+        }
+
+def shareable_sections(report_type: str) -> list:
+    return [name for name in REPORT_TYPE_SECTIONS[report_type] if SECTIONS[name].scope is None]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=10000)
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--entities", type=int, default=200, help="Distinct entities users filter on")
+    parser.add_argument("--time-period", default="last_month")
+    parser.add_argument("--naive-sample", type=int, default=20, help="Reports computed one by one and extrapolated")
+    parser.add_argument("--mongomock", action="store_true", help="Use an in-process mongomock database")
+    parser.add_argument("--database", default="bench_report_batch", help="Scratch database on MONGODB_URL, dropped first")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+
+        database.mongo_db = mongomock.MongoClient()[args.database]
+    else:
+        client = pymongo.MongoClient(settings.MONGODB_URL)
+        client.drop_database(args.database)
+        database.mongo_db = client[args.database]
+
+    rng = random.Random(11)
+    entities = [f"Brand {number}" for number in range(args.entities)]
+    window_start, window_end = report_window(args.time_period, now=datetime(2024, 6, 30, 12))
+    get_collected_data_collection().insert_many(
+        list(generate_documents(args.documents, entities, window_start, window_end, rng))
+    )
+    contexts = list(generate_contexts(args.reports, entities, window_start, window_end, rng))
+    naive_aggregations = sum(
+        len(shareable_sections(context["report_type"])) * len(context["data_sources"]) for context in contexts
+    )
+
+    # Naive: every report aggregates each of its sections per source
+    sample = rng.sample(contexts, min(args.naive_sample, len(contexts)))
+    naive_partials = {}
+    started = time.perf_counter()
+    for context in sample:
+        for name in shareable_sections(context["report_type"]):
+            for source in context["data_sources"]:
+                naive_partials[(context["user_id"], name, source)] = SECTIONS[name].aggregate(
+                    context, source, window_start, window_end
+                )
+    naive_seconds = (time.perf_counter() - started) / len(sample) * len(contexts)
+
+    # Batched: one aggregation per section and source, split per entity filter
+    started = time.perf_counter()
+    batch = batch_context(contexts)
+    batch_aggregations = 0
+    split = {}
+    for name in SECTIONS:
+        if SECTIONS[name].scope is not None:
+            continue
+        for source in batch["data_sources"]:
+            entity_filters = {
+                entity_set_key(context["entities"]): context["entities"]
+                for context in contexts
+                if name in shareable_sections(context["report_type"]) and source in context["data_sources"]
+            }
+            if not entity_filters:
+                continue
+            computed = SECTIONS[name].aggregate(batch, source, window_start, window_end)
+            batch_aggregations += 1
+            for key, partials in split_signature_partials(computed, entity_filters).items():
+                split[(key, name, source)] = partials
+    batch_seconds = time.perf_counter() - started
+
+    mismatches = sum(
+        split[(entity_set_key(context["entities"]), name, source)] != naive_partials[(context["user_id"], name, source)]
+        for context in sample
+        for name in shareable_sections(context["report_type"])
+        for source in context["data_sources"]
+    )
+    distinct_filters = len({entity_set_key(context["entities"]) for context in contexts})
+
+    print(f"{args.reports} scheduled {args.time_period} reports, {args.documents} documents, {distinct_filters} distinct entity filters")
+    print(f"{'approach':<10} {'aggregations':>13} {'compute s':>11}")
+    print(f"{'naive':<10} {naive_aggregations:>13} {naive_seconds:>11.1f}  (extrapolated from {len(sample)} reports)")
+    print(f"{'batched':<10} {batch_aggregations:>13} {batch_seconds:>11.1f}")
+    print(f"speedup {naive_seconds / batch_seconds:.1f}x, sampled partial mismatches: {mismatches}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Render time and peak memory benchmark for report formats
+
+Renders a market overview report built from synthetic section results in
+every format and reports the one-off cost of compiling its render plan and
+assets, the median render time with the cached plan and the tracemalloc
+peak of a render. Output is consumed chunk by chunk like the artifact store
+does:
+
+    python -m benchmarks.report_render_benchmark --days 365 --repeat 20
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.services.activity_timeline import ACTIVITY_TYPES
+from app.services.report_render import compile_plan, office_template, pdf_assets, render_report
+from app.services.report_sections import REPORT_TYPE_SECTIONS, SECTIONS
+
+FORMATS = ["html", "pdf", "docx", "pptx"]
+
+def synthetic_results(days: int, rng: random.Random) -> dict:
+    window_end = datetime(2024, 7, 1)
+    context = {"window_start": window_end - timedelta(days=days), "window_end": window_end}
+    partials = {"sentiment": {}, "trends": {}, "entities": {}, "competitors": {}}
+    for offset in range(days):
+        day = (context["window_start"] + timedelta(days=offset)).strftime("%Y-%m-%d")
+        partials["sentiment"][day] = {label: rng.randint(0, 200) for label in ("positive", "neutral", "negative")}
+        volume = {source: rng.randint(0, 400) for source in ("twitter", "news", "reddit")}
+        partials["trends"][day] = {"volume": sum(volume.values()), "by_source": volume}
+        partials["entities"][day] = {f"Entity {number}": rng.randint(0, 50) for number in rng.sample(range(500), 40)}
+        partials["competitors"][day] = {
+            "mentions": {f"Competitor {number}": {"positive": rng.randint(0, 20), "negative": rng.randint(0, 20)} for number in range(10)},
+            "activity": {f"Competitor {number}": {rng.choice(ACTIVITY_TYPES): 1} for number in range(10)},
+        }
+    return {name: SECTIONS[name].merge(partials[name], context) for name in partials}, context
+
+def render(report: dict, results: dict) -> int:
+    size = 0
+    for chunk in render_report(report, results):
+        size += len(chunk)
+    return size
+
+def compile_cost(report: dict) -> float:
+    compile_plan.cache_clear()
+    pdf_assets.cache_clear()
+    office_template.cache_clear()
+    started = time.perf_counter()
+    compile_plan(report["format"], tuple((section["name"], section["title"]) for section in report["sections"]))
+    return (time.perf_counter() - started) * 1000
+
+def measure(report: dict, results: dict, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = render(report, results)
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    render(report, results)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), peak, size
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365, help="Days covered by the report")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--chart-workers", type=int, default=0, help="Chart process pool size; 0 lays charts out in-thread")
+    args = parser.parse_args()
+
+    settings.REPORT_CHART_WORKERS = args.chart_workers
+    results, context = synthetic_results(args.days, random.Random(5))
+    sections = REPORT_TYPE_SECTIONS["market_overview"]
+    report = {
+        "title": "Market overview",
+        "description": "Synthetic benchmark report",
+        "format": None,
+        "sections": [{"name": name, "title": SECTIONS[name].title} for name in sections],
+        **context,
+    }
+
+    print(f"market_overview report over {args.days} days, median of {args.repeat} renders")
+    print(f"{'format':<6} {'size KB':>8} {'compile ms':>11} {'render ms':>10} {'peak MB':>8}")
+    for file_format in FORMATS:
+        report["format"] = file_format
+        # Warm imports so the compile cost only covers the plan and its assets
+        render(report, results)
+        compile_ms = compile_cost(report)
+        render_ms, peak, size = measure(report, results, args.repeat)
+        print(f"{file_format:<6} {size / 1024:>8.1f} {compile_ms:>11.2f} {render_ms:>10.1f} {peak / 1e6:>8.2f}")
+
+if __name__ == "__main__":
+    main()
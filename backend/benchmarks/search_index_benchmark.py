@@ -0,0 +1,103 @@
+"""
+Query latency benchmark for the collected data search index
+
+Builds an index over a synthetic Zipf-distributed corpus and times a mix of
+term, boolean, phrase and filtered queries. The 10M document run from the
+design review is:
+
+    python -m benchmarks.search_index_benchmark --documents 10000000
+"""
+import argparse
+import itertools
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from app.services.search_index import SearchIndex
+
+SOURCES = ["twitter", "news", "web", "reddit", "linkedin"]
+
+QUERIES = [
+    ("term", "w12"),
+    ("rare_term", "w4000"),
+    ("and", "w3 w40"),
+    ("or", "w25 OR w600"),
+    ("not", "w5 -w7"),
+    ("phrase", '"w1 w2"'),
+    ("source_filter", "w30"),
+    ("date_filter", "w30"),
+]
+
+def generate_documents(count: int, vocabulary_size: int, seed: int):
+    rng = random.Random(seed)
+    # Zipf-like weights: the n-th most common word has weight 1/n
+    words = [f"w{rank}" for rank in range(1, vocabulary_size + 1)]
+    cumulative_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, vocabulary_size + 1)))
+    # Spread the corpus evenly over one year
+    start = datetime(2024, 1, 1)
+    spacing = timedelta(days=365) / count
+    for number in range(count):
+        length = rng.randint(8, 40)
+        yield {
+            "_id": f"doc-{number}",
+            "content": " ".join(rng.choices(words, cum_weights=cumulative_weights, k=length)),
+            "source": rng.choice(SOURCES),
+            "collected_at": start + spacing * number,
+        }
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200000)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--flush-documents", type=int, default=50000)
+    parser.add_argument("--directory", default=None, help="Index directory (a temporary one is removed afterwards)")
+    args = parser.parse_args()
+
+    directory = args.directory or tempfile.mkdtemp(prefix="search-index-")
+    index = SearchIndex(directory, flush_documents=args.flush_documents)
+
+    started = time.perf_counter()
+    index.add_documents(generate_documents(args.documents, args.vocabulary, seed=7))
+    index.flush()
+    build_seconds = time.perf_counter() - started
+    size_bytes = sum(
+        entry.stat().st_size
+        for segment in index._segments.values()
+        for entry in os.scandir(segment.path)
+    )
+    print(f"indexed {args.documents} documents in {build_seconds:.1f}s "
+          f"({args.documents / build_seconds:.0f} docs/s), {len(index._segments)} segments, "
+          f"{size_bytes / 1e6:.1f} MB on disk")
+
+    print(f"{'query':<14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'hits':>8}")
+    for name, query in QUERIES:
+        kwargs = {}
+        if name == "source_filter":
+            kwargs["source"] = "news"
+        if name == "date_filter":
+            kwargs["date_from"] = date(2024, 3, 1)
+            kwargs["date_to"] = date(2024, 3, 7)
+        timings = []
+        hits = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            hits = index.search(query, limit=10, **kwargs)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<14} {statistics.median(timings):9.2f} {percentile(timings, 0.95):9.2f} "
+              f"{percentile(timings, 0.99):9.2f} {len(hits):8d}")
+
+    index.close()
+    if args.directory is None:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
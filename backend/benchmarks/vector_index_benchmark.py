@@ -0,0 +1,138 @@
+"""
+Recall and latency benchmark for the semantic search vector index
+
+Builds an IVF-PQ index over synthetic clustered unit vectors (the shape of
+sentence embeddings: many topics, documents near their topic) through the
+same add/flush path as ingestion, then times queries at several probe
+counts and measures recall@10 against exact brute-force neighbours. Vectors
+are generated in seeded chunks and regenerated for the exact search, so
+memory stays flat as the corpus grows. The runs from the design review are:
+
+    python -m benchmarks.vector_index_benchmark --vectors 1000000 10000000
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.vector_index import VectorIndex
+
+SOURCES = ["twitter", "news", "web", "reddit", "linkedin"]
+CHUNK_VECTORS = 50000
+FIRST_DAY = 738886  # 2024-01-01
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def topic_centers(topics: int, dimensions: int, seed: int) -> np.ndarray:
+    return unit(np.random.default_rng([seed, 0]).standard_normal((topics, dimensions)))
+
+def generate_chunk(centers: np.ndarray, chunk: int, count: int, spread: float, seed: int) -> tuple:
+    rng = np.random.default_rng([seed, 1, chunk])
+    topics = rng.integers(0, len(centers), count)
+    noise = rng.standard_normal((count, centers.shape[1])) * (spread / np.sqrt(centers.shape[1]))
+    return unit(centers[topics] + noise), rng.integers(0, len(SOURCES), count), rng.integers(0, 365, count)
+
+def iter_chunks(total: int, centers: np.ndarray, spread: float, seed: int):
+    for chunk, start in enumerate(range(0, total, CHUNK_VECTORS)):
+        yield start, *generate_chunk(centers, chunk, min(CHUNK_VECTORS, total - start), spread, seed)
+
+def exact_neighbours(queries: np.ndarray, total: int, centers: np.ndarray, spread: float, seed: int, k: int) -> np.ndarray:
+    """
+    Row numbers of the k most similar vectors to each query, streaming over the regenerated corpus
+    """
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), k), dtype=np.int64)
+    for start, vectors, _, _ in iter_chunks(total, centers, spread, seed):
+        scores = queries @ vectors.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        merged_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+        merged_rows = np.concatenate([best_rows, top + start], axis=1)
+        keep = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+        best_rows = np.take_along_axis(merged_rows, keep, axis=1)
+    return best_rows
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def run(args: argparse.Namespace, total: int) -> None:
+    centers = topic_centers(args.topics, args.dimensions, args.seed)
+    directory = tempfile.mkdtemp(prefix="vector-index-")
+    try:
+        index = VectorIndex(
+            directory,
+            flush_documents=args.flush_documents,
+            train_size=args.train_size,
+            lists=args.lists,
+            subvectors=args.subvectors,
+        )
+        started = time.perf_counter()
+        for start, vectors, sources, days in iter_chunks(total, centers, args.spread, args.seed):
+            index.add(
+                [str(row) for row in range(start, start + len(vectors))],
+                vectors,
+                [SOURCES[source] for source in sources],
+                (days + FIRST_DAY).tolist(),
+            )
+        index.flush()
+        build_seconds = time.perf_counter() - started
+        stats = index.stats()
+        size = directory_size(directory)
+        print(
+            f"{total} vectors, d={args.dimensions}: built in {build_seconds:.1f} s,"
+            f" {stats['segments']} segments, {stats['lists']} lists, {size / 2**20:.0f} MiB on disk"
+            f" ({size / total:.0f} bytes/vector)"
+        )
+
+        # Queries are fresh points around the same topics
+        rng = np.random.default_rng([args.seed, 2])
+        queries = unit(
+            centers[rng.integers(0, args.topics, args.queries)]
+            + rng.standard_normal((args.queries, args.dimensions)) * (args.spread / np.sqrt(args.dimensions))
+        )
+        started = time.perf_counter()
+        truth = exact_neighbours(queries, total, centers, args.spread, args.seed, args.k)
+        print(f"  exact neighbours of {args.queries} queries in {time.perf_counter() - started:.1f} s")
+
+        for probes in args.probes:
+            latencies = []
+            hits = 0
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                found = index.search(query, limit=args.k, probes=probes, rerank=args.rerank)
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits += len({int(doc_id) for doc_id, _ in found} & set(expected.tolist()))
+            latencies.sort()
+            print(
+                f"  probes {probes:>3}  recall@{args.k} {hits / truth.size:.3f}"
+                f"  p50 {statistics.median(latencies):7.2f} ms  p95 {latencies[int(len(latencies) * 0.95)]:7.2f} ms"
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=5000)
+    parser.add_argument("--spread", type=float, default=0.8, help="Noise norm around a topic center")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--probes", type=int, nargs="+", default=[8, 16, 32, 64])
+    parser.add_argument("--rerank", type=int, default=40, help="Candidates re-scored exactly per result")
+    parser.add_argument("--lists", type=int, default=1024)
+    parser.add_argument("--subvectors", type=int, default=48)
+    parser.add_argument("--train-size", type=int, default=50000)
+    parser.add_argument("--flush-documents", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    for total in args.vectors:
+        run(args, total)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.services import report_cache
+from app.services.report_cache import batch_context, batch_fingerprints, entity_set_key, source_fingerprints
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = mongomock.MongoClient().db.collected_data
+    monkeypatch.setattr(report_cache, "get_collected_data_collection", lambda: collection)
+    return collection
+
+def test_batch_fingerprints_match_source_fingerprints(collection):
+    collection.insert_many([
+        {"source": "twitter", "collected_at": datetime(2024, 1, day, 12), "entities": entities, "updated_at": datetime(2024, 2, 1, day)}
+        for day, entities in [(1, ["Acme"]), (1, ["Acme", "Globex"]), (2, ["Globex"])]
+    ])
+    contexts = [
+        {
+            "data_sources": ["twitter"],
+            "entities": entities,
+            "window_start": datetime(2024, 1, 1),
+            "window_end": datetime(2024, 1, 3),
+            "competitors": [],
+        }
+        for entities in (["Acme"], None)
+    ]
+    batched = batch_fingerprints(
+        batch_context(contexts),
+        "twitter",
+        {entity_set_key(context["entities"]): context["entities"] for context in contexts},
+    )
+    for context in contexts:
+        assert batched[entity_set_key(context["entities"])] == source_fingerprints(context, "twitter")
+
+    # An update in place changes both fingerprints alike
+    collection.update_one({"entities": ["Globex"]}, {"$set": {"sentiment": "positive", "updated_at": datetime(2024, 3, 1)}})
+    batched = batch_fingerprints(batch_context(contexts), "twitter", {"*": None})
+    assert batched["*"] == source_fingerprints(contexts[1], "twitter")
+    assert batched["*"]["2024-01-02"].endswith("2024-03-01T00:00:00")
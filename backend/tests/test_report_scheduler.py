@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.core import database
+from app.core.config import settings
+from app.services import report_scheduler
+from app.services.report_cache import source_fingerprints
+from app.services.report_pipeline import build_context
+from app.services.report_store import get_reports_collection
+
+@pytest.fixture
+def mongo(monkeypatch):
+    monkeypatch.setattr(database, "mongo_db", mongomock.MongoClient().db)
+    monkeypatch.setattr(settings, "LIVE_EVENTS_ENABLED", False)
+    return database.mongo_db
+
+def test_scheduled_reports_reuse_the_fingerprints_of_on_demand_reports(mongo, monkeypatch):
+    now = datetime.utcnow()
+    mongo.collected_data.insert_many([
+        {"source": "twitter", "collected_at": now - timedelta(days=day), "entities": ["Acme"], "updated_at": now}
+        for day in (1, 1, 2)
+    ])
+    handed_over = {}
+    monkeypatch.setattr(report_scheduler, "fill_batch_section_cache", lambda *args: {"aggregations": 0, "compute_ms": 0.0})
+    monkeypatch.setattr(report_scheduler, "run_report", lambda report_id, known: handed_over.update({report_id: known}))
+    schedules = [
+        report_scheduler.create_report_schedule(
+            1,
+            {"title": "Weekly", "data_sources": ["twitter"], "time_period": "last_week", "entities": entities, "format": "html"},
+            ["sentiment"],
+            24,
+        )
+        for entities in (["Acme"], None)
+    ]
+
+    report_scheduler.run_batch(schedules, now)
+
+    assert len(handed_over) == 2
+    for report_id, known in handed_over.items():
+        context = build_context(get_reports_collection().find_one({"_id": report_id}))
+        assert known["twitter"] and known["twitter"] == source_fingerprints(context, "twitter")
@@ -0,0 +1,23 @@
+import random
+
+from app.services.search_index import SearchIndex
+
+def test_flushes_keep_replaced_and_deleted_documents_out(tmp_path):
+    index = SearchIndex(str(tmp_path), flush_documents=1000000, merge_factor=3)
+    rng = random.Random(1)
+    live = {}
+    for _ in range(12):
+        for _ in range(50):
+            doc_id = str(rng.randint(0, 400))
+            live[doc_id] = f"term{rng.randint(0, 9)} common"
+            index.add_documents([{"id": doc_id, "source": rng.choice("ab"), "content": live[doc_id], "collected_at": "2026-01-01"}])
+        deleted = rng.sample(sorted(live), 10)
+        index.delete_documents(deleted)
+        for doc_id in deleted:
+            del live[doc_id]
+        index.flush()
+        assert index.document_ids() == set(live)
+        assert sorted(index.match_ids("common")) == sorted(live)
+
+    # Another process reading the same directory sees the same documents
+    assert SearchIndex(str(tmp_path)).document_ids() == set(live)
@@ -0,0 +1,70 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.core.config import settings
+from app.services import stream_ingestion
+from app.services.collected_data import COLLECTED_DATA_INDEXES
+from app.services.stream_ingestion import InMemoryStreamSource, StreamIngestionPipeline, StreamSource
+
+def post(post_id: str) -> dict:
+    return {"id": post_id, "platform": "twitter", "content": f"post {post_id}", "author": "someone"}
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = mongomock.MongoClient().db.collected_data
+    collection.create_indexes(COLLECTED_DATA_INDEXES)
+    monkeypatch.setattr(stream_ingestion, "get_collected_data_collection", lambda: collection)
+    monkeypatch.setattr(settings, "ALERTS_ENABLED", False)
+    return collection
+
+def test_stream_source_is_abstract():
+    with pytest.raises(TypeError):
+        StreamSource()
+
+def test_offsets_are_committed_only_after_the_write(collection):
+    source = InMemoryStreamSource({0: [post("1"), post("2")], 1: [post("3")]})
+
+    def failing_writer(documents):
+        raise RuntimeError("datastore unavailable")
+
+    with pytest.raises(RuntimeError):
+        StreamIngestionPipeline(source, writer=failing_writer).process_batch(source.poll(10, 0))
+    assert source.committed == {0: 0, 1: 0}
+
+    # Restarted consumers resume from the committed offsets
+    source.rewind()
+    pipeline = StreamIngestionPipeline(source)
+    assert pipeline.process_batch(source.poll(10, 0)) == 3
+    assert source.committed == {0: 2, 1: 1}
+    assert source.lag() == {0: 0, 1: 0}
+    assert collection.count_documents({}) == 3
+
+def test_replayed_and_repeated_records_are_stored_once(collection):
+    source = InMemoryStreamSource({0: [post("1"), post("2"), post("1")]})
+    pipeline = StreamIngestionPipeline(source)
+    assert pipeline.process_batch(source.poll(10, 0)) == 2
+    assert pipeline.stats.duplicates == 1
+
+    # A crash between the write and the offset commit replays the batch
+    # into a consumer with an empty dedupe cache
+    source.committed[0] = 0
+    source.rewind()
+    replay = StreamIngestionPipeline(source)
+    assert replay.process_batch(source.poll(10, 0)) == 0
+    assert replay.stats.duplicates == 3
+    assert source.committed == {0: 3}
+    assert sorted(document["dedupe_key"] for document in collection.find()) == ["twitter:1", "twitter:2"]
+
+def test_failing_stages_after_the_commit_do_not_stop_the_batch(collection, monkeypatch):
+    def failing_stage(documents):
+        raise RuntimeError("index unavailable")
+
+    mentioned = []
+    monkeypatch.setattr(stream_ingestion, "index_collected_documents", failing_stage)
+    monkeypatch.setattr(stream_ingestion, "record_competitor_mentions", mentioned.extend)
+    source = InMemoryStreamSource({0: [post("1"), post("2")]})
+    assert StreamIngestionPipeline(source).process_batch(source.poll(10, 0)) == 2
+    assert source.committed == {0: 2}
+    # Later stages still run
+    assert len(mentioned) == 2
@@ -0,0 +1,25 @@
+import random
+
+import numpy as np
+
+from app.services.vector_index import VectorIndex
+
+def test_flushes_keep_replaced_and_deleted_vectors_out(tmp_path):
+    index = VectorIndex(str(tmp_path), flush_documents=1000000, train_size=600, lists=4, subvectors=4, merge_factor=3)
+    rng = random.Random(1)
+    vectors = np.random.default_rng(0).normal(size=(100, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    live = set()
+    for _ in range(12):
+        doc_ids = [str(rng.randint(0, 400)) for _ in range(100)]
+        index.add(doc_ids, vectors, [rng.choice("ab") for _ in doc_ids], [1] * len(doc_ids))
+        live.update(doc_ids)
+        deleted = rng.sample(sorted(live), 10)
+        index.delete(deleted)
+        live.difference_update(deleted)
+        index.flush()
+        assert index.document_ids() == live
+        assert index.doc_count == len(live)
+
+    # Another process reading the same directory sees the same vectors
+    assert VectorIndex(str(tmp_path)).document_ids() == live